@@ -0,0 +1,143 @@
+"""
+Measures the time of syntax coloring updates after typical edits in a large file.
+
+Compares incremental lexing of triple-quoted strings with rescanning the whole text,
+as was done before for each edit which could affect triple-quoted strings.
+
+Needs a display. Run from the repository root:
+
+    python misc/benchmarks/coloring.py [line_count]
+"""
+
+import statistics
+import sys
+import time
+import tkinter as tk
+from os.path import abspath, dirname, join
+from types import SimpleNamespace
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..", "..")))
+
+from thonny.plugins.coloring import CodeViewSyntaxColorer
+
+TAGS = [
+    "comment",
+    "magic",
+    "string",
+    "open_string",
+    "keyword",
+    "number",
+    "builtin",
+    "definition",
+    "function_call",
+    "method_call",
+    "class_definition",
+    "function_definition",
+    "string3",
+    "open_string3",
+    "tab",
+    "unclosed_expression",
+]
+
+CHUNK = '''
+class Shape{0}:
+    """
+    Docstring of class {0}
+    """
+
+    def area(self, width, height=2.5):
+        # comment with 'quotes'
+        result = width * height + {0}
+        print("Area:", result, 'of', self)
+        return result
+'''
+
+
+def create_source(line_count):
+    chunks = []
+    i = 0
+    while len(chunks) * CHUNK.count("\n") < line_count:
+        chunks.append(CHUNK.format(i))
+        i += 1
+    return "".join(chunks)
+
+
+def insert(text, colorer, index, chars):
+    index = text.index(index)
+    text.insert(index, chars)
+    colorer.mark_dirty(
+        SimpleNamespace(sequence="TextInsert", index=index, text=chars, trivial_for_coloring=False)
+    )
+
+
+def delete(text, colorer, index1, index2):
+    index1 = text.index(index1)
+    index2 = text.index(index2)
+    text.delete(index1, index2)
+    colorer.mark_dirty(
+        SimpleNamespace(
+            sequence="TextDelete", index1=index1, index2=index2, trivial_for_coloring=False
+        )
+    )
+
+
+def measure(text, colorer, edit, rounds=20):
+    times = []
+    full_times = []
+    for _ in range(rounds):
+        edit()
+        start = time.perf_counter()
+        colorer._update_coloring()
+        times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        colorer._update_multiline_tokens("1.0", "end")
+        full_times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000, statistics.median(full_times) * 1000
+
+
+def main():
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    root = tk.Tk()
+    text = tk.Text(root, width=100, height=40)
+    text.grid()
+    for tag in TAGS:
+        text.tag_configure(tag)
+    text.insert("1.0", create_source(line_count))
+    root.update()
+
+    colorer = CodeViewSyntaxColorer(text)
+    colorer.mark_dirty()
+    start = time.perf_counter()
+    colorer._update_coloring()
+    print(f"initial coloring of {line_count} lines: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    middle = line_count // 2
+    text.see(f"{middle}.0")
+    root.update()
+
+    scenarios = {
+        "type a letter": lambda: insert(text, colorer, f"{middle}.8", "x"),
+        "type a newline": lambda: insert(text, colorer, f"{middle}.0", "\n"),
+        "type a hash": lambda: insert(text, colorer, f"{middle}.0", "#"),
+        "type a quote": lambda: insert(text, colorer, f"{middle}.0", '"'),
+        "open and close a string3": lambda: (
+            insert(text, colorer, f"{middle}.0", '"""')
+            if '"""' not in text.get(f"{middle}.0", f"{middle}.3")
+            else delete(text, colorer, f"{middle}.0", f"{middle}.3")
+        ),
+    }
+
+    for name, edit in scenarios.items():
+        incremental_ms, full_ms = measure(text, colorer, edit)
+        print(
+            f"{name:<26} incremental: {incremental_ms:7.2f} ms,"
+            f" full string3 rescan: {full_ms:7.2f} ms"
+        )
+
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
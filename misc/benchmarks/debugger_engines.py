@@ -0,0 +1,124 @@
+"""
+Compares the sys.monitoring and settrace engines of the faster debugger ("FastDebug").
+
+The program runs a busy loop and calls a function whose last line has a breakpoint,
+so most of the measured time is spent in code which the debugger doesn't need to stop in.
+The sys.monitoring engine is only available on Python 3.12 and later.
+
+Run from the repository root:
+
+    python misc/benchmarks/debugger_engines.py [path/to/python]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..", "..")))
+
+from thonny.common import (
+    DebuggerCommand,
+    ToplevelCommand,
+    parse_message,
+    read_one_incoming_message_str,
+    serialize_message,
+)
+
+LAUNCHER = join(
+    dirname(__file__), "..", "..", "thonny", "plugins", "cpython_backend", "cp_launcher.py"
+)
+
+PROGRAM = """
+def busy(n):
+    total = 0
+    for i in range(n):
+        total += i % 7
+    return total
+
+def finish(result):
+    return result
+
+finish(busy(2_000_000))
+"""
+BREAKPOINT_LINE = 10
+REPEATS = 5
+
+
+def run_program(python, program_path, command_name, engine):
+    env = dict(os.environ, THONNY_DEBUGGER_ENGINE=engine)
+    proc = subprocess.Popen(
+        [python, LAUNCHER, dirname(program_path), "{}"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        env=env,
+    )
+    try:
+        proc.stdout.readline()  # greeting
+
+        def send(msg):
+            proc.stdin.write(serialize_message(msg) + "\n")
+            proc.stdin.flush()
+
+        def read_response():
+            while True:
+                data = read_one_incoming_message_str(proc.stdout.readline)
+                if data == "":
+                    raise RuntimeError("Backend exited unexpectedly")
+                if not data.startswith("\x02"):
+                    continue
+                msg = parse_message(data)
+                if msg.event_type in ["DebuggerResponse", "ToplevelResponse"]:
+                    return msg
+
+        breakpoints = {program_path: {BREAKPOINT_LINE}}
+        start_time = time.perf_counter()
+        send(ToplevelCommand(command_name, args=[program_path], breakpoints=breakpoints))
+        msg = read_response()
+        if msg.event_type == "DebuggerResponse":
+            frame = msg.stack[-1]
+            assert frame.lineno == BREAKPOINT_LINE, frame.lineno
+            send(
+                DebuggerCommand(
+                    "resume",
+                    frame_id=frame.id,
+                    breakpoints=breakpoints,
+                    state=frame.event,
+                    focus=frame.focus,
+                    exception=None,
+                    allow_stepping_into_libraries=False,
+                )
+            )
+            msg = read_response()
+        assert msg.event_type == "ToplevelResponse"
+        return time.perf_counter() - start_time
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def main():
+    python = sys.argv[1] if len(sys.argv) > 1 else sys.executable
+    with tempfile.TemporaryDirectory() as temp_dir:
+        program_path = join(temp_dir, "busy.py")
+        with open(program_path, "w", encoding="utf-8") as fp:
+            fp.write(PROGRAM)
+
+        for label, command_name, engine in [
+            ("Run", "Run", ""),
+            ("FastDebug, settrace", "FastDebug", "settrace"),
+            ("FastDebug, sys.monitoring", "FastDebug", "monitoring"),
+        ]:
+            times = [
+                run_program(python, program_path, command_name, engine) for _ in range(REPEATS)
+            ]
+            print(f"{label:<28} median {statistics.median(times) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Compares the cached JSON<->dataclass converters of lsp_proxy with the former recursive ones.
+
+Uses synthetic completion, diagnostics and semantic tokens messages. Recorded traffic can
+be given as arguments. Thonny records it into lsp_communication_*.log files in its user
+directory, when running in debug mode.
+
+Run from the repository root:
+
+    python misc/benchmarks/lsp_conversion.py [lsp_communication_PyrightProxy.log ...]
+"""
+
+import inspect
+import json
+import re
+import sys
+import time
+import typing
+from enum import Enum
+from os.path import abspath, dirname, join
+from types import NoneType, UnionType
+from typing import Any, Dict, List, Optional, Tuple, Type, Union, get_args, get_origin
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..", "..")))
+
+from thonny import lsp_types
+from thonny.lsp_proxy import LanguageServerProxy, _convert_from_json_value, _convert_to_json_value
+
+
+def legacy_convert_from_json_value(value: Any, target_type: Type):
+    """The implementation before converter caching"""
+    from dataclasses import is_dataclass
+    from typing import get_type_hints
+
+    if target_type in [None, NoneType]:
+        if value is None:
+            return None
+        else:
+            raise TypeError(f"Expected None but got {type(value)}")
+    elif target_type in [int, float, bool, str]:
+        if isinstance(value, target_type):
+            return value
+        else:
+            raise TypeError(f"Expected {target_type} but got {type(value)}")
+    elif target_type == dict or get_origin(target_type) == dict:
+        if isinstance(value, dict):
+            return value
+        else:
+            raise TypeError(f"Expected dict but got {type(value)}")
+    elif target_type == list or get_origin(target_type) == list:
+        if not isinstance(value, list):
+            raise TypeError(f"Expected list but got {type(value)}")
+        if target_type == list:
+            return value
+        element_type = get_args(target_type)[0]
+        return [legacy_convert_from_json_value(element, element_type) for element in value]
+    elif get_origin(target_type) in (Union, UnionType):
+        for target_type_option in get_args(target_type):
+            try:
+                return legacy_convert_from_json_value(value, target_type_option)
+            except TypeError:
+                pass
+        raise TypeError(f"Could not convert {value} to {target_type}")
+    elif isinstance(target_type, typing.ForwardRef):
+        referenced_type = getattr(lsp_types, target_type.__forward_arg__)
+        return legacy_convert_from_json_value(value, referenced_type)
+    elif is_dataclass(target_type):
+        if not isinstance(value, dict):
+            raise TypeError(f"Can not convert {type(value)} to {target_type}")
+        converted_fields = {}
+        field_types = get_type_hints(target_type)
+        for field_name in value:
+            if field_name not in field_types:
+                raise TypeError(f"field {field_name} is not present in {target_type}")
+            converted_fields[field_name] = legacy_convert_from_json_value(
+                value[field_name], field_types[field_name]
+            )
+        return target_type(**converted_fields)
+    elif issubclass(target_type, Enum):
+        return target_type(value)
+    else:
+        raise RuntimeError(f"Unexpected type {target_type}")
+
+
+def create_completion_response(item_count: int) -> Dict:
+    items = []
+    for i in range(item_count):
+        edit_range = {"start": {"line": 10, "character": 4}, "end": {"line": 10, "character": 6}}
+        if i % 2:
+            text_edit = {"range": edit_range, "newText": f"name_{i}"}
+        else:
+            text_edit = {"insert": edit_range, "replace": edit_range, "newText": f"name_{i}"}
+        items.append(
+            {
+                "label": f"name_{i}",
+                "kind": i % 25 + 1,
+                "sortText": f"09.9999.name_{i}",
+                "detail": "module" if i % 3 else None,
+                "documentation": (
+                    {"kind": "markdown", "value": f"Documentation of `name_{i}`"}
+                    if i % 4
+                    else f"Plain documentation {i}"
+                ),
+                "textEdit": text_edit,
+                "data": {"workspacePath": "/home/user", "position": {"line": 10, "character": 6}},
+            }
+        )
+    return {"isIncomplete": False, "items": items}
+
+
+def create_diagnostics_notification(count: int) -> Dict:
+    return {
+        "uri": "file:///home/user/prog.py",
+        "version": 3,
+        "diagnostics": [
+            {
+                "range": {"start": {"line": i, "character": 0}, "end": {"line": i, "character": 8}},
+                "message": f'"name_{i}" is not defined',
+                "severity": 1 + i % 4,
+                "source": "Pyright",
+                "code": "reportUndefinedVariable",
+                "codeDescription": {"href": "https://github.com/microsoft/pyright/docs"},
+                "tags": [1] if i % 5 == 0 else None,
+            }
+            for i in range(count)
+        ],
+    }
+
+
+def get_result_types_by_method() -> Dict[str, Type]:
+    result = {}
+    for name, function in inspect.getmembers(LanguageServerProxy, inspect.isfunction):
+        if not name.startswith("request_"):
+            continue
+        match = re.search(r'_send_request\(\s*"([^"]+)"', inspect.getsource(function))
+        handler_type = inspect.signature(function).parameters["handler"].annotation
+        response_type = get_args(handler_type)[0][0]
+        result[match.group(1)] = get_args(response_type)[0]
+    return result
+
+
+def load_recorded_messages(path: str) -> List[Tuple[Any, Type]]:
+    result_types = get_result_types_by_method()
+    notification_types = {"textDocument/publishDiagnostics": lsp_types.PublishDiagnosticsParams}
+    with open(path, encoding="utf-8") as fp:
+        blocks = re.split(r"^\[\[\[ FROM (CLIENT|SERVER) \]\]\]$", fp.read(), flags=re.MULTILINE)
+
+    methods_by_request_id = {}
+    messages = []
+    for sender, block in zip(blocks[1::2], blocks[2::2]):
+        msg = json.loads(block)
+        if sender == "CLIENT" and "id" in msg and "method" in msg:
+            methods_by_request_id[msg["id"]] = msg["method"]
+        elif sender == "SERVER" and "result" in msg:
+            method = methods_by_request_id.get(msg["id"])
+            if method in result_types:
+                messages.append((msg["result"], result_types[method]))
+        elif sender == "SERVER" and msg.get("method") in notification_types:
+            messages.append((msg["params"], notification_types[msg["method"]]))
+
+    return messages
+
+
+def measure(converter, messages, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for value, target_type in messages:
+            converter(value, target_type)
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    completion_type = Union[List[lsp_types.CompletionItem], lsp_types.CompletionList, None]
+    scenarios = {
+        "completion, 2000 items": [(create_completion_response(2000), completion_type)],
+        "diagnostics, 500 items": [
+            (create_diagnostics_notification(500), lsp_types.PublishDiagnosticsParams)
+        ],
+        "semantic tokens, 50000 ints": [
+            ({"resultId": "1", "data": list(range(50000))}, Optional[lsp_types.SemanticTokens])
+        ],
+    }
+    for path in sys.argv[1:]:
+        scenarios[path] = load_recorded_messages(path)
+
+    for name, messages in scenarios.items():
+        # both must produce equal objects
+        for value, target_type in messages:
+            converted = _convert_from_json_value(value, target_type)
+            assert converted == legacy_convert_from_json_value(value, target_type)
+            _convert_to_json_value(converted)
+
+        legacy_ms = measure(legacy_convert_from_json_value, messages, 3)
+        cached_ms = measure(_convert_from_json_value, messages, 3)
+        converted_messages = [_convert_from_json_value(v, t) for v, t in messages]
+        start = time.perf_counter()
+        for _ in range(3):
+            for msg in converted_messages:
+                _convert_to_json_value(msg)
+        encode_ms = (time.perf_counter() - start) / 3 * 1000
+        print(
+            f"{name:<30} decode: legacy {legacy_ms:8.1f} ms, cached {cached_ms:8.1f} ms"
+            f" ({legacy_ms / cached_ms:4.1f}x)   encode: {encode_ms:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
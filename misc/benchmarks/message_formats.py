@@ -0,0 +1,115 @@
+"""
+Compares the text (ascii/eval) and binary (marshal/base64) formats of backend messages.
+
+Run from the repository root:
+
+    python misc/benchmarks/message_formats.py
+"""
+
+import statistics
+import sys
+import time
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, abspath(join(dirname(__file__), "..", "..")))
+
+from thonny.common import (
+    BINARY_MESSAGE_FORMAT,
+    TEXT_MESSAGE_FORMAT,
+    BackendEvent,
+    DebuggerResponse,
+    FrameInfo,
+    TextRange,
+    ToplevelResponse,
+    ValueInfo,
+    parse_message,
+    serialize_message,
+)
+
+
+def create_output_events(count):
+    return [
+        BackendEvent("ProgramOutput", stream_name="stdout", data=f"Line {i}: {'x' * (i % 80)}\n")
+        for i in range(count)
+    ]
+
+
+def create_toplevel_response(global_count):
+    return ToplevelResponse(
+        command_name="execute_source",
+        cwd="/home/user/projects",
+        globals={
+            f"var_{i}": ValueInfo(140000000 + i, repr(list(range(i % 30)))) for i in range(global_count)
+        },
+    )
+
+
+def create_debugger_response(frame_count, local_count):
+    frames = []
+    for i in range(frame_count):
+        frames.append(
+            FrameInfo(
+                id=1000 + i,
+                filename="/home/user/projects/prog.py",
+                module_name="__main__",
+                code_name=f"func_{i}",
+                source="def f(x):\n    return x * 2\n" * 20,
+                lineno=i + 1,
+                firstlineno=1,
+                in_library=False,
+                locals={f"loc_{j}": ValueInfo(2000 + j, repr(j * 1.5)) for j in range(local_count)},
+                globals={f"glob_{j}": ValueInfo(3000 + j, repr("s" * j)) for j in range(50)},
+                freevars=(),
+                event="before_statement",
+                focus=TextRange(i + 1, 4, i + 1, 20),
+                node_tags={"statement", "Expr"},
+                current_statement=TextRange(i + 1, 4, i + 1, 20),
+                current_root_expression=None,
+                current_evaluations=[(TextRange(i + 1, 4, i + 1, 5), "42")],
+            )
+        )
+    return DebuggerResponse(stack=frames, in_present=True, io_symbol_count=1234)
+
+
+def measure(messages, message_format, rounds=5):
+    latencies = []
+    total_chars = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for msg in messages:
+            t = time.perf_counter()
+            data = serialize_message(msg, message_format=message_format)
+            parse_message(data)
+            latencies.append(time.perf_counter() - t)
+            total_chars += len(data)
+    duration = time.perf_counter() - start
+    return {
+        "messages_per_s": len(messages) * rounds / duration,
+        "median_latency_ms": statistics.median(latencies) * 1000,
+        "max_latency_ms": max(latencies) * 1000,
+        "avg_chars": total_chars / len(latencies),
+    }
+
+
+def main():
+    scenarios = {
+        "10000 output events": create_output_events(10000),
+        "toplevel response, 5000 globals": [create_toplevel_response(5000)] * 5,
+        "debugger response, 30 frames": [create_debugger_response(30, 100)] * 5,
+    }
+
+    for name, messages in scenarios.items():
+        print(name)
+        for message_format in [TEXT_MESSAGE_FORMAT, BINARY_MESSAGE_FORMAT]:
+            result = measure(messages, message_format)
+            print(
+                f"  {message_format:<7}"
+                f" {result['messages_per_s']:10.0f} msg/s"
+                f"   median {result['median_latency_ms']:8.3f} ms"
+                f"   max {result['max_latency_ms']:8.3f} ms"
+                f"   {result['avg_chars']:10.0f} chars/msg"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares importing all built-in plug-in modules (as happens when the plug-in manifest
+is missing) with importing only the modules which don't allow lazy loading.
+
+Only the import part of plug-in loading is measured, as load_plugin functions need
+the workbench. For a full startup profile, run Thonny with THONNY_REPORT_TIME=1 and look
+for the TIME/MODS lines in frontend.log (twice, so that the second run uses the manifest).
+
+Run from the repository root:
+
+    python misc/benchmarks/plugin_loading.py
+"""
+
+import statistics
+import subprocess
+import sys
+from os.path import abspath, dirname, join
+
+REPO_DIR = abspath(join(dirname(__file__), "..", ".."))
+REPEATS = 5
+
+CHILD_SCRIPT = """
+import importlib, pkgutil, sys, time
+import thonny.workbench
+import thonny.plugins
+from thonny.plugin_manifest import LAZY_LOADING_FLAG
+
+skip_lazy = sys.argv[1] == "1"
+lazy_names = set(sys.argv[2].split(",")) if skip_lazy else set()
+start_time = time.perf_counter()
+for _, name, _ in sorted(
+    pkgutil.iter_modules(thonny.plugins.__path__, "thonny.plugins."), key=lambda x: x[2]
+):
+    if name not in lazy_names:
+        try:
+            m = importlib.import_module(name)
+        except ImportError:
+            # Thonny logs these and goes on
+            continue
+        if getattr(m, LAZY_LOADING_FLAG, False):
+            print(name)
+print(time.perf_counter() - start_time)
+"""
+
+
+def measure(skip_lazy, lazy_names):
+    out = subprocess.check_output(
+        [sys.executable, "-c", CHILD_SCRIPT, "1" if skip_lazy else "0", ",".join(lazy_names)],
+        cwd=REPO_DIR,
+        text=True,
+    )
+    *names, duration = out.splitlines()
+    return names, float(duration)
+
+
+def main():
+    lazy_names, _ = measure(False, [])
+    print("Lazy plug-ins:", ", ".join(name.split(".")[-1] for name in lazy_names))
+
+    for label, skip_lazy in [("All plug-in modules", False), ("Without lazy plug-ins", True)]:
+        times = [measure(skip_lazy, lazy_names)[1] for _ in range(REPEATS)]
+        print(f"{label:<24} median {statistics.median(times) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
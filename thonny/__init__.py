@@ -29,7 +29,8 @@ sys.path.insert(
 
 SINGLE_INSTANCE_DEFAULT = True
 BACKEND_LOG_MARKER = "Thonny's backend.log"
-REPORT_TIME = False
+# Startup profile (see report_time) can be requested with THONNY_REPORT_TIME=1
+REPORT_TIME = os.environ.get("THONNY_REPORT_TIME", "") in ["1", "True", "true"]
 
 
 logger = getLogger(__name__)
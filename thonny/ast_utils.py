@@ -177,6 +177,12 @@ def mark_text_ranges(node, source: Union[str, bytes], fallback_to_one_char=False
     assert isinstance(source, (str, bytes))
     from asttokens.asttokens import ASTTokens
 
+    if isinstance(source, bytes):
+        # ASTTokens expects text
+        from importlib.util import decode_source
+
+        source = decode_source(source)
+
     ASTTokens(source, tree=node)
     for child in ast.walk(node):
         if hasattr(child, "last_token"):
@@ -29,6 +29,7 @@ from thonny.common import (  # TODO: try to get rid of this
     ToplevelCommand,
     ToplevelResponse,
     execute_with_frontend_sys_path,
+    get_message_format_from_environment,
     parse_message,
     read_one_incoming_message_str,
     serialize_message,
@@ -45,6 +46,9 @@ logger = getLogger(__name__)
 class BaseBackend(ABC):
     """Methods for both MainBackend and forwarding backend"""
 
+    # Format of outgoing messages, as requested by the frontend
+    _message_format = get_message_format_from_environment()
+
     def __init__(self):
         self._current_command = None
         self._current_command_interrupt_event = None
@@ -193,7 +197,7 @@ class BaseBackend(ABC):
                 return InlineResponse(command_name=command.name, **args)
 
     def send_message(self, msg: MessageFromBackend) -> None:
-        sys.stdout.write(serialize_message(msg) + "\n")
+        sys.stdout.write(serialize_message(msg, message_format=self._message_format) + "\n")
         sys.stdout.flush()
 
     def _send_output(self, data, stream_name):
@@ -5,10 +5,10 @@ import tkinter as tk
 from abc import ABC
 from logging import getLogger
 from tkinter import messagebox, simpledialog, ttk
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from thonny import get_runner, get_workbench, misc_utils, tktextext
-from thonny.common import InlineCommand, UserError, get_dirs_children_info
+from thonny.common import InlineCommand, UserError, get_single_dir_child_data
 from thonny.languages import tr
 from thonny.misc_utils import (
     format_date_and_time_compact,
@@ -47,6 +47,17 @@ FILE_DIALOG_REVERSE_ORDER_OPTION = "file.dialog_reverse_order"
 FILE_DIALOG_WIDTH_EMS_OPTION = "file.dialog_width_ems"
 FILE_DIALOG_HEIGHT_EMS_OPTION = "file.dialog_height_ems"
 
+# How often local browsers check whether the shown directories have changed
+LOCAL_DIRS_POLL_INTERVAL_MS = 2000
+MAX_CACHED_DIR_LISTINGS = 200
+# Listings of directories modified more recently are not cached, as the file system
+# may not register a change in the same second
+MIN_CACHED_DIR_AGE = 2
+
+# How many children of a directory get inserted into the tree at once. The rest is
+# represented by a placeholder node, which gets replaced by next chunk when it becomes visible.
+RENDER_CHUNK_SIZE = 200
+
 logger = getLogger(__name__)
 
 
@@ -61,6 +72,16 @@ class BaseFileBrowser(ttk.Frame):
         self.reverse_order = reverse_order
         self.filter: Optional[List[str]] = None
 
+        # path -> (children data, filter, order_by, reverse_order, sorted matching names)
+        self._sorted_child_names: Dict[str, Tuple[Any, Any, str, bool, List[str]]] = {}
+        # node id -> number of children to be shown
+        self._rendered_child_counts: Dict[str, int] = {}
+        # node id -> id of its "more items" placeholder node
+        self._more_node_ids: Dict[str, str] = {}
+        # node id -> (name, data) it was last rendered with
+        self._rendered_node_data: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._more_check_id = None
+
         ttk.Frame.__init__(self, master, borderwidth=0, relief="flat")
         self.vert_scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL)
         self.vert_scrollbar.grid(row=0, column=1, sticky=tk.NSEW, rowspan=3)
@@ -92,7 +113,7 @@ class BaseFileBrowser(ttk.Frame):
                 # 4,
                 # 5
             ),
-            yscrollcommand=self.vert_scrollbar.set,
+            yscrollcommand=self._on_tree_yscroll,
             selectmode="extended",
         )
         self.tree.tag_configure("project", font="BoldTkDefaultFont")
@@ -225,6 +246,7 @@ class BaseFileBrowser(ttk.Frame):
         self.invalidate_cache()
         self.path_bar.direct_delete("1.0", "end")
         self.tree.set_children("")
+        self._forget_rendered_nodes()
         self.current_focus = None
 
     def path_exists(self, path: str) -> Optional[bool]:
@@ -240,6 +262,7 @@ class BaseFileBrowser(ttk.Frame):
 
         # clear
         self.tree.set_children(ROOT_NODE_ID)
+        self._forget_rendered_nodes()
 
         self.tree.set(ROOT_NODE_ID, "path", path)
 
@@ -311,7 +334,12 @@ class BaseFileBrowser(ttk.Frame):
         # In most cases this does no harm, because the command would apply to children as well,
         # but dummy dir marker nodes may cause confusion
         nodes = self.tree.selection()
-        return [node for node in nodes if self.tree.item(node, "text") != _dummy_node_text]
+        return [
+            node
+            for node in nodes
+            if self.tree.item(node, "text") != _dummy_node_text
+            and self.tree.set(node, "kind") != "more"
+        ]
 
     def get_selected_node(self):
         """Returns single node (or nothing)"""
@@ -403,25 +431,21 @@ class BaseFileBrowser(ttk.Frame):
         messagebox.showinfo(tr("Storage info"), text, master=self)
 
     def cache_dirs_child_data(self, data):
-        from copy import deepcopy
-
-        data = deepcopy(data)
-
-        for parent_path in data:
-            children_data = data[parent_path]
+        for parent_path, children_data in data.items():
             if isinstance(children_data, dict):
-                for child_name in children_data:
-                    child_data = children_data[child_name]
-                    assert isinstance(child_data, dict)
-                    if "label" not in child_data:
-                        child_data["label"] = child_name
-
-                    if "isdir" not in child_data:
-                        child_data["isdir"] = child_data.get("size_bytes", 0) is None
+                # copy, as listings may be shared between browsers
+                children_data = {
+                    child_name: {
+                        "label": child_name,
+                        "isdir": child_data.get("size_bytes", 0) is None,
+                        **child_data,
+                    }
+                    for child_name, child_data in children_data.items()
+                }
             else:
-                assert children_data is None
+                assert children_data in [None, "file", "missing"]
 
-        self._cached_child_data.update(data)
+            self._cached_child_data[parent_path] = children_data
 
     def file_exists_in_cache(self, path):
         for parent_path in self._cached_child_data:
@@ -463,10 +487,12 @@ class BaseFileBrowser(ttk.Frame):
     def invalidate_cache(self, paths=None):
         if paths is None:
             self._cached_child_data.clear()
+            self._sorted_child_names.clear()
         else:
             for path in paths:
                 if path in self._cached_child_data:
                     del self._cached_child_data[path]
+                self._sorted_child_names.pop(path, None)
 
     def render_children_from_cache(self, node_id=""):
         """This node is supposed to be a directory and
@@ -493,36 +519,38 @@ class BaseFileBrowser(ttk.Frame):
             if node_id == "":
                 self.show_error("Directory " + path + " does not exist anymore", node_id)
             elif children_data == "missing":
+                self._forget_rendered_nodes([node_id])
                 self.tree.delete(node_id)
             else:
                 assert children_data == "file"
+                self._forget_rendered_nodes(self.tree.get_children(node_id))
                 self.tree.set_children(node_id)  # clear the list of children
                 self.tree.item(node_id, open=False)
 
         elif children_data is None:
             raise RuntimeError("None data for %s" % path)
         else:
-            children_data = {
-                name: atts
-                for (name, atts) in children_data.items()
-                if self.item_matches_filter(name, atts)
-            }
-            fs_children_names = children_data.keys()
-            tree_children_ids = self.tree.get_children(node_id)
-
-            # recollect children
-            children = {}
+            names = self.get_sorted_child_names(path, children_data)
+            shown_count = self._get_rendered_child_count(node_id, path, names)
+            shown_names = names[:shown_count]
 
-            # first the ones, which are present already in tree
-            for child_id in tree_children_ids:
+            # reuse the nodes, which are present already in tree
+            children = {}
+            obsolete_ids = []
+            more_id = self._more_node_ids.get(node_id)
+            for child_id in self.tree.get_children(node_id):
+                if child_id == more_id:
+                    continue
                 name = self.tree.set(child_id, "name")
-                if name in fs_children_names:
+                if name and name in children_data and name not in children:
                     children[name] = child_id
-                    self.update_node_data(child_id, name, children_data[name])
+                else:
+                    obsolete_ids.append(child_id)
 
-            # add missing children
-            for name in fs_children_names:
-                if name not in children:
+            ids_in_order = []
+            for name in shown_names:
+                child_id = children.pop(name, None)
+                if child_id is None:
                     child_path = self.join(path, name)
                     if self.is_project_dir(child_path):
                         tags = ("project",)
@@ -531,53 +559,141 @@ class BaseFileBrowser(ttk.Frame):
                     else:
                         tags = ()
                     child_id = self.tree.insert(node_id, "end", tags=tags)
-                    children[name] = child_id
-                    self.tree.set(children[name], "path", child_path)
+                    self.tree.set(child_id, "path", child_path)
+
+                if self._rendered_node_data.get(child_id) != (name, children_data[name]):
                     self.update_node_data(child_id, name, children_data[name])
+                    self._rendered_node_data[child_id] = (name, children_data[name])
+                ids_in_order.append(child_id)
+
+            # the ones, which were filtered out or fell outside of shown range
+            obsolete_ids.extend(children.values())
+
+            hidden_count = len(names) - len(shown_names)
+            if hidden_count:
+                if more_id is None:
+                    more_id = self.tree.insert(node_id, "end", values=("", "more"))
+                    self._more_node_ids[node_id] = more_id
+                self.tree.item(more_id, text=" " + tr("%d more items") % hidden_count + " ...")
+                ids_in_order.append(more_id)
+            elif more_id is not None:
+                del self._more_node_ids[node_id]
+                obsolete_ids.append(more_id)
+
+            if obsolete_ids:
+                self._forget_rendered_nodes(obsolete_ids)
+                self.tree.delete(*obsolete_ids)
+
+            if list(self.tree.get_children(node_id)) != ids_in_order:
+                self.tree.set_children(node_id, *ids_in_order)
 
-            def file_order(name):
-                # items in a folder should be ordered so that
-                # folders come first and names are ordered case insensitively
-                if self.order_by == "size":
-                    return (
-                        not children_data[name]["isdir"],  # prefer directories
-                        not ":" in name,  # prefer drives
-                        children_data[name]["size_bytes"],
-                        name.upper(),
-                        name,
-                    )
-                elif self.order_by == "modified":
-                    return (
-                        -children_data[name]["modified_epoch"],  # prefer newer files
-                        name.upper(),
-                        name,
-                    )
-                else:
-                    return (
-                        not children_data[name]["isdir"],  # prefer directories
-                        not ":" in name,  # prefer drives
-                        name.upper(),
-                        name,
-                    )
+            # recursively update open children
+            for child_id in ids_in_order:
+                if child_id != more_id and self._is_open_dir_node(child_id):
+                    self.render_children_from_cache(child_id)
 
-            # update tree
-            ids_sorted_by_name = list(
-                map(
-                    lambda key: children[key],
-                    sorted(children.keys(), key=file_order, reverse=self.reverse_order),
+    def get_sorted_child_names(self, path: str, children_data: Dict[str, Any]) -> List[str]:
+        """Returns the names matching the filter in the order of presentation.
+
+        The result is remembered until data, filter or order changes."""
+        filter = self.filter and tuple(self.filter)
+        memo = self._sorted_child_names.get(path)
+        if (
+            memo is not None
+            and memo[0] is children_data
+            and memo[1:4] == (filter, self.order_by, self.reverse_order)
+        ):
+            return memo[4]
+
+        def file_order(name):
+            # items in a folder should be ordered so that
+            # folders come first and names are ordered case insensitively
+            if self.order_by == "size":
+                return (
+                    not children_data[name]["isdir"],  # prefer directories
+                    not ":" in name,  # prefer drives
+                    children_data[name]["size_bytes"],
+                    name.upper(),
+                    name,
+                )
+            elif self.order_by == "modified":
+                return (
+                    -children_data[name]["modified_epoch"],  # prefer newer files
+                    name.upper(),
+                    name,
+                )
+            else:
+                return (
+                    not children_data[name]["isdir"],  # prefer directories
+                    not ":" in name,  # prefer drives
+                    name.upper(),
+                    name,
                 )
-            )
-            self.tree.set_children(node_id, *ids_sorted_by_name)
 
-            # recursively update open children
-            for child_id in ids_sorted_by_name:
-                if self._is_open_dir_node(child_id):
-                    self.render_children_from_cache(child_id)
+        names = sorted(
+            (name for name in children_data if self.item_matches_filter(name, children_data[name])),
+            key=file_order,
+            reverse=self.reverse_order,
+        )
+        self._sorted_child_names[path] = (
+            children_data,
+            filter,
+            self.order_by,
+            self.reverse_order,
+            names,
+        )
+        return names
+
+    def _get_rendered_child_count(self, node_id: str, path: str, names: List[str]) -> int:
+        count = self._rendered_child_counts.get(node_id, RENDER_CHUNK_SIZE)
+
+        # make sure the item to be highlighted gets a node
+        if self.path_to_highlight and len(names) > count:
+            for i in range(count, len(names)):
+                if self.join(path, names[i]) == self.path_to_highlight:
+                    count = (i // RENDER_CHUNK_SIZE + 1) * RENDER_CHUNK_SIZE
+                    self._rendered_child_counts[node_id] = count
+                    break
+
+        return count
+
+    def render_more_children(self, node_id: str) -> None:
+        self._rendered_child_counts[node_id] = (
+            self._rendered_child_counts.get(node_id, RENDER_CHUNK_SIZE) + RENDER_CHUNK_SIZE
+        )
+        self.render_children_from_cache(node_id)
+
+    def _forget_rendered_nodes(self, node_ids: Optional[Iterable[str]] = None) -> None:
+        """Drops rendering info about the nodes (or all nodes) and their descendants"""
+        if node_ids is None:
+            self._rendered_child_counts.clear()
+            self._more_node_ids.clear()
+            self._rendered_node_data.clear()
+            return
+
+        for node_id in node_ids:
+            self._rendered_node_data.pop(node_id, None)
+            self._rendered_child_counts.pop(node_id, None)
+            self._more_node_ids.pop(node_id, None)
+            self._forget_rendered_nodes(self.tree.get_children(node_id))
+
+    def _on_tree_yscroll(self, first, last):
+        self.vert_scrollbar.set(first, last)
+        if self._more_node_ids and self._more_check_id is None:
+            self._more_check_id = self.after_idle(self._render_visible_more_nodes)
+
+    def _render_visible_more_nodes(self):
+        self._more_check_id = None
+        for node_id, more_id in list(self._more_node_ids.items()):
+            # bbox is empty for nodes scrolled out of view or inside collapsed nodes
+            if self.tree.exists(more_id) and self.tree.bbox(more_id):
+                self.render_more_children(node_id)
 
     def show_error(self, msg, node_id=""):
         if not node_id:
             # clear tree
             self.tree.set_children("")
+            self._forget_rendered_nodes()
 
         err_id = self.tree.insert(node_id, "end")
         self.tree.item(err_id, text=msg)
@@ -633,7 +749,10 @@ class BaseFileBrowser(ttk.Frame):
             self.tree.set(node_id, "size_fmt", sizeof_fmt(data["size_bytes"]))
 
             # Make sure it doesn't have children
-            self.tree.set_children(node_id)
+            children_ids = self.tree.get_children(node_id)
+            if children_ids:
+                self._forget_rendered_nodes(children_ids)
+                self.tree.set_children(node_id)
 
             if (
                 path.lower().endswith(".py")
@@ -670,7 +789,9 @@ class BaseFileBrowser(ttk.Frame):
         path = self.get_selected_path()
         kind = self.get_selected_kind()
         name = self.get_selected_name()
-        if kind == "file":
+        if self.tree.set(self.tree.focus(), "kind") == "more":
+            self.render_more_children(self.tree.parent(self.tree.focus()))
+        elif kind == "file":
             if self.should_open_name_in_thonny(name):
                 self.open_file(path)
             else:
@@ -876,6 +997,15 @@ class BaseFileBrowser(ttk.Frame):
             self.select_path_if_visible(self.path_to_highlight)
             self.path_to_highlight = None
 
+    def rerender_tree(self):
+        """Applies changed order or filter to the cached data"""
+        if self.winfo_ismapped():
+            self.render_children_from_cache("")
+
+        if self.path_to_highlight:
+            self.select_path_if_visible(self.path_to_highlight)
+            self.path_to_highlight = None
+
     def create_new_file(self):
         selected_node_id = self.get_selected_node()
 
@@ -1046,7 +1176,7 @@ class BaseFileBrowser(ttk.Frame):
             self.order_by = column_name
             self.reverse_order = False
 
-        self.refresh_tree()
+        self.rerender_tree()
         self._update_heading_labels()
 
     def item_matches_filter(self, name: str, atts: Dict[str, Any]) -> bool:
@@ -1095,6 +1225,8 @@ class BaseFileBrowser(ttk.Frame):
 
     def destroy(self):
         self.unbind("<<ThemeChanged>>", self._on_theme_changed_binding)
+        if self._more_check_id is not None:
+            self.after_cancel(self._more_check_id)
         super().destroy()
 
     def is_project_dir(self, path: str) -> bool:
@@ -1184,6 +1316,72 @@ class CopyPaste(object):
             self.reset()
 
 
+class DirListingCache:
+    """
+    Keeps local directory listings, until the modification time of the directory changes.
+
+    Adding, removing or renaming children changes directory's modification time, modifying
+    a child doesn't. Therefore the listings of the directories containing changed files
+    need to be invalidated explicitly.
+    """
+
+    def __init__(self):
+        # (path, include_hidden) -> (mtime_ns, data)
+        self._listings: Dict[Tuple[str, bool], Tuple[int, Dict[str, Dict]]] = {}
+
+    def get(self, path: str, include_hidden: bool) -> Optional[Dict[str, Dict]]:
+        key = (path, include_hidden)
+        mtime_ns = self._get_mtime_ns(path)
+        cached = self._listings.pop(key, None)
+        if cached is not None and cached[0] == mtime_ns:
+            # re-insert as the most recently used
+            self._listings[key] = cached
+            return cached[1]
+
+        data = get_single_dir_child_data(path, include_hidden)
+        if (
+            data is not None
+            and mtime_ns is not None
+            and mtime_ns / 1e9 < time.time() - MIN_CACHED_DIR_AGE
+        ):
+            self._listings[key] = (mtime_ns, data)
+            while len(self._listings) > MAX_CACHED_DIR_LISTINGS:
+                del self._listings[next(iter(self._listings))]
+
+        return data
+
+    def get_changed_paths(self, paths: Iterable[str]) -> List[str]:
+        """Returns the paths, which may have been modified after listing them"""
+        mtimes = {path: mtime_ns for (path, _), (mtime_ns, _) in self._listings.items()}
+        return [
+            path
+            for path in paths
+            if path not in mtimes or mtimes[path] != self._get_mtime_ns(path)
+        ]
+
+    def invalidate(self, paths: Optional[Iterable[str]] = None) -> None:
+        if paths is None:
+            self._listings.clear()
+        else:
+            paths = set(paths)
+            for key in list(self._listings):
+                if key[0] in paths:
+                    del self._listings[key]
+
+    def _get_mtime_ns(self, path: str) -> Optional[int]:
+        if path == "":
+            # drives in Windows
+            return None
+
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+
+_local_dir_listing_cache = DirListingCache()
+
+
 class BaseLocalFileBrowser(BaseFileBrowser):
     def __init__(
         self, master, show_expand_buttons=True, order_by: str = "name", reverse_order: bool = False
@@ -1196,12 +1394,16 @@ class BaseLocalFileBrowser(BaseFileBrowser):
             reverse_order=reverse_order,
         )
         get_workbench().bind("WindowFocusIn", self.on_window_focus_in, True)
+        get_workbench().bind("ToplevelResponse", self.on_toplevel_response, True)
         get_workbench().bind("LocalFileOperation", self.on_local_file_operation, True)
         self.copypaste = CopyPaste(self)
+        self._dirs_poll_id = self.after(LOCAL_DIRS_POLL_INTERVAL_MS, self._poll_dirs)
 
     def destroy(self):
+        self.after_cancel(self._dirs_poll_id)
         super().destroy()
         get_workbench().unbind("WindowFocusIn", self.on_window_focus_in)
+        get_workbench().unbind("ToplevelResponse", self.on_toplevel_response)
         get_workbench().unbind("LocalFileOperation", self.on_local_file_operation)
 
     def path_exists(self, path: str) -> Optional[bool]:
@@ -1211,9 +1413,50 @@ class BaseLocalFileBrowser(BaseFileBrowser):
         get_workbench().get_editor_notebook().open_new_file(path)
 
     def request_dirs_child_data(self, node_id, paths):
-        self.cache_dirs_child_data(get_dirs_children_info(paths, show_hidden_files()))
+        include_hidden = show_hidden_files()
+        data = {}
+        for path in paths:
+            if path not in self._cached_child_data:
+                data[path] = _local_dir_listing_cache.get(path, include_hidden)
+                if data[path] is None:
+                    data[path] = "file" if os.path.isfile(path) else "missing"
+
+        self.cache_dirs_child_data(data)
         self.render_children_from_cache(node_id)
 
+    def check_for_changes(self):
+        """Refreshes the directories, which have changed since they were listed"""
+        changed_paths = _local_dir_listing_cache.get_changed_paths(self._get_listed_paths())
+        if changed_paths:
+            logger.debug("Refreshing changed dirs %r", changed_paths)
+            self.refresh_tree(changed_paths)
+
+    def revalidate_listed_dirs(self):
+        """Re-lists the shown directories, including the ones with unchanged mtime"""
+        # overwriting a file (by user's program or another application)
+        # doesn't change the modification time of its directory
+        listed_paths = self._get_listed_paths()
+        _local_dir_listing_cache.invalidate(listed_paths)
+        if listed_paths and self.winfo_ismapped():
+            self.refresh_tree(listed_paths)
+
+    def _get_listed_paths(self) -> List[str]:
+        return [
+            path
+            for path, children_data in self._cached_child_data.items()
+            if path != "" and isinstance(children_data, dict)
+        ]
+
+    def _poll_dirs(self):
+        if self.winfo_ismapped():
+            self.check_for_changes()
+        self._dirs_poll_id = self.after(LOCAL_DIRS_POLL_INTERVAL_MS, self._poll_dirs)
+
+    def cmd_refresh_tree(self):
+        # also re-read the details of the files, which may have changed in place
+        _local_dir_listing_cache.invalidate()
+        super().cmd_refresh_tree()
+
     def split_path(self, path):
         parts = super().split_path(path)
         if running_on_windows() and path.startswith("\\\\"):
@@ -1244,11 +1487,17 @@ class BaseLocalFileBrowser(BaseFileBrowser):
             )
 
     def on_window_focus_in(self, event=None):
-        self.refresh_tree()
+        self.revalidate_listed_dirs()
+
+    def on_toplevel_response(self, event=None):
+        self.revalidate_listed_dirs()
 
     def on_local_file_operation(self, event):
         if event["operation"] in ["save", "delete"]:
-            self.refresh_tree()
+            # overwriting a file doesn't change the modification time of its directory
+            dir_path = os.path.dirname(event["path"])
+            _local_dir_listing_cache.invalidate([dir_path])
+            self.refresh_tree([dir_path])
             self.select_path_if_visible(event["path"])
 
     def request_fs_info(self, path):
@@ -1744,7 +1993,7 @@ class FileDialog(CommonDialog, ABC):
             filter = None
 
         self.browser.filter = filter
-        self.browser.refresh_tree()
+        self.browser.rerender_tree()
 
     def save_settings(self):
         get_workbench().set_option(FILE_DIALOG_ORDER_BY_OPTION, self.browser.order_by)
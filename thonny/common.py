@@ -5,9 +5,12 @@ Classes used both by front-end and back-end
 """
 from __future__ import annotations
 
+import base64
 import dataclasses
+import marshal
 import os.path
 import site
+import stat
 import sys
 from collections import namedtuple
 from dataclasses import dataclass
@@ -19,6 +22,11 @@ logger = getLogger(__name__)
 STRING_PSEUDO_FILENAME = "<string>"
 REPL_PSEUDO_FILENAME = "<stdin>"
 MESSAGE_MARKER = "\x02"
+# Second marker character distinguishes binary frames from text frames (which continue with a digit)
+BINARY_MESSAGE_MARKER = MESSAGE_MARKER + "B"
+MESSAGE_FORMAT_ENV_VAR = "THONNY_MESSAGE_FORMAT"
+TEXT_MESSAGE_FORMAT = "text"
+BINARY_MESSAGE_FORMAT = "binary"
 OBJECT_LINK_START = "[ide_object_link=%d]"
 OBJECT_LINK_END = "[/ide_object_link]"
 PROCESS_ACK = "OK"
@@ -26,6 +34,9 @@ INTERNAL_ERROR_STATUS_CODE = 193
 
 NBSP = "\u00a0"
 
+_FILE_ATTRIBUTE_HIDDEN = 0x2
+_FILE_ATTRIBUTE_SYSTEM = 0x4
+
 IGNORED_FILES_AND_DIRS = [
     "System Volume Information",
     "._.Trashes",
@@ -35,6 +46,9 @@ IGNORED_FILES_AND_DIRS = [
 ]
 
 ValueInfo = namedtuple("ValueInfo", ["id", "repr"])
+# Stands for a dict of variables (name -> ValueInfo) in backend messages.
+# Unless complete, it lists only the changes since the previous dict of the same scope.
+VariablesDelta = namedtuple("VariablesDelta", ["scope", "complete", "changed", "removed"])
 FrameInfo = namedtuple(
     "FrameInfo",
     [
@@ -248,11 +262,147 @@ class InlineResponse(MessageFromBackend):
         self.event_type = self.command_name + "_response"
 
 
-def serialize_message(msg: Record, max_line_length=65536) -> str:
+class VariablesDeltaEncoder:
+    """
+    Replaces the globals in ToplevelResponses and DebuggerResponses with VariablesDeltas.
+    Assumes that the frontend decodes all these messages in the same order.
+    """
+
+    def __init__(self):
+        self._sent_variables: Dict[str, Dict[str, ValueInfo]] = {}
+
+    def encode_message(self, msg: MessageFromBackend) -> None:
+        if isinstance(msg, ToplevelResponse) and isinstance(msg.get("globals"), dict):
+            msg["globals"] = self.encode("__main__", msg["globals"])
+
+        if isinstance(msg, (ToplevelResponse, DebuggerResponse)) and msg.get("stack"):
+            # the list and frames may be shared with tracer's history
+            msg["stack"] = [
+                (
+                    frame._replace(globals=self.encode(frame.module_name, frame.globals))
+                    if isinstance(frame.globals, dict)
+                    else frame
+                )
+                for frame in msg["stack"]
+            ]
+
+    def encode(self, scope: str, variables: Dict[str, ValueInfo]) -> VariablesDelta:
+        previous = self._sent_variables.get(scope)
+        self._sent_variables[scope] = variables
+        if previous is None:
+            return VariablesDelta(scope, True, variables, [])
+
+        changed = {
+            name: value_info
+            for name, value_info in variables.items()
+            if previous.get(name) != value_info
+        }
+        removed = [name for name in previous if name not in variables]
+        if len(changed) + len(removed) >= len(variables):
+            return VariablesDelta(scope, True, variables, [])
+
+        return VariablesDelta(scope, False, changed, removed)
+
+
+class VariablesDeltaDecoder:
+    """Restores the dicts of variables in messages processed by VariablesDeltaEncoder"""
+
+    def __init__(self):
+        self._received_variables: Dict[str, Dict[str, ValueInfo]] = {}
+
+    def decode_message(self, msg: MessageFromBackend) -> None:
+        if isinstance(msg.get("globals"), VariablesDelta):
+            msg["globals"] = self.decode(msg["globals"])
+
+        if msg.get("stack") and any(
+            isinstance(frame.globals, VariablesDelta) for frame in msg["stack"]
+        ):
+            msg["stack"] = [
+                (
+                    frame._replace(globals=self.decode(frame.globals))
+                    if isinstance(frame.globals, VariablesDelta)
+                    else frame
+                )
+                for frame in msg["stack"]
+            ]
+
+    def decode(self, delta: VariablesDelta) -> Dict[str, ValueInfo]:
+        if delta.complete:
+            variables = dict(delta.changed)
+        else:
+            # new dict, so that the receivers can compare it with previous ones
+            variables = dict(self._received_variables[delta.scope])
+            variables.update(delta.changed)
+            for name in delta.removed:
+                del variables[name]
+
+        self._received_variables[delta.scope] = variables
+        return variables
+
+
+# Tags for the tuples produced by _encode_wire_value
+_WIRE_TUPLE = 0
+_WIRE_RECORD = 1
+_WIRE_NAMEDTUPLE = 2
+_WIRE_DATACLASS = 3
+_WIRE_SET = 4
+_WIRE_FROZENSET = 5
+_WIRE_ATOMIC_TYPES = frozenset([str, int, float, bool, type(None), bytes, complex])
+# Classes which may travel in binary messages. Values of other classes make the message
+# fall back to text format.
+_WIRE_CLASSES = {
+    cls.__name__: cls
+    for cls in [
+        ValueInfo,
+        VariablesDelta,
+        FrameInfo,
+        TextRange,
+        DistInfo,
+        Record,
+        InputSubmission,
+        CommandToBackend,
+        ImmediateCommand,
+        EOFCommand,
+        ToplevelCommand,
+        DebuggerCommand,
+        InlineCommand,
+        MessageFromBackend,
+        ToplevelResponse,
+        DebuggerResponse,
+        BackendEvent,
+        OscEvent,
+        InlineResponse,
+    ]
+}
+# Oldest format which supports all required types. Fixed, so that frontend and backend
+# can run on different Python versions.
+_MARSHAL_VERSION = 4
+
+
+def get_message_format_from_environment() -> str:
+    """Returns the format the frontend has asked this process to use for outgoing messages"""
+    value = os.environ.get(MESSAGE_FORMAT_ENV_VAR, TEXT_MESSAGE_FORMAT)
+    if value not in [TEXT_MESSAGE_FORMAT, BINARY_MESSAGE_FORMAT]:
+        logger.warning("Unknown message format %r, falling back to text", value)
+        return TEXT_MESSAGE_FORMAT
+    return value
+
+
+def serialize_message(
+    msg: Record, max_line_length=65536, message_format: str = TEXT_MESSAGE_FORMAT
+) -> str:
     # I want to transfer only ASCII chars because encodings are not reliable
     # (eg. can't find a way to specify PYTHONIOENCODING for cx_freeze'd program)
     # The possibility for splitting message into several lines is required because of
     # default (safe) window size in Paramiko (https://github.com/thonny/thonny/issues/1680)
+    if message_format == BINARY_MESSAGE_FORMAT:
+        try:
+            return _serialize_binary_message(msg, max_line_length)
+        except TypeError:
+            # Something without binary encoding (eg. a custom object in a plugin's response).
+            # Text format is understood by all readers.
+            logger.debug("Falling back to text format for %r", type(msg), exc_info=True)
+
     msg_str = ascii(msg)
 
     lines: List[str] = []
@@ -263,6 +413,9 @@ def serialize_message(msg: Record, max_line_length=65536) -> str:
 
 
 def parse_message(msg_string: str) -> Record:
+    if msg_string.startswith(BINARY_MESSAGE_MARKER):
+        return _parse_binary_message(msg_string)
+
     # DataFrames may have nan
     # pylint: disable=unused-variable
     locals()["nan"] = float("nan")
@@ -274,6 +427,128 @@ def parse_message(msg_string: str) -> Record:
     return eval(msg_string[msg_start:].replace("\n", ""))
 
 
+def _serialize_binary_message(msg: Record, max_line_length: int) -> str:
+    # Frame: marker, line count, payload length, base64 payload split into lines.
+    # Base64 keeps the frame ASCII and newline-free, so it survives the same channels
+    # (pipes, SSH, Paramiko) as the text format.
+    payload = marshal.dumps(_encode_wire_value(msg), _MARSHAL_VERSION)
+    payload_str = base64.b64encode(payload).decode("ascii")
+
+    lines: List[str] = []
+    for i in range(0, len(payload_str), max_line_length):
+        lines.append(payload_str[i : i + max_line_length])
+
+    return (
+        BINARY_MESSAGE_MARKER + str(len(lines)) + " " + str(len(payload)) + " " + "\n".join(lines)
+    )
+
+
+def _parse_binary_message(msg_string: str) -> Record:
+    header_end = msg_string.index(" ", msg_string.index(" ") + 1)
+    line_count_str, payload_length_str = msg_string[len(BINARY_MESSAGE_MARKER) : header_end].split()
+    payload_str = msg_string[header_end + 1 :].strip()
+    assert int(line_count_str) == payload_str.count("\n") + 1
+    payload = base64.b64decode(payload_str.replace("\n", ""))
+    assert len(payload) == int(payload_length_str)
+    result = _decode_wire_value(marshal.loads(payload))
+    assert isinstance(result, Record)
+    return result
+
+
+def _encode_wire_value(value: Any) -> Any:
+    """Converts the value to a structure which marshal can dump.
+
+    Tuples are reserved for tagged values, so plain tuples get a tag as well.
+    """
+    value_type = type(value)
+    if value_type in _WIRE_ATOMIC_TYPES:
+        return value
+    elif value_type is dict:
+        return {
+            (k if type(k) in _WIRE_ATOMIC_TYPES else _encode_wire_value(k)): (
+                v if type(v) in _WIRE_ATOMIC_TYPES else _encode_wire_value(v)
+            )
+            for k, v in value.items()
+        }
+    elif value_type is list:
+        return [x if type(x) in _WIRE_ATOMIC_TYPES else _encode_wire_value(x) for x in value]
+    elif value_type is tuple:
+        return (_WIRE_TUPLE,) + tuple(_encode_wire_value(x) for x in value)
+    elif _WIRE_CLASSES.get(value_type.__name__) is value_type:
+        if isinstance(value, Record):
+            return (_WIRE_RECORD, value_type.__name__, _encode_wire_value(value.__dict__))
+        elif isinstance(value, tuple):
+            # ValueInfo, FrameInfo, TextRange and other namedtuples
+            return (_WIRE_NAMEDTUPLE, value_type.__name__) + tuple(
+                _encode_wire_value(x) for x in value
+            )
+
+        assert dataclasses.is_dataclass(value)
+        return (
+            _WIRE_DATACLASS,
+            value_type.__name__,
+            {
+                field.name: _encode_wire_value(getattr(value, field.name))
+                for field in dataclasses.fields(value)
+            },
+        )
+    elif value_type is set or value_type is frozenset:
+        return (_WIRE_SET if value_type is set else _WIRE_FROZENSET,) + tuple(
+            _encode_wire_value(x) for x in value
+        )
+    elif isinstance(value, (str, int, float)):
+        # subclass of an atomic type (eg. IntEnum), send as base value
+        for base_type in (bool, int, float, str):
+            if isinstance(value, base_type):
+                return base_type(value)
+
+    raise TypeError(f"Can't encode {value_type!r} for binary message")
+
+
+def _decode_wire_value(value: Any) -> Any:
+    value_type = type(value)
+    if value_type in _WIRE_ATOMIC_TYPES:
+        return value
+    elif value_type is dict:
+        return {
+            (k if type(k) in _WIRE_ATOMIC_TYPES else _decode_wire_value(k)): (
+                v if type(v) in _WIRE_ATOMIC_TYPES else _decode_wire_value(v)
+            )
+            for k, v in value.items()
+        }
+    elif value_type is list:
+        return [x if type(x) in _WIRE_ATOMIC_TYPES else _decode_wire_value(x) for x in value]
+
+    assert value_type is tuple
+    tag = value[0]
+    if tag == _WIRE_TUPLE:
+        return tuple(_decode_wire_value(x) for x in value[1:])
+    elif tag == _WIRE_RECORD:
+        record_class = _get_wire_class(value[1])
+        assert issubclass(record_class, Record)
+        # bypass __init__, so that the result has the same state as the original
+        record = record_class.__new__(record_class)
+        record.__dict__.update(_decode_wire_value(value[2]))
+        return record
+    elif tag == _WIRE_NAMEDTUPLE:
+        return _get_wire_class(value[1])(*(_decode_wire_value(x) for x in value[2:]))
+    elif tag == _WIRE_DATACLASS:
+        return _get_wire_class(value[1])(**_decode_wire_value(value[2]))
+    elif tag == _WIRE_SET:
+        return {_decode_wire_value(x) for x in value[1:]}
+    elif tag == _WIRE_FROZENSET:
+        return frozenset(_decode_wire_value(x) for x in value[1:])
+    else:
+        raise ValueError(f"Unknown wire tag {tag!r}")
+
+
+def _get_wire_class(name: str) -> type:
+    try:
+        return _WIRE_CLASSES[name]
+    except KeyError:
+        raise ValueError(f"Unknown wire class {name!r}") from None
+
+
 def normpath_with_actual_case(name: str) -> str:
     """In Windows return the path with the case it is stored in the filesystem"""
     if not os.path.exists(name):
@@ -426,11 +701,22 @@ def is_hidden_or_system_file(path: str) -> bool:
     elif sys.platform == "win32":
         from ctypes import windll
 
-        FILE_ATTRIBUTE_HIDDEN = 0x2
-        FILE_ATTRIBUTE_SYSTEM = 0x4
         return bool(
             windll.kernel32.GetFileAttributesW(path)  # @UndefinedVariable
-            & (FILE_ATTRIBUTE_HIDDEN | FILE_ATTRIBUTE_SYSTEM)
+            & (_FILE_ATTRIBUTE_HIDDEN | _FILE_ATTRIBUTE_SYSTEM)
+        )
+    else:
+        return False
+
+
+def _is_hidden_or_system_entry(entry: os.DirEntry, st: os.stat_result) -> bool:
+    # Same as is_hidden_or_system_file, but without extra system calls
+    if entry.name.startswith("."):
+        return True
+    elif sys.platform == "win32":
+        return bool(
+            getattr(st, "st_file_attributes", 0)
+            & (_FILE_ATTRIBUTE_HIDDEN | _FILE_ATTRIBUTE_SYSTEM)
         )
     else:
         return False
@@ -453,21 +739,22 @@ def get_single_dir_child_data(path: str, include_hidden: bool = False) -> Option
         result: Dict[str, Any] = {}
 
         try:
-            for child in os.listdir(path):
-                full_child_path = os.path.join(path, child)
-                if not os.path.exists(full_child_path):
-                    # must be broken link
-                    continue
-                full_child_path = normpath_with_actual_case(full_child_path)
-                hidden = is_hidden_or_system_file(full_child_path)
-                if not hidden or include_hidden:
-                    name = os.path.basename(full_child_path)
-                    st = os.stat(full_child_path, dir_fd=None, follow_symlinks=True)
-                    result[name] = {
-                        "size_bytes": None if os.path.isdir(full_child_path) else st.st_size,
-                        "modified_epoch": st.st_mtime,
-                        "hidden": hidden,
-                    }
+            # Names come with their actual case and DirEntry-s reuse the information
+            # from the listing where possible, so it's at most one stat call per child
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        st = entry.stat(follow_symlinks=True)
+                    except OSError:
+                        # must be broken link
+                        continue
+                    hidden = _is_hidden_or_system_entry(entry, st)
+                    if not hidden or include_hidden:
+                        result[entry.name] = {
+                            "size_bytes": None if stat.S_ISDIR(st.st_mode) else st.st_size,
+                            "modified_epoch": st.st_mtime,
+                            "hidden": hidden,
+                        }
         except PermissionError:
             result["<not accessible>"] = {
                 "kind": "error",
@@ -730,10 +1017,13 @@ def read_one_incoming_message_str(line_reader):
     if msg_str == "":
         return ""
 
-    if not msg_str.startswith(MESSAGE_MARKER):
+    if msg_str.startswith(BINARY_MESSAGE_MARKER):
+        line_count = int(msg_str[len(BINARY_MESSAGE_MARKER) :].split(maxsplit=1)[0])
+    elif msg_str.startswith(MESSAGE_MARKER):
+        line_count = int(msg_str[1:].split(maxsplit=1)[0])
+    else:
         return msg_str
 
-    line_count = int(msg_str[1:].split(maxsplit=1)[0])
     read_lines = 1
     while read_lines < line_count:
         msg_str += line_reader()
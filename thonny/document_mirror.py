@@ -0,0 +1,182 @@
+"""
+Copies of documents as they are known to language servers.
+
+A mirror gets updated with the same edits which are applied to the Tk text and produces
+corresponding LSP content changes. The content is kept as a list of lines (without line
+terminators), so that an edit only touches the affected lines and the whole text gets
+materialized only when a server needs to be primed.
+"""
+
+from logging import getLogger
+from typing import List, Optional, Tuple
+
+from thonny.lsp_types import Position, Range, RangedTextDocumentContentChangeEvent
+
+logger = getLogger(__name__)
+
+_tk_counts_utf16_code_units: Optional[bool] = None
+
+
+def tk_counts_utf16_code_units(tk_app) -> bool:
+    """Tcl 8.6 represents characters outside BMP as surrogate pairs, Tcl 9 doesn't"""
+    global _tk_counts_utf16_code_units
+    if _tk_counts_utf16_code_units is None:
+        _tk_counts_utf16_code_units = int(tk_app.call("string", "length", "\U0001f600")) == 2
+    return _tk_counts_utf16_code_units
+
+
+def utf16_len(s: str) -> int:
+    if s.isascii():
+        return len(s)
+    return len(s.encode("utf-16-le")) // 2
+
+
+def utf16_col_to_code_point_col(line: str, col: int) -> int:
+    if line.isascii():
+        return col
+
+    units = 0
+    for i, ch in enumerate(line):
+        if units >= col:
+            return i
+        units += 2 if ord(ch) > 0xFFFF else 1
+
+    return len(line)
+
+
+class DocumentMirror:
+    def __init__(self, text: str = "", tk_columns_in_utf16: bool = True):
+        self._lines: List[str] = text.split("\n")
+        self._tk_columns_in_utf16 = tk_columns_in_utf16
+
+    def get_text(self) -> str:
+        return "\n".join(self._lines)
+
+    def get_line_count(self) -> int:
+        return len(self._lines)
+
+    def insert(self, tk_index: str, chars: str) -> RangedTextDocumentContentChangeEvent:
+        line, col = self._from_tk_index(tk_index)
+        return self._replace(line, col, line, col, chars)
+
+    def delete(self, tk_index1: str, tk_index2: str) -> RangedTextDocumentContentChangeEvent:
+        start = self._from_tk_index(tk_index1)
+        end = max(start, self._from_tk_index(tk_index2))
+        return self._replace(*start, *end, "")
+
+    def replace_lines_from(
+        self, line: int, text: str
+    ) -> Optional[RangedTextDocumentContentChangeEvent]:
+        """
+        Replaces everything from the start of given (0-based) line with given text.
+        Returns the minimal change or None if the text didn't change.
+        """
+        line = min(line, len(self._lines) - 1)
+        old_text = "\n".join(self._lines[line:])
+        if old_text == text:
+            return None
+
+        prefix_len = 0
+        max_prefix_len = min(len(old_text), len(text))
+        while prefix_len < max_prefix_len and old_text[prefix_len] == text[prefix_len]:
+            prefix_len += 1
+
+        suffix_len = 0
+        max_suffix_len = max_prefix_len - prefix_len
+        while (
+            suffix_len < max_suffix_len
+            and old_text[-suffix_len - 1] == text[-suffix_len - 1]
+        ):
+            suffix_len += 1
+
+        start_line, start_col = self._offset_to_position(line, prefix_len)
+        end_line, end_col = self._offset_to_position(line, len(old_text) - suffix_len)
+        return self._replace(
+            start_line, start_col, end_line, end_col, text[prefix_len : len(text) - suffix_len]
+        )
+
+    def _offset_to_position(self, first_line: int, offset: int) -> Tuple[int, int]:
+        line = first_line
+        while offset > len(self._lines[line]):
+            offset -= len(self._lines[line]) + 1
+            line += 1
+        return line, offset
+
+    def _from_tk_index(self, tk_index: str) -> Tuple[int, int]:
+        """Returns 0-based line and code point column, clamped to the document"""
+        tk_line, tk_col = map(int, tk_index.split(".", maxsplit=1))
+        line = tk_line - 1
+        if line >= len(self._lines):
+            # Tk's end index is after its implicit final newline
+            line = len(self._lines) - 1
+            return line, len(self._lines[line])
+
+        text = self._lines[line]
+        if self._tk_columns_in_utf16:
+            col = utf16_col_to_code_point_col(text, tk_col)
+        else:
+            col = tk_col
+        return line, min(col, len(text))
+
+    def _position(self, line: int, col: int) -> Position:
+        return Position(line=line, character=utf16_len(self._lines[line][:col]))
+
+    def _replace(
+        self, start_line: int, start_col: int, end_line: int, end_col: int, text: str
+    ) -> RangedTextDocumentContentChangeEvent:
+        change = RangedTextDocumentContentChangeEvent(
+            range=Range(
+                start=self._position(start_line, start_col),
+                end=self._position(end_line, end_col),
+            ),
+            text=text,
+        )
+
+        prefix = self._lines[start_line][:start_col]
+        suffix = self._lines[end_line][end_col:]
+        new_lines = text.split("\n")
+        new_lines[0] = prefix + new_lines[0]
+        new_lines[-1] += suffix
+        self._lines[start_line : end_line + 1] = new_lines
+
+        return change
+
+
+def append_change(
+    changes: List[RangedTextDocumentContentChangeEvent],
+    change: RangedTextDocumentContentChangeEvent,
+) -> None:
+    """Appends the change to the list, merging it with the last change if possible"""
+    if changes:
+        last = changes[-1]
+        if (
+            last.range.start == last.range.end
+            and change.range.start == change.range.end
+            and change.range.start == _get_end_of_inserted_text(last)
+        ):
+            # typing
+            changes[-1] = RangedTextDocumentContentChangeEvent(
+                range=last.range, text=last.text + change.text
+            )
+            return
+
+        if not last.text and not change.text and change.range.end == last.range.start:
+            # backspacing
+            changes[-1] = RangedTextDocumentContentChangeEvent(
+                range=Range(start=change.range.start, end=last.range.end), text=""
+            )
+            return
+
+    changes.append(change)
+
+
+def _get_end_of_inserted_text(change: RangedTextDocumentContentChangeEvent) -> Position:
+    start = change.range.start
+    last_line_start = change.text.rfind("\n") + 1
+    if last_line_start == 0:
+        return Position(line=start.line, character=start.character + utf16_len(change.text))
+
+    return Position(
+        line=start.line + change.text.count("\n"),
+        character=utf16_len(change.text[last_line_start:]),
+    )
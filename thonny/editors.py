@@ -22,14 +22,13 @@ from thonny.common import (
     universal_dirname,
 )
 from thonny.custom_notebook import CustomNotebook, CustomNotebookPage, CustomNotebookTab
+from thonny.document_mirror import DocumentMirror, append_change, tk_counts_utf16_code_units
 from thonny.languages import tr
 from thonny.lsp_proxy import LanguageServerProxy
 from thonny.lsp_types import (
     DidChangeTextDocumentParams,
     DidCloseTextDocumentParams,
     DidOpenTextDocumentParams,
-    Position,
-    Range,
     RangedTextDocumentContentChangeEvent,
     TextDocumentIdentifier,
     TextDocumentItem,
@@ -57,7 +56,6 @@ from thonny.ui_utils import (
     askopenfilename,
     asksaveasfilename,
     get_beam_cursor,
-    parse_text_index,
     select_sequence,
 )
 
@@ -200,8 +198,9 @@ class Editor(BaseEditor):
         )
 
         self._last_change_time: float = 0
-        self._unpublished_incremental_changes = []
-        self._content_at_server: Optional[str] = None  # for validating incremental updates
+        self._unpublished_incremental_changes: List[RangedTextDocumentContentChangeEvent] = []
+        # the content known to language servers
+        self._ls_document: Optional[DocumentMirror] = None
 
         self._last_fully_published_version: Optional[int] = None
 
@@ -649,7 +648,7 @@ class Editor(BaseEditor):
         self._primed_ls_proxies = []
         self._unpublished_incremental_changes = []
         self._last_fully_published_version = None
-        self._content_at_server = None
+        self._ls_document = None
 
     def _listen_debugger_progress(self, event):
         # Go read-only
@@ -712,9 +711,14 @@ class Editor(BaseEditor):
 
         self._last_change_time = time.time()
 
-        if self._last_fully_published_version is not None:
+        if self._ls_document is not None:
             # meaning the changes should be collected
-            self._unpublished_incremental_changes.append(event)
+            if event["sequence"] == "TextInsert":
+                change = self._ls_document.insert(event["index"], event["text"])
+            else:
+                assert event["sequence"] == "TextDelete"
+                change = self._ls_document.delete(event["index1"], event["index2"])
+            append_change(self._unpublished_incremental_changes, change)
 
             self.after(int(DEBOUNCE_SECONDS * 1000), self._consider_sending_changes_to_server)
 
@@ -784,7 +788,10 @@ class Editor(BaseEditor):
                 self._prime_language_server(ls_proxy)
 
         self._unpublished_incremental_changes = []
-        self._content_at_server = self.get_content()
+        if self._ls_document is None:
+            self._ls_document = DocumentMirror(
+                self.get_content(), tk_counts_utf16_code_units(self.get_text_widget().tk)
+            )
         get_workbench().event_generate("AfterSendingDocumentUpdates", uri=self.get_uri())
         self._last_fully_published_version = self._get_version_to_be_published()
 
@@ -820,32 +827,11 @@ class Editor(BaseEditor):
 
         if not self._primed_ls_proxies:
             logger.debug("No primed proxies, not sending changes")
+            # servers primed later get the full content
+            self._unpublished_incremental_changes = []
             return
 
-        logger.debug("Publishing %s events", len(self._unpublished_incremental_changes))
-
-        ls_changes = []
-        for change in self._unpublished_incremental_changes:
-            logger.info("processing change %r", change)
-            if change["sequence"] == "TextInsert":
-                line, col = parse_text_index(change["index"])
-                pos = Position(line=line - 1, character=col)  # TODO: Utf-16
-                ls_change = RangedTextDocumentContentChangeEvent(
-                    range=Range(start=pos, end=pos), text=change["text"]
-                )
-            else:
-                assert change["sequence"] == "TextDelete"
-                start_line, start_col = parse_text_index(change["index1"])
-                end_line, end_col = parse_text_index(change["index2"])
-                ls_change = RangedTextDocumentContentChangeEvent(
-                    range=Range(
-                        start=Position(line=start_line - 1, character=start_col),
-                        end=Position(line=end_line - 1, character=end_col),
-                    ),
-                    text="",
-                )
-
-            ls_changes.append(ls_change)
+        logger.debug("Publishing %s changes", len(self._unpublished_incremental_changes))
 
         version = self._get_version_to_be_published()
         for ls_proxy in self._primed_ls_proxies:
@@ -854,11 +840,12 @@ class Editor(BaseEditor):
                     textDocument=VersionedTextDocumentIdentifier(
                         version=version, uri=self.get_uri()
                     ),
-                    contentChanges=ls_changes,
+                    contentChanges=self._unpublished_incremental_changes,
                 )
             )
 
         self._unpublished_incremental_changes = []
+        self._last_fully_published_version = version
 
     def get_language_id(self) -> str:
         return self.get_text_widget().file_type
@@ -28,6 +28,7 @@ from typing import (
     Dict,
     List,
     Optional,
+    Tuple,
     Type,
     Union,
     get_args,
@@ -80,7 +81,8 @@ class LanguageServerProxy(ABC):
         self._request_handlers: Dict[str, Optional[Callable]] = {}
         self._notification_handlers: Dict[str, List[Callable]] = {}
         self._diagnostics: Dict[str, PublishDiagnosticsParams] = {}
-        self._unprocessed_messages_from_server: Queue[Dict] = Queue()
+        # messages with their payloads decoded in the reader thread (or None)
+        self._unprocessed_messages_from_server: Queue[Tuple[Dict, Any]] = Queue()
 
         self.server_capabilities: Optional[lsp_types.ServerCapabilities] = None
         self.server_info: Optional[lsp_types.ServerCapabilities] = None
@@ -1057,9 +1059,9 @@ class LanguageServerProxy(ABC):
 
     def _process_messages_from_server(self) -> None:
         while not self._unprocessed_messages_from_server.empty():
-            msg = self._unprocessed_messages_from_server.get()
+            msg, decoded_payload = self._unprocessed_messages_from_server.get()
             try:
-                self._handle_message_from_server(msg)
+                self._handle_message_from_server(msg, decoded_payload)
             except Exception:
                 logger.exception("Failed processing message %r", msg)
                 # TODO: make it less invasive?
@@ -1124,7 +1126,8 @@ class LanguageServerProxy(ABC):
         try:
             while self._server_process_alive():
                 msg = _read_json_rpc_message(self._proc)
-                self._unprocessed_messages_from_server.put(msg)
+                decoded_payload = self._try_decode_payload(msg) if msg is not None else None
+                self._unprocessed_messages_from_server.put((msg, decoded_payload))
         except Exception:
             logger.exception("_listen_stdout failed")
         logger.info("_listen_stdout done")
@@ -1139,7 +1142,37 @@ class LanguageServerProxy(ABC):
             logger.exception("_listen_stderr failed")
         logger.info("_listen_stderr done")
 
-    def _handle_message_from_server(self, msg: Dict) -> None:
+    def _try_decode_payload(self, msg: Dict) -> Any:
+        """
+        Runs in the reader thread, so that the UI thread doesn't need to spend time on
+        converting large responses. Returns None if the payload needs to be decoded later.
+        """
+        method = msg.get("method")
+        request_id = msg.get("id")
+        try:
+            if method is None and request_id is not None:
+                # response. Handler is registered before the request gets sent.
+                handler = self._pending_handlers.get(request_id)
+                if handler is not None:
+                    return self._create_response(
+                        request_id, handler, msg.get("result"), msg.get("error")
+                    )
+            elif method is not None and request_id is None:
+                # notification. Returns params converted for each expected type
+                params_by_type = {}
+                for handler in list(self._notification_handlers.get(method, [])):
+                    expected_params_type = _get_function_arg_type(handler)
+                    if expected_params_type not in params_by_type:
+                        params_by_type[expected_params_type] = _convert_from_json_value(
+                            msg.get("params"), expected_params_type
+                        )
+                return params_by_type
+        except Exception:
+            logger.warning("Could not decode %r in reader thread", method, exc_info=True)
+
+        return None
+
+    def _handle_message_from_server(self, msg: Dict, decoded_payload: Any = None) -> None:
         logger.debug("Handling message from server: %r", msg)
         if get_workbench().in_debug_mode():
             self._add_to_communication_log(msg, "SERVER")
@@ -1153,31 +1186,44 @@ class LanguageServerProxy(ABC):
             if request_id is not None:
                 self._handle_request_from_server(request_id, method, params)
             else:
-                self._handle_notification_from_server(method, params)
+                self._handle_notification_from_server(method, params, decoded_payload)
         elif request_id is not None:
-            self._handle_response_from_server(request_id, result, error)
+            self._handle_response_from_server(request_id, result, error, decoded_payload)
         else:
             raise RuntimeError(f"Don't know how to handle {msg}")
 
     def _handle_response_from_server(
-        self, request_id: Union[str, int], result: Optional[Dict], error: Optional[Dict]
+        self,
+        request_id: Union[str, int],
+        result: Optional[Dict],
+        error: Optional[Dict],
+        decoded_response: Optional[LspResponse] = None,
     ):
         if request_id in self._pending_handlers:
             handler = self._pending_handlers[request_id]
             del self._pending_handlers[request_id]
-            expected_response_type = _get_function_arg_type(handler)
-            assert typing.get_origin(expected_response_type) == LspResponse
-            expected_result_type = typing.get_args(expected_response_type)[0]
-            handler(
-                LspResponse(
-                    request_id=request_id,
-                    result=_convert_from_json_value(result, expected_result_type),
-                    error=_convert_from_json_value(error, Optional[lsp_types.ResponseError]),
-                )
-            )
+            if decoded_response is None:
+                decoded_response = self._create_response(request_id, handler, result, error)
+            handler(decoded_response)
         else:
             logger.info("Ignoring response for request %r", request_id)
 
+    def _create_response(
+        self,
+        request_id: Union[str, int],
+        handler: Callable,
+        result: Optional[Dict],
+        error: Optional[Dict],
+    ) -> LspResponse:
+        expected_response_type = _get_function_arg_type(handler)
+        assert typing.get_origin(expected_response_type) == LspResponse
+        expected_result_type = typing.get_args(expected_response_type)[0]
+        return LspResponse(
+            request_id=request_id,
+            result=_convert_from_json_value(result, expected_result_type),
+            error=_convert_from_json_value(error, Optional[lsp_types.ResponseError]),
+        )
+
     def _handle_request_from_server(
         self, request_id: Union[int, str], method: str, params: Any
     ) -> None:
@@ -1204,10 +1250,15 @@ class LanguageServerProxy(ABC):
                 error = ResponseError(message=str(e), code=ErrorCodes.InternalError)
             self._send_response(request_id=request_id, result=None, error=error)
 
-    def _handle_notification_from_server(self, method: str, params: Any) -> None:
+    def _handle_notification_from_server(
+        self, method: str, params: Any, decoded_params_by_type: Optional[Dict[Type, Any]] = None
+    ) -> None:
         for handler in self._notification_handlers.get(method, []):
             expected_params_type = _get_function_arg_type(handler)
-            handler(_convert_from_json_value(params, expected_params_type))
+            if decoded_params_by_type and expected_params_type in decoded_params_by_type:
+                handler(decoded_params_by_type[expected_params_type])
+            else:
+                handler(_convert_from_json_value(params, expected_params_type))
 
     def _get_communication_log_path(self) -> str:
         return os.path.join(get_thonny_user_dir(), f"lsp_communication_{type(self).__name__}.log")
@@ -1258,100 +1309,292 @@ def _read_json_rpc_message(proc: subprocess.Popen) -> Optional[Dict]:
 
 
 def _get_function_arg_type(function: Callable, index: int = 0) -> Type:
+    # Handlers are often bound methods or closures, which get re-created for each request,
+    # but share the code object
+    code = getattr(function, "__code__", None) or getattr(
+        getattr(function, "__func__", None), "__code__", None
+    )
+    if code is None:
+        return _compute_function_arg_type(function, index)
+
+    key = (code, hasattr(function, "__self__"), index)
+    try:
+        return _function_arg_types[key]
+    except KeyError:
+        result = _compute_function_arg_type(function, index)
+        _function_arg_types[key] = result
+        return result
+
+
+def _compute_function_arg_type(function: Callable, index: int) -> Type:
     signature = inspect.signature(function)
     param = list(signature.parameters.values())[index]
     return param.annotation
 
 
+_function_arg_types: Dict[Any, Type] = {}
+
+# Converters are created once per target type. Creating them involves resolving type hints
+# and forward references, which is too slow to be done for each message.
+_from_json_converters: Dict[Any, Callable[[Any], Any]] = {}
+_from_json_converters_in_progress: Dict[Any, Callable[[Any], Any]] = {}
+_converter_creation_lock = threading.RLock()
+_json_kinds: Dict[Any, Optional[typing.FrozenSet[type]]] = {}
+_to_json_converters: Dict[type, Callable[[Any, bool], Any]] = {}
+
+
 def _convert_from_json_value(value: Any, target_type: Type):
+    return _get_from_json_converter(target_type)(value)
+
+
+def _get_from_json_converter(target_type: Type) -> Callable[[Any], Any]:
+    try:
+        return _from_json_converters[target_type]
+    except KeyError:
+        pass
+
+    # Converters are used both in the reader thread and in the UI thread
+    with _converter_creation_lock:
+        if target_type in _from_json_converters:
+            return _from_json_converters[target_type]
+
+        if target_type in _from_json_converters_in_progress:
+            # Recursive type refers to itself while its converter is being created
+            return _from_json_converters_in_progress[target_type]
+
+        def convert_via_cache(value: Any) -> Any:
+            return _get_from_json_converter(target_type)(value)
+
+        _from_json_converters_in_progress[target_type] = convert_via_cache
+        try:
+            converter = _create_from_json_converter(target_type)
+        finally:
+            del _from_json_converters_in_progress[target_type]
+
+        _from_json_converters[target_type] = converter
+        return converter
+
+
+def _create_from_json_converter(target_type: Type) -> Callable[[Any], Any]:
     if target_type in [None, NoneType]:
-        if value is None:
-            return None
-        else:
-            raise TypeError(f"Expected None but got {type(value)}")
-    elif target_type == int:
-        if isinstance(value, int):
-            return value
-        else:
-            raise TypeError(f"Expected int but got {type(value)}")
-    elif target_type == float:
-        if isinstance(value, float):
-            return value
-        else:
-            raise TypeError(f"Expected float but got {type(value)}")
-    elif target_type == bool:
-        if isinstance(value, bool):
-            return value
-        else:
-            raise TypeError(f"Expected bool but got {type(value)}")
-    elif target_type == str:
-        if isinstance(value, str):
-            return value
-        else:
-            raise TypeError(f"Expected str but got {type(value)}")
-    elif get_origin(target_type) == Optional:
-        if value is None:
-            return value
-        else:
-            return _convert_from_json_value(value, get_args(target_type)[0])
+
+        def convert_none(value):
+            if value is None:
+                return None
+            else:
+                raise TypeError(f"Expected None but got {type(value)}")
+
+        return convert_none
+
+    elif target_type in [int, float, bool, str]:
+        # NB! bool is accepted as int, but int is not accepted as float
+        expected_type = target_type
+        type_name = target_type.__name__
+
+        def convert_atom(value):
+            if isinstance(value, expected_type):
+                return value
+            else:
+                raise TypeError(f"Expected {type_name} but got {type(value)}")
+
+        return convert_atom
+
+    elif target_type is Any:
+        return _return_unchanged
+
     elif target_type == dict or get_origin(target_type) == dict:
-        if isinstance(value, dict):
-            return value
-        else:
-            raise TypeError(f"Expected dict but got {type(value)}")
 
-    elif target_type == list or get_origin(target_type) == list:
-        if not isinstance(value, list):
-            raise TypeError(f"Expected list but got {type(value)}")
+        def convert_dict(value):
+            if isinstance(value, dict):
+                return value
+            else:
+                raise TypeError(f"Expected dict but got {type(value)}")
+
+        return convert_dict
 
-        if target_type == list:
+    elif target_type == list or get_origin(target_type) == list:
+        if target_type == list or get_args(target_type)[0] is Any:
             # plain list without argument
-            return value
+            element_converter = _return_unchanged
         else:
-            element_type = get_args(target_type)[0]
-            converted_elements = []
-            for element in value:
-                converted_elements.append(_convert_from_json_value(element, element_type))
-            return converted_elements
+            element_converter = _get_from_json_converter(get_args(target_type)[0])
+
+        def convert_list(value):
+            if not isinstance(value, list):
+                raise TypeError(f"Expected list but got {type(value)}")
+
+            return [element_converter(element) for element in value]
+
+        return convert_list
+
+    elif get_origin(target_type) == typing.Literal:
+        allowed_values = get_args(target_type)
+
+        def convert_literal(value):
+            if value in allowed_values and type(value) in map(type, allowed_values):
+                return value
+            else:
+                raise TypeError(f"Expected one of {allowed_values} but got {value!r}")
+
+        return convert_literal
 
     elif get_origin(target_type) in (Union, UnionType):
-        for target_type_option in get_args(target_type):
+        return _create_union_converter(target_type)
+
+    elif isinstance(target_type, typing.ForwardRef):
+        return _get_from_json_converter(_resolve_forward_ref(target_type))
+
+    elif is_dataclass(target_type):
+        return _create_dataclass_converter(target_type)
+
+    elif isinstance(target_type, type) and issubclass(target_type, Enum):
+        return target_type
+
+    elif not isinstance(target_type, type):
+        raise TypeError(f"Can't convert to {target_type}")
+
+    else:
+        raise RuntimeError(f"Unexpected type {target_type}")
+
+
+def _return_unchanged(value: Any) -> Any:
+    return value
+
+
+def _resolve_forward_ref(ref: typing.ForwardRef) -> Type:
+    referenced_type_name = ref.__forward_arg__
+    referenced_type = getattr(lsp_types, referenced_type_name, None)
+    if referenced_type is None:
+        raise TypeError(
+            f"Don't know where to look for forward referenced type {referenced_type_name}"
+        )
+    return referenced_type
+
+
+def _create_union_converter(target_type: Type) -> Callable[[Any], Any]:
+    options = []
+    for option_type in get_args(target_type):
+        try:
+            option_converter = _get_from_json_converter(option_type)
+        except Exception as e:
+            # report the problem only if this option gets reached
+            option_converter = _create_raising_converter(e)
+            options.append((None, None, option_converter))
+            continue
+
+        if isinstance(option_type, typing.ForwardRef):
+            option_type = _resolve_forward_ref(option_type)
+
+        if is_dataclass(option_type):
+            # allows ruling out the option without attempting conversion
+            field_names = set()
+            required_field_names = set()
+            for field in dataclasses.fields(option_type):
+                field_names.add(field.name)
+                if (
+                    field.default is dataclasses.MISSING
+                    and field.default_factory is dataclasses.MISSING
+                ):
+                    required_field_names.add(field.name)
+            fields_info = (frozenset(field_names), frozenset(required_field_names))
+        else:
+            fields_info = None
+
+        options.append((_get_json_kinds(option_type), fields_info, option_converter))
+
+    def convert_union(value):
+        value_type = type(value)
+        for kinds, fields_info, option_converter in options:
+            if kinds is not None and value_type not in kinds:
+                continue
+
+            if fields_info is not None:
+                field_names, required_field_names = fields_info
+                if not (field_names.issuperset(value) and required_field_names.issubset(value)):
+                    continue
+
             # return the first conversion that succeeds
             try:
-                return _convert_from_json_value(value, target_type_option)
+                return option_converter(value)
             except TypeError:
                 pass
-        else:
-            raise TypeError(f"Could not convert {value} to {target_type}")
 
+        raise TypeError(f"Could not convert {value} to {target_type}")
+
+    return convert_union
+
+
+def _create_raising_converter(error: Exception) -> Callable[[Any], Any]:
+    def raise_error(value):
+        raise error
+
+    return raise_error
+
+
+def _get_json_kinds(target_type: Type) -> Optional[typing.FrozenSet[type]]:
+    """Returns the types of JSON values which may be convertible to given type (None means any)"""
+    try:
+        return _json_kinds[target_type]
+    except KeyError:
+        pass
+
+    # recursive type aliases can't constrain themselves
+    _json_kinds[target_type] = None
+
+    result: Optional[typing.FrozenSet[type]]
+    if target_type in [None, NoneType]:
+        result = frozenset([NoneType])
+    elif target_type == int:
+        result = frozenset([int, bool])
+    elif target_type in [float, bool, str]:
+        result = frozenset([target_type])
+    elif target_type == dict or get_origin(target_type) == dict or is_dataclass(target_type):
+        result = frozenset([dict])
+    elif target_type == list or get_origin(target_type) == list:
+        result = frozenset([list])
+    elif get_origin(target_type) in (Union, UnionType):
+        result = frozenset()
+        for option_type in get_args(target_type):
+            option_kinds = _get_json_kinds(option_type)
+            if option_kinds is None:
+                result = None
+                break
+            result |= option_kinds
     elif isinstance(target_type, typing.ForwardRef):
-        referenced_type_name = target_type.__forward_arg__
-        referenced_type = getattr(lsp_types, referenced_type_name, None)
-        if referenced_type is None:
-            raise TypeError(
-                f"Don't know where to look for forward referenced type {referenced_type_name}"
-            )
-        return _convert_from_json_value(value, referenced_type)
+        result = _get_json_kinds(_resolve_forward_ref(target_type))
+    else:
+        result = None
 
-    elif is_dataclass(target_type):
+    _json_kinds[target_type] = result
+    return result
+
+
+def _create_dataclass_converter(target_type: Type) -> Callable[[Any], Any]:
+    # Field converters get created on first use, as they may refer back to this type
+    field_converters: Optional[Dict[str, Callable[[Any], Any]]] = None
+
+    def convert_dataclass(value):
+        nonlocal field_converters
         if not isinstance(value, dict):
             raise TypeError(f"Can not convert {type(value)} to {target_type}")
 
+        if field_converters is None:
+            field_converters = {
+                name: _get_from_json_converter(field_type)
+                for name, field_type in get_type_hints(target_type).items()
+            }
+
         converted_fields = {}
-        field_types = get_type_hints(target_type)
-        for field_name in value:
-            if field_name not in field_types:
+        for field_name, field_value in value.items():
+            field_converter = field_converters.get(field_name)
+            if field_converter is None:
                 raise TypeError(f"field {field_name} is not present in {target_type}")
             else:
-                converted_fields[field_name] = _convert_from_json_value(
-                    value[field_name], field_types[field_name]
-                )
+                converted_fields[field_name] = field_converter(field_value)
 
         return target_type(**converted_fields)
-    elif issubclass(target_type, Enum):
-        return target_type(value)
-    else:
-        raise RuntimeError(f"Unexpected type {target_type}")
+
+    return convert_dataclass
 
 
 def _omit_nulls_dict(value):
@@ -1360,23 +1603,56 @@ def _omit_nulls_dict(value):
 
 
 def _convert_to_json_value(value, omit_nones_in_dataclasses: bool = True) -> Any:
-    if isinstance(value, (str, int, float, bool, type(None))):
-        return value
-    elif isinstance(value, dict):
+    value_type = type(value)
+    try:
+        converter = _to_json_converters[value_type]
+    except KeyError:
+        converter = _create_to_json_converter(value_type)
+        _to_json_converters[value_type] = converter
+
+    return converter(value, omit_nones_in_dataclasses)
+
+
+def _create_to_json_converter(value_type: type) -> Callable[[Any, bool], Any]:
+    if issubclass(value_type, (str, int, float, bool, type(None))):
+        return _return_unchanged_ignoring_options
+    elif issubclass(value_type, dict):
         # assuming it is already json-compatible
-        return value
-    elif isinstance(value, list):
-        return [_convert_to_json_value(el, omit_nones_in_dataclasses) for el in value]
-    elif isinstance(value, Enum):
-        return value.value
-    elif is_dataclass(value):
+        return _return_unchanged_ignoring_options
+    elif issubclass(value_type, list):
+        return _convert_list_to_json_value
+    elif issubclass(value_type, Enum):
+        return _convert_enum_to_json_value
+    elif is_dataclass(value_type):
         # dataclasses.as_dict is tempting, but it wouldn't convert enums
-        result = {}
-        for field in dataclasses.fields(value):
-            field_name = field.name
-            field_value = getattr(value, field_name)
-            if not omit_nones_in_dataclasses or field_value is not None:
-                result[field_name] = _convert_to_json_value(field_value, omit_nones_in_dataclasses)
-        return result
+        field_names = [field.name for field in dataclasses.fields(value_type)]
+
+        def convert_dataclass(value, omit_nones_in_dataclasses):
+            result = {}
+            for field_name in field_names:
+                field_value = getattr(value, field_name)
+                if not omit_nones_in_dataclasses or field_value is not None:
+                    result[field_name] = _convert_to_json_value(
+                        field_value, omit_nones_in_dataclasses
+                    )
+            return result
+
+        return convert_dataclass
     else:
-        raise TypeError(f"Unexpected type {type(value)}")
+
+        def raise_type_error(value, omit_nones_in_dataclasses):
+            raise TypeError(f"Unexpected type {value_type}")
+
+        return raise_type_error
+
+
+def _return_unchanged_ignoring_options(value, omit_nones_in_dataclasses):
+    return value
+
+
+def _convert_list_to_json_value(value, omit_nones_in_dataclasses):
+    return [_convert_to_json_value(el, omit_nones_in_dataclasses) for el in value]
+
+
+def _convert_enum_to_json_value(value, omit_nones_in_dataclasses):
+    return value.value
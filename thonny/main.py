@@ -89,6 +89,7 @@ def run() -> int:
         runner = get_runner()
         if runner is not None:
             runner.destroy_backend()
+            runner.discard_spare_backend()
 
 
 def _check_welcome():
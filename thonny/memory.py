@@ -2,13 +2,20 @@
 
 import tkinter as tk
 import tkinter.font as tk_font
+from logging import getLogger
 
-from thonny import get_workbench, ui_utils
-from thonny.common import ValueInfo
+from thonny import get_runner, get_workbench, ui_utils
+from thonny.common import InlineCommand, ValueInfo
 from thonny.languages import tr
 from thonny.ui_utils import TreeFrame
 
+logger = getLogger(__name__)
+
 MAX_REPR_LENGTH_IN_GRID = 100
+# Large containers and objects are loaded by pages of this many items
+ITEMS_PAGE_SIZE = 200
+# Next page is requested when the visible part of the grid gets this close to the end
+NEXT_PAGE_SCROLL_MARGIN = 0.1
 
 
 def format_object_id(object_id):
@@ -37,9 +44,91 @@ class MemoryFrame(TreeFrame):
         font.configure(underline=True)
         self.tree.tag_configure("hovered", font=font)
 
+        # Paging state of the shown items
+        self._paged_object_id = None
+        self._paged_kind = None
+        self._paged_end = None
+        self._paged_count = None
+        self._page_requested = False
+        self._paging_bound = False
+        self.tree.configure(yscrollcommand=self._on_tree_yscroll)
+
+    def destroy(self):
+        if self._paging_bound:
+            get_workbench().unbind("get_object_items_response", self._handle_object_items_response)
+        super().destroy()
+
     def stop_debugging(self):
         self._clear_tree()
 
+    def set_paging_state(self, object_id, kind, end, count):
+        """
+        Remembers that the grid shows given kind of items (attributes, elements or entries)
+        of the object up to end. If there are more, they get fetched when the user scrolls
+        near the end of the grid.
+        """
+        if end is None or count is None or end >= count:
+            self._paged_object_id = None
+        else:
+            self._paged_object_id = object_id
+
+        self._paged_kind = kind
+        self._paged_end = end
+        self._paged_count = count
+        self._page_requested = False
+
+        if self._paged_object_id is not None and not self._paging_bound:
+            get_workbench().bind(
+                "get_object_items_response", self._handle_object_items_response, True
+            )
+            self._paging_bound = True
+
+    def add_page(self, items, offset):
+        """Shows next page of the items"""
+        raise NotImplementedError()
+
+    def _on_tree_yscroll(self, first, last):
+        self.vert_scrollbar.set(first, last)
+        if (
+            self._paged_object_id is not None
+            and not self._page_requested
+            and float(last) >= 1 - NEXT_PAGE_SCROLL_MARGIN
+            and self.tree.winfo_ismapped()
+        ):
+            self._page_requested = True
+            get_runner().send_command(
+                InlineCommand(
+                    "get_object_items",
+                    object_id=self._paged_object_id,
+                    kind=self._paged_kind,
+                    offset=self._paged_end,
+                    limit=ITEMS_PAGE_SIZE,
+                    all_attributes=True,
+                )
+            )
+
+    def _handle_object_items_response(self, msg):
+        if (
+            msg.get("id") != self._paged_object_id
+            or msg.get("kind") != self._paged_kind
+            or msg.get("offset") != self._paged_end
+        ):
+            # stale response
+            return
+
+        if msg.get("error"):
+            logger.warning("Could not fetch object items: %s", msg["error"])
+            # don't try again before the grid gets refreshed
+            self._paged_object_id = None
+            return
+
+        self.add_page(msg["items"], msg["offset"])
+        self.set_paging_state(self._paged_object_id, self._paged_kind, msg["end"], msg["count"])
+
+    def _clear_tree(self):
+        super()._clear_tree()
+        self._paged_object_id = None
+
     def show_selected_object_info(self):
         object_id = self.get_object_id()
         if object_id is not None:
@@ -71,6 +160,8 @@ class VariablesFrame(MemoryFrame):
         self.tree.heading("name", text=tr("Name"), anchor=tk.W)
         self.tree.heading("id", text=tr("Value ID"), anchor=tk.W)
         self.tree.heading("value", text=tr("Value"), anchor=tk.W)
+        # (group title, variable name) -> (node id, values)
+        self._nodes_by_key = {}
 
         get_workbench().bind("ShowView", self._update_memory_model, True)
         get_workbench().bind("HideView", self._update_memory_model, True)
@@ -97,9 +188,8 @@ class VariablesFrame(MemoryFrame):
             # self.tree.columnconfigure(2, weight=1, width=400)
 
     def update_variables(self, all_variables):
-        self._clear_tree()
-
         if not all_variables:
+            self._clear_tree()
             return
 
         if isinstance(all_variables, list):
@@ -107,23 +197,41 @@ class VariablesFrame(MemoryFrame):
         else:
             groups = [("", all_variables)]
 
+        rows = []
         for group_title, variables in groups:
             if group_title:
-                node_id = self.tree.insert("", "end", tags=("group_title",))
-                self.tree.set(node_id, "name", group_title)
+                rows.append(((group_title, None), "group_title", (group_title, "", "")))
 
             for name in sorted(variables.keys(), key=lambda x: (x.startswith("_"), x)):
-                node_id = self.tree.insert("", "end", tags="item")
-                self.tree.set(node_id, "name", name)
                 if isinstance(variables[name], ValueInfo):
                     description = variables[name].repr
-                    id_str = variables[name].id
+                    id_str = format_object_id(variables[name].id)
                 else:
                     description = variables[name]
-                    id_str = None
-
-                self.tree.set(node_id, "id", format_object_id(id_str))
-                self.tree.set(node_id, "value", description)
+                    id_str = ""
+
+                rows.append(((group_title, name), "item", (name, id_str, description)))
+
+        # Reuse the nodes of the unchanged variables, as updating a large tree is slow.
+        # Nodes keep their relative order, new ones get inserted at their final positions.
+        desired_keys = {key for key, _, _ in rows}
+        for key in list(self._nodes_by_key):
+            if key not in desired_keys:
+                self.tree.delete(self._nodes_by_key.pop(key)[0])
+
+        for index, (key, tag, values) in enumerate(rows):
+            if key in self._nodes_by_key:
+                node_id, old_values = self._nodes_by_key[key]
+                if values != old_values:
+                    self.tree.item(node_id, values=values)
+            else:
+                node_id = self.tree.insert("", index, tags=(tag,), values=values)
+
+            self._nodes_by_key[key] = (node_id, values)
+
+    def _clear_tree(self):
+        super()._clear_tree()
+        self._nodes_by_key = {}
 
     def on_select(self, event):
         self.show_selected_object_info()
@@ -542,6 +542,15 @@ def get_menu_char():
 
 
 def download_bytes(url: str, timeout: int = 10) -> bytes:
+    return download_bytes_and_headers(url, timeout)[0]
+
+
+def download_bytes_and_headers(
+    url: str, timeout: int = 10, extra_headers: Optional[Dict[str, str]] = None
+) -> Tuple[bytes, Dict[str, str]]:
+    """Returns response headers with lowercase names.
+
+    Raises urllib.error.HTTPError also for "304 Not Modified"."""
     from urllib.request import Request, urlopen
 
     req = Request(
@@ -550,15 +559,17 @@ def download_bytes(url: str, timeout: int = 10) -> bytes:
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:124.0) Gecko/20100101 Firefox/124.0",
             "Accept-Encoding": "gzip, deflate",
             "Cache-Control": "no-cache",
+            **(extra_headers or {}),
         },
     )
     with urlopen(req, timeout=timeout) as fp:
+        headers = {name.lower(): value for (name, value) in fp.info().items()}
         if fp.info().get("Content-Encoding") == "gzip":
             import gzip
 
-            return gzip.decompress(fp.read())
+            return gzip.decompress(fp.read()), headers
         else:
-            return fp.read()
+            return fp.read(), headers
 
 
 def download_and_parse_json(url: str, timeout: int = 10) -> Any:
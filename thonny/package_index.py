@@ -0,0 +1,527 @@
+"""
+Searching in the package summaries, which Thonny publishes for the package managers,
+and fetching package metadata from PyPI JSON API.
+
+Both are kept in Thonny's user directory and revalidated with conditional requests
+(ETag / Last-Modified), so that unchanged data is not downloaded again.
+Names are indexed by their bigrams and trigrams. A query scores (with the relatively
+expensive compute_dist_name_similarity) only the names sharing most n-grams with it.
+"""
+
+import gzip
+import hashlib
+import http.client
+import itertools
+import json
+import os.path
+import threading
+import time
+import urllib.error
+import urllib.parse
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging import getLogger
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from packaging.utils import canonicalize_name
+
+from thonny import get_thonny_user_dir
+from thonny.misc_utils import download_bytes_and_headers, jaro_similarity
+
+logger = getLogger(__name__)
+
+# How many best n-gram matches get the actual similarity score
+MAX_SCORED_CANDIDATES = 100
+# How often (in seconds) a loaded index gets revalidated against the server
+INDEX_REVALIDATION_INTERVAL = 60 * 60
+
+# How long (in seconds) fetched metadata is used without asking the server again
+METADATA_MAX_AGE = 10 * 60
+# How many projects' metadata is kept in memory (JSON of big projects can take megabytes)
+MAX_METADATA_IN_MEMORY = 50
+# Least recently used responses get removed from the disk cache when there are more of them
+MAX_CACHED_RESPONSES = 500
+# PyPI redirects to the project's display name (eg. /pypi/django/json -> /pypi/Django/json)
+REDIRECT_STATUSES = (301, 302, 307, 308)
+MAX_REDIRECTS = 5
+PYPI_URL = "https://pypi.org"
+
+_indexes: Dict[str, Tuple["PackageSearchIndex", float]] = {}
+_indexes_lock = threading.Lock()
+
+_pypi_client: Optional["PyPIMetadataClient"] = None
+_pypi_client_lock = threading.Lock()
+
+
+class PackageSearchIndex:
+    def __init__(self, packages: List[Dict[str, Any]]):
+        self.packages = packages
+        self._gram_counts: List[int] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._postings_by_part: Dict[str, List[int]] = defaultdict(list)
+
+        for i, package in enumerate(packages):
+            parts = canonicalize_name(package["name"]).split("-")
+            grams = _get_ngrams(parts)
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                self._postings[gram].append(i)
+            for part in set(parts):
+                self._postings_by_part[part].append(i)
+
+    def search(
+        self, query: str, common_tokens: List[str], limit: int = 20
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """Returns best (score, package) pairs, best first"""
+        query_parts = canonicalize_name(query).split("-")
+        query_grams = _get_ngrams(query_parts)
+
+        shared_counts: Dict[int, int] = defaultdict(int)
+        for gram in query_grams:
+            for i in self._postings.get(gram, []):
+                shared_counts[i] += 1
+
+        candidates = sorted(
+            shared_counts,
+            key=lambda i: (-shared_counts[i], abs(self._gram_counts[i] - len(query_grams))),
+        )[:MAX_SCORED_CANDIDATES]
+
+        # the ones sharing a rare part are relevant even when they have long names
+        candidates = set(candidates)
+        for part in query_parts:
+            part_postings = self._postings_by_part.get(part, [])
+            if len(part_postings) <= MAX_SCORED_CANDIDATES:
+                candidates.update(part_postings)
+
+        scored = [
+            (compute_dist_name_similarity(self.packages[i]["name"], query_parts, common_tokens), i)
+            for i in candidates
+        ]
+        scored.sort(key=lambda pair: (-pair[0], pair[1]))
+        return [(score, self.packages[i]) for (score, i) in scored[:limit]]
+
+
+def get_package_search_index(data_url: str, cache_dir: Optional[str] = None) -> PackageSearchIndex:
+    if cache_dir is None:
+        cache_dir = os.path.join(get_thonny_user_dir(), "package_index")
+
+    with _indexes_lock:
+        index, checked_time = _indexes.get(data_url, (None, 0.0))
+        if index is not None and time.time() - checked_time < INDEX_REVALIDATION_INTERVAL:
+            return index
+
+        cache_path = os.path.join(cache_dir, _get_cache_file_name(data_url))
+        data, modified = download_with_cache(data_url, cache_path)
+        if index is None or modified:
+            logger.info("Indexing %r", data_url)
+            index = PackageSearchIndex(json.loads(data))
+
+        _indexes[data_url] = (index, time.time())
+        return index
+
+
+def download_with_cache(url: str, cache_path: str, timeout: int = 10) -> Tuple[bytes, bool]:
+    """Returns the content and whether it differs from the one in cache.
+
+    Falls back to cached content when the server can't be reached."""
+    meta_path = cache_path + ".meta.json"
+    cached_data = None
+    meta: Dict[str, str] = {}
+    if os.path.isfile(cache_path) and os.path.isfile(meta_path):
+        try:
+            with open(meta_path, encoding="utf-8") as fp:
+                meta = json.load(fp)
+            with open(cache_path, "rb") as fp:
+                cached_data = fp.read()
+        except (OSError, ValueError):
+            logger.exception("Could not read cached %r", cache_path)
+            meta = {}
+
+        if meta.get("url") != url:
+            cached_data = None
+
+    extra_headers = {}
+    if cached_data is not None:
+        if meta.get("etag"):
+            extra_headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            extra_headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        data, headers = download_bytes_and_headers(url, timeout, extra_headers)
+    except urllib.error.HTTPError as e:
+        if cached_data is None:
+            raise
+        if e.code != 304:
+            logger.warning("Could not revalidate %r (%s), using cached content", url, e)
+        return cached_data, False
+    except OSError as e:
+        if cached_data is None:
+            raise
+        logger.warning("Could not revalidate %r (%s), using cached content", url, e)
+        return cached_data, False
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        _write_atomically(cache_path, data)
+        _write_atomically(
+            meta_path,
+            json.dumps(
+                {
+                    "url": url,
+                    "etag": headers.get("etag", ""),
+                    "last_modified": headers.get("last-modified", ""),
+                }
+            ).encode("utf-8"),
+        )
+    except OSError:
+        logger.exception("Could not cache %r", url)
+
+    return data, data != cached_data
+
+
+class PyPIMetadataClient:
+    """Fetches project data from PyPI JSON API (or a compatible index).
+
+    Keeps connections open between requests and the responses both in memory and on disk.
+    Concurrent requests for the same data share a single download."""
+
+    def __init__(
+        self,
+        base_url: str = PYPI_URL,
+        cache_dir: Optional[str] = None,
+        timeout: int = 10,
+        max_connections: int = 4,
+    ):
+        parts = urllib.parse.urlsplit(base_url)
+        self._scheme = parts.scheme
+        self._netloc = parts.netloc
+        self._base_path = parts.path.rstrip("/")
+        self._cache_dir = cache_dir
+        self._timeout = timeout
+        self._max_connections = max_connections
+
+        self._lock = threading.Lock()
+        self._idle_connections: List[http.client.HTTPConnection] = []
+        # path -> (data or None for missing project, time of validation), least recent first
+        self._fresh_data: "OrderedDict[str, Tuple[Optional[Dict[str, Any]], float]]" = (
+            OrderedDict()
+        )
+        self._pending: Dict[str, Future] = {}
+        self._prefetch_executor = ThreadPoolExecutor(
+            max_workers=max_connections, thread_name_prefix="PyPIPrefetch"
+        )
+
+    def get_project_data(self, name: str, version: Optional[str] = None) -> Dict[str, Any]:
+        """Raises urllib.error.HTTPError with code 404 for unknown project or version"""
+        if version is None:
+            path = "/pypi/{}/json".format(urllib.parse.quote(name))
+        else:
+            path = "/pypi/{}/{}/json".format(urllib.parse.quote(name), urllib.parse.quote(version))
+        path = self._base_path + path
+
+        with self._lock:
+            fresh = self._fresh_data.get(path)
+            if fresh is not None and time.time() - fresh[1] < METADATA_MAX_AGE:
+                self._fresh_data.move_to_end(path)
+                future = None
+            else:
+                if fresh is not None:
+                    del self._fresh_data[path]
+                fresh = None
+                future = self._pending.get(path)
+                owner = future is None
+                if owner:
+                    future = Future()
+                    self._pending[path] = future
+
+        if fresh is not None:
+            data = fresh[0]
+        elif not owner:
+            data = future.result()
+        else:
+            try:
+                final_path, data = self._fetch(path)
+                with self._lock:
+                    for key in {path, final_path}:
+                        self._fresh_data[key] = (data, time.time())
+                        self._fresh_data.move_to_end(key)
+                    while len(self._fresh_data) > MAX_METADATA_IN_MEMORY:
+                        self._fresh_data.popitem(last=False)
+                future.set_result(data)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    del self._pending[path]
+
+        if data is None:
+            raise urllib.error.HTTPError(self._get_url(path), 404, "Not Found", None, None)
+
+        return data
+
+    def prefetch(self, names: Iterable[str]) -> None:
+        """Starts fetching the data in background threads"""
+        for name in names:
+            self._prefetch_executor.submit(self._prefetch_project_data, name)
+
+    def close(self) -> None:
+        self._prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            connections = self._idle_connections
+            self._idle_connections = []
+
+        for conn in connections:
+            conn.close()
+
+    def _prefetch_project_data(self, name: str) -> None:
+        try:
+            self.get_project_data(name)
+        except Exception as e:
+            logger.info("Could not prefetch %r: %s", name, e)
+
+    def _fetch(self, path: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Returns the path the data was found at (after redirects) and the data"""
+        for _ in range(MAX_REDIRECTS + 1):
+            cached = self._load_cached_response(path)
+            headers = {"Accept": "application/json", "Accept-Encoding": "gzip"}
+            if cached is not None:
+                if cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+                if cached.get("last_modified"):
+                    headers["If-Modified-Since"] = cached["last_modified"]
+
+            logger.info("Fetching %s", self._get_url(path))
+            try:
+                status, reason, response_headers, body = self._request(path, headers)
+            except (OSError, http.client.HTTPException) as e:
+                if cached is None:
+                    raise
+                logger.warning("Could not revalidate %r (%s), using cached data", path, e)
+                return path, cached["data"]
+
+            if status in REDIRECT_STATUSES:
+                path = self._get_redirect_path(path, status, reason, response_headers)
+            else:
+                data = self._process_response(
+                    path, status, reason, response_headers, body, cached
+                )
+                return path, data
+
+        raise urllib.error.HTTPError(self._get_url(path), status, "Too many redirects", None, None)
+
+    def _get_redirect_path(
+        self, path: str, status: int, reason: str, response_headers: Dict[str, str]
+    ) -> str:
+        location = response_headers.get("location")
+        target = urllib.parse.urlsplit(urllib.parse.urljoin(self._get_url(path), location or ""))
+        if not location or (target.scheme, target.netloc) != (self._scheme, self._netloc):
+            # the pooled connections only serve one host
+            raise urllib.error.HTTPError(self._get_url(path), status, reason, None, None)
+
+        logger.debug("%s redirects to %s", path, location)
+        return target.path + ("?" + target.query if target.query else "")
+
+    def _process_response(
+        self,
+        path: str,
+        status: int,
+        reason: str,
+        response_headers: Dict[str, str],
+        body: bytes,
+        cached: Optional[Dict[str, Any]],
+    ) -> Optional[Dict[str, Any]]:
+        if status == 304 and cached is not None:
+            return cached["data"]
+        elif status == 404:
+            return None
+        elif status != 200:
+            raise urllib.error.HTTPError(self._get_url(path), status, reason, None, None)
+
+        if response_headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        data = json.loads(body)
+
+        self._save_cached_response(
+            path,
+            {
+                "etag": response_headers.get("etag", ""),
+                "last_modified": response_headers.get("last-modified", ""),
+                "data": data,
+            },
+        )
+        return data
+
+    def _request(
+        self, path: str, headers: Dict[str, str]
+    ) -> Tuple[int, str, Dict[str, str], bytes]:
+        for attempt in range(2):
+            conn, reused = self._acquire_connection()
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                if reused and attempt == 0:
+                    # server may have closed the idle connection
+                    continue
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._release_connection(conn)
+
+            response_headers = {name.lower(): value for (name, value) in response.getheaders()}
+            return response.status, response.reason, response_headers, body
+
+        raise AssertionError("unreachable")
+
+    def _acquire_connection(self) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            if self._idle_connections:
+                return self._idle_connections.pop(), True
+
+        if self._scheme == "https":
+            return http.client.HTTPSConnection(self._netloc, timeout=self._timeout), False
+        else:
+            return http.client.HTTPConnection(self._netloc, timeout=self._timeout), False
+
+    def _release_connection(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if len(self._idle_connections) < self._max_connections:
+                self._idle_connections.append(conn)
+                return
+
+        conn.close()
+
+    def _get_url(self, path: str) -> str:
+        return self._scheme + "://" + self._netloc + path
+
+    def _get_cache_path(self, path: str) -> Optional[str]:
+        if self._cache_dir is None:
+            return None
+
+        url = self._get_url(path)
+        file_name = hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json"
+        return os.path.join(self._cache_dir, file_name)
+
+    def _load_cached_response(self, path: str) -> Optional[Dict[str, Any]]:
+        cache_path = self._get_cache_path(path)
+        if cache_path is None or not os.path.isfile(cache_path):
+            return None
+
+        try:
+            with open(cache_path, encoding="utf-8") as fp:
+                result = json.load(fp)
+        except (OSError, ValueError):
+            logger.exception("Could not read cached %r", cache_path)
+            return None
+
+        try:
+            # for pruning
+            os.utime(cache_path)
+        except OSError:
+            pass
+
+        return result
+
+    def _save_cached_response(self, path: str, response: Dict[str, Any]) -> None:
+        cache_path = self._get_cache_path(path)
+        if cache_path is None:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            _write_atomically(cache_path, json.dumps(response).encode("utf-8"))
+        except OSError:
+            logger.exception("Could not cache %r", path)
+            return
+
+        self._prune_cache()
+
+    def _prune_cache(self) -> None:
+        try:
+            entries = [
+                entry for entry in os.scandir(self._cache_dir) if entry.name.endswith(".json")
+            ]
+            if len(entries) <= MAX_CACHED_RESPONSES:
+                return
+
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[: len(entries) - MAX_CACHED_RESPONSES]:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+        except OSError:
+            logger.warning("Could not prune PyPI metadata cache", exc_info=True)
+
+
+def get_pypi_client() -> PyPIMetadataClient:
+    global _pypi_client
+    with _pypi_client_lock:
+        if _pypi_client is None:
+            _pypi_client = PyPIMetadataClient(
+                cache_dir=os.path.join(get_thonny_user_dir(), "package_index", "pypi")
+            )
+
+        return _pypi_client
+
+
+def compute_dist_name_similarity(
+    name: str, query_parts: List[str], common_tokens: List[str]
+) -> float:
+    name_parts = canonicalize_name(name).split("-")
+
+    for common_token in common_tokens:
+        if common_token in name_parts and common_token not in query_parts:
+            # don't penalize omitting this part
+            name_parts.remove(common_token)
+
+    common_count = min(len(query_parts), len(name_parts))
+    name_perms = list(itertools.permutations(name_parts, common_count))
+    query_perms = list(itertools.permutations(query_parts, common_count))
+
+    if len(name_perms) * len(query_perms) > 36:
+        # 36 corresponds to 3-part name and 3-part query.
+        # More than that would be too much effort. Assume correct order and match sub-lists instead.
+        name_perms = _get_sublists_of_length(name_parts, common_count)
+        query_perms = _get_sublists_of_length(query_parts, common_count)
+
+    best_score = 0
+    for name_perm, query_perm in itertools.product(name_perms, query_perms):
+        score = jaro_similarity("-".join(name_perm), "-".join(query_perm))
+        best_score = max(score, best_score)
+
+    parts_length_penalty = 1.0 - abs(len(query_parts) - len(name_parts)) * 0.05
+    return best_score * parts_length_penalty
+
+
+def _get_ngrams(parts: List[str]) -> set:
+    result = set()
+    for part in parts:
+        padded = "^" + part + "$"
+        for n in [2, 3]:
+            for i in range(len(padded) - n + 1):
+                result.add(padded[i : i + n])
+
+    return result
+
+
+def _get_sublists_of_length(l: List[Any], n: int) -> List[List[Any]]:
+    return [l[i : i + n] for i in range(len(l) - n + 1)]
+
+
+def _get_cache_file_name(url: str) -> str:
+    url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()[:10]
+    return url_hash + "_" + url.rstrip("/").split("/")[-1]
+
+
+def _write_atomically(path: str, data: bytes) -> None:
+    temp_path = "%s.%d.tmp" % (path, threading.get_ident())
+    with open(temp_path, "wb") as fp:
+        fp.write(data)
+    os.replace(temp_path, path)
@@ -0,0 +1,207 @@
+"""
+Parse trees of code view texts, shared by the editor plugins.
+
+A ParseService keeps a copy of its text up to date through TextInsert and TextDelete
+events. After a pause in editing it re-parses the copy with parso's diff parser in a
+background thread, which re-uses the unchanged parts of the previous tree.
+
+The plugins don't get the tree itself, as next parse modifies it in place. Instead they
+register analyzers, which get run in the background thread right after parsing and
+turn the tree into plain data. The analyses of the latest text are cached and given to
+the plugins in the UI thread.
+"""
+
+import itertools
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, Optional
+
+from thonny import get_workbench
+from thonny.document_mirror import DocumentMirror, tk_counts_utf16_code_units
+
+logger = getLogger(__name__)
+
+# Time between last edit and re-parsing
+PARSE_DELAY_MS = 150
+POLL_INTERVAL_MS = 20
+
+# Takes parso's Module, returns data which doesn't refer to the tree
+Analyzer = Callable[[Any], Any]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_service_counter = itertools.count(1)
+_events_bound = False
+
+
+@dataclass(frozen=True)
+class ParseResult:
+    version: int
+    analyzer_names: FrozenSet[str]
+    analyses: Dict[str, Any]
+
+
+class ParseService:
+    def __init__(self, text):
+        self.text = text
+        self._document = self._create_document()
+        # incremented on each change
+        self._version = 0
+        self._analyzers: Dict[str, Analyzer] = {}
+        self._pending_callbacks: Dict[str, Callable[[Any], None]] = {}
+        self._result: Optional[ParseResult] = None
+        self._future: Optional[Future] = None
+        self._parse_scheduling_id = None
+        self._closed = False
+        # key of the tree in parso's diff cache
+        self._cache_path = Path("<thonny-parse-service-%d>" % next(_service_counter))
+
+    def request(self, name: str, analyzer: Analyzer, callback: Callable[[Any], None]) -> None:
+        """
+        Calls back with the analysis of current text, either immediately (if it's cached)
+        or after the text has been parsed. Only the latest callback of each name is kept.
+        """
+        self._analyzers[name] = analyzer
+        if (
+            self._result is not None
+            and self._result.version == self._version
+            and name in self._result.analyses
+        ):
+            self._pending_callbacks.pop(name, None)
+            callback(self._result.analyses[name])
+            return
+
+        self._pending_callbacks[name] = callback
+        if self._parse_scheduling_id is None and self._future is None:
+            self._schedule_parse(0)
+
+    def discard(self, name: str) -> None:
+        """Stops running the analyzer"""
+        self._analyzers.pop(name, None)
+        self._pending_callbacks.pop(name, None)
+
+    def close(self) -> None:
+        self._closed = True
+        if self._parse_scheduling_id is not None:
+            self.text.after_cancel(self._parse_scheduling_id)
+            self._parse_scheduling_id = None
+        _submit(self._forget_tree)
+
+    def notify_change(self, event) -> None:
+        if event.sequence == "TextInsert":
+            self._document.insert(event.index, event.text)
+        else:
+            self._document.delete(event.index1, event.index2)
+
+        self._version += 1
+        if self._analyzers:
+            self._schedule_parse(PARSE_DELAY_MS)
+
+    def _create_document(self) -> DocumentMirror:
+        return DocumentMirror(
+            self.text.get("1.0", "end-1c"), tk_counts_utf16_code_units(self.text.tk)
+        )
+
+    def _schedule_parse(self, delay_ms: int) -> None:
+        if self._parse_scheduling_id is not None:
+            self.text.after_cancel(self._parse_scheduling_id)
+        self._parse_scheduling_id = self.text.after(delay_ms, self._start_parse)
+
+    def _start_parse(self) -> None:
+        self._parse_scheduling_id = None
+        if self._closed or not self._analyzers or self._future is not None:
+            # running parse checks the version when it's done
+            return
+
+        if self._document.get_line_count() != int(self.text.index("end-1c").split(".")[0]):
+            logger.warning("Parse service got out of sync with the text")
+            self._document = self._create_document()
+
+        self._future = _submit(
+            self._parse_and_analyze, self._document.get_text(), self._version, dict(self._analyzers)
+        )
+        self.text.after(POLL_INTERVAL_MS, self._poll_parse)
+
+    def _parse_and_analyze(
+        self, source: str, version: int, analyzers: Dict[str, Analyzer]
+    ) -> ParseResult:
+        import parso
+
+        module = parso.load_grammar().parse(source, path=self._cache_path, diff_cache=True)
+        analyses = {}
+        for name, analyzer in analyzers.items():
+            try:
+                analyses[name] = analyzer(module)
+            except Exception:
+                logger.exception("Problem when running analyzer %r", name)
+
+        return ParseResult(version, frozenset(analyzers), analyses)
+
+    def _forget_tree(self) -> None:
+        from parso.cache import parser_cache
+
+        for trees_by_path in parser_cache.values():
+            trees_by_path.pop(self._cache_path, None)
+
+    def _poll_parse(self) -> None:
+        if self._closed:
+            return
+
+        assert self._future is not None
+        if not self._future.done():
+            self.text.after(POLL_INTERVAL_MS, self._poll_parse)
+            return
+
+        future = self._future
+        self._future = None
+        try:
+            self._result = future.result()
+        except Exception:
+            logger.exception("Problem when parsing")
+            return
+
+        if self._result.version != self._version:
+            # changed during parsing
+            if self._parse_scheduling_id is None:
+                self._schedule_parse(PARSE_DELAY_MS)
+            return
+
+        for name in list(self._pending_callbacks):
+            if name in self._result.analyses:
+                self._pending_callbacks.pop(name)(self._result.analyses[name])
+            elif name in self._result.analyzer_names:
+                # the analyzer failed
+                del self._pending_callbacks[name]
+
+        if self._pending_callbacks:
+            # requested during parsing
+            self._schedule_parse(0)
+
+
+def get_parse_service(text) -> ParseService:
+    global _events_bound
+    if not _events_bound:
+        get_workbench().bind("TextInsert", _notify_change, True)
+        get_workbench().bind("TextDelete", _notify_change, True)
+        _events_bound = True
+
+    if not hasattr(text, "parse_service"):
+        text.parse_service = ParseService(text)
+        text.bind("<Destroy>", lambda event: text.parse_service.close(), True)
+
+    return text.parse_service
+
+
+def _notify_change(event) -> None:
+    service = getattr(event.text_widget, "parse_service", None)
+    if service is not None:
+        service.notify_change(event)
+
+
+def _submit(fn, *args) -> Future:
+    global _executor
+    if _executor is None:
+        # single thread, because parso's cache is not thread-safe
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ParseService")
+    return _executor.submit(fn, *args)
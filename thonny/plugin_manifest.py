@@ -0,0 +1,379 @@
+"""
+Loads plug-ins with help of a cached plug-in manifest.
+
+Without a manifest, every module in thonny.plugins and thonnycontrib gets imported at startup
+and its load_plugin gets called. A plug-in module can allow postponing this by defining
+``load_lazily = True``. In this case its load_plugin may only register commands, views,
+configuration pages and option defaults, and the module may not have other effects
+at import time. A lazy plug-in module without load_plugin doesn't get imported at all.
+
+When the manifest is missing or stale, all plug-ins get loaded as usual, but the
+registrations made by lazy plug-ins get recorded into the manifest. In following startups
+these registrations get replayed with stand-ins in place of the registered functions
+and classes. The plug-in gets imported and loaded when one of its stand-ins gets used
+for the first time (e.g. when its command gets invoked or its view gets opened).
+
+The manifest is specific to Thonny version, language, UI mode and the plug-in files.
+"""
+
+import ast
+import hashlib
+import importlib
+import inspect
+import os.path
+import pkgutil
+from logging import getLogger
+from typing import Any, Dict, List, Optional, Tuple
+
+import thonny
+from thonny import get_version
+
+logger = getLogger(__name__)
+
+# Change when the layout of the manifest changes
+MANIFEST_FORMAT_VERSION = 1
+
+LOAD_FUNCTION_NAME = "load_plugin"
+LAZY_LOADING_FLAG = "load_lazily"
+
+# Workbench methods a lazy plug-in may call in its load_plugin, with the names of
+# the arguments which get replaced by stand-ins until the plug-in is loaded
+REGISTRATION_METHODS = {
+    "add_command": ["handler", "tester"],
+    "add_view": ["cls"],
+    "add_configuration_page": ["page_class"],
+    "set_default": [],
+}
+
+# Workbench methods a lazy plug-in may use for deciding what to register.
+# Their results need to be covered by the manifest key.
+ALLOWED_QUERIES = ["get_ui_mode", "in_simple_mode"]
+
+# method name, literal arguments, names of objects replaced by stand-ins
+RecordedCall = Tuple[str, Dict[str, Any], Dict[str, str]]
+
+
+class PluginStandIn:
+    """Stands for a function or class registered by a plug-in which is not loaded yet"""
+
+    def __init__(
+        self, loader: "PluginLoader", module_name: str, call_index: int, arg_name: str, name: str
+    ):
+        self._loader = loader
+        self._module_name = module_name
+        self._call_index = call_index
+        self._arg_name = arg_name
+        # Workbench.add_view uses class name as view id
+        self.__name__ = name
+
+    def __call__(self, *args, **kwargs):
+        target = self._loader.resolve(self._module_name, self._call_index, self._arg_name)
+        return target(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<stand-in for {self._module_name}.{self.__name__}>"
+
+
+class PluginLoader:
+    def __init__(self, workbench, manifest_path: str, skipped_modules: List[str]):
+        self._workbench = workbench
+        self._manifest_path = manifest_path
+        self._skipped_modules = skipped_modules
+        self._lazy_plugins: Dict[str, List[RecordedCall]] = {}
+        self._resolved_arguments: Dict[str, List[Dict[str, Any]]] = {}
+
+    def load_plugins(self, sources: List[Tuple[List[str], str]]) -> None:
+        """Loads plug-ins from given (package path, module name prefix) pairs"""
+        module_names = []
+        for path, prefix in sources:
+            for _, module_name, _ in sorted(
+                pkgutil.iter_modules(path, prefix), key=lambda x: x[2]
+            ):
+                if module_name in self._skipped_modules:
+                    logger.debug("Skipping plug-in %s", module_name)
+                else:
+                    module_names.append(module_name)
+
+        key = self._get_manifest_key(sources, module_names)
+        manifest = self._read_manifest(key)
+        if manifest is None:
+            logger.info("Loading all plug-ins and recording the plug-in manifest")
+            manifest = self._load_and_record_plugins(module_names)
+            self._write_manifest(key, manifest)
+        else:
+            self._load_plugins_with_manifest(manifest)
+
+    def resolve(self, module_name: str, call_index: int, arg_name: str) -> Any:
+        if module_name not in self._resolved_arguments:
+            self._resolved_arguments[module_name] = self._load_lazy_plugin(module_name)
+
+        return self._resolved_arguments[module_name][call_index][arg_name]
+
+    def _load_and_record_plugins(self, module_names: List[str]) -> Dict[str, Any]:
+        imports = []
+        lazy_module_names = set()
+        modules = []
+        for module_name in module_names:
+            try:
+                logger.debug("Importing %r", module_name)
+                m = importlib.import_module(module_name)
+            except Exception:
+                logger.exception("Failed loading plugin '" + module_name + "'")
+                # let it fail again next time
+                imports.append(module_name)
+                continue
+
+            if getattr(m, LAZY_LOADING_FLAG, False):
+                lazy_module_names.add(module_name)
+            else:
+                imports.append(module_name)
+            if hasattr(m, LOAD_FUNCTION_NAME):
+                modules.append(m)
+
+        plugins = []
+        for m in sorted(modules, key=_get_module_sort_key):
+            if m.__name__ in lazy_module_names:
+                calls = self._call_load_function(m, record=True)
+                if calls is None:
+                    imports.append(m.__name__)
+                plugins.append((m.__name__, calls))
+            else:
+                self._call_load_function(m)
+                plugins.append((m.__name__, None))
+
+        return {"imports": imports, "plugins": plugins}
+
+    def _load_plugins_with_manifest(self, manifest: Dict[str, Any]) -> None:
+        modules = {}
+        for module_name in manifest["imports"]:
+            try:
+                logger.debug("Importing %r", module_name)
+                modules[module_name] = importlib.import_module(module_name)
+            except Exception:
+                logger.exception("Failed loading plugin '" + module_name + "'")
+
+        for module_name, calls in manifest["plugins"]:
+            if calls is None:
+                if module_name in modules:
+                    self._call_load_function(modules[module_name])
+            else:
+                self._register_stand_ins(module_name, calls)
+
+    def _call_load_function(self, m, record: bool = False) -> Optional[List[RecordedCall]]:
+        """Loads the plug-in. When recording, returns the registrations
+        or None if these can't be replayed."""
+        logger.debug("Loading plugin %r from file %r", m.__name__, m.__file__)
+        interceptor = _WorkbenchInterceptor(self._workbench, forward=True)
+        try:
+            if record:
+                with interceptor:
+                    getattr(m, LOAD_FUNCTION_NAME)()
+            else:
+                getattr(m, LOAD_FUNCTION_NAME)()
+        except Exception:
+            logger.exception("Could not load plugin")
+            self._workbench.report_exception("Coult not load plugin " + m.__name__)
+            return None
+
+        if not record:
+            return None
+
+        if interceptor.unsupported_uses:
+            logger.warning(
+                "Plug-in %s can't be loaded lazily, as its %s uses %s",
+                m.__name__,
+                LOAD_FUNCTION_NAME,
+                sorted(set(interceptor.unsupported_uses)),
+            )
+            return None
+
+        calls = []
+        for method_name, arguments in interceptor.calls:
+            call = _encode_call(method_name, arguments)
+            if call is None:
+                logger.warning(
+                    "Plug-in %s can't be loaded lazily, as arguments of %s can't be recorded",
+                    m.__name__,
+                    method_name,
+                )
+                return None
+            calls.append(call)
+
+        return calls
+
+    def _register_stand_ins(self, module_name: str, calls: List[RecordedCall]) -> None:
+        logger.debug("Registering stand-ins for plugin %r", module_name)
+        self._lazy_plugins[module_name] = calls
+        try:
+            for i, (method_name, literal_arguments, stand_in_names) in enumerate(calls):
+                arguments = dict(literal_arguments)
+                for arg_name, name in stand_in_names.items():
+                    arguments[arg_name] = PluginStandIn(self, module_name, i, arg_name, name)
+                getattr(self._workbench, method_name)(**arguments)
+        except Exception:
+            logger.exception("Could not load plugin")
+            self._workbench.report_exception("Coult not load plugin " + module_name)
+
+    def _load_lazy_plugin(self, module_name: str) -> List[Dict[str, Any]]:
+        """Runs load_plugin of a lazy plug-in without repeating its registrations.
+        Returns the actual arguments of the registrations."""
+        logger.info("Loading lazy plugin %r", module_name)
+        m = importlib.import_module(module_name)
+        interceptor = _WorkbenchInterceptor(self._workbench, forward=False)
+        with interceptor:
+            getattr(m, LOAD_FUNCTION_NAME)()
+
+        recorded_method_names = [call[0] for call in self._lazy_plugins[module_name]]
+        actual_method_names = [method_name for method_name, _ in interceptor.calls]
+        if actual_method_names != recorded_method_names:
+            # next startup will record it again
+            self._remove_manifest()
+            raise RuntimeError(
+                f"Plug-in {module_name} registered other things than recorded in plug-in manifest"
+                f" ({actual_method_names} vs {recorded_method_names}). Please restart Thonny!"
+            )
+
+        return [arguments for _, arguments in interceptor.calls]
+
+    def _get_manifest_key(self, sources: List[Tuple[List[str], str]], module_names: List[str]):
+        hasher = hashlib.sha256()
+        context = (
+            MANIFEST_FORMAT_VERSION,
+            get_version(),
+            self._workbench.get_option("general.language"),
+            self._workbench.get_ui_mode(),
+            module_names,
+        )
+        hasher.update(repr(context).encode("utf-8", errors="surrogatepass"))
+
+        for path, _ in sources:
+            for dir_path in path:
+                for stamp in _get_file_stamps(dir_path, depth=2):
+                    hasher.update(repr(stamp).encode("utf-8", errors="surrogatepass"))
+
+        return hasher.hexdigest()
+
+    def _read_manifest(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._manifest_path, encoding="utf-8") as fp:
+                data = ast.literal_eval(fp.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Could not read plug-in manifest", exc_info=True)
+            return None
+
+        if not isinstance(data, dict) or data.get("key") != key:
+            logger.info("Plug-in manifest is stale")
+            return None
+
+        return data
+
+    def _write_manifest(self, key: str, manifest: Dict[str, Any]) -> None:
+        temp_path = "%s.%d.tmp" % (self._manifest_path, os.getpid())
+        try:
+            with open(temp_path, "w", encoding="utf-8") as fp:
+                fp.write(repr(dict(manifest, key=key)))
+            os.replace(temp_path, self._manifest_path)
+        except Exception:
+            logger.warning("Could not write plug-in manifest", exc_info=True)
+
+    def _remove_manifest(self) -> None:
+        try:
+            os.remove(self._manifest_path)
+        except OSError:
+            pass
+
+
+class _WorkbenchInterceptor:
+    """
+    Takes the place of the workbench (as seen by get_workbench) while load_plugin
+    of a lazy plug-in is running. Collects the registrations and the names of
+    other used workbench attributes. Forwards the registrations only if asked to.
+    """
+
+    def __init__(self, workbench, forward: bool):
+        self._workbench = workbench
+        self._forward = forward
+        self._original_workbench = None
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        self.unsupported_uses: List[str] = []
+
+    def __enter__(self):
+        self._original_workbench = thonny._workbench
+        thonny._workbench = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        thonny._workbench = self._original_workbench
+
+    def __getattr__(self, name):
+        value = getattr(self._workbench, name)
+        if name in REGISTRATION_METHODS:
+            signature = inspect.signature(value)
+
+            def intercept(*args, **kwargs):
+                self.calls.append((name, dict(signature.bind(*args, **kwargs).arguments)))
+                if self._forward:
+                    return value(*args, **kwargs)
+
+            return intercept
+
+        if name not in ALLOWED_QUERIES:
+            self.unsupported_uses.append(name)
+
+        return value
+
+
+def _encode_call(method_name: str, arguments: Dict[str, Any]) -> Optional[RecordedCall]:
+    literal_arguments = {}
+    stand_in_names = {}
+    for arg_name, value in arguments.items():
+        if arg_name in REGISTRATION_METHODS[method_name] and callable(value):
+            stand_in_names[arg_name] = getattr(value, "__name__", arg_name)
+        elif _is_literal(value):
+            literal_arguments[arg_name] = value
+        else:
+            return None
+
+    return method_name, literal_arguments, stand_in_names
+
+
+def _is_literal(value: Any) -> bool:
+    """Tells whether the value survives repr and ast.literal_eval"""
+    if value is None or type(value) in (bool, int, float, str, bytes):
+        return True
+    if type(value) in (list, tuple, set):
+        return all(_is_literal(item) for item in value)
+    if type(value) is dict:
+        return all(_is_literal(key) and _is_literal(item) for key, item in value.items())
+    return False
+
+
+def _get_module_sort_key(m) -> str:
+    return getattr(m, "load_order_key", m.__name__)
+
+
+def _get_file_stamps(dir_path: str, depth: int) -> List[Tuple[str, int, int]]:
+    stamps = []
+    try:
+        entries = sorted(os.scandir(dir_path), key=lambda entry: entry.name)
+    except OSError:
+        return stamps
+
+    for entry in entries:
+        if entry.name == "__pycache__":
+            continue
+        try:
+            if entry.is_dir():
+                # mtime of a directory changes also when __pycache__ gets created
+                stamps.append((entry.path, 0, 0))
+                if depth > 1:
+                    stamps.extend(_get_file_stamps(entry.path, depth - 1))
+            else:
+                stat = entry.stat()
+                stamps.append((entry.path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            continue
+
+    return stamps
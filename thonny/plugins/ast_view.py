@@ -207,5 +207,8 @@ def pretty(node, key="/", level=0):
     return "\n".join(lines)
 
 
+load_lazily = True
+
+
 def load_plugin() -> None:
     get_workbench().add_view(AstView, tr("Program tree"), "s")
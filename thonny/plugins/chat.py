@@ -661,5 +661,8 @@ class ChatView(tktextext.TextFrame):
         update_text_height(self.suggestions_text, min_lines=1, max_lines=5)
 
 
+load_lazily = True
+
+
 def load_plugin():
     get_workbench().add_view(ChatView, tr("Chat"), "se", visible_by_default=False)
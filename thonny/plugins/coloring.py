@@ -3,29 +3,123 @@ Each text will get its on SyntaxColorer.
 
 For performance reasons, coloring is updated in 2 phases:
     1. recolor single-line tokens on the modified line(s)
-    2. recolor multi-line tokens (triple-quoted strings) in the whole text
+    2. recolor multi-line tokens (triple-quoted strings)
 
 First phase may insert wrong tokens inside triple-quoted strings, but the
 priorities of triple-quoted-string tags are higher and therefore user
 doesn't see these wrong taggings. In some cases (eg. open strings)
 these wrong tags are removed later.
 
+In code views the second phase is incremental. The colorer remembers for each line
+whether it starts inside a triple-quoted string and re-lexes from the modified lines
+only until this state matches the remembered state again.
+
 In Shell only current command entry is colored
 
+Tag ranges are collected and added with one Tk call per tag.
+
 Regexes are adapted from idlelib
 """
 
 import re
+from bisect import bisect_right
 from logging import getLogger
+from typing import Dict, List, Optional, Tuple
 
 from thonny import get_workbench
 from thonny.codeview import CodeViewText, SyntaxText
+from thonny.document_mirror import tk_counts_utf16_code_units, utf16_len
 from thonny.shell import ShellText
 
 logger = getLogger(__name__)
 
 TODO = "COLOR_TODO"
 
+# Number of lines fetched from the widget at once during incremental lexing
+LEXING_CHUNK_SIZE = 200
+
+# (start column, end column, whether the string gets closed)
+String3Span = Tuple[int, int, bool]
+
+
+class String3Lexer:
+    """
+    Finds triple-quoted strings line by line.
+
+    The state between lines is the delimiter of the string which remains open at the end
+    of the line, or None.
+    """
+
+    def __init__(self):
+        from thonny.token_utils import (
+            COMMENT_WITH_Q3DELIMITER,
+            DQ3STRING_BODY,
+            MAGIC_COMMAND,
+            SQ3STRING_BODY,
+            STRING3_DELIMITER,
+        )
+
+        # need to notice triple-quotes inside comments and magic commands
+        self._start_regex = re.compile(
+            STRING3_DELIMITER + "|" + COMMENT_WITH_Q3DELIMITER + "|" + MAGIC_COMMAND, re.S
+        )
+        self._body_regexes = {
+            "'''": re.compile(SQ3STRING_BODY, re.S),
+            '"""': re.compile(DQ3STRING_BODY, re.S),
+        }
+
+    def scan_line(
+        self, line: str, state: Optional[str]
+    ) -> Tuple[List[String3Span], Optional[str]]:
+        """
+        Returns the string parts of the line (given with its line break) and
+        the state at the end of the line.
+        """
+        spans = []
+        pos = 0
+        start = 0
+        while True:
+            if state is None:
+                match = self._start_regex.search(line, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if match.lastgroup == "DELIMITER3":
+                    state = match.group()[-3:]
+                    start = match.start()
+            else:
+                match = self._body_regexes[state].match(line, pos)
+                # last group is the closing delimiter
+                if match.group(match.re.groups) is None:
+                    spans.append((start, len(line), False))
+                    break
+                spans.append((start, match.end(), True))
+                pos = match.end()
+                state = None
+
+        return spans, state
+
+
+class _ChunkIndexer:
+    """Converts character offsets in a chunk of text into Tk indices"""
+
+    def __init__(self, chars: str, start_index: str, utf16_columns: bool):
+        self._chars = chars
+        self._start_line, self._start_col = map(int, start_index.split("."))
+        self._line_offsets = [0] + [match.end() for match in re.finditer("\n", chars)]
+        self._utf16_columns = utf16_columns and not chars.isascii()
+
+    def __call__(self, offset: int) -> str:
+        i = bisect_right(self._line_offsets, offset) - 1
+        line_offset = self._line_offsets[i]
+        if self._utf16_columns:
+            col = utf16_len(self._chars[line_offset:offset])
+        else:
+            col = offset - line_offset
+        if i == 0:
+            col += self._start_col
+        return "%d.%d" % (self._start_line + i, col)
+
 
 class SyntaxColorer:
     def __init__(self, text: SyntaxText):
@@ -34,8 +128,8 @@ class SyntaxColorer:
         self._config_tags()
         self._update_scheduled = False
         self._use_coloring = True
-        self._multiline_dirty = True
         self._highlight_tabs = True
+        self._utf16_columns = tk_counts_utf16_code_units(text.tk)
 
     def _compile_regexes(self):
         from thonny.token_utils import (
@@ -137,16 +231,12 @@ class SyntaxColorer:
                 end_row = start_row + event.text.count("\n")
                 start_index = "%d.%d" % (start_row, 0)
                 end_index = "%d.%d" % (end_row + 1, 0)
-                if not event.trivial_for_coloring:
-                    self._multiline_dirty = True
 
             elif event.sequence == "TextDelete":
                 index = self.text.index(event.index1)
                 start_row = int(index.split(".")[0])
                 start_index = "%d.%d" % (start_row, 0)
                 end_index = "%d.%d" % (start_row + 1, 0)
-                if not event.trivial_for_coloring:
-                    self._multiline_dirty = True
 
         self.text.tag_add(TODO, start_index, end_index)
 
@@ -176,6 +266,12 @@ class SyntaxColorer:
         for tag in self.uniline_tags | {"tab"}:
             self.text.tag_remove(tag, start, end)
 
+        to_index = _ChunkIndexer(chars, self.text.index(start), self._utf16_columns)
+        ranges_by_tag: Dict[str, List[str]] = {}
+
+        def add_range(tag, range_start, range_end):
+            ranges_by_tag.setdefault(tag, []).extend((to_index(range_start), to_index(range_end)))
+
         if self._use_coloring:
             for match in self.uniline_regex.finditer(chars):
                 for token_type, token_text in match.groupdict().items():
@@ -183,33 +279,25 @@ class SyntaxColorer:
                         token_text = token_text.strip()
                         match_start, match_end = match.span(token_type)
 
-                        self.text.tag_add(
-                            token_type, start + "+%dc" % match_start, start + "+%dc" % match_end
-                        )
+                        add_range(token_type, match_start, match_end)
 
                         # Mark also the word following def or class
                         if token_text in ("def", "class"):
                             id_match = self.id_regex.match(chars, match_end)
                             if id_match:
                                 id_match_start, id_match_end = id_match.span(1)
-                                self.text.tag_add(
-                                    "definition",
-                                    start + "+%dc" % id_match_start,
-                                    start + "+%dc" % id_match_end,
-                                )
+                                add_range("definition", id_match_start, id_match_end)
                                 if token_text == "def":
                                     tag_type = "function_definition"
                                 else:
                                     tag_type = "class_definition"
-                                self.text.tag_add(
-                                    tag_type,
-                                    start + "+%dc" % id_match_start,
-                                    start + "+%dc" % id_match_end,
-                                )
+                                add_range(tag_type, id_match_start, id_match_end)
 
         if self._highlight_tabs:
-            self._update_tabs(start, end)
+            for match in re.finditer("\t", chars):
+                add_range("tab", match.start(), match.end())
 
+        _add_tag_ranges(self.text, ranges_by_tag)
         self.text.tag_remove(TODO, start, end)
 
     def _update_multiline_tokens(self, start, end):
@@ -221,6 +309,9 @@ class SyntaxColorer:
         if not self._use_coloring:
             return
 
+        to_index = _ChunkIndexer(chars, self.text.index(start), self._utf16_columns)
+        ranges_by_tag: Dict[str, List[str]] = {}
+
         for match in self.multiline_regex.finditer(chars):
             token_text = match.group(1)
             if token_text is None:
@@ -241,24 +332,53 @@ class SyntaxColorer:
             else:
                 token_type = "string3"
 
-            token_start = start + "+%dc" % match_start
-            token_end = start + "+%dc" % match_end
-            self.text.tag_add(token_type, token_start, token_end)
+            ranges_by_tag.setdefault(token_type, []).extend(
+                (to_index(match_start), to_index(match_end))
+            )
 
-        self._multiline_dirty = False
+        _add_tag_ranges(self.text, ranges_by_tag)
         self._raise_tags()
 
-    def _update_tabs(self, start, end):
-        while True:
-            pos = self.text.search("\t", start, end)
-            if pos:
-                self.text.tag_add("tab", pos)
-                start = self.text.index("%s +1 c" % pos)
-            else:
-                break
-
 
 class CodeViewSyntaxColorer(SyntaxColorer):
+    def __init__(self, text: SyntaxText):
+        super().__init__(text)
+        self._string3_lexer = String3Lexer()
+        # lexer state at the start of each line, None if not known yet
+        self._line_states: Optional[List[Optional[str]]] = None
+        # first and last line (1-based) which need to be lexed again
+        self._string3_dirty_range: Optional[Tuple[int, int]] = None
+
+    def mark_dirty(self, event=None):
+        super().mark_dirty(event)
+
+        if self._line_states is None or not hasattr(event, "sequence"):
+            return
+
+        if event.sequence == "TextInsert":
+            line = int(event.index.split(".")[0])
+            added_line_count = event.text.count("\n")
+            # states of new lines get computed during the update
+            self._line_states[line:line] = [None] * added_line_count
+            self._add_string3_dirty_range(line, line + added_line_count, added_line_count)
+
+        elif event.sequence == "TextDelete":
+            line1 = int(event.index1.split(".")[0])
+            line2 = int(event.index2.split(".")[0])
+            del self._line_states[line1:line2]
+            self._add_string3_dirty_range(line1, line1, line1 - line2)
+
+    def _add_string3_dirty_range(self, first_line, last_line, line_count_delta):
+        """Lines after first_line have been shifted by line_count_delta"""
+        if self._string3_dirty_range is not None:
+            prev_first_line, prev_last_line = self._string3_dirty_range
+            if prev_last_line > first_line:
+                prev_last_line = max(first_line, prev_last_line + line_count_delta)
+            first_line = min(first_line, prev_first_line)
+            last_line = max(last_line, prev_last_line)
+
+        self._string3_dirty_range = (first_line, last_line)
+
     def _update_coloring(self):
         viewport_start = self.text.index("@0,0")
         viewport_end = self.text.index(
@@ -292,9 +412,7 @@ class CodeViewSyntaxColorer(SyntaxColorer):
             else:
                 search_start = update_end
 
-        # Multiline tokens need to be searched from the whole source
-        if self._multiline_dirty:
-            self._update_multiline_tokens("1.0", "end")
+        self._update_string3_tokens()
 
         # Get rid of wrong open string tags (https://github.com/thonny/thonny/issues/943)
         search_start = viewport_start
@@ -308,6 +426,85 @@ class CodeViewSyntaxColorer(SyntaxColorer):
 
             search_start = tag_range[1]
 
+    def _update_string3_tokens(self):
+        if not self._use_coloring:
+            for tag in self.multiline_tags:
+                self.text.tag_remove(tag, "1.0", "end")
+            self._line_states = None
+            return
+
+        line_count = int(self.text.index("end-1c").split(".")[0])
+        if self._line_states is None or len(self._line_states) != line_count:
+            # first update or edits which didn't produce events
+            self._line_states = [None] * line_count
+            self._string3_dirty_range = (1, line_count)
+        elif self._string3_dirty_range is None:
+            return
+
+        first_line, last_dirty_line = self._string3_dirty_range
+        self._string3_dirty_range = None
+
+        # a string which started on an earlier line needs to be tagged again from its start
+        first_line = min(first_line, line_count)
+        while self._line_states[first_line - 1] is not None:
+            first_line -= 1
+
+        ranges_by_tag: Dict[str, List[str]] = {}
+        token_start = None
+        state = None
+        line = first_line
+        chunk_start_line = line
+        chunk: List[str] = []
+        while line <= line_count:
+            if line > last_dirty_line and self._line_states[line - 1] == state:
+                # the rest of the text is lexed already
+                break
+
+            if line - chunk_start_line >= len(chunk):
+                chunk_start_line = line
+                chunk = self._get_lines(line, LEXING_CHUNK_SIZE)
+            line_text = chunk[line - chunk_start_line]
+
+            self._line_states[line - 1] = state
+            spans, state = self._string3_lexer.scan_line(line_text, state)
+            for start_col, end_col, closed in spans:
+                if token_start is None:
+                    token_start = self._get_tk_index(line, line_text, start_col)
+                if closed:
+                    ranges_by_tag.setdefault("string3", []).extend(
+                        (token_start, self._get_tk_index(line, line_text, end_col))
+                    )
+                    token_start = None
+            line += 1
+
+        if line <= line_count:
+            end_index = "%d.0" % line
+        else:
+            end_index = "end"
+
+        if token_start is not None:
+            # the string continues in the part, which was not lexed again
+            if end_index != "end" and "string3" in self.text.tag_names(end_index):
+                token_type = "string3"
+            else:
+                token_type = "open_string3"
+            ranges_by_tag.setdefault(token_type, []).extend((token_start, end_index))
+
+        for tag in self.multiline_tags:
+            self.text.tag_remove(tag, "%d.0" % first_line, end_index)
+        _add_tag_ranges(self.text, ranges_by_tag)
+        self._raise_tags()
+
+    def _get_lines(self, first_line: int, count: int) -> List[str]:
+        chars = self.text.get("%d.0" % first_line, "%d.0" % (first_line + count))
+        # the text always ends with a line break
+        return [line + "\n" for line in chars.split("\n")[:-1]]
+
+    def _get_tk_index(self, line: int, line_text: str, col: int) -> str:
+        if self._utf16_columns and not line_text.isascii():
+            col = utf16_len(line_text[:col])
+        return "%d.%d" % (line, col)
+
 
 class ShellSyntaxColorer(SyntaxColorer):
     def _update_coloring(self):
@@ -327,6 +524,11 @@ class ShellSyntaxColorer(SyntaxColorer):
             self._update_multiline_tokens(start_index, end_index)
 
 
+def _add_tag_ranges(text: SyntaxText, ranges_by_tag: Dict[str, List[str]]) -> None:
+    for tag, indices in ranges_by_tag.items():
+        text.tag_add(tag, *indices)
+
+
 def update_coloring_on_event(event):
     if hasattr(event, "text_widget"):
         text = event.text_widget
@@ -1,16 +1,20 @@
 # Frontend plugin is in cpython_frontend.py
 import ast
+import atexit
 import builtins
 import functools
 import importlib.util
 import inspect
 import io
+import itertools
 import os.path
 import queue
 import re
 import site
 import subprocess
 import sys
+import threading
+import time
 import tokenize
 import traceback
 import types
@@ -28,6 +32,7 @@ from thonny.common import (
     STRING_PSEUDO_FILENAME,
     BackendEvent,
     CommandToBackend,
+    DebuggerResponse,
     DistInfo,
     EOFCommand,
     FrameInfo,
@@ -41,6 +46,7 @@ from thonny.common import (
     ToplevelResponse,
     UserError,
     ValueInfo,
+    VariablesDeltaEncoder,
     execute_system_command,
     execute_with_frontend_sys_path,
     export_installed_distributions_info,
@@ -54,9 +60,57 @@ from thonny.common import (
     try_get_base_executable,
     update_system_path,
 )
+from thonny.plugins.cpython_backend.cp_heap import HeapHandleTable
 
 _REPL_HELPER_NAME = "_thonny_repl_print"
 
+# Object inspector shows only the beginning of huge reprs
+MAX_INSPECTED_REPR_LENGTH = 100_000
+
+# Program output gets collected and sent in batches, which are flushed when they grow this big
+# or get this old or when any other message needs to be sent.
+OUTPUT_BUFFER_MAX_SIZE = 4096
+OUTPUT_BUFFER_MAX_AGE = 0.02
+
+# Child processes write directly to the original stdout, buffered output needs to go out before
+_PROCESS_START_AUDIT_EVENTS = {
+    "os.exec",
+    "os.fork",
+    "os.forkpty",
+    "os.posix_spawn",
+    "os.spawn",
+    "os.startfile",
+    "os.system",
+    "subprocess.Popen",
+}
+
+# Repr of the values of these types stays the same while the value is the same object
+_STABLE_REPR_TYPES = frozenset(
+    [
+        str,
+        bytes,
+        int,
+        float,
+        complex,
+        bool,
+        type(None),
+        range,
+        type,
+        types.FunctionType,
+        types.BuiltinFunctionType,
+        types.ModuleType,
+    ]
+)
+
+# Repr of these containers can be built only as far as it gets shown
+_RECURSIVE_REPRS = {
+    list: "[...]",
+    tuple: "(...)",
+    dict: "{...}",
+    set: "set(...)",
+    frozenset: "frozenset(...)",
+}
+
 _CONFIG_FILENAME = os.path.join(thonny.get_thonny_user_dir(), "backend_configuration.ini")
 
 
@@ -72,6 +126,18 @@ class MainCPythonBackend(MainBackend):
         global _backend
         _backend = self
 
+        self._output_lock = threading.RLock()
+        self._output_condition = threading.Condition(self._output_lock)
+        self._pending_output_stream_name = None
+        self._pending_output_chunks = []
+        self._pending_output_size = 0
+        self._pending_output_deadline = None
+        self._output_flusher = None
+        atexit.register(self._flush_output)
+        if hasattr(os, "register_at_fork"):
+            # flusher thread doesn't survive forking
+            os.register_at_fork(after_in_child=self._forget_output_flusher)
+
         self._ini = None
         self._options = options
         self._object_info_tweakers = []
@@ -81,7 +147,10 @@ class MainCPythonBackend(MainBackend):
         self._source_preprocessors = []
         self._ast_postprocessors = []
         self._main_dir = os.path.dirname(sys.modules["thonny"].__file__)
-        self._heap = {}  # WeakValueDictionary would be better, but can't store reference to None
+        self._heap = HeapHandleTable()
+        # id of module's dict -> variable name -> (value, repr)
+        self._module_variable_reprs: Dict[int, Dict[str, Tuple[object, str]]] = {}
+        self._variables_encoder = VariablesDeltaEncoder()
         self._source_info_by_frame = {}
         self._init_help()
         self._install_fake_streams()
@@ -109,6 +178,7 @@ class MainCPythonBackend(MainBackend):
         report_time("After loading plugins")
         if self._options.get("run.warn_module_shadowing", False):
             sys.addaudithook(self.import_audit_hook)
+        sys.addaudithook(self._process_start_audit_hook)
 
         # preceding code was run in an empty directory, now switch to provided
         try:
@@ -237,6 +307,10 @@ class MainCPythonBackend(MainBackend):
 
         self._warned_shadow_casters.add(current_spec.origin)
 
+    def _process_start_audit_hook(self, event: str, args):
+        if event in _PROCESS_START_AUDIT_EVENTS:
+            self._flush_output()
+
     def _find_spec_ignore_loaded(self, module_name):
         if module_name not in sys.modules:
             return importlib.util.find_spec(module_name)
@@ -459,9 +533,12 @@ class MainCPythonBackend(MainBackend):
 
     def _cmd_FastDebug(self, cmd):
         self.switch_env_to_script_mode(cmd)
-        from thonny.plugins.cpython_backend.cp_tracers import FastTracer
+        from thonny.plugins.cpython_backend.cp_tracers import FastTracer, MonitoringTracer
 
-        return self._execute_file(cmd, FastTracer)
+        if MonitoringTracer.is_available():
+            return self._execute_file(cmd, MonitoringTracer)
+        else:
+            return self._execute_file(cmd, FastTracer)
 
     def _cmd_Debug(self, cmd):
         self.switch_env_to_script_mode(cmd)
@@ -587,10 +664,10 @@ class MainCPythonBackend(MainBackend):
 
     def _cmd_get_heap(self, cmd):
         result = {}
-        for key in self._heap:
-            result[key] = self.export_value(self._heap[key])
+        for key, value in self._heap.items():
+            result[key] = ValueInfo(key, self._get_value_repr(value, 5000))
 
-        return InlineResponse("get_heap", heap=result)
+        return InlineResponse("get_heap", heap=result, heap_stats=self._heap.get_stats())
 
     def _cmd_get_object_info(self, cmd):
         if self._current_executor and self._current_executor.is_in_past():
@@ -598,27 +675,26 @@ class MainCPythonBackend(MainBackend):
 
         elif cmd.object_id in self._heap:
             value = self._heap[cmd.object_id]
-            attributes = {}
-            if cmd.include_attributes:
-                for name in dir(value):
-                    if not name.startswith("__") or cmd.all_attributes:
-                        # attributes[name] = inspect.getattr_static(value, name)
-                        try:
-                            attributes[name] = getattr(value, name)
-                        except Exception:
-                            pass
-
-            self._heap[id(type(value))] = type(value)
+            # user may navigate back to it in the inspector
+            self._heap.pin(value, "inspected")
+            # None means all items. Further pages can be fetched with get_object_items
+            page_size = cmd.get("page_size", None)
+
+            self._heap.add(type(value))
             info = {
                 "id": cmd.object_id,
-                "repr": repr(value),
+                "repr": self._get_value_repr(value, MAX_INSPECTED_REPR_LENGTH),
                 "type": str(type(value)),
                 "full_type_name": str(type(value))
                 .replace("<class '", "")
                 .replace("'>", "")
                 .strip(),
-                "attributes": self.export_variables(attributes, all_variables=True),
+                "attributes": {},
             }
+            if cmd.include_attributes:
+                info["attributes"], info["attributes_end"], info["attributes_count"] = (
+                    self._export_attributes_page(value, cmd.all_attributes, 0, page_size)
+                )
 
             if isinstance(value, io.TextIOWrapper):
                 self._add_file_handler_info(value, info)
@@ -634,9 +710,9 @@ class MainCPythonBackend(MainBackend):
             ):
                 self._add_function_info(value, info)
             elif isinstance(value, (list, tuple, set)):
-                self._add_elements_info(value, info)
+                self._add_elements_info(value, info, page_size)
             elif isinstance(value, dict):
-                self._add_entries_info(value, info)
+                self._add_entries_info(value, info, page_size)
             elif isinstance(value, float):
                 self._add_float_info(value, info)
             elif hasattr(value, "image_data"):
@@ -653,6 +729,30 @@ class MainCPythonBackend(MainBackend):
 
         return dict(id=cmd.object_id, info=info)
 
+    def _cmd_get_object_items(self, cmd):
+        """Returns a window of object's attributes, elements or entries"""
+        if self._current_executor and self._current_executor.is_in_past():
+            return dict(id=cmd.object_id, kind=cmd.kind, error="past info not available")
+
+        if cmd.object_id not in self._heap:
+            return dict(id=cmd.object_id, kind=cmd.kind, error="object info not available")
+
+        value = self._heap[cmd.object_id]
+        if cmd.kind == "attributes":
+            items, end, count = self._export_attributes_page(
+                value, cmd.all_attributes, cmd.offset, cmd.limit
+            )
+        elif cmd.kind == "elements":
+            items, end, count = self._export_elements_page(value, cmd.offset, cmd.limit)
+        elif cmd.kind == "entries":
+            items, end, count = self._export_entries_page(value, cmd.offset, cmd.limit)
+        else:
+            raise ValueError("Unknown item kind %r" % cmd.kind)
+
+        return dict(
+            id=cmd.object_id, kind=cmd.kind, offset=cmd.offset, end=end, count=count, items=items
+        )
+
     def _cmd_mkdir(self, cmd):
         os.mkdir(cmd.path)
 
@@ -768,15 +868,48 @@ class MainCPythonBackend(MainBackend):
         except Exception:
             pass
 
-    def _add_elements_info(self, value, info):
-        info["elements"] = []
-        for element in value:
-            info["elements"].append(self.export_value(element))
+    def _add_elements_info(self, value, info, limit=None):
+        info["elements"], info["elements_end"], info["elements_count"] = (
+            self._export_elements_page(value, 0, limit)
+        )
+
+    def _add_entries_info(self, value, info, limit=None):
+        info["entries"], info["entries_end"], info["entries_count"] = self._export_entries_page(
+            value, 0, limit
+        )
 
-    def _add_entries_info(self, value, info):
-        info["entries"] = []
-        for key in value:
-            info["entries"].append((self.export_value(key), self.export_value(value[key])))
+    def _export_attributes_page(self, value, all_attributes, offset, limit):
+        names = [name for name in dir(value) if not name.startswith("__") or all_attributes]
+        # same order as in the grid, so that next pages get appended
+        names.sort(key=lambda name: (name.startswith("_"), name))
+        end = _get_page_end(offset, limit, len(names))
+
+        attributes = {}
+        for name in names[offset:end]:
+            # attributes[name] = inspect.getattr_static(value, name)
+            try:
+                attributes[name] = getattr(value, name)
+            except Exception:
+                pass
+
+        return self.export_variables(attributes, all_variables=True), end, len(names)
+
+    def _export_elements_page(self, value, offset, limit):
+        end = _get_page_end(offset, limit, len(value))
+        if isinstance(value, (list, tuple)):
+            window = value[offset:end]
+        else:
+            window = itertools.islice(value, offset, end)
+
+        return [self.export_value(element) for element in window], end, len(value)
+
+    def _export_entries_page(self, value, offset, limit):
+        end = _get_page_end(offset, limit, len(value))
+        entries = [
+            (self.export_value(key), self.export_value(value[key]))
+            for key in itertools.islice(value, offset, end)
+        ]
+        return entries, end, len(value)
 
     def _add_float_info(self, value, info):
         if not value.is_integer():
@@ -839,7 +972,7 @@ class MainCPythonBackend(MainBackend):
                 except Exception as e:
                     obj_repr = "<repr error: " + str(e) + ">"
                 print(OBJECT_LINK_START % id(obj), obj_repr, OBJECT_LINK_END, sep="")
-                self._heap[id(obj)] = obj
+                self._heap.pin(obj, "shell")
                 builtins._ = obj
 
         setattr(builtins, _REPL_HELPER_NAME, _handle_repl_value)
@@ -883,13 +1016,105 @@ class MainCPythonBackend(MainBackend):
             if "globals" not in msg:
                 msg["globals"] = self.export_globals()
 
-        self._original_stdout.write(serialize_message(msg) + "\n")
+        with self._output_lock:
+            if isinstance(msg, (ToplevelResponse, DebuggerResponse)):
+                # send only the changes of the variables the frontend already has
+                self._variables_encoder.encode_message(msg)
+
+            # Input requests, debugger states, responses etc. must not overtake program output
+            self._flush_output()
+            try:
+                self._write_message(msg)
+            except Exception:
+                # the frontend may have missed the changes, next messages should be complete
+                self._variables_encoder = VariablesDeltaEncoder()
+                raise
+
+        if isinstance(msg, (ToplevelResponse, DebuggerResponse)):
+            # the views don't refer to previously exported values anymore
+            self._heap.start_generation()
+
+    def _write_message(self, msg: MessageFromBackend) -> None:
+        self._original_stdout.write(
+            serialize_message(msg, message_format=self._message_format) + "\n"
+        )
         self._original_stdout.flush()
 
+    def _send_output(self, data, stream_name):
+        if not data:
+            return
+
+        data = self._transform_output(data, stream_name)
+        with self._output_lock:
+            if stream_name != self._pending_output_stream_name:
+                # keep the order of interleaved stdout and stderr writes
+                self._flush_output()
+                self._pending_output_stream_name = stream_name
+
+            self._pending_output_chunks.append(data)
+            self._pending_output_size += len(data)
+            self._last_sent_output = data
+
+            if self._pending_output_size >= OUTPUT_BUFFER_MAX_SIZE:
+                self._flush_output()
+            elif self._pending_output_deadline is None:
+                self._pending_output_deadline = time.time() + OUTPUT_BUFFER_MAX_AGE
+                self._ensure_output_flusher()
+                self._output_condition.notify()
+
+    def _flush_output(self) -> None:
+        with self._output_lock:
+            if not self._pending_output_chunks:
+                return
+
+            msg = BackendEvent(
+                event_type="ProgramOutput",
+                stream_name=self._pending_output_stream_name,
+                data="".join(self._pending_output_chunks),
+            )
+            self._pending_output_chunks = []
+            self._pending_output_size = 0
+            self._pending_output_deadline = None
+            self._write_message(msg)
+
+    def _ensure_output_flusher(self) -> None:
+        if self._output_flusher is None:
+            self._output_flusher = threading.Thread(
+                target=self._flush_output_periodically, name="ThonnyOutputFlusher", daemon=True
+            )
+            self._output_flusher.start()
+
+    def _forget_output_flusher(self) -> None:
+        self._output_flusher = None
+
+    def _flush_output_periodically(self) -> None:
+        # Runs in a separate thread, so that output of a program, which goes quiet
+        # (eg. sleeps or computes), doesn't get stuck in the buffer
+        with self._output_condition:
+            while True:
+                if self._pending_output_deadline is None:
+                    self._output_condition.wait()
+                    continue
+
+                remaining_time = self._pending_output_deadline - time.time()
+                if remaining_time > 0:
+                    self._output_condition.wait(remaining_time)
+                else:
+                    try:
+                        self._flush_output()
+                    except Exception:
+                        logger.exception("Could not flush output")
+
     def export_value(self, value, max_repr_length=5000):
-        self._heap[id(value)] = value
+        return ValueInfo(self._heap.add(value), self._get_value_repr(value, max_repr_length))
+
+    def retain_exported_value(self, value) -> None:
+        """Keeps a value exported earlier available for the views showing it"""
+        self._heap.add(value)
+
+    def _get_value_repr(self, value, max_repr_length):
         try:
-            rep = repr(value)
+            rep = get_bounded_repr(value, max_repr_length)
         except Exception:
             # See https://bitbucket.org/plas/thonny/issues/584/problem-with-thonnys-back-end-obj-no
             rep = "??? <repr error>"
@@ -897,15 +1122,37 @@ class MainCPythonBackend(MainBackend):
         if len(rep) > max_repr_length:
             rep = rep[:max_repr_length] + "…"
 
-        return ValueInfo(id(value), rep)
+        return rep
 
     def export_variables(self, variables, all_variables=False):
+        # Globals get exported after each command and debugger step. Their unchanged values
+        # are usually the same objects as before, no need to compute their reprs again.
+        module_name = variables.get("__name__")
+        module = sys.modules.get(module_name) if isinstance(module_name, str) else None
+        if module is not None and getattr(module, "__dict__", None) is variables:
+            previous_reprs = self._module_variable_reprs.get(id(variables), {})
+            reprs = {}
+            self._module_variable_reprs[id(variables)] = reprs
+        else:
+            previous_reprs = {}
+            reprs = None
+
         result = {}
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
             for name in variables:
                 if not name.startswith("__") or all_variables:
-                    result[name] = self.export_value(variables[name], 100)
+                    value = variables[name]
+                    value_and_repr = previous_reprs.get(name)
+                    if value_and_repr is not None and value_and_repr[0] is value:
+                        rep = value_and_repr[1]
+                    else:
+                        rep = self._get_value_repr(value, 100)
+
+                    if reprs is not None and type(value) in _STABLE_REPR_TYPES:
+                        reprs[name] = (value, rep)
+
+                    result[name] = ValueInfo(self._heap.add(value), rep)
 
         return result
 
@@ -1112,6 +1359,10 @@ class FakeOutputStream(FakeStream):
         finally:
             self._backend._exit_io_function()
 
+    def flush(self):
+        self._backend._flush_output()
+        self._target_stream.flush()
+
 
 class FakeInputStream(FakeStream):
     def __init__(self, backend: MainCPythonBackend, target_stream):
@@ -1265,10 +1516,7 @@ class Executor:
                 statements = compile(module, filename, "exec")
             elif mode == "exec":
                 report_time("Before preparing ast in executor")
-                root = self._prepare_ast(source, filename, mode)
-                for func in ast_postprocessors:
-                    func(root)
-                statements = compile(root, filename, mode)
+                statements = self._compile_source(source, filename, mode, ast_postprocessors)
                 report_time("After compiling ast in executor")
             else:
                 raise ValueError("Unknown mode", mode)
@@ -1286,6 +1534,12 @@ class Executor:
         """override in subclass for custom-loading user modules"""
         return None
 
+    def _compile_source(self, source, filename, mode, ast_postprocessors):
+        root = self._prepare_ast(source, filename, mode)
+        for func in ast_postprocessors:
+            func(root)
+        return compile(root, filename, mode)
+
     def _prepare_ast(self, source, filename, mode):
         return ast.parse(source, filename, mode)
 
@@ -1422,6 +1676,69 @@ def format_exception_with_frame_info(e_type, e_value, e_traceback, shorten_filen
     return list(items)
 
 
+def get_bounded_repr(value, max_length):
+    """
+    Returns repr of the value or its prefix, which is longer than max_length.
+    Builtin containers don't get represented further than that.
+    """
+    pieces = []
+    length = 0
+    for piece in _iter_repr_pieces(value, set()):
+        pieces.append(piece)
+        length += len(piece)
+        if length > max_length:
+            break
+
+    return "".join(pieces)
+
+
+def _iter_repr_pieces(value, active_ids):
+    value_type = type(value)
+    if value_type not in _RECURSIVE_REPRS or not value:
+        # subclasses may have their own repr
+        yield repr(value)
+        return
+
+    if id(value) in active_ids:
+        yield _RECURSIVE_REPRS[value_type]
+        return
+
+    active_ids.add(id(value))
+    if value_type is list:
+        yield "["
+    elif value_type is tuple:
+        yield "("
+    elif value_type is frozenset:
+        yield "frozenset({"
+    else:
+        yield "{"
+
+    for i, item in enumerate(value):
+        if i > 0:
+            yield ", "
+        yield from _iter_repr_pieces(item, active_ids)
+        if value_type is dict:
+            yield ": "
+            yield from _iter_repr_pieces(value[item], active_ids)
+
+    if value_type is list:
+        yield "]"
+    elif value_type is tuple:
+        yield ",)" if len(value) == 1 else ")"
+    elif value_type is frozenset:
+        yield "})"
+    else:
+        yield "}"
+    active_ids.remove(id(value))
+
+
+def _get_page_end(offset, limit, count):
+    if limit is None:
+        return count
+    else:
+        return min(offset + limit, count)
+
+
 def in_debug_mode():
     return os.environ.get("THONNY_DEBUG", False) in [1, "1", True, "True", "true"]
 
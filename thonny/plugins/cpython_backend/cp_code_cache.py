@@ -0,0 +1,243 @@
+"""
+Keeps the code objects instrumented by NiceTracer, so that unchanged user modules don't
+need to be parsed, marked and instrumented again in each debugging session.
+
+Like __pycache__, but kept in Thonny's user directory, as instrumented code is only
+usable under NiceTracer. There is one entry per source path. An entry is used only if
+the source, Python's bytecode format and the code of the instrumentation are the same
+as when it was stored. Unreadable entries are treated as missing.
+"""
+
+import hashlib
+import marshal
+import os
+import sys
+import threading
+from importlib.util import MAGIC_NUMBER, find_spec
+from logging import getLogger
+from typing import Any, List, Optional, Tuple, Union
+
+from thonny.common import TextRange, execute_with_frontend_sys_path
+
+logger = getLogger(__name__)
+
+# Change when the layout of the entries changes
+CACHE_FORMAT_VERSION = 1
+
+# Least recently used entries get removed when there are more of them
+MAX_CACHE_ENTRIES = 1000
+
+ENTRY_SUFFIX = ".tic"
+
+# Modules whose code determines the result of instrumentation
+_INSTRUMENTATION_MODULES = [
+    "thonny.ast_utils",
+    "thonny.plugins.cpython_backend.cp_tracers",
+    "thonny.plugins.cpython_backend.cp_code_cache",
+]
+
+_instrumentation_fingerprint = None
+
+
+class InstrumentedNode:
+    """Keeps the information NiceTracer needs at runtime about an instrumented AST node"""
+
+    __slots__ = [
+        "lineno",
+        "col_offset",
+        "end_lineno",
+        "end_col_offset",
+        "tags",
+        "parent_node",
+        "parent_statement_focus",
+    ]
+
+
+NodeRecord = Tuple[
+    Optional[int],
+    Optional[int],
+    Optional[int],
+    Optional[int],
+    set,
+    Optional[int],
+    Optional[tuple],
+]
+
+
+def export_node_records(nodes: List[Any]) -> List[NodeRecord]:
+    """
+    Converts the AST nodes referred to by marker calls into marshallable tuples.
+    Index of a record is the id of the node in marker calls. The parents of the nodes
+    get appended to the list, so that they can be referred to by index.
+    """
+    nodes = list(nodes)
+    indices = {id(node): i for i, node in enumerate(nodes)}
+    records = []
+
+    i = 0
+    while i < len(nodes):
+        node = nodes[i]
+        parent = getattr(node, "parent_node", None)
+        if parent is None:
+            parent_index = None
+        else:
+            parent_index = indices.get(id(parent))
+            if parent_index is None:
+                parent_index = len(nodes)
+                indices[id(parent)] = parent_index
+                nodes.append(parent)
+
+        statement_focus = getattr(node, "parent_statement_focus", None)
+        records.append(
+            (
+                getattr(node, "lineno", None),
+                getattr(node, "col_offset", None),
+                getattr(node, "end_lineno", None),
+                getattr(node, "end_col_offset", None),
+                getattr(node, "tags", set()),
+                parent_index,
+                None if statement_focus is None else tuple(statement_focus),
+            )
+        )
+        i += 1
+
+    return records
+
+
+def create_nodes(records: List[NodeRecord]) -> List[InstrumentedNode]:
+    nodes = [InstrumentedNode() for _ in records]
+    for node, record in zip(nodes, records):
+        (
+            node.lineno,
+            node.col_offset,
+            node.end_lineno,
+            node.end_col_offset,
+            node.tags,
+            parent_index,
+            statement_focus,
+        ) = record
+        # the attributes are left unset when the AST node didn't have them
+        if parent_index is not None:
+            node.parent_node = nodes[parent_index]
+        if statement_focus is not None:
+            node.parent_statement_focus = TextRange(*statement_focus)
+
+    return nodes
+
+
+def get_instrumentation_fingerprint() -> str:
+    global _instrumentation_fingerprint
+    if _instrumentation_fingerprint is None:
+        hasher = hashlib.sha256()
+        for module_name in _INSTRUMENTATION_MODULES:
+            with open(find_spec(module_name).origin, "rb") as fp:
+                hasher.update(fp.read())
+
+        # text ranges are computed by asttokens
+        asttokens_spec = execute_with_frontend_sys_path(lambda: find_spec("asttokens"))
+        if asttokens_spec is not None and asttokens_spec.submodule_search_locations:
+            asttokens_dir = asttokens_spec.submodule_search_locations[0]
+            for name in sorted(os.listdir(asttokens_dir)):
+                if name.endswith(".py"):
+                    with open(os.path.join(asttokens_dir, name), "rb") as fp:
+                        hasher.update(fp.read())
+
+        _instrumentation_fingerprint = hasher.hexdigest()
+
+    return _instrumentation_fingerprint
+
+
+class InstrumentedCodeCache:
+    def __init__(self, cache_dir: str, max_entries: int = MAX_CACHE_ENTRIES):
+        self._cache_dir = cache_dir
+        self._max_entries = max_entries
+
+    def load(
+        self, source: Union[str, bytes], filename: str, mode: str
+    ) -> Optional[Tuple[Any, List[NodeRecord]]]:
+        """Returns the code object and node records or None if there is no valid entry"""
+        entry_path = self._get_entry_path(filename, mode)
+        try:
+            with open(entry_path, "rb") as fp:
+                data = fp.read()
+        except OSError:
+            return None
+
+        try:
+            format_version, key, code, node_records = marshal.loads(data)
+        except Exception:
+            logger.warning("Removing unreadable instrumentation cache entry %s", entry_path)
+            self._remove_entry(entry_path)
+            return None
+
+        if format_version != CACHE_FORMAT_VERSION or key != self._get_key(source, filename, mode):
+            return None
+
+        try:
+            # for pruning
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+        return code, node_records
+
+    def store(
+        self,
+        source: Union[str, bytes],
+        filename: str,
+        mode: str,
+        code: Any,
+        node_records: List[NodeRecord],
+    ) -> None:
+        entry_path = self._get_entry_path(filename, mode)
+        temp_path = "%s.%d.%d.tmp" % (entry_path, os.getpid(), threading.get_ident())
+        try:
+            data = marshal.dumps(
+                (CACHE_FORMAT_VERSION, self._get_key(source, filename, mode), code, node_records)
+            )
+            os.makedirs(self._cache_dir, exist_ok=True)
+            with open(temp_path, "wb") as fp:
+                fp.write(data)
+            os.replace(temp_path, entry_path)
+        except Exception:
+            logger.warning("Could not store instrumented code for %s", filename, exc_info=True)
+            self._remove_entry(temp_path)
+            return
+
+        self._prune()
+
+    def _get_entry_path(self, filename: str, mode: str) -> str:
+        name_hash = hashlib.sha1(
+            (filename + "\0" + mode).encode("utf-8", errors="surrogatepass")
+        ).hexdigest()
+        return os.path.join(self._cache_dir, name_hash + ENTRY_SUFFIX)
+
+    def _get_key(self, source: Union[str, bytes], filename: str, mode: str) -> str:
+        if isinstance(source, str):
+            source = source.encode("utf-8", errors="surrogatepass")
+
+        hasher = hashlib.sha256(source)
+        context = (filename, mode, MAGIC_NUMBER, sys.flags.optimize)
+        hasher.update(repr(context).encode("utf-8", errors="surrogatepass"))
+        hasher.update(get_instrumentation_fingerprint().encode("ascii"))
+        return hasher.hexdigest()
+
+    def _prune(self) -> None:
+        try:
+            entries = [
+                entry for entry in os.scandir(self._cache_dir) if entry.name.endswith(ENTRY_SUFFIX)
+            ]
+            if len(entries) <= self._max_entries:
+                return
+
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[: len(entries) - self._max_entries]:
+                self._remove_entry(entry.path)
+        except OSError:
+            logger.warning("Could not prune instrumentation cache", exc_info=True)
+
+    def _remove_entry(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,126 @@
+"""
+Keeps the objects, which the frontend may refer to by their ids.
+
+The values exported for the latest ToplevelResponse or DebuggerResponse (the current
+generation) and the values exported after it are referenced strongly. So are the
+recently inspected objects and the values of recent Shell links, as the user may
+navigate back to them. When a new response gets sent, the values of older generations,
+which are not exported again, are referenced only weakly (if their type allows it)
+or forgotten.
+"""
+
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Tuple
+
+# How many recently pinned objects of each kind are kept alive
+MAX_PINNED_OBJECTS_PER_KIND = 100
+
+_MISSING = object()
+
+
+class HeapHandleTable:
+    def __init__(self, max_pinned_objects_per_kind: int = MAX_PINNED_OBJECTS_PER_KIND):
+        self._max_pinned_objects_per_kind = max_pinned_objects_per_kind
+        self._generation = 0
+        # exported since the latest response
+        self._pending: Dict[int, Any] = {}
+        # exported for the latest response
+        self._shown: Dict[int, Any] = {}
+        self._pinned: Dict[str, "OrderedDict[int, Any]"] = {}
+        self._weak: Dict[int, weakref.ref] = {}
+
+    def add(self, value: Any) -> int:
+        key = id(value)
+        self._pending[key] = value
+        return key
+
+    def pin(self, value: Any, kind: str) -> int:
+        """Keeps the value alive until MAX_PINNED_OBJECTS_PER_KIND later values of this kind"""
+        key = id(value)
+        pinned = self._pinned.setdefault(kind, OrderedDict())
+        pinned[key] = value
+        pinned.move_to_end(key)
+        while len(pinned) > self._max_pinned_objects_per_kind:
+            self._demote(*pinned.popitem(last=False))
+
+        return key
+
+    def start_generation(self) -> None:
+        """Should be called after sending a response, which replaces the values in the views"""
+        previously_shown = self._shown
+        self._shown = self._pending
+        self._pending = {}
+        self._generation += 1
+
+        for key, value in previously_shown.items():
+            self._demote(key, value)
+
+    def get(self, key: int, default: Any = None) -> Any:
+        value = self._get_strongly_referenced(key)
+        if value is not _MISSING:
+            return value
+
+        ref = self._weak.get(key)
+        if ref is not None:
+            value = ref()
+            if value is not None:
+                return value
+
+        return default
+
+    def __contains__(self, key: int) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key: int) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def items(self) -> Iterator[Tuple[int, Any]]:
+        """Lists each live object once"""
+        seen_keys = set()
+        for table in [self._pending, self._shown, *self._pinned.values()]:
+            for key, value in table.items():
+                if key not in seen_keys:
+                    seen_keys.add(key)
+                    yield key, value
+
+        # callbacks may remove items during iteration
+        for key, ref in list(self._weak.items()):
+            value = ref()
+            if key not in seen_keys and value is not None:
+                seen_keys.add(key)
+                yield key, value
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "generation": self._generation,
+            "pending": len(self._pending),
+            "shown": len(self._shown),
+            "pinned": sum(map(len, self._pinned.values())),
+            "weak": len(self._weak),
+        }
+
+    def _get_strongly_referenced(self, key: int) -> Any:
+        for table in [self._pending, self._shown, *self._pinned.values()]:
+            value = table.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+        return _MISSING
+
+    def _demote(self, key: int, value: Any) -> None:
+        if self._get_strongly_referenced(key) is not _MISSING or key in self._weak:
+            return
+
+        def forget(ref, key=key):
+            if self._weak.get(key) is ref:
+                del self._weak[key]
+
+        try:
+            self._weak[key] = weakref.ref(value, forget)
+        except TypeError:
+            # int, str, list, dict etc. can't be weakly referenced
+            pass
@@ -1,4 +1,5 @@
 import _ast
+import _thread
 import ast
 import builtins
 import dis
@@ -11,7 +12,7 @@ from importlib.machinery import PathFinder, SourceFileLoader
 from logging import getLogger
 from typing import Union
 
-from thonny import report_time
+from thonny import get_thonny_user_dir, report_time
 from thonny.common import (
     DebuggerCommand,
     DebuggerResponse,
@@ -26,6 +27,11 @@ from thonny.common import (
     try_load_modules_with_frontend_sys_path,
 )
 from thonny.plugins.cpython_backend.cp_back import Executor, format_exception_with_frame_info
+from thonny.plugins.cpython_backend.cp_code_cache import (
+    InstrumentedCodeCache,
+    create_nodes,
+    export_node_records,
+)
 
 BEFORE_STATEMENT_MARKER = "_thonny_hidden_before_stmt"
 BEFORE_EXPRESSION_MARKER = "_thonny_hidden_before_expr"
@@ -41,6 +47,17 @@ _CO_WEIRDO = _CO_GENERATOR | _CO_COROUTINE | _CO_ITERABLE_COROUTINE | _CO_ASYNC_
 
 logger = getLogger(__name__)
 
+# Allows choosing the engine of FastTracer ("settrace" or "monitoring")
+DEBUGGER_ENGINE_ENV_VAR = "THONNY_DEBUGGER_ENGINE"
+
+# Approximate memory budget (in MB) for the states NiceTracer keeps for stepping back
+DEFAULT_HISTORY_MEMORY_LIMIT = 256
+
+# Rough sizes (in bytes) for estimating the memory used by saved states
+_SAVED_STATE_SIZE = 200
+_FRAME_INFO_SIZE = 120
+_VALUE_INFO_SIZE = 120
+
 TempFrameInfo = namedtuple(
     "TempFrameInfo",
     [
@@ -57,6 +74,54 @@ TempFrameInfo = namedtuple(
 )
 
 
+class Evaluation(tuple):
+    """
+    (focus, ValueInfo) of an evaluated expression. Also keeps the value itself, so that the
+    frontend can query it as long as the evaluation is shown.
+    """
+
+    def __new__(cls, focus, value_info, value):
+        evaluation = super().__new__(cls, (focus, value_info))
+        evaluation.value = value
+        return evaluation
+
+
+class SavedState:
+    """Snapshot of the program state at a NiceTracer progress event"""
+
+    __slots__ = [
+        "stack",
+        "active_frame",
+        "in_client_log",
+        "io_symbol_count",
+        "exception_value",
+        "fresh_exception_id",
+        "exception_info",
+        "size",
+    ]
+
+    def __init__(
+        self,
+        stack,
+        active_frame,
+        io_symbol_count,
+        exception_value,
+        fresh_exception_id,
+        exception_info,
+        size,
+    ):
+        # stack is shared with previous state if only the active frame has changed
+        self.stack = stack
+        self.active_frame = active_frame
+        self.in_client_log = False
+        self.io_symbol_count = io_symbol_count
+        self.exception_value = exception_value
+        self.fresh_exception_id = fresh_exception_id
+        self.exception_info = exception_info
+        # approximate number of bytes not shared with the previous state
+        self.size = size
+
+
 class Tracer(Executor):
     def __init__(self, backend, original_cmd):
         super().__init__(backend, original_cmd)
@@ -108,20 +173,27 @@ class Tracer(Executor):
     def _execute_prepared_user_code(self, statements, global_vars):
         old_breakpointhook = None
         try:
-            sys.settrace(self._trace)
+            self._start_tracing()
             if hasattr(sys, "breakpointhook"):
                 old_breakpointhook = sys.breakpointhook
                 sys.breakpointhook = self._breakpointhook
 
             return super()._execute_prepared_user_code(statements, global_vars)
         finally:
-            sys.settrace(None)
+            self._stop_tracing()
             if hasattr(sys, "breakpointhook"):
                 sys.breakpointhook = old_breakpointhook
 
+    def _start_tracing(self):
+        sys.settrace(self._trace)
+
+    def _stop_tracing(self):
+        sys.settrace(None)
+
     def _is_interesting_frame(self, frame):
-        code = frame.f_code
+        return self._is_interesting_code(frame.f_code)
 
+    def _is_interesting_code(self, code):
         return not (
             code is None
             or code.co_filename is None
@@ -425,6 +497,217 @@ class FastTracer(Tracer):
         )
 
 
+class MonitoringTracer(FastTracer):
+    """
+    FastTracer built on sys.monitoring (PEP 669) instead of sys.settrace.
+
+    LINE events are enabled only in the code objects containing breakpoints or the lines
+    where current command may complete. The event locations, which turn out to be irrelevant
+    for current command, get disabled until next command. Therefore code without breakpoints
+    runs (almost) at full speed when resuming.
+    """
+
+    def __init__(self, backend, original_cmd):
+        self._tool_id = sys.monitoring.DEBUGGER_ID
+        self._thread_id = _thread.get_ident()
+        self._code_interest_cache = {}
+        # interesting code objects, which have been executed
+        self._seen_codes = set()
+        # code objects with local events
+        self._configured_codes = set()
+        self._reported_codes = set()
+        self._command_code = None
+        self._events_active = False
+        super().__init__(backend, original_cmd)
+
+    @classmethod
+    def is_available(cls):
+        return (
+            hasattr(sys, "monitoring")
+            and sys.monitoring.get_tool(sys.monitoring.DEBUGGER_ID) is None
+            and os.environ.get(DEBUGGER_ENGINE_ENV_VAR, "monitoring") == "monitoring"
+        )
+
+    def _start_tracing(self):
+        monitoring = sys.monitoring
+        events = monitoring.events
+        monitoring.use_tool_id(self._tool_id, "Thonny")
+        monitoring.register_callback(self._tool_id, events.PY_START, self._on_py_start)
+        monitoring.register_callback(self._tool_id, events.PY_RETURN, self._on_py_return)
+        monitoring.register_callback(self._tool_id, events.PY_YIELD, self._on_py_return)
+        monitoring.register_callback(self._tool_id, events.PY_UNWIND, self._on_py_return)
+        monitoring.register_callback(self._tool_id, events.LINE, self._on_line)
+        monitoring.register_callback(self._tool_id, events.RAISE, self._on_raise)
+        self._events_active = True
+        self._configure_events(None)
+
+    def _stop_tracing(self):
+        monitoring = sys.monitoring
+        self._events_active = False
+        monitoring.set_events(self._tool_id, monitoring.events.NO_EVENTS)
+        for code in self._configured_codes:
+            monitoring.set_local_events(self._tool_id, code, monitoring.events.NO_EVENTS)
+        self._configured_codes = set()
+        monitoring.free_tool_id(self._tool_id)
+
+    def _initialize_new_command(self, current_frame):
+        # FastTracer's version deals with frame.f_trace
+        Tracer._initialize_new_command(self, current_frame)
+        self._command_frame_returned = False
+        if self._current_command.breakpoints != self._prev_breakpoints:
+            self._code_breakpoints_cache = {}
+            self._code_interest_cache = {}
+
+        if self._events_active:
+            self._configure_events(current_frame)
+
+    def _configure_events(self, current_frame):
+        monitoring = sys.monitoring
+        events = monitoring.events
+
+        for code in self._configured_codes:
+            monitoring.set_local_events(self._tool_id, code, events.NO_EVENTS)
+        self._configured_codes = set()
+
+        self._command_code = None
+        frame = current_frame
+        while frame is not None:
+            if id(frame) == self._current_command.frame_id:
+                self._command_code = frame.f_code
+            # active frames don't get PY_START event
+            if self._is_interesting_code(frame.f_code):
+                self._seen_codes.add(frame.f_code)
+            frame = frame.f_back
+
+        global_events = events.PY_START | events.PY_UNWIND
+        if self._current_command.name in ["step_into", "step_over"]:
+            global_events |= events.RAISE
+        if self._current_command.name == "step_into":
+            global_events |= events.LINE
+        monitoring.set_events(self._tool_id, global_events)
+
+        for code in self._seen_codes:
+            self._configure_code(code)
+
+        # enable the locations disabled during previous command
+        monitoring.restart_events()
+
+    def _configure_code(self, code):
+        if not self._is_interesting_code(code):
+            return
+
+        self._seen_codes.add(code)
+        events = sys.monitoring.events
+        local_events = events.NO_EVENTS
+        if self._get_breakpoints_in_code(code):
+            local_events |= events.LINE
+        if code is self._command_code:
+            local_events |= events.PY_RETURN | events.PY_YIELD
+            if self._current_command.name == "step_over":
+                local_events |= events.LINE
+        if code in self._reported_codes:
+            local_events |= events.PY_RETURN | events.PY_YIELD
+
+        if local_events:
+            sys.monitoring.set_local_events(self._tool_id, code, local_events)
+            self._configured_codes.add(code)
+
+    def _is_interesting_code(self, code):
+        result = self._code_interest_cache.get(code)
+        if result is None:
+            result = super()._is_interesting_code(code)
+            self._code_interest_cache[code] = result
+
+        return result
+
+    def _is_relevant_event(self, code):
+        return (
+            _thread.get_ident() == self._thread_id
+            and self._is_interesting_code(code)
+            and not self._backend.is_doing_io()
+        )
+
+    def _on_py_start(self, code, instruction_offset):
+        if _thread.get_ident() != self._thread_id or self._backend.is_doing_io():
+            return None
+        if not self._is_interesting_code(code):
+            return sys.monitoring.DISABLE
+
+        self._check_store_main_frame_id(sys._getframe(1))
+        self._fresh_exception = None
+        if code not in self._seen_codes:
+            self._configure_code(code)
+
+        # local events of this code are now configured for current command
+        return sys.monitoring.DISABLE
+
+    def _on_py_return(self, code, instruction_offset, retval_or_exception):
+        if not self._is_relevant_event(code):
+            return None
+
+        frame_id = id(sys._getframe(1))
+        self._fresh_exception = None
+        if frame_id == self._current_command.frame_id and not self._command_frame_returned:
+            self._command_frame_returned = True
+            if self._current_command.name in ["step_over", "step_out"]:
+                # command completes on next interesting line
+                sys.monitoring.set_events(
+                    self._tool_id,
+                    sys.monitoring.get_events(self._tool_id) | sys.monitoring.events.LINE,
+                )
+                sys.monitoring.restart_events()
+
+        self._check_notify_return(frame_id)
+        return None
+
+    def _on_line(self, code, line_number):
+        if _thread.get_ident() != self._thread_id or self._backend.is_doing_io():
+            return None
+        if not self._is_interesting_code(code):
+            return sys.monitoring.DISABLE
+
+        frame = sys._getframe(1)
+        self._fresh_exception = None
+
+        if self._command_completion_handler(frame):
+            self._report_current_state(frame)
+            self._fetch_next_debugger_command(frame)
+            return None
+
+        if (
+            line_number in self._get_breakpoints_in_code(code)
+            or self._command_frame_returned
+            or self._current_command.name == "step_into"
+            or self._current_command.name == "step_over"
+            and code is self._command_code
+        ):
+            return None
+
+        return sys.monitoring.DISABLE
+
+    def _on_raise(self, code, instruction_offset, exception):
+        if not self._is_relevant_event(code):
+            return
+
+        frame = sys._getframe(1)
+        arg = (type(exception), exception, exception.__traceback__)
+        if self._is_interesting_exception(frame, arg):
+            self._fresh_exception = arg
+            self._register_affected_frame(exception, frame)
+            # UI doesn't know about separate exception events
+            self._report_current_state(frame)
+            self._fetch_next_debugger_command(frame)
+
+    def _report_current_state(self, frame):
+        super()._report_current_state(frame)
+
+        self._reported_codes = set()
+        while frame is not None:
+            if id(frame) in self._last_reported_frame_ids:
+                self._reported_codes.add(frame.f_code)
+            frame = frame.f_back
+
+
 class NiceTracer(Tracer):
     def __init__(self, backend, original_cmd):
         super().__init__(backend, original_cmd)
@@ -433,11 +716,24 @@ class NiceTracer(Tracer):
         self._custom_stack = []
         self._saved_states = []
         self._current_state_index = 0
+        self._history_size = 0
+        self._history_size_limit = (
+            self._original_cmd.get("history_memory_limit", DEFAULT_HISTORY_MEMORY_LIMIT)
+            * 1024
+            * 1024
+        )
+        self._client_log_state_count = 0
+        self._discarded_state_count = 0
 
         from collections import Counter
 
         self._fulltags = Counter()
+        # InstrumentedNodes per filename, indexed by the node ids in marker calls
         self._nodes = {}
+        self._exported_nodes = None
+        self._code_cache = InstrumentedCodeCache(
+            os.path.join(get_thonny_user_dir(), "instrumented_code")
+        )
 
     def _breakpointhook(self, *args, **kw):
         self._report_state(len(self._saved_states) - 1)
@@ -457,7 +753,29 @@ class NiceTracer(Tracer):
             if not hasattr(builtins, name):
                 setattr(builtins, name, getattr(self, name))
 
+    def _compile_source(self, source, filename, mode, ast_postprocessors):
+        if ast_postprocessors:
+            # their effect can't be captured by the cache key
+            return super()._compile_source(source, filename, mode, ast_postprocessors)
+
+        cached = self._code_cache.load(source, filename, mode)
+        if cached is not None:
+            code, node_records = cached
+            logger.debug("Using cached instrumented code for %s", filename)
+        else:
+            root, node_records = self._instrument_ast(source, filename, mode)
+            code = compile(root, filename, mode)
+            self._code_cache.store(source, filename, mode, code, node_records)
+
+        self._register_instrumented_file(filename, node_records)
+        return code
+
     def _prepare_ast(self, source: Union[str, bytes], filename: str, mode: str):
+        root, node_records = self._instrument_ast(source, filename, mode)
+        self._register_instrumented_file(filename, node_records)
+        return root
+
+    def _instrument_ast(self, source: Union[str, bytes], filename: str, mode: str):
         # ast_utils need to be imported after asttokens
         # is (custom-)imported
         try_load_modules_with_frontend_sys_path(["asttokens", "six", "astroid"])
@@ -465,14 +783,22 @@ class NiceTracer(Tracer):
 
         root = ast.parse(source, filename, mode)
 
-        ast_utils.mark_text_ranges(root, source)
-        self._tag_nodes(root)
-        self._insert_expression_markers(root)
-        self._insert_statement_markers(root)
-        self._insert_for_target_markers(root)
-        self._instrumented_files.add(filename)
+        self._exported_nodes = []
+        try:
+            ast_utils.mark_text_ranges(root, source)
+            self._tag_nodes(root)
+            self._insert_expression_markers(root)
+            self._insert_statement_markers(root)
+            self._insert_for_target_markers(root)
+            node_records = export_node_records(self._exported_nodes)
+        finally:
+            self._exported_nodes = None
 
-        return root
+        return root, node_records
+
+    def _register_instrumented_file(self, filename, node_records):
+        self._nodes[filename] = create_nodes(node_records)
+        self._instrumented_files.add(filename)
 
     def _should_skip_frame(self, frame, event):
         # nice tracer can't skip any of the frames which need to be
@@ -558,7 +884,9 @@ class NiceTracer(Tracer):
                     raise AssertionError("Unknown marker function")
 
                 marker_function_args = frame.f_locals.copy()
-                node = self._nodes[marker_function_args["node_id"]]
+                node = self._nodes[frame.f_back.f_code.co_filename][
+                    marker_function_args["node_id"]
+                ]
 
                 del marker_function_args["self"]
 
@@ -641,7 +969,7 @@ class NiceTracer(Tracer):
 
         if self._saved_states:
             prev_state = self._saved_states[-1]
-            prev_state_frame = self._create_actual_active_frame(prev_state)
+            prev_state_frame = prev_state.active_frame
         else:
             prev_state = None
             prev_state_frame = None
@@ -680,7 +1008,7 @@ class NiceTracer(Tracer):
             if event == "after_expression" and "value" in args:
                 # value is missing in case of exception
                 custom_frame.current_evaluations.append(
-                    (focus, self._backend.export_value(args["value"]))
+                    Evaluation(focus, self._backend.export_value(args["value"]), args["value"])
                 )
 
         # Save the snapshot.
@@ -688,43 +1016,85 @@ class NiceTracer(Tracer):
         if (
             prev_state is not None
             and id(prev_state_frame.system_frame) == id(frame)
-            and prev_state["exception_value"] is self._get_current_exception()[1]
-            and prev_state["fresh_exception_id"] == id(self._fresh_exception)
+            and prev_state.exception_value is self._get_current_exception()[1]
+            and prev_state.fresh_exception_id == id(self._fresh_exception)
             and ("before" in event or "skipexport" in node.tags)
         ):
-            exception_info = prev_state["exception_info"]
+            exception_info = prev_state.exception_info
             # share the stack ...
-            stack = prev_state["stack"]
-            # ... but override certain things
-            active_frame_overrides = {
-                "event": custom_frame.event,
-                "focus": custom_frame.focus,
-                "node_tags": custom_frame.node_tags,
-                "current_root_expression": custom_frame.current_root_expression,
-                "current_evaluations": custom_frame.current_evaluations.copy(),
-                "current_statement": custom_frame.current_statement,
-            }
+            stack = prev_state.stack
+            # ... but override certain things in the active frame
+            active_frame = stack[-1]._replace(
+                event=custom_frame.event,
+                focus=custom_frame.focus,
+                node_tags=custom_frame.node_tags,
+                current_root_expression=custom_frame.current_root_expression,
+                current_evaluations=self._share_evaluations(
+                    custom_frame.current_evaluations, prev_state_frame.current_evaluations
+                ),
+                current_statement=custom_frame.current_statement,
+            )
+            size = _SAVED_STATE_SIZE
         else:
             # make full export
-            stack = self._export_stack()
+            stack, size = self._export_stack(prev_state.stack if prev_state else None)
             exception_info = self._export_exception_info()
-            active_frame_overrides = {}
-
-        msg = {
-            "stack": stack,
-            "active_frame_overrides": active_frame_overrides,
-            "in_client_log": False,
-            "io_symbol_count": (
-                sys.stdin._processed_symbol_count
-                + sys.stdout._processed_symbol_count
-                + sys.stderr._processed_symbol_count
-            ),
-            "exception_value": self._get_current_exception()[1],
-            "fresh_exception_id": id(self._fresh_exception),
-            "exception_info": exception_info,
-        }
+            active_frame = stack[-1]
+            size += _SAVED_STATE_SIZE
+
+        self._saved_states.append(
+            SavedState(
+                stack=stack,
+                active_frame=active_frame,
+                io_symbol_count=(
+                    sys.stdin._processed_symbol_count
+                    + sys.stdout._processed_symbol_count
+                    + sys.stderr._processed_symbol_count
+                ),
+                exception_value=self._get_current_exception()[1],
+                fresh_exception_id=id(self._fresh_exception),
+                exception_info=exception_info,
+                size=size,
+            )
+        )
+        self._history_size += size
+        if self._history_size > self._history_size_limit:
+            self._discard_oldest_states()
+
+    def _discard_oldest_states(self):
+        """Forgets old states (but not the one being processed) until the history
+        takes at most 3/4 of its budget. Discarding in batches keeps the cost amortized."""
+        target_size = self._history_size_limit * 3 // 4
+        count = 0
+        while count < self._current_state_index and self._history_size > target_size:
+            state = self._saved_states[count]
+            self._history_size -= state.size
+            if state.in_client_log:
+                self._client_log_state_count -= 1
+            count += 1
+
+        if count:
+            del self._saved_states[:count]
+            self._current_state_index -= count
+            self._discarded_state_count += count
+            logger.info("Discarded %d oldest states of the debugger history", count)
+
+    def _export_evaluations(self, evaluations):
+        result = []
+        for evaluation in evaluations:
+            # the values were exported when evaluated, but they may be shown for many steps
+            self._backend.retain_exported_value(evaluation.value)
+            result.append(tuple(evaluation))
+        return result
 
-        self._saved_states.append(msg)
+    def _share_evaluations(self, evaluations, prev_evaluations):
+        # Evaluations only get appended or reset, and each added item is a new tuple
+        if len(evaluations) == len(prev_evaluations) and (
+            not evaluations or evaluations[-1] is prev_evaluations[-1]
+        ):
+            return prev_evaluations
+        else:
+            return tuple(evaluations)
 
     def _respond_to_commands(self):
         """Tries to respond to client commands with states collected so far.
@@ -735,10 +1105,11 @@ class NiceTracer(Tracer):
         while self._current_state_index < len(self._saved_states):
             state = self._saved_states[self._current_state_index]
 
-            # Get current state's most recent frame (together with overrides
-            frame = self._create_actual_active_frame(state)
+            # Get current state's most recent frame (together with overrides)
+            frame = state.active_frame
 
             # Is this state meant to be seen?
+            reported = False
             if "skip_" + frame.event not in frame.node_tags:
                 # if True:
                 # Has the command completed?
@@ -746,27 +1117,37 @@ class NiceTracer(Tracer):
                 cmd_complete = tester(frame, self._current_command)
 
                 if cmd_complete:
-                    state["in_client_log"] = True
-                    self._report_state(self._current_state_index)
-                    self._fetch_next_debugger_command(frame)
+                    self._report_state_and_fetch_command(state, frame)
+                    reported = True
 
             if self._current_command.name == "step_back":
                 if self._current_state_index == 0:
                     # Already in first state. Remain in this loop
-                    pass
+                    if not reported:
+                        # Older states have been discarded and the oldest remaining one
+                        # is not meant to be seen. Show it anyway, as there is nothing
+                        # to step back to, and looping here would never end.
+                        self._report_state_and_fetch_command(state, frame)
                 else:
                     assert self._current_state_index > 0
                     # Current event is no longer present in GUI "undo log"
-                    self._saved_states[self._current_state_index]["in_client_log"] = False
+                    if state.in_client_log:
+                        state.in_client_log = False
+                        self._client_log_state_count -= 1
                     self._current_state_index -= 1
             else:
                 # Other commands move the pointer forward
                 self._current_state_index += 1
 
-    def _create_actual_active_frame(self, state):
-        return state["stack"][-1]._replace(**state["active_frame_overrides"])
+    def _report_state_and_fetch_command(self, state, frame):
+        if not state.in_client_log:
+            state.in_client_log = True
+            self._client_log_state_count += 1
+        self._report_state(self._current_state_index)
+        self._fetch_next_debugger_command(frame)
 
     def _report_state(self, state_index):
+        state = self._saved_states[state_index]
         in_present = state_index == len(self._saved_states) - 1
         if in_present:
             # For reported new events re-export stack to make sure it is not shared.
@@ -775,25 +1156,15 @@ class NiceTracer(Tracer):
             # was not the right choice. See tag_nodes for more.)
             # Re-exporting reduces the harm by showing correct data at least
             # for present states.
-            self._saved_states[state_index]["stack"] = self._export_stack()
-
-        # need to make a copy for applying overrides
-        # and removing helper fields without modifying original
-        state = self._saved_states[state_index].copy()
-        state["stack"] = state["stack"].copy()
-
-        state["in_present"] = in_present
-        if not in_present:
-            # for past states fix the newest frame
-            state["stack"][-1] = self._create_actual_active_frame(state)
-
-        del state["exception_value"]
-        del state["active_frame_overrides"]
+            state.stack, size = self._export_stack(state.stack)
+            state.active_frame = state.stack[-1]
+            state.size += size
+            self._history_size += size
 
         # Convert stack of TempFrameInfos to stack of FrameInfos
         new_stack = []
         self._last_reported_frame_ids = set()
-        for tframe in state["stack"]:
+        for tframe in state.stack[:-1] + [state.active_frame]:
             system_frame = tframe.system_frame
             module_name = system_frame.f_globals.get("__name__", None)
             code_name = system_frame.f_code.co_name
@@ -819,17 +1190,27 @@ class NiceTracer(Tracer):
                     focus=tframe.focus,
                     node_tags=tframe.node_tags,
                     current_statement=tframe.current_statement,
-                    current_evaluations=tframe.current_evaluations,
+                    current_evaluations=self._export_evaluations(tframe.current_evaluations),
                     current_root_expression=tframe.current_root_expression,
                 )
             )
 
             self._last_reported_frame_ids.add(frame_id)
 
-        state["stack"] = new_stack
-        state["tracer_class"] = "NiceTracer"
-
-        self._backend.send_message(DebuggerResponse(**state))
+        self._backend.send_message(
+            DebuggerResponse(
+                stack=new_stack,
+                in_present=in_present,
+                io_symbol_count=state.io_symbol_count,
+                exception_info=state.exception_info,
+                fresh_exception_id=state.fresh_exception_id,
+                in_client_log=state.in_client_log,
+                # how many of the previously reported states can be stepped back to
+                steps_back_available=self._client_log_state_count - state.in_client_log,
+                history_truncated=self._discarded_state_count > 0,
+                tracer_class="NiceTracer",
+            )
+        )
 
     def _try_interpret_as_again_event(self, frame, original_event, original_args, original_node):
         """
@@ -919,7 +1300,7 @@ class NiceTracer(Tracer):
     def _cmd_step_back_completed(self, frame, cmd):
         # Check if the selected message has been previously sent to front-end
         return (
-            self._saved_states[self._current_state_index]["in_client_log"]
+            self._saved_states[self._current_state_index].in_client_log
             or self._current_state_index == 0
         )
 
@@ -933,7 +1314,7 @@ class NiceTracer(Tracer):
         if self._at_a_breakpoint(frame, cmd):
             return True
 
-        prev_state_frame = self._saved_states[self._current_state_index - 1]["stack"][-1]
+        prev_state_frame = self._saved_states[self._current_state_index - 1].stack[-1]
 
         return (
             # the frame has completed
@@ -975,45 +1356,85 @@ class NiceTracer(Tracer):
 
         return False
 
-    def _export_stack(self):
+    def _export_stack(self, prev_stack=None):
+        """Returns TempFrameInfos for the custom stack together with the approximate
+        size of the data which could not be shared with prev_stack"""
         result = []
+        size = 0
+
+        prev_frames = {}
+        prev_globals_per_module = {}
+        for tframe in prev_stack or []:
+            prev_frames[id(tframe.system_frame)] = tframe
+            prev_globals_per_module[tframe.system_frame.f_globals.get("__name__", None)] = (
+                tframe.globals
+            )
+
+        def share_variables(variables, prev_variables):
+            nonlocal size
+            if variables == prev_variables:
+                return prev_variables
+
+            size += sys.getsizeof(variables)
+            prev_variables = prev_variables or {}
+            for name, value_info in variables.items():
+                prev_value_info = prev_variables.get(name)
+                if prev_value_info == value_info:
+                    variables[name] = prev_value_info
+                else:
+                    size += _VALUE_INFO_SIZE + len(value_info.repr)
+
+            return variables
 
         exported_globals_per_module = {}
 
         def export_globals(module_name, frame):
             if module_name not in exported_globals_per_module:
-                exported_globals_per_module[module_name] = self._backend.export_variables(
-                    frame.f_globals
+                exported_globals_per_module[module_name] = share_variables(
+                    self._backend.export_variables(frame.f_globals),
+                    prev_globals_per_module.get(module_name),
                 )
             return exported_globals_per_module[module_name]
 
         for custom_frame in self._custom_stack:
             system_frame = custom_frame.system_frame
             module_name = system_frame.f_globals.get("__name__", None)
+            prev_tframe = prev_frames.get(id(system_frame))
 
-            result.append(
-                TempFrameInfo(
-                    # need to store the reference to the frame to avoid it being GC-d
-                    # otherwise frame id-s would be reused and this would
-                    # mess up communication with the frontend.
-                    system_frame=system_frame,
-                    locals=(
-                        None
-                        if system_frame.f_locals is system_frame.f_globals
-                        else self._backend.export_variables(system_frame.f_locals)
-                    ),
-                    globals=export_globals(module_name, system_frame),
-                    event=custom_frame.event,
-                    focus=custom_frame.focus,
-                    node_tags=custom_frame.node_tags,
-                    current_evaluations=custom_frame.current_evaluations.copy(),
-                    current_statement=custom_frame.current_statement,
-                    current_root_expression=custom_frame.current_root_expression,
+            if system_frame.f_locals is system_frame.f_globals:
+                frame_locals = None
+            else:
+                frame_locals = share_variables(
+                    self._backend.export_variables(system_frame.f_locals),
+                    prev_tframe.locals if prev_tframe else None,
                 )
+
+            tframe = TempFrameInfo(
+                # need to store the reference to the frame to avoid it being GC-d
+                # otherwise frame id-s would be reused and this would
+                # mess up communication with the frontend.
+                system_frame=system_frame,
+                locals=frame_locals,
+                globals=export_globals(module_name, system_frame),
+                event=custom_frame.event,
+                focus=custom_frame.focus,
+                node_tags=custom_frame.node_tags,
+                current_evaluations=self._share_evaluations(
+                    custom_frame.current_evaluations,
+                    prev_tframe.current_evaluations if prev_tframe else (),
+                ),
+                current_statement=custom_frame.current_statement,
+                current_root_expression=custom_frame.current_root_expression,
             )
+            if tframe == prev_tframe:
+                tframe = prev_tframe
+            else:
+                size += _FRAME_INFO_SIZE
+
+            result.append(tframe)
 
         assert result  # not empty
-        return result
+        return result, size
 
     def _thonny_hidden_before_stmt(self, node_id):
         # The code to be debugged will be instrumented with this function
@@ -1411,8 +1832,9 @@ class NiceTracer(Tracer):
 
     def _export_node(self, node):
         assert isinstance(node, (ast.expr, ast.stmt))
-        node_id = id(node)
-        self._nodes[node_id] = node
+        # ids must not depend on the session, as the code may get cached
+        node_id = len(self._exported_nodes)
+        self._exported_nodes.append(node)
         return ast.Constant(node_id)
 
     def _debug(self, *args):
@@ -1437,12 +1859,17 @@ class FancySourceFileLoader(SourceFileLoader):
         super().__init__(fullname, path)
         self._tracer = tracer
 
+    def get_code(self, fullname):
+        # Regular bytecode in __pycache__ is not instrumented, and instrumented code
+        # must not end up there
+        path = self.get_filename(fullname)
+        return self.source_to_code(self.get_data(path), path)
+
     def source_to_code(self, data, path, *, _optimize=-1):
         old_tracer = sys.gettrace()
         sys.settrace(None)
         try:
-            root = self._tracer._prepare_ast(data, path, "exec")
-            return super().source_to_code(root, path)
+            return self._tracer._compile_source(data, path, "exec", [])
         finally:
             sys.settrace(old_tracer)
 
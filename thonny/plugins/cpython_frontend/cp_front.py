@@ -79,6 +79,14 @@ class LocalCPythonProxy(SubprocessProxy):
         # Can't run in isolated mode as it would hide user site-packages
         return False
 
+    def can_use_spare_process(self) -> bool:
+        return get_workbench().get_option("run.prewarm_backend")
+
+    def get_spare_process_conditions(self) -> Any:
+        # site adds user site-packages to sys.path only if the directory exists at startup
+        usp = self.get_user_site_packages()
+        return usp is not None and os.path.isdir(usp)
+
     def _store_state_info(self, msg):
         super()._store_state_info(msg)
 
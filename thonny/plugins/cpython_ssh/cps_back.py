@@ -23,6 +23,7 @@ from thonny.backend import (
     interrupt_local_process,
 )
 from thonny.common import (
+    MESSAGE_FORMAT_ENV_VAR,
     PROCESS_ACK,
     CommandToBackend,
     EOFCommand,
@@ -89,7 +90,7 @@ class SshCPythonBackend(BaseBackend, SshMixin):
             super().send_message(msg)
 
     def _forward_incoming_command(self, msg):
-        msg_str = serialize_message(msg, 1024)
+        msg_str = serialize_message(msg, 1024, message_format=self._message_format)
 
         for line in msg_str.splitlines(keepends=True):
             self._proc.stdin.write(line)
@@ -135,7 +136,11 @@ class SshCPythonBackend(BaseBackend, SshMixin):
             raise ConnectionAbortedError()
 
     def _start_main_backend(self) -> RemoteProcess:
-        env = {"THONNY_USER_DIR": "~/.config/Thonny", "THONNY_FRONTEND_SYS_PATH": "[]"}
+        env = {
+            "THONNY_USER_DIR": "~/.config/Thonny",
+            "THONNY_FRONTEND_SYS_PATH": "[]",
+            MESSAGE_FORMAT_ENV_VAR: self._message_format,
+        }
         self._main_backend_is_fresh = True
 
         cp_launcher_file = (
@@ -198,6 +203,10 @@ class SshCPythonBackend(BaseBackend, SshMixin):
             thonny.plugins.cpython_backend.cp_back.__file__,
             thonny.plugins.cpython_backend.cp_back.__file__.replace("cp_back.py", "cp_launcher.py"),
             thonny.plugins.cpython_backend.cp_back.__file__.replace("cp_back.py", "cp_tracers.py"),
+            thonny.plugins.cpython_backend.cp_back.__file__.replace("cp_back.py", "cp_heap.py"),
+            thonny.plugins.cpython_backend.cp_back.__file__.replace(
+                "cp_back.py", "cp_code_cache.py"
+            ),
         ]:
             local_suffix = local_path[len(local_context) :]
             remote_path = launch_dir + local_suffix.replace("\\", "/")
@@ -97,6 +97,7 @@ class Debugger:
             return (
                 self._last_progress_message
                 and self._last_progress_message["tracer_class"] == "NiceTracer"
+                and self._last_progress_message.get("steps_back_available", 1) > 0
             )
         else:
             return True
@@ -595,6 +596,8 @@ class EditorVisualizer(FrameVisualizer):
         FrameVisualizer._update_this_frame(self, msg, frame_info)
         if msg.in_present:
             self._decorate_editor_title("")
+        elif msg.get("history_truncated") and not msg.get("steps_back_available"):
+            self._decorate_editor_title("   <<< REPLAYING (older steps forgotten) >>> ")
         else:
             self._decorate_editor_title("   <<< REPLAYING >>> ")
 
@@ -1292,6 +1295,7 @@ def load_plugin() -> None:
         "debugger.preferred_debugger", "faster" if running_on_rpi() else "nicer"
     )
     get_workbench().set_default("debugger.allow_stepping_into_libraries", False)
+    get_workbench().set_default("debugger.history_memory_limit", 256)
 
     get_workbench().add_command(
         "runresume",
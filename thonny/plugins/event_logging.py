@@ -1,10 +1,16 @@
+import bisect
+import json
 import os.path
+import queue
+import threading
 import time
 import tkinter as tk
+import weakref
+from collections import OrderedDict
 from datetime import datetime
 from logging import getLogger
 from tkinter import messagebox
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
 from thonny import get_shell, get_thonny_user_dir, get_workbench
 from thonny.common import InlineResponse, MessageFromBackend, ToplevelResponse
@@ -17,17 +23,34 @@ logger = getLogger(__name__)
 
 TIMESTAMP_FORMAT = "%Y-%m-%d_%H-%M-%S"
 
-session_events = []
 session_start_time: Optional[time.struct_time] = None
 session_start_epoch_time: Optional[float] = None
 
 IDLE_SECONDS_FOR_SESSION_SPLIT = 15 * 60
 
+# Compressed session logs consist of separate gzip members of at most this many events.
+# Their offsets are recorded in the sidecar index, so that blocks can be decompressed
+# independently.
+INDEX_BLOCK_SIZE = 1000
+# Incomplete block gets written after this many seconds, so that a crash doesn't lose much
+BLOCK_FLUSH_INTERVAL = 10
+INDEX_FILE_SUFFIX = ".index.json"
+INDEX_FORMAT_VERSION = 2
+
+
+_event_logger: Optional["EventLogger"] = None
+_BLOCK_TIMEOUT = object()
+
 
 class EventLogger:
     def __init__(self):
         self._closing = False
         self._last_event_epoch_time: Optional[float] = None
+        self._writer: Optional[EventLogWriter] = None
+        # Widget properties which don't change during widget's lifetime.
+        # Looking these up via Tcl for every keypress would be wasteful.
+        self._widget_in_workbench_cache: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._text_widget_context_cache: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
         wb = get_workbench()
         wb.bind("WorkbenchClose", self._on_worbench_close, True)
@@ -102,9 +125,9 @@ class EventLogger:
                 attributes["text_widget"] = attributes["widget"]
 
         if "text_widget" in attributes:
-            widget = attributes["text_widget"]
-            if isinstance(widget.master.master, ShellView):
-                attributes["text_widget_context"] = "shell"
+            context = self._get_text_widget_context(attributes["text_widget"])
+            if context is not None:
+                attributes["text_widget_context"] = context
 
         # select attributes
         data = {}
@@ -133,6 +156,22 @@ class EventLogger:
 
         return data
 
+    def _get_text_widget_context(self, widget) -> Optional[str]:
+        try:
+            return self._text_widget_context_cache[widget]
+        except KeyError:
+            context = "shell" if isinstance(widget.master.master, ShellView) else None
+            self._text_widget_context_cache[widget] = context
+            return context
+
+    def _is_in_workbench(self, widget) -> bool:
+        try:
+            return self._widget_in_workbench_cache[widget]
+        except KeyError:
+            result = widget.winfo_toplevel() is get_workbench()
+            self._widget_in_workbench_cache[widget] = result
+            return result
+
     def _consider_splitting_and_log_event(self, sequence, event):
         now = time.time()
         if (
@@ -157,7 +196,6 @@ class EventLogger:
         widget: Optional[tk.Widget]
 
         event_time = datetime.now()
-        import json
 
         widget_str = getattr(event, "widget", None) or getattr(event, "editor", None)
         try:
@@ -181,7 +219,7 @@ class EventLogger:
                 return
 
             try:
-                if widget.winfo_toplevel() is not get_workbench():
+                if not self._is_in_workbench(widget):
                     # logger.debug("Skipping non-workspace event %r", event)
                     return
             except tk.TclError:
@@ -196,9 +234,7 @@ class EventLogger:
         if len(data["time"]) == 19:
             # 0 fraction gets skipped, but reader assumes it
             data["time"] += ".0"
-        session_events.append(data)
-        json.dump(data, self._out_fp)
-        self._out_fp.write("\n")
+        self._writer.write(data)
 
         self._last_event_epoch_time = event_time.timestamp()
 
@@ -212,28 +248,41 @@ class EventLogger:
         now = datetime.now()
         session_start_time = now.timetuple()
 
-        self._file_path = os.path.join(
-            get_log_dir(), format_time_range(session_start_time, None) + ".jsonl"
+        file_path = os.path.join(
+            get_log_dir(), format_time_range(session_start_time, None) + ".jsonl.gz"
         )
-        self._out_fp = open(self._file_path, mode="w", encoding="utf-8", buffering=1)
-        logger.info("Starting logging user events into %r", self._file_path)
+        self._writer = EventLogWriter(file_path)
+        logger.info("Starting logging user events into %r", file_path)
 
     def _close_session(self):
-        # save the file, compress it and remove the uncompressed copy
+        # finish writing and give the file its final name
         logger.info("Closing event log")
-        self._out_fp.close()
+        assert self._writer is not None
+        self._writer.close()
         out_file_path = os.path.join(
             get_log_dir(), format_time_range(session_start_time, time.localtime()) + ".jsonl.gz"
         )
-        import gzip
-
         logger.info("Events will be saved to %r", out_file_path)
-        with gzip.open(out_file_path, mode="wb") as out_fp:
-            with open(self._file_path, mode="rb") as in_fp:
-                out_fp.write(in_fp.read())
+        self._writer.move(out_file_path)
+        self._writer.save_index(get_index_path(out_file_path))
+        self._writer = None
+
+    def get_session_events(
+        self, prepare_event: Optional[Callable[[Dict], None]] = None
+    ) -> Sequence[Dict]:
+        if self._writer is None:
+            return []
+
+        if not self._writer.flush(timeout=5):
+            logger.warning("Event log writer did not flush in time")
+
+        index = self._writer.get_index()
+        if not index["block_offsets"]:
+            return []
 
-        os.remove(self._file_path)
-        session_events.clear()
+        events = IndexedSessionEvents(self._writer.path, index, prepare_event)
+        self._writer.add_view(events)
+        return events
 
     def _split_session(self):
         self._close_session()
@@ -260,6 +309,123 @@ class EventLogger:
             )
 
 
+class EventLogWriter:
+    """
+    Serializes and compresses events in a background thread.
+
+    Events get collected into blocks, which are written as separate gzip members, so that
+    the file can be read while it's being written and a crash loses at most the last block.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.Queue = queue.Queue()
+        self._fp = open(path, mode="wb")
+        self._index_builder = SessionIndexBuilder()
+        # guards the index builder and _data_size
+        self._index_lock = threading.Lock()
+        self._data_size = 0
+        # the events being read from this file, need to follow it when it gets renamed
+        self._views: "weakref.WeakSet[IndexedSessionEvents]" = weakref.WeakSet()
+        self._thread = threading.Thread(target=self._work, name="EventLogWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, event: Dict) -> None:
+        self._queue.put(event)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Makes the writer write out pending events and waits until it's done"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        self._fp.close()
+
+    def add_view(self, events: "IndexedSessionEvents") -> None:
+        self._views.add(events)
+
+    def move(self, new_path: str) -> None:
+        """Renames the file after closing"""
+        os.replace(self.path, new_path)
+        self.path = new_path
+        for events in list(self._views):
+            events.path = new_path
+
+    def get_index(self) -> Dict[str, Any]:
+        with self._index_lock:
+            return self._index_builder.to_dict(self._data_size)
+
+    def save_index(self, path: str) -> None:
+        with open(path, mode="w", encoding="utf-8") as fp:
+            json.dump(self.get_index(), fp)
+
+    def _work(self) -> None:
+        events: List[Dict] = []
+        lines: List[bytes] = []
+        block_deadline: Optional[float] = None
+        while True:
+            if block_deadline is None:
+                timeout = None
+            else:
+                timeout = max(block_deadline - time.monotonic(), 0)
+
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                # time to write the incomplete block
+                item = _BLOCK_TIMEOUT
+
+            if isinstance(item, dict):
+                try:
+                    lines.append(json.dumps(item).encode("utf-8") + b"\n")
+                except Exception:
+                    logger.exception("Could not serialize event %r", item)
+                    continue
+                events.append(item)
+                if block_deadline is None:
+                    block_deadline = time.monotonic() + BLOCK_FLUSH_INTERVAL
+                if len(events) < INDEX_BLOCK_SIZE:
+                    continue
+
+            if events:
+                self._write_block(events, lines)
+                events, lines = [], []
+                block_deadline = None
+
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    def _write_block(self, events: List[Dict], lines: List[bytes]) -> None:
+        import gzip
+
+        try:
+            self._fp.write(gzip.compress(b"".join(lines), compresslevel=6))
+            self._fp.flush()
+        except OSError:
+            logger.exception("Could not write events to %r", self.path)
+            self._fp.seek(self._data_size)
+            self._fp.truncate()
+            return
+
+        with self._index_lock:
+            self._index_builder.add_block(self._data_size, events)
+            self._data_size = self._fp.tell()
+
+
+def get_current_session_events(
+    prepare_event: Optional[Callable[[Dict], None]] = None
+) -> Sequence[Dict]:
+    if _event_logger is None:
+        return []
+
+    return _event_logger.get_session_events(prepare_event)
+
+
 def get_log_dir():
     return os.path.join(get_thonny_user_dir(), "user_logs")
 
@@ -301,8 +467,6 @@ def parse_file_name(name: str) -> Tuple[time.struct_time, Optional[time.struct_t
 
 
 def save_events_to_file(events: List[Dict], path: str) -> None:
-    import json
-
     data = json.dumps(events, indent=4)
     if path.lower().endswith(".zip"):
         import zipfile
@@ -318,9 +482,12 @@ def save_events_to_file(events: List[Dict], path: str) -> None:
 
 
 def load_events_from_file(path: str) -> List[Dict]:
-    import json
+    return list(iter_events_from_file(path))
+
 
+def iter_events_from_file(path: str) -> Iterator[Dict]:
     if path.lower().endswith(".zip"):
+        import io
         import zipfile
 
         with zipfile.ZipFile(path, "r") as zipf:
@@ -330,19 +497,20 @@ def load_events_from_file(path: str) -> List[Dict]:
                     "The zip contains several files.\nPlease extract the files and load one of them!"
                 )
             name = names[0]
-            data = zipf.read(name)
 
             if name.lower().endswith(".jsonl"):
-                return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+                with zipf.open(name) as fp:
+                    for line in io.TextIOWrapper(fp, encoding="utf-8"):
+                        yield json.loads(line)
             elif name.lower().endswith(".json") or name.lower().endswith(".txt"):
-                return json.loads(data.decode("utf-8"))
+                yield from json.loads(zipf.read(name).decode("utf-8"))
             else:
                 raise EventsInputOutputFileError(f"Don't know how to open {name}")
 
     elif path.lower().endswith(".txt") or path.lower().endswith(".json"):
         # import/export JSON format
         with open(path, encoding="utf-8") as fp:
-            return json.load(fp)
+            yield from json.load(fp)
     else:
         # internal, JSON lines format
         if path.lower().endswith(".jsonl.gz"):
@@ -356,12 +524,190 @@ def load_events_from_file(path: str) -> List[Dict]:
         else:
             raise EventsInputOutputFileError("Can't determine file format")
 
-        result = []
         with open_fun(path, mode="rt", encoding="utf-8") as fp:
-            for line in fp:
-                result.append(json.loads(line))
+            try:
+                for line in fp:
+                    yield json.loads(line)
+            except (EOFError, json.JSONDecodeError):
+                # the last block may be incomplete after a crash
+                logger.warning("Log file %r is truncated", path, exc_info=True)
+
+
+def parse_event_time(event: Dict) -> float:
+    event_time_str = event["time"]
+    if len(event_time_str) == 19:
+        # 0 fraction may have been skipped
+        event_time_str += ".0"
+    return datetime.strptime(event_time_str, "%Y-%m-%dT%H:%M:%S.%f").timestamp()
+
+
+def get_index_path(path: str) -> str:
+    return path + INDEX_FILE_SUFFIX
+
+
+class SessionIndexBuilder:
+    def __init__(self):
+        self.event_count = 0
+        self.block_offsets: List[int] = []
+        self.block_start_indices: List[int] = []
+        self.block_start_times: List[float] = []
+        self.start_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self.editor_ids: Dict[int, None] = {}
+
+    def add_block(self, offset: int, events: List[Dict]) -> None:
+        assert events
+        self.block_offsets.append(offset)
+        self.block_start_indices.append(self.event_count)
+        self.block_start_times.append(parse_event_time(events[0]))
+        if self.start_time is None:
+            self.start_time = self.block_start_times[-1]
+        self.end_time = parse_event_time(events[-1])
+        self.event_count += len(events)
+        for event in events:
+            if "editor_id" in event:
+                self.editor_ids[event["editor_id"]] = None
+
+    def to_dict(self, data_file_size: int) -> Dict[str, Any]:
+        return {
+            "format_version": INDEX_FORMAT_VERSION,
+            "data_file_size": data_file_size,
+            "event_count": self.event_count,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "block_offsets": self.block_offsets.copy(),
+            "block_start_indices": self.block_start_indices.copy(),
+            "block_start_times": self.block_start_times.copy(),
+            "editor_ids": list(self.editor_ids),
+        }
+
+
+def load_session_index(path: str) -> Optional[Dict[str, Any]]:
+    """Returns the sidecar index of given compressed log, if it exists and is up-to-date"""
+    index_path = get_index_path(path)
+    if not os.path.isfile(index_path):
+        return None
+
+    try:
+        with open(index_path, encoding="utf-8") as fp:
+            index = json.load(fp)
+    except (OSError, ValueError):
+        logger.warning("Could not read session index %r", index_path, exc_info=True)
+        return None
+
+    if (
+        index.get("format_version") != INDEX_FORMAT_VERSION
+        or index.get("data_file_size") != os.path.getsize(path)
+        or not index.get("block_offsets")
+    ):
+        logger.info("Ignoring outdated session index %r", index_path)
+        return None
+
+    return index
+
+
+class IndexedSessionEvents(Sequence[Dict]):
+    """
+    Read-only list of events backed by a blockwise compressed log and its index.
+    Blocks get decompressed on demand and only a limited number of them are kept in memory.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        index: Dict[str, Any],
+        prepare_event: Optional[Callable[[Dict], None]] = None,
+        max_cached_blocks: int = 16,
+    ):
+        self.path = path
+        self.start_time: float = index["start_time"]
+        self.end_time: float = index["end_time"]
+        self.editor_ids: List[int] = index["editor_ids"]
+        self._event_count: int = index["event_count"]
+        self._block_start_indices: List[int] = index["block_start_indices"]
+        self._block_offsets: List[int] = index["block_offsets"] + [index["data_file_size"]]
+        self._block_start_times: List[float] = index["block_start_times"]
+        self._prepare_event = prepare_event
+        self._max_cached_blocks = max_cached_blocks
+        self._cached_blocks: OrderedDict[int, List[Dict]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return self._event_count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += self._event_count
+        if not 0 <= index < self._event_count:
+            raise IndexError("event index out of range")
+
+        block_no = bisect.bisect_right(self._block_start_indices, index) - 1
+        return self._get_block(block_no)[index - self._block_start_indices[block_no]]
+
+    def __iter__(self) -> Iterator[Dict]:
+        for block_no in range(len(self._block_start_times)):
+            if block_no in self._cached_blocks:
+                yield from self._cached_blocks[block_no]
+            else:
+                # don't disturb the cache while streaming through the whole session
+                yield from self._read_block(block_no)
+
+    def get_index_range_for_time(self, epoch_time: float) -> Tuple[int, int]:
+        """Returns the range of indices (inclusive) containing the events closest to given time"""
+        block_no = max(bisect.bisect_right(self._block_start_times, epoch_time) - 1, 0)
+        start_index = self._block_start_indices[block_no]
+        # the first event of the next block may be the closest
+        if block_no + 1 < len(self._block_start_indices):
+            end_index = self._block_start_indices[block_no + 1]
+        else:
+            end_index = self._event_count - 1
+        return start_index, end_index
+
+    def _get_block(self, block_no: int) -> List[Dict]:
+        block = self._cached_blocks.get(block_no)
+        if block is None:
+            block = self._read_block(block_no)
+            self._cached_blocks[block_no] = block
+            if len(self._cached_blocks) > self._max_cached_blocks:
+                self._cached_blocks.popitem(last=False)
+        else:
+            self._cached_blocks.move_to_end(block_no)
+
+        return block
+
+    def _read_block(self, block_no: int) -> List[Dict]:
+        import gzip
+
+        start = self._block_offsets[block_no]
+        end = self._block_offsets[block_no + 1]
+        with open(self.path, mode="rb") as fp:
+            fp.seek(start)
+            data = gzip.decompress(fp.read(end - start))
+
+        events = [json.loads(line) for line in data.splitlines() if line.strip()]
+        if self._prepare_event is not None:
+            for event in events:
+                self._prepare_event(event)
+
+        return events
+
+
+def open_session_events(
+    path: str, prepare_event: Optional[Callable[[Dict], None]] = None
+) -> Sequence[Dict]:
+    """Returns indexed lazy events if possible, otherwise loads all events of the file"""
+    if path.lower().endswith(".jsonl.gz"):
+        index = load_session_index(path)
+        if index is not None:
+            return IndexedSessionEvents(path, index, prepare_event)
 
-        return result
+    events = load_events_from_file(path)
+    if prepare_event is not None:
+        for event in events:
+            prepare_event(event)
+    return events
 
 
 class EventsInputOutputFileError(ValueError):
@@ -380,4 +726,5 @@ def load_plugin() -> None:
         )
 
         # create logger
-        EventLogger()
+        global _event_logger
+        _event_logger = EventLogger()
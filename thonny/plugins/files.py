@@ -133,10 +133,6 @@ class FilesView(tk.PanedWindow):
 
 
 class ActiveLocalFileBrowser(BaseLocalFileBrowser):
-    def __init__(self, master):
-        super().__init__(master)
-        get_workbench().bind("ToplevelResponse", self.on_toplevel_response, True)
-
     def is_active_browser(self):
         return True
 
@@ -188,6 +184,7 @@ class ActiveLocalFileBrowser(BaseLocalFileBrowser):
             get_workbench().set_local_cwd(path)
 
     def on_toplevel_response(self, event):
+        super().on_toplevel_response(event)
         self.check_update_focus()
 
     def check_update_focus(self):
@@ -4,7 +4,7 @@ import tkinter as tk
 from logging import getLogger
 from tkinter import ttk
 
-from thonny import get_workbench
+from thonny import get_shell, get_workbench
 from thonny.languages import tr
 from thonny.misc_utils import running_on_mac_os
 from thonny.ui_utils import CommonDialog, select_sequence, show_dialog
@@ -327,6 +327,9 @@ class FindDialog(CommonDialog):
             FindDialog.last_searched_word = tofind  # set the data about last search
             self.last_search_case = self._is_search_case_sensitive()
 
+        if search_backwards:
+            search_start_index = self._try_load_scrollback(tofind, search_start_index)
+
         wordstart = self.codeview.text.search(
             tofind,
             search_start_index,
@@ -366,6 +369,30 @@ class FindDialog(CommonDialog):
             case_sensitive=self._is_search_case_sensitive(),
         )
 
+    # Shell can keep older lines outside of the widget. Brings them in if the search would otherwise
+    # wrap around. Returns the search start index adjusted for the inserted lines.
+    def _try_load_scrollback(self, tofind, search_start_index):
+        text = self.codeview.text
+        if not hasattr(text, "load_scrollback_for_search") or text.search(
+            tofind,
+            search_start_index,
+            "1.0",
+            backwards=True,
+            nocase=not self._is_search_case_sensitive(),
+        ):
+            return search_start_index
+
+        line_count_before = int(text.index("end").split(".")[0])
+        if not text.load_scrollback_for_search(tofind, self._is_search_case_sensitive()):
+            return search_start_index
+
+        added_line_count = int(text.index("end").split(".")[0]) - line_count_before
+        # remembered positions are not valid anymore
+        text.tag_remove("found", "1.0", "end")
+        self.passive_found_tags = set()
+        self._find_and_tag_all(tofind, force=True)
+        return text.index("%s +%d lines" % (search_start_index, added_line_count))
+
     def _ok(self, event=None):
         """Called when the window is closed. responsible for handling all cleanup."""
         self._remove_all_tags()
@@ -421,6 +448,12 @@ def load_plugin() -> None:
         if _active_find_dialog is not None:
             _active_find_dialog.focus_set()
         else:
+            shell = get_shell(create=False)
+            if event is not None and shell is not None and event.widget is shell.text:
+                dlg = FindDialog(shell)
+                show_dialog(dlg, modal=False)
+                return
+
             editor = get_workbench().get_editor_notebook().get_current_editor()
             if editor:
                 dlg = FindDialog(editor._code_view)
@@ -32,6 +32,9 @@ ACCESS_TOKEN_SECRET_KEY = "github_copilot_access_token"
 
 logger = getLogger(__name__)
 
+# Nothing to load at startup, the module gets imported by its users
+load_lazily = True
+
 
 class GithubAccessTokenDialog(WorkDialog):
     def __init__(self, master):
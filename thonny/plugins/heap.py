@@ -81,5 +81,8 @@ class HeapView(MemoryFrame):
             pass
 
 
+load_lazily = True
+
+
 def load_plugin() -> None:
     get_workbench().add_view(HeapView, tr("Heap"), "e")
@@ -1,7 +1,9 @@
 import tkinter as tk
 from logging import getLogger
+from typing import Set, Tuple
 
 from thonny import get_workbench
+from thonny.parse_service import get_parse_service
 
 logger = getLogger(__name__)
 
@@ -16,6 +18,69 @@ def is_scope(node):
     return t in ("file_input", "classdef", "funcdef", "lambdef", "sync_comp_for")
 
 
+def find_local_name_positions(module) -> Set[Tuple[str, str]]:
+    """Returns start and end indices of local variables in parso module"""
+    from parso.python import tree
+
+    locs = []
+
+    def process_scope(scope):
+        if isinstance(scope, tree.Function):
+            # process all children after name node,
+            # (otherwise name of global function will be marked as local def)
+            local_names = set()
+            global_names = set()
+            for child in scope.children[2:]:
+                process_node(child, local_names, global_names)
+        else:
+            if hasattr(scope, "subscopes"):
+                for child in scope.subscopes:
+                    process_scope(child)
+            elif hasattr(scope, "children"):
+                for child in scope.children:
+                    process_scope(child)
+
+    def process_node(node, local_names, global_names):
+        if isinstance(node, tree.GlobalStmt):
+            global_names.update([n.value for n in node.get_global_names()])
+
+        elif isinstance(node, tree.Name):
+            if node.value in global_names:
+                return
+
+            if node.is_definition():  # local def
+                locs.append(node)
+                local_names.add(node.value)
+            elif node.value in local_names:  # use of local
+                locs.append(node)
+
+        elif isinstance(node, tree.BaseNode):
+            # ref: parso/python/grammar*.txt
+            if node.type == "trailer" and node.children[0].value == ".":
+                # this is attribute
+                return
+
+            if isinstance(node, tree.Function):
+                global_names = set()  # outer global statement doesn't have effect anymore
+
+            for child in node.children:
+                process_node(child, local_names, global_names)
+
+    for child in module.children:
+        if isinstance(child, tree.BaseNode) and is_scope(child):
+            process_scope(child)
+
+    loc_pos = set(
+        (
+            "%d.%d" % (usage.start_pos[0], usage.start_pos[1]),
+            "%d.%d" % (usage.start_pos[0], usage.start_pos[1] + len(usage.value)),
+        )
+        for usage in locs
+    )
+
+    return loc_pos
+
+
 class LocalsHighlighter:
     def __init__(self, text):
         self.text = text
@@ -24,72 +89,14 @@ class LocalsHighlighter:
 
     def get_positions(self):
         import parso
-        from parso.python import tree
-
-        locs = []
-
-        def process_scope(scope):
-            if isinstance(scope, tree.Function):
-                # process all children after name node,
-                # (otherwise name of global function will be marked as local def)
-                local_names = set()
-                global_names = set()
-                for child in scope.children[2:]:
-                    process_node(child, local_names, global_names)
-            else:
-                if hasattr(scope, "subscopes"):
-                    for child in scope.subscopes:
-                        process_scope(child)
-                elif hasattr(scope, "children"):
-                    for child in scope.children:
-                        process_scope(child)
-
-        def process_node(node, local_names, global_names):
-            if isinstance(node, tree.GlobalStmt):
-                global_names.update([n.value for n in node.get_global_names()])
-
-            elif isinstance(node, tree.Name):
-                if node.value in global_names:
-                    return
-
-                if node.is_definition():  # local def
-                    locs.append(node)
-                    local_names.add(node.value)
-                elif node.value in local_names:  # use of local
-                    locs.append(node)
-
-            elif isinstance(node, tree.BaseNode):
-                # ref: parso/python/grammar*.txt
-                if node.type == "trailer" and node.children[0].value == ".":
-                    # this is attribute
-                    return
-
-                if isinstance(node, tree.Function):
-                    global_names = set()  # outer global statement doesn't have effect anymore
-
-                for child in node.children:
-                    process_node(child, local_names, global_names)
-
-        source = self.text.get("1.0", "end")
-        module = parso.parse(source)
-        for child in module.children:
-            if isinstance(child, tree.BaseNode) and is_scope(child):
-                process_scope(child)
-
-        loc_pos = set(
-            (
-                "%d.%d" % (usage.start_pos[0], usage.start_pos[1]),
-                "%d.%d" % (usage.start_pos[0], usage.start_pos[1] + len(usage.value)),
-            )
-            for usage in locs
-        )
 
-        return loc_pos
+        return find_local_name_positions(parso.parse(self.text.get("1.0", "end")))
 
     def _highlight(self, pos_info):
-        for pos in pos_info:
-            start_index, end_index = pos[0], pos[1]
-            self.text.tag_add("local_name", start_index, end_index)
+        self.text.tag_remove("local_name", "1.0", "end")
+        indices = [index for pos in sorted(pos_info) for index in pos]
+        if indices:
+            self.text.tag_add("local_name", *indices)
 
     def schedule_update(self):
         def perform_update():
@@ -103,14 +110,15 @@ class LocalsHighlighter:
             self.text.after_idle(perform_update)
 
     def update(self):
-        self.text.tag_remove("local_name", "1.0", "end")
-
         if get_workbench().get_option("view.locals_highlighting") and self.text.is_python_text():
-            try:
-                highlight_positions = self.get_positions()
-                self._highlight(highlight_positions)
-            except Exception:
-                logger.exception("Problem when updating local variable tags")
+            # tags get updated when the analysis of current text is ready
+            get_parse_service(self.text).request(
+                "local_names", find_local_name_positions, self._highlight
+            )
+        else:
+            self.text.tag_remove("local_name", "1.0", "end")
+            if hasattr(self.text, "parse_service"):
+                self.text.parse_service.discard("local_names")
 
 
 def update_highlighting(event):
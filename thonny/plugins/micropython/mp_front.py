@@ -146,7 +146,8 @@ class MicroPythonProxy(SubprocessProxy):
 
     @classmethod
     def search_packages(cls, query: str) -> List[DistInfo]:
-        from thonny.plugins.pip_gui import compute_dist_name_similarity, perform_pypi_search
+        from thonny.package_index import compute_dist_name_similarity
+        from thonny.plugins.pip_gui import perform_pypi_search
 
         norm_query = canonicalize_name(query.strip())
         query_parts = norm_query.split("-")
@@ -1,8 +1,10 @@
+import os.path
 import re
+import subprocess
 from logging import getLogger
 from typing import Dict, List, Optional
 
-from thonny import get_runner, get_workbench
+from thonny import get_runner, get_thonny_user_dir, get_workbench
 from thonny.program_analysis import (
     ProgramAnalyzerResponseItem,
     ProgramAnalyzerResponseItemType,
@@ -12,10 +14,22 @@ from thonny.running import get_front_interpreter_for_subprocess
 
 logger = getLogger(__name__)
 
+USE_DAEMON_OPTION = "assistance.use_mypy_daemon"
+
+# Messages of the daemon client, which don't concern the checked program
+_DAEMON_MESSAGE_PREFIXES = ["Daemon started", "Daemon stopped", "Restarting:"]
+
 
 class MyPyAnalyzer(SubprocessProgramAnalyzer):
+    def __init__(self):
+        super().__init__()
+        self._daemon_used = False
+
     def parse_output_line(self, line: str) -> Optional[ProgramAnalyzerResponseItem]:
         print("MP PARSONG", line)
+        if any(line.startswith(prefix) for prefix in _DAEMON_MESSAGE_PREFIXES):
+            return None
+
         m = re.match(r"(.*?):(\d+)(:(\d+))?:(.*?):(.*)", line.strip())
         if m is not None:
             message = m.group(6).strip()
@@ -43,10 +57,13 @@ class MyPyAnalyzer(SubprocessProgramAnalyzer):
 
     def get_command_line(self, main_file_path: str) -> List[str]:
         print("GETTTTING")
-        return [
-            get_front_interpreter_for_subprocess(),
-            "-m",
-            "mypy",
+        if get_workbench().get_option(USE_DAEMON_OPTION):
+            # The daemon keeps the results for unchanged modules (incl. typeshed) in memory
+            prefix = self._get_daemon_command_prefix() + ["run", "--"]
+        else:
+            prefix = [get_front_interpreter_for_subprocess(), "-m", "mypy"]
+
+        return prefix + [
             "--ignore-missing-imports",
             "--check-untyped-defs",
             "--warn-redundant-casts",
@@ -64,6 +81,34 @@ class MyPyAnalyzer(SubprocessProgramAnalyzer):
             main_file_path,
         ]
 
+    def start_subprocess(self, main_file: str) -> None:
+        if get_workbench().get_option(USE_DAEMON_OPTION):
+            # computing the command line (e.g. for the config key) doesn't start the daemon
+            self._daemon_used = True
+        super().start_subprocess(main_file)
+
+    def close(self) -> None:
+        if self._daemon_used:
+            try:
+                subprocess.Popen(
+                    self._get_daemon_command_prefix() + ["stop"],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    cwd=get_workbench().get_local_cwd(),
+                )
+            except Exception:
+                logger.exception("Could not stop mypy daemon")
+
+    def _get_daemon_command_prefix(self) -> List[str]:
+        return [
+            get_front_interpreter_for_subprocess(),
+            "-m",
+            "mypy.dmypy",
+            # default would be in user's working directory
+            "--status-file",
+            os.path.join(get_thonny_user_dir(), "dmypy.json"),
+        ]
+
     def get_env(self) -> Dict[str, str]:
         env = super().get_env()
         mypypath = get_workbench().get_option("assistance.mypypath")
@@ -74,4 +119,5 @@ class MyPyAnalyzer(SubprocessProgramAnalyzer):
 
 
 def load_plugin():
+    get_workbench().set_default(USE_DAEMON_OPTION, True)
     get_workbench().add_program_analyzer("mypy", MyPyAnalyzer())
@@ -69,5 +69,8 @@ class NotesView(TextFrame):
         super().destroy()
 
 
+load_lazily = True
+
+
 def load_plugin():
     get_workbench().add_view(NotesView, tr("Notes"), "ne", default_position_key="zz")
@@ -238,6 +238,7 @@ class ObjectInspector(ttk.Frame):
                 all_attributes=True,
                 frame_width=frame_width,
                 frame_height=frame_height,
+                page_size=thonny.memory.ITEMS_PAGE_SIZE,
             )
         )
 
@@ -260,6 +261,12 @@ class ObjectInspector(ttk.Frame):
             )
             self.attributes_page.update_variables(object_info["attributes"])
             self.attributes_page.context_id = object_info["id"]
+            self.attributes_page.set_paging_state(
+                object_info["id"],
+                "attributes",
+                object_info.get("attributes_end"),
+                object_info.get("attributes_count"),
+            )
             self.update_type_specific_info(object_info)
 
             # update layout
@@ -580,9 +587,15 @@ class ElementsInspector(thonny.memory.MemoryFrame, ContentInspector):
         self.context_id = object_info["id"]
 
         self._clear_tree()
-        index = 0
-        # TODO: don't show too big number of elements
-        for element in object_info["elements"]:
+        self.add_page(object_info["elements"], 0)
+
+        # MicroPython sends all elements
+        count = object_info.get("elements_count", len(object_info["elements"]))
+        self.len_label.configure(text=" len: %d" % count)
+        self.set_paging_state(object_info["id"], "elements", object_info.get("elements_end"), count)
+
+    def add_page(self, items, offset):
+        for index, element in enumerate(items, offset):
             node_id = self.tree.insert("", "end")
             if self.elements_have_indices:
                 self.tree.set(node_id, "index", index)
@@ -593,10 +606,6 @@ class ElementsInspector(thonny.memory.MemoryFrame, ContentInspector):
             self.tree.set(
                 node_id, "value", shorten_repr(element.repr, thonny.memory.MAX_REPR_LENGTH_IN_GRID)
             )
-            index += 1
-
-        count = len(object_info["elements"])
-        self.len_label.configure(text=" len: %d" % count)
 
 
 class DictInspector(thonny.memory.MemoryFrame, ContentInspector):
@@ -644,8 +653,16 @@ class DictInspector(thonny.memory.MemoryFrame, ContentInspector):
         self.context_id = object_info["id"]
 
         self._clear_tree()
-        # TODO: don't show too big number of elements
-        for key, value in object_info["entries"]:
+        self.add_page(object_info["entries"], 0)
+
+        # MicroPython sends all entries
+        count = object_info.get("entries_count", len(object_info["entries"]))
+        self.len_label.configure(text=" len: %d" % count)
+        self.set_paging_state(object_info["id"], "entries", object_info.get("entries_end"), count)
+        self.update_memory_model()
+
+    def add_page(self, items, offset):
+        for key, value in items:
             node_id = self.tree.insert("", "end")
             self.tree.set(node_id, "key_id", thonny.memory.format_object_id(key.id))
             self.tree.set(
@@ -656,10 +673,6 @@ class DictInspector(thonny.memory.MemoryFrame, ContentInspector):
                 node_id, "value", shorten_repr(value.repr, thonny.memory.MAX_REPR_LENGTH_IN_GRID)
             )
 
-        count = len(object_info["entries"])
-        self.len_label.configure(text=" len: %d" % count)
-        self.update_memory_model()
-
 
 class ImageInspector(ContentInspector, tk.Frame):
     def __init__(self, master):
@@ -697,6 +710,15 @@ class AttributesFrame(thonny.memory.VariablesFrame):
     def __init__(self, master):
         thonny.memory.VariablesFrame.__init__(self, master, consider_heading_stripe=False)
         self.configure(border=0)
+        self._attributes = {}
+
+    def update_variables(self, all_variables):
+        self._attributes = all_variables
+        super().update_variables(all_variables)
+
+    def add_page(self, items, offset):
+        # pages come in the order of the grid, so the new rows get appended
+        self.update_variables({**self._attributes, **items})
 
     def on_select(self, event):
         pass
@@ -728,5 +750,8 @@ class AttributesFrame(thonny.memory.VariablesFrame):
         get_workbench().event_generate("ObjectSelect", object_id=object_id)
 
 
+load_lazily = True
+
+
 def load_plugin() -> None:
     get_workbench().add_view(ObjectInspector, tr("Object inspector"), "se")
@@ -175,5 +175,8 @@ class OutlineView(ttk.Frame):
             )
 
 
+load_lazily = True
+
+
 def load_plugin() -> None:
     get_workbench().add_view(OutlineView, tr("Outline"), "ne")
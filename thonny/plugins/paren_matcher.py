@@ -1,12 +1,15 @@
 import io
 import time
 import token as token_module
+from typing import List, NamedTuple, Tuple
 
 from thonny import get_workbench
 from thonny.codeview import CodeViewText
+from thonny.parse_service import get_parse_service
 from thonny.shell import ShellText
 
 _OPENERS = {")": "(", "]": "[", "}": "{"}
+_PAREN_CHARS = {"(", ")", "[", "]", "{", "}"}
 
 TOKTYPES = {
     token_module.LPAR,
@@ -23,12 +26,32 @@ BLANK_LINE_REGEX_STR = r"^\s*$"
 BLOCK_START_REGEX_STR = r"^\s*(class|def|while|elif|with|try|except|finally) "
 
 
+class ParenToken(NamedTuple):
+    string: str
+    start: Tuple[int, int]
+    end: Tuple[int, int]
+
+
+def find_paren_tokens(module) -> List[ParenToken]:
+    """Returns brackets of parso module in source order"""
+    result = []
+    stack = [module]
+    while stack:
+        node = stack.pop()
+        children = getattr(node, "children", None)
+        if children is not None:
+            stack.extend(reversed(children))
+        elif node.value in _PAREN_CHARS and node.type in ("operator", "error_leaf"):
+            result.append(ParenToken(node.value, node.start_pos, node.end_pos))
+
+    return result
+
+
 class ParenMatcher:
     def __init__(self, text):
         self.text = text
         self._update_scheduling_id = None
         self._delayed_scheduling_id = None
-        self._tokens_cache = {}
 
     def schedule_update(self, delay=None):
         if self._update_scheduling_id is not None:
@@ -45,18 +68,23 @@ class ParenMatcher:
         finally:
             self._update_scheduled = False
 
-    def invalidate_token_cache(self):
-        self._tokens_cache = {}
-
     def update_highlighting(self):
-        clear_highlighting(self.text)
-
         if get_workbench().get_option("view.paren_highlighting") and (
             self.text.is_python_text() or self.text.is_pythonlike_text()
         ):
             self._update_highlighting_for_active_range()
+        else:
+            clear_highlighting(self.text)
 
     def _update_highlighting_for_active_range(self):
+        # highlighting gets updated when the tokens of current text are ready
+        get_parse_service(self.text).request(
+            "paren_tokens", find_paren_tokens, self._highlight_active_range
+        )
+
+    def _highlight_active_range(self, tokens: List[ParenToken]) -> None:
+        clear_highlighting(self.text)
+
         start_index = "1.0"
         end_index = self.text.index("end")
 
@@ -70,7 +98,11 @@ class ParenMatcher:
         if index:
             end_index = index
 
-        self._highlight(start_index, end_index)
+        start_pos = tuple(map(int, start_index.split(".")))
+        end_pos = tuple(map(int, end_index.split(".")))
+        self._highlight(
+            start_index, end_index, [t for t in tokens if start_pos <= t.start < end_pos]
+        )
 
     def _find_block_start(self, start_position, backwards):
         while True:
@@ -96,12 +128,12 @@ class ParenMatcher:
 
         return index
 
-    def _highlight(self, start_index, end_index):
+    def _highlight(self, start_index, end_index, tokens):
         stack = []
 
         cursor_row, cursor_col = map(int, self.text.index("insert").split("."))
 
-        for t in self._get_paren_tokens(start_index, end_index):
+        for t in tokens:
             if t.string in "([{":
                 stack.append(t)
             elif not stack:
@@ -138,12 +170,22 @@ class ParenMatcher:
             open_index = "%d.%d" % opener.start
             self.text.tag_add("unclosed_expression", open_index, end_index)
 
+
+class ShellParenMatcher(ParenMatcher):
+    def _update_highlighting_for_active_range(self):
+        # TODO: check that cursor is in this range
+        clear_highlighting(self.text)
+        index_parts = self.text.tag_prevrange("command", "end")
+
+        if index_parts:
+            start_index, end_index = index_parts
+            self._highlight(
+                start_index, end_index, self._get_paren_tokens(start_index, end_index)
+            )
+
     def _get_paren_tokens(self, start_index, end_index):
         import tokenize
 
-        if (start_index, end_index) in self._tokens_cache:
-            return self._tokens_cache[(start_index, end_index)]
-
         start_row, start_col = map(int, start_index.split("."))
         source = self.text.get(start_index, end_index)
         # prepend source with empty lines and spaces to make
@@ -161,23 +203,10 @@ class ParenMatcher:
             # happens eg when parens are unbalanced or there is indentation error or ...
             pass
 
-        if start_index == "1.0" and end_index == "end":
-            self._tokens_cache[(start_index, end_index)] = result
-
         return result
 
 
-class ShellParenMatcher(ParenMatcher):
-    def _update_highlighting_for_active_range(self):
-        # TODO: check that cursor is in this range
-        index_parts = self.text.tag_prevrange("command", "end")
-
-        if index_parts:
-            start_index, end_index = index_parts
-            self._highlight(start_index, end_index)
-
-
-def _update_highlighting(event, text_changed, need_update, delay=None):
+def _update_highlighting(event, need_update, delay=None):
     text = event.widget
     if not hasattr(text, "paren_matcher"):
         if isinstance(text, CodeViewText):
@@ -187,15 +216,12 @@ def _update_highlighting(event, text_changed, need_update, delay=None):
         else:
             return
 
-    if text_changed:
-        text.paren_matcher.invalidate_token_cache()
-
     if need_update:
         text.paren_matcher.schedule_update(delay)
 
 
 def update_highlighting_full(event):
-    _update_highlighting(event, True, True)
+    _update_highlighting(event, True)
 
 
 def clear_highlighting(text):
@@ -216,14 +242,14 @@ def update_highlighting_move(event):
     else:
         delay = 300
     _last_move_time = t
-    _update_highlighting(event, False, True, delay=delay)
+    _update_highlighting(event, True, delay=delay)
 
 
 def update_highlighting_edit_cw(event):
     if isinstance(event.text_widget, CodeViewText):
         event.widget = event.text_widget
         trivial = event.get("trivial_for_parens", False)
-        _update_highlighting(event, True, not trivial)
+        _update_highlighting(event, not trivial)
         if trivial:
             event.text_widget.tag_remove("surrounding_parens", "0.1", "end")
 
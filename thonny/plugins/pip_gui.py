@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import itertools
 import json
 import math
 import os
@@ -9,7 +8,6 @@ import sys
 import tkinter as tk
 import tkinter.font as tk_font
 import urllib.error
-import urllib.parse
 from abc import ABC, abstractmethod
 from logging import getLogger
 from os import makedirs
@@ -33,13 +31,8 @@ from thonny.common import (
     running_in_virtual_environment,
 )
 from thonny.languages import tr
-from thonny.misc_utils import (
-    construct_cmd_line,
-    download_and_parse_json,
-    download_bytes,
-    get_menu_char,
-    jaro_similarity,
-)
+from thonny.misc_utils import construct_cmd_line, get_menu_char
+from thonny.package_index import get_package_search_index, get_pypi_client
 from thonny.running import BackendProxy, InlineCommandDialog, get_front_interpreter_for_subprocess
 from thonny.ui_utils import (
     AutoScrollbar,
@@ -839,6 +832,9 @@ class PipFrame(ttk.Frame, ABC):
             self.info_text.direct_insert("end", (info.summary or "<No description>").strip() + "\n")
             # self._append_info_text("\n")
 
+        # user will probably select some of these
+        get_pypi_client().prefetch(info.name for info in results if info.source == "PyPI")
+
     @abstractmethod
     def _should_show_search_result_source(self):
         raise NotImplementedError()
@@ -1131,6 +1127,8 @@ class BackendPipFrame(PipFrame):
             output_prelude=f"{command} {construct_cmd_line(args)}\n",
         )
         ui_utils.show_dialog(dlg)
+        # a process started before the change would not see it
+        get_runner().discard_spare_backend()
 
         return dlg.returncode, dlg.stdout, dlg.stderr
 
@@ -1347,6 +1345,8 @@ class PluginsPipFrame(PipFrame):
             self, prepared_proc=proc, title="pip " + command, long_description=title, autostart=True
         )
         ui_utils.show_dialog(dlg)
+        # backend plug-ins get loaded when the backend starts
+        get_runner().discard_spare_backend()
         return dlg.returncode, dlg.stdout, dlg.stderr
 
     def _append_location_to_info_path(self, path):
@@ -1515,15 +1515,12 @@ class StubsPipFrame(PipFrame):
 def perform_pypi_search(query: str, data_url: str, common_tokens: List[str]) -> List[DistInfo]:
     logger.info("Performing PyPI search for %r", query)
 
-    data = download_bytes(data_url)
-    packages: List[Dict] = json.loads(data)
+    index = get_package_search_index(data_url)
 
     canonical_query = canonicalize_name(query)
-    query_parts = canonical_query.split("-")
-    for package in packages:
-        package["score"] = compute_dist_name_similarity(package["name"], query_parts, common_tokens)
-
-    packages.sort(key=lambda p: p["score"], reverse=True)
+    packages: List[Dict] = [
+        {**package, "score": score} for (score, package) in index.search(query, common_tokens)
+    ]
 
     if not packages or packages[0]["score"] < 1.0:
         # test for exact match
@@ -1545,35 +1542,6 @@ def perform_pypi_search(query: str, data_url: str, common_tokens: List[str]) ->
     ]
 
 
-def compute_dist_name_similarity(
-    name: str, query_parts: List[str], common_tokens: List[str]
-) -> float:
-    name_parts = canonicalize_name(name).split("-")
-
-    for common_token in common_tokens:
-        if common_token in name_parts and common_token not in query_parts:
-            # don't penalize omitting this part
-            name_parts.remove(common_token)
-
-    common_count = min(len(query_parts), len(name_parts))
-    name_perms = list(itertools.permutations(name_parts, common_count))
-    query_perms = list(itertools.permutations(query_parts, common_count))
-
-    if len(name_perms) * len(query_perms) > 36:
-        # 36 corresponds to 3-part name and 3-part query.
-        # More than that would be too much effort. Assume correct order and match sub-lists instead.
-        name_perms = _get_sublists_of_length(name_parts, common_count)
-        query_perms = _get_sublists_of_length(query_parts, common_count)
-
-    best_score = 0
-    for name_perm, query_perm in itertools.product(name_perms, query_perms):
-        score = jaro_similarity("-".join(name_perm), "-".join(query_perm))
-        best_score = max(score, best_score)
-
-    parts_length_penalty = 1.0 - abs(len(query_parts) - len(name_parts)) * 0.05
-    return best_score * parts_length_penalty
-
-
 def download_dist_info_from_pypi(name: str, version: Optional[str]) -> DistInfo:
     # versioned data does not have releases, so need to make 2 downloads
     info = download_dist_data_from_pypi(name, version)["info"]
@@ -1607,16 +1575,8 @@ def try_download_version_list_from_pypi(name: str) -> List[str]:
 
 
 def download_dist_data_from_pypi(name: str, version: Optional[str]) -> Dict:
-    if version is None:
-        url = "https://pypi.org/pypi/{}/json".format(urllib.parse.quote(name))
-    else:
-        url = "https://pypi.org/pypi/{}/{}/json".format(
-            urllib.parse.quote(name), urllib.parse.quote(version)
-        )
-
-    logger.info("Downloading package info (%r, %r) from %s", name, version, url)
-
-    return download_and_parse_json(url)
+    logger.info("Getting package info (%r, %r) from PyPI", name, version)
+    return get_pypi_client().get_project_data(name, version)
 
 
 def _extract_click_text(widget, event, tag):
@@ -1638,8 +1598,7 @@ def export_installed_distributions_info_as_dict() -> Dict[NormalizedName, DistIn
     return {canonicalize_name(d.name): d for d in export_installed_distributions_info()}
 
 
-def _get_sublists_of_length(l: List[Any], n: int) -> List[List[Any]]:
-    return [l[i : i + n] for i in range(len(l) - n + 1)]
+load_lazily = True
 
 
 def load_plugin() -> None:
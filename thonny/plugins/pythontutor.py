@@ -34,6 +34,9 @@ def _can_visualize() -> bool:
     return editor is not None and editor.get_content().strip()
 
 
+load_lazily = True
+
+
 def load_plugin():
     get_workbench().add_command(
         "visualize_in_pythontutor",
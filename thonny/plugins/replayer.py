@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import ast
+import bisect
+import collections
 import datetime
 import os.path
 import re
@@ -10,7 +12,7 @@ from dataclasses import dataclass
 from logging import getLogger
 from pprint import pformat
 from tkinter import messagebox, ttk
-from typing import Any, Callable, Dict, List, Optional, Tuple, cast
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, cast
 
 from thonny import codeview, get_workbench, ui_utils
 from thonny.custom_notebook import CustomNotebook
@@ -25,7 +27,12 @@ from thonny.misc_utils import (
     running_on_mac_os,
     uri_to_long_title,
 )
-from thonny.plugins.event_logging import EventsInputOutputFileError, format_time_range
+from thonny.plugins.event_logging import (
+    EventsInputOutputFileError,
+    IndexedSessionEvents,
+    format_time_range,
+    parse_event_time,
+)
 from thonny.shell import BaseShellText
 from thonny.tktextext import TextFrame, TweakableText
 from thonny.ui_utils import (
@@ -48,6 +55,15 @@ instance: Optional[Replayer] = None
 
 CURRENT_SESSION_MARKER = "__CURRENT_SESSION__"
 
+# A snapshot of the editors and the shell is taken after each CHECKPOINT_INTERVAL events
+# when the replay passes these positions for the first time.
+CHECKPOINT_INTERVAL = 1000
+# Restoring a checkpoint is considered to be about as expensive as replaying this many events
+CHECKPOINT_RESTORE_COST = 100
+
+# (chars, tags) pairs
+TextRuns = Tuple[Tuple[str, Tuple[str, ...]], ...]
+
 
 class Replayer(tk.Toplevel):
     def __init__(self, master):
@@ -56,6 +72,11 @@ class Replayer(tk.Toplevel):
         self.session_start_time: Optional[time.struct_time] = None
         self.session_end_time: Optional[time.struct_time] = None
         self.last_event_index = -1
+        # Events after this index have been applied in order since last reset or restore,
+        # i.e. they have the information required for reverting them
+        self._revertible_from = -1
+        self._checkpoints: Dict[int, ReplayerCheckpoint] = {}
+        self._checkpoint_indices: List[int] = []
         self.loading = False
         self.commands: List[ReplayerCommand] = []
         self._scrubbing_after_id = None
@@ -290,7 +311,9 @@ class Replayer(tk.Toplevel):
             start_time = event_logging.session_start_time
             end_time = time.localtime(time.time())
             # As I'm fixing the end time, I need to also fix the events
-            self.current_session_events = event_logging.session_events.copy()
+            self.current_session_events = event_logging.get_current_session_events(
+                _prepare_event
+            )
 
             start_time_str = format_time_compact(start_time, without_seconds=True)
             end_time_str = format_time_compact(end_time, without_seconds=True)
@@ -300,20 +323,21 @@ class Replayer(tk.Toplevel):
 
         log_dir = get_log_dir()
 
-        filenames = list(reversed(sorted(os.listdir(log_dir))))
+        filenames = [
+            name
+            for name in sorted(os.listdir(log_dir), reverse=True)
+            if name.endswith(".txt") or name.endswith(".jsonl") or name.endswith(".jsonl.gz")
+        ]
 
         # Need to know how many sessions were started at the same minute
-        all_minute_prefixes = [name[:16] for name in filenames]
+        minute_prefix_counts = collections.Counter(name[:16] for name in filenames)
 
         for name in filenames:
-            if not (name.endswith(".txt") or name.endswith(".jsonl") or name.endswith(".jsonl.gz")):
-                continue
-
             full_path = os.path.join(log_dir, name)
 
             try:
                 minute_prefix = name[:16]
-                without_seconds = all_minute_prefixes.count(minute_prefix) == 1
+                without_seconds = minute_prefix_counts[minute_prefix] == 1
                 start_time, end_time = parse_file_name(name)
                 # need mktime, because the tuples may have different value in dst field, which makes them unequal
                 if event_logging.session_start_time is not None and time.mktime(
@@ -339,7 +363,7 @@ class Replayer(tk.Toplevel):
         return mapping
 
     def select_session_from_combobox(self, event: Optional[tk.Event] = None) -> None:
-        from thonny.plugins.event_logging import load_events_from_file
+        from thonny.plugins.event_logging import open_session_events
 
         session_path, start_time, end_time = self.session_combo.get_selected_value()
         logger.info("Selected session %r", session_path)
@@ -353,7 +377,7 @@ class Replayer(tk.Toplevel):
         elif session_path == CURRENT_SESSION_MARKER:
             events = self.current_session_events
         elif os.path.isfile(session_path):
-            events = load_events_from_file(session_path)
+            events = open_session_events(session_path, _prepare_event)
         else:
             raise RuntimeError("File does not exist: " + str(session_path))
 
@@ -361,21 +385,43 @@ class Replayer(tk.Toplevel):
         self.session_end_time = end_time
         self.load_session(events)
 
-    def load_session(self, events: List[Dict]) -> None:
+    def load_session(self, events: Sequence[Dict]) -> None:
         logger.info("Loading session with %d events", len(events))
         self.loading = True
+        try:
+            if isinstance(events, IndexedSessionEvents):
+                # Indexed logs are written in current format and events get prepared on demand
+                self.events = events
+                start_time, end_time = events.start_time, events.end_time
+            else:
+                self.events = self._prepare_event_list(events)
+                start_time = self.events[0]["_epoch_time"]
+                end_time = self.events[-1]["_epoch_time"]
+
+            self.reset_session()
+            self.scrubber.config(state="normal")
+            for cmd in self.commands:
+                cmd.button.configure(state="normal")
+
+            self.scrubber.config(from_=start_time, to=end_time)
+            self.select_event(0)
+            self.scrubber.focus_set()
+        finally:
+            self.loading = False
+
+    def _prepare_event_list(self, events: Sequence[Dict]) -> List[Dict]:
         # Need a fixed copy. The source list can be appended to, and we want to tweak things.
-        self.events = events.copy()
+        events = list(events)
 
         # Generate InsertEditorToNotebook events for old format logs
-        for event in self.events:
+        for event in events:
             if event["sequence"] == "InsertEditorToNotebook":
                 break
         else:
-            for i in reversed(range(0, len(self.events) - 1)):
-                event = self.events[i]
+            for i in reversed(range(0, len(events) - 1)):
+                event = events[i]
                 if event["sequence"] == "EditorTextCreated":
-                    self.events.insert(
+                    events.insert(
                         i + 1,
                         {
                             "sequence": "InsertEditorToNotebook",
@@ -388,18 +434,18 @@ class Replayer(tk.Toplevel):
                     )
 
         # Generate ToplevelResponse events for old format logs
-        for event in self.events:
+        for event in events:
             if event["sequence"] == "ToplevelResponse":
                 break
         else:
-            for i in reversed(range(0, len(self.events) - 1)):
-                event = self.events[i]
+            for i in reversed(range(0, len(events) - 1)):
+                event = events[i]
                 if (
                     event["sequence"] == "TextInsert"
                     and event["text"] == ">>> "
                     and "prompt" in event["tags"]
                 ):
-                    self.events.insert(
+                    events.insert(
                         i + 1,
                         {
                             "event_type": "ToplevelResponse",
@@ -409,32 +455,11 @@ class Replayer(tk.Toplevel):
                         },
                     )
 
-        try:
-            for event in self.events:
-                event_time_str = event["time"]
-                if len(event_time_str) == 19:
-                    # 0 fraction may have been skipped
-                    event_time_str += ".0"
-                event_time = datetime.datetime.strptime(event_time_str, "%Y-%m-%dT%H:%M:%S.%f")
-                # yes, I'm modifying the argument. I'll live with this hack.
-                event["_epoch_time"] = event_time.timestamp()
-
-                if "filename" in event and "uri" not in event:
-                    event["uri"] = legacy_filename_to_uri(event["filename"])
-
-            self.reset_session()
-            self.scrubber.config(state="normal")
-            for cmd in self.commands:
-                cmd.button.configure(state="normal")
+        for event in events:
+            # yes, I'm modifying the argument. I'll live with this hack.
+            _prepare_event(event)
 
-            self.scrubber.config(
-                from_=self.events[0]["_epoch_time"], to=self.events[-1]["_epoch_time"]
-            )
-            # need to apply all events in order to record reversion information
-            self.select_event(len(self.events) - 1)
-            self.scrubber.focus_set()
-        finally:
-            self.loading = False
+        return events
 
     def can_select_event(self) -> bool:
         return True
@@ -474,6 +499,14 @@ class Replayer(tk.Toplevel):
         self.select_event(self.last_event_index + 1)
 
     def find_closest_index(self, target_timestamp: float, start_index: int, end_index: int) -> int:
+        if (
+            isinstance(self.events, IndexedSessionEvents)
+            and start_index == 0
+            and end_index == len(self.events) - 1
+        ):
+            # avoid decompressing blocks on the way
+            start_index, end_index = self.events.get_index_range_for_time(target_timestamp)
+
         if start_index == end_index:
             return start_index
 
@@ -515,17 +548,65 @@ class Replayer(tk.Toplevel):
             self._selecting_event = False
 
     def process_events_towards(self, index):
-        if index > self.last_event_index:
-            # replay all events between last replayed event up to and including this event
-            while self.last_event_index < index:
-                self.process_event(self.events[self.last_event_index + 1], reverse=False)
-                self.last_event_index += 1
+        if index == self.last_event_index:
+            return
 
-        elif index < self.last_event_index:
+        checkpoint_index = self._checkpoint_indices[
+            bisect.bisect_right(self._checkpoint_indices, index) - 1
+        ]
+        restore_cost = index - checkpoint_index + CHECKPOINT_RESTORE_COST
+
+        if index > self.last_event_index:
+            if (
+                checkpoint_index > self.last_event_index
+                and restore_cost < index - self.last_event_index
+            ):
+                self.restore_checkpoint(checkpoint_index)
+        elif (
+            index < self._revertible_from
+            or restore_cost < self.last_event_index - index
+            or not self._can_revert_to(index)
+        ):
+            self.restore_checkpoint(checkpoint_index)
+        else:
             # undo events up to and including the event following the desired event
             while self.last_event_index > index:
                 self.process_event(self.events[self.last_event_index], reverse=True)
                 self.last_event_index -= 1
+            return
+
+        # replay all events between last replayed event up to and including this event
+        while self.last_event_index < index:
+            event = self.events[self.last_event_index + 1]
+            self.process_event(event, reverse=False)
+            event["_applied"] = True
+            self.last_event_index += 1
+            if (
+                self.last_event_index % CHECKPOINT_INTERVAL == CHECKPOINT_INTERVAL - 1
+                and self.last_event_index not in self._checkpoints
+            ):
+                self.create_checkpoint()
+
+    def _can_revert_to(self, index: int) -> bool:
+        # Lazily loaded events lose their reversion information when they are evicted
+        return all(
+            "_applied" in self.events[i] for i in range(index + 1, self.last_event_index + 1)
+        )
+
+    def create_checkpoint(self) -> None:
+        self._checkpoints[self.last_event_index] = ReplayerCheckpoint(
+            editors=self.editor_notebook.export_state(),
+            shell=self.shell.export_state(),
+        )
+        bisect.insort(self._checkpoint_indices, self.last_event_index)
+
+    def restore_checkpoint(self, index: int) -> None:
+        logger.debug("Restoring checkpoint %d", index)
+        checkpoint = self._checkpoints[index]
+        self.editor_notebook.restore_state(checkpoint.editors)
+        self.shell.restore_state(checkpoint.shell)
+        self.last_event_index = index
+        self._revertible_from = index
 
     def update_title(self, event=None):
         session_label = self.session_combo.get()
@@ -569,6 +650,11 @@ class Replayer(tk.Toplevel):
         self.shell.clear()
         self.editor_notebook.clear()
         self.last_event_index = -1
+        self._revertible_from = -1
+        self._checkpoints = {}
+        self._checkpoint_indices = []
+        # the state before the first event
+        self.create_checkpoint()
 
     def on_scrub(self, value):
         if self.loading or self._selecting_event:
@@ -760,6 +846,18 @@ class ReplayerEditor(BaseEditor):
         self._uri = None
         self._code_view.text.edit_modified(False)
 
+    def export_state(self) -> ReplayerEditorState:
+        return ReplayerEditorState(
+            text=_export_text_state(self._code_view.text),
+            uri=self._uri,
+            modified=bool(self._code_view.text.edit_modified()),
+        )
+
+    def restore_state(self, state: ReplayerEditorState) -> None:
+        _restore_text_state(self._code_view.text, state.text)
+        self._uri = state.uri
+        self._code_view.text.edit_modified(state.modified)
+
     def complete_select_event(self):
         _see_last_change_in_text(self.get_text_widget())
         self.get_code_view().update_gutter()
@@ -769,16 +867,69 @@ class ReplayerEditorNotebook(CustomNotebook):
     def __init__(self, master):
         CustomNotebook.__init__(self, master, closable=False)
         self._editors_by_text_widget_id = {}
+        # Editors which don't exist at the restored checkpoint. They are reused when the
+        # replay reaches their creation again, so that the editor references stored in
+        # the events remain valid.
+        self._spare_editors_by_text_widget_id = {}
         self.bind("<<NotebookTabChanged>>", self.on_tab_changed, True)
 
     def clear(self):
         for child in self.winfo_children():
             self.forget(child)
-            child.destroy()
 
         assert self.current_page is None
 
+        for editor in self._editors_by_text_widget_id.values():
+            editor.destroy()
+        for editor in self._spare_editors_by_text_widget_id.values():
+            editor.destroy()
+
         self._editors_by_text_widget_id = {}
+        self._spare_editors_by_text_widget_id = {}
+
+    def _create_editor(self, text_widget_id) -> ReplayerEditor:
+        editor = self._spare_editors_by_text_widget_id.pop(text_widget_id, None)
+        if editor is None:
+            editor = ReplayerEditor(self)
+        self._editors_by_text_widget_id[text_widget_id] = editor
+        return editor
+
+    def export_state(self) -> ReplayerNotebookState:
+        ids_by_editor = {
+            editor: text_widget_id
+            for text_widget_id, editor in self._editors_by_text_widget_id.items()
+        }
+        current_child = self.get_current_child()
+        return ReplayerNotebookState(
+            editors={
+                text_widget_id: editor.export_state()
+                for text_widget_id, editor in self._editors_by_text_widget_id.items()
+            },
+            tab_order=[ids_by_editor[page.content] for page in self.pages],
+            selected=None if current_child is None else ids_by_editor[current_child],
+        )
+
+    def restore_state(self, state: ReplayerNotebookState) -> None:
+        all_editors = {**self._spare_editors_by_text_widget_id, **self._editors_by_text_widget_id}
+        self._editors_by_text_widget_id = {}
+        self._spare_editors_by_text_widget_id = {}
+        for text_widget_id, editor in all_editors.items():
+            if text_widget_id in state.editors:
+                editor.restore_state(state.editors[text_widget_id])
+                self._editors_by_text_widget_id[text_widget_id] = editor
+            else:
+                editor.restore_state(_INITIAL_EDITOR_STATE)
+                self._spare_editors_by_text_widget_id[text_widget_id] = editor
+
+        target_children = [self._editors_by_text_widget_id[key] for key in state.tab_order]
+        if [page.content for page in self.pages] != target_children:
+            for page in list(self.pages):
+                self.forget(page.content)
+            for editor in target_children:
+                self.insert("end", editor, text=editor.get_title())
+
+        if state.selected is not None:
+            self.select(self._editors_by_text_widget_id[state.selected])
 
     def get_editor_for_event(self, event) -> Optional[ReplayerEditor]:
         text_widget_id = event.get("text_widget_id", None)
@@ -788,16 +939,13 @@ class ReplayerEditorNotebook(CustomNotebook):
             return self._editors_by_text_widget_id[text_widget_id]
 
         if "editor_id" in event or "Editor" in event["sequence"]:
-            editor = ReplayerEditor(self)
-            self._editors_by_text_widget_id[text_widget_id] = editor
-            return editor
+            return self._create_editor(text_widget_id)
 
         return None
 
     def get_editor_by_text_widget_id(self, text_widget_id) -> Optional[ReplayerEditor]:
         if text_widget_id not in self._editors_by_text_widget_id:
-            editor = ReplayerEditor(self)
-            self._editors_by_text_widget_id[text_widget_id] = editor
+            self._create_editor(text_widget_id)
 
         return self._editors_by_text_widget_id[text_widget_id]
 
@@ -886,6 +1034,12 @@ class ShellFrame(ttk.Frame):
     def clear(self):
         self.text.direct_delete("1.0", "end")
 
+    def export_state(self) -> ReplayerTextState:
+        return _export_text_state(self.text)
+
+    def restore_state(self, state: ReplayerTextState) -> None:
+        _restore_text_state(self.text, state)
+
     def is_shell_event(self, event) -> bool:
         return (
             event.get("text_widget_context", None) == "shell"
@@ -920,6 +1074,49 @@ class ReplayerCommand:
     tester: Callable
 
 
+@dataclass(frozen=True)
+class ReplayerTextState:
+    runs: TextRuns
+    last_event_indices: Optional[List[str]]
+    # for detecting unchanged texts, which can share the runs with previous checkpoint
+    edit_count: int = -1
+
+
+@dataclass(frozen=True)
+class ReplayerEditorState:
+    text: ReplayerTextState
+    uri: Optional[str]
+    modified: bool
+
+
+@dataclass(frozen=True)
+class ReplayerNotebookState:
+    editors: Dict[Any, ReplayerEditorState]
+    tab_order: List[Any]
+    selected: Optional[Any]
+
+
+@dataclass(frozen=True)
+class ReplayerCheckpoint:
+    editors: ReplayerNotebookState
+    shell: ReplayerTextState
+
+
+_INITIAL_EDITOR_STATE = ReplayerEditorState(
+    text=ReplayerTextState(runs=(), last_event_indices=None),
+    uri=PLACEHOLDER_URI,
+    modified=False,
+)
+
+
+def _prepare_event(event: Dict) -> None:
+    if "_epoch_time" not in event:
+        event["_epoch_time"] = parse_event_time(event)
+
+    if "filename" in event and "uri" not in event:
+        event["uri"] = legacy_filename_to_uri(event["filename"])
+
+
 def _see_last_change_in_text(text: TweakableText) -> None:
     last_event_indices = getattr(text, "last_event_indices", None)
     if last_event_indices is None or len(last_event_indices) == 0:
@@ -977,6 +1174,51 @@ def _revert_event_on_text(event: Dict, text: TweakableText) -> None:
             text.last_change_indices = []
 
 
+def _export_text_state(text: TweakableText) -> ReplayerTextState:
+    last_event_indices = getattr(text, "last_event_indices", None)
+    previous_state: Optional[ReplayerTextState] = getattr(text, "last_exported_state", None)
+    if previous_state is not None and previous_state.edit_count == text.get_edit_count():
+        runs = previous_state.runs
+    else:
+        runs = []
+        active_tags = []
+        for key, value, _ in text.dump("1.0", "end-1c", text=True, tag=True):
+            if key == "text":
+                tags = tuple(active_tags)
+                if runs and runs[-1][1] == tags:
+                    runs[-1] = (runs[-1][0] + value, tags)
+                else:
+                    runs.append((value, tags))
+            elif value == "sel":
+                continue
+            elif key == "tagon":
+                active_tags.append(value)
+            elif key == "tagoff" and value in active_tags:
+                active_tags.remove(value)
+        runs = tuple(runs)
+
+    state = ReplayerTextState(
+        runs=runs,
+        last_event_indices=None if last_event_indices is None else list(last_event_indices),
+        edit_count=text.get_edit_count(),
+    )
+    text.last_exported_state = state
+    return state
+
+
+def _restore_text_state(text: TweakableText, state: ReplayerTextState) -> None:
+    text.direct_delete("1.0", "end")
+    for chars, tags in state.runs:
+        text.direct_insert("end", chars, tags)
+
+    text.last_event_indices = state.last_event_indices
+    text.last_exported_state = ReplayerTextState(
+        runs=state.runs,
+        last_event_indices=state.last_event_indices,
+        edit_count=text.get_edit_count(),
+    )
+
+
 def _export_text_range_with_tags(text: tk.Text, index1: str, index2: str) -> List[Dict]:
     # If this approach brings some problems then consider using Text.dump
     # logger.debug("Exporting %r to %r", index1, index2)
@@ -1021,6 +1263,9 @@ def open_replayer(session_filename: Optional[str] = None):
         instance.open_file(session_filename)
 
 
+load_lazily = True
+
+
 def load_plugin() -> None:
     get_workbench().set_default("tools.replayer_last_browser_folder", os.path.expanduser("~/"))
     get_workbench().set_default("replayer.show_event_details", False)
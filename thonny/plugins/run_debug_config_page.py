@@ -51,6 +51,14 @@ class RunDebugConfigurationPage(ConfigurationPage):
             tr("Allow stepping into libraries (ie. outside of main script directory)"),
             tooltip=tr("May make debugging slower."),
         )
+        add_option_combobox(
+            self,
+            "debugger.history_memory_limit",
+            tr("Memory for stepping back (MB)"),
+            choices=[64, 128, 256, 512, 1024],
+            width=8,
+            tooltip=tr("Oldest steps get forgotten when the nicer debugger exceeds this limit."),
+        )
 
         add_vertical_separator(self)
 
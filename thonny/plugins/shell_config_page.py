@@ -32,6 +32,12 @@ class ShellConfigurationPage(ConfigurationPage):
             choices=[100, 500, 1000, 5000, 10000, 50000, 100000],
         )
 
+        add_option_checkbox(
+            self,
+            "shell.scrollback_to_disk",
+            tr("Keep older lines in a temporary file (loaded back when scrolling up)"),
+        )
+
         add_option_combobox(
             self,
             "shell.squeeze_threshold",
@@ -7,10 +7,12 @@ http://rkeene.org/projects/tcl/tk.fossil/tkthistory/2954673
 import os.path
 from logging import getLogger
 from tkinter import font
+from typing import Dict, List, Tuple
 
 import thonny
 from thonny import get_workbench
 from thonny.codeview import get_syntax_options_for_tag
+from thonny.parse_service import get_parse_service
 
 logger = getLogger(__name__)
 
@@ -146,18 +148,16 @@ def clear_tags(text):
                 text.tag_remove("%s_%s_%s" % (pos, top, bottom), "1.0", "end")
 
 
-def add_tags(text):
-    source = text.get("1.0", "end")
-    clear_tags(text)
-    tree = ...  # TODO
+def find_statement_tag_ranges(module) -> List[Tuple[str, str, str]]:
+    """Returns (tag, start index, end index) triples for statements of parso module"""
+    from parso.python import tree as python_tree
 
-    print_tree(tree)
+    result = []
     last_line = 0
     last_col = 0
 
     def tag_tree(node):
         nonlocal last_line, last_col
-        from parso.python import tree as python_tree
 
         if node.type == "simple_stmt" or isinstance(node, (python_tree.Flow, python_tree.Scope)):
             start_line, start_col = node.start_pos
@@ -170,12 +170,9 @@ def add_tags(text):
                 for i in range(last_line + 1, start_line):
                     # NB! tag not visible when logically empty line
                     # doesn't have indent prefix
-                    text.tag_add(
-                        "ver_False_False", "%d.%d" % (i, last_col - 1), "%d.%d" % (i, last_col)
+                    result.append(
+                        ("ver_False_False", "%d.%d" % (i, last_col - 1), "%d.%d" % (i, last_col))
                     )
-                    print("ver_False_False", "%d.%d" % (i, last_col - 1), "%d.%d" % (i, last_col))
-
-            print(node)
 
             # usually end_col is 0
             # exceptions: several statements on the same line (semicoloned statements)
@@ -186,31 +183,24 @@ def add_tags(text):
 
                 # horizontal line (only for first or last line)
                 if top or bottom:
-                    text.tag_add(
-                        "hor_%s_%s" % (top, bottom),
-                        "%d.%d" % (lineno, start_col),
-                        "%d.%d" % (lineno + 1 if end_col == 0 else lineno, 0),
-                    )
-
-                    print(
-                        "hor_%s_%s" % (top, bottom),
-                        "%d.%d" % (lineno, start_col),
-                        "%d.%d" % (lineno + 1, 0),
+                    result.append(
+                        (
+                            "hor_%s_%s" % (top, bottom),
+                            "%d.%d" % (lineno, start_col),
+                            "%d.%d" % (lineno + 1 if end_col == 0 else lineno, 0),
+                        )
                     )
 
                 # vertical line (only for indented statements)
                 # Note that I'm using start col for all lines
                 # (statement's indent shouldn't decrease in continuation lines)
                 if start_col > 0:
-                    text.tag_add(
-                        "ver_%s_%s" % (top, bottom),
-                        "%d.%d" % (lineno, start_col - 1),
-                        "%d.%d" % (lineno, start_col),
-                    )
-                    print(
-                        "ver_%s_%s" % (top, bottom),
-                        "%d.%d" % (lineno, start_col - 1),
-                        "%d.%d" % (lineno, start_col),
+                    result.append(
+                        (
+                            "ver_%s_%s" % (top, bottom),
+                            "%d.%d" % (lineno, start_col - 1),
+                            "%d.%d" % (lineno, start_col),
+                        )
                     )
 
                     last_line = lineno
@@ -221,7 +211,25 @@ def add_tags(text):
             for child in node.children:
                 tag_tree(child)
 
-    tag_tree(tree)
+    tag_tree(module)
+    return result
+
+
+def add_tags(text):
+    # tags get added when the analysis of current text is ready
+    get_parse_service(text).request(
+        "statement_tags", find_statement_tag_ranges, lambda ranges: _apply_tags(text, ranges)
+    )
+
+
+def _apply_tags(text, ranges: List[Tuple[str, str, str]]) -> None:
+    clear_tags(text)
+    indices_by_tag: Dict[str, List[str]] = {}
+    for tag, start_index, end_index in ranges:
+        indices_by_tag.setdefault(tag, []).extend((start_index, end_index))
+
+    for tag, indices in indices_by_tag.items():
+        text.tag_add(tag, *indices)
 
 
 def handle_editor_event(event):
@@ -137,5 +137,8 @@ class TodoView(ui_utils.TreeFrame):
                 editor.select_line(line_no)
 
 
+load_lazily = True
+
+
 def load_plugin() -> None:
     get_workbench().add_view(TodoView, tr("TODO"), "s")
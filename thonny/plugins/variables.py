@@ -74,7 +74,6 @@ class VariablesView(VariablesFrame):
 
     def show_globals(self, globals_, module_name, is_active=True):
         self.clear_error()
-        # TODO: update only if something has changed
         self.update_variables(globals_)
 
         if self.containing_notebook is not None:
@@ -91,7 +90,6 @@ class VariablesView(VariablesFrame):
         self._update_back_button(not is_active)
 
     def show_frame_variables(self, locals_, globals_, freevars, frame_name, is_active=True):
-        # TODO: update only if something has changed
         actual_locals = {}
         nonlocals = {}
         for name in locals_:
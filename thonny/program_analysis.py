@@ -1,15 +1,22 @@
+import hashlib
+import os.path
 import shlex
 import subprocess
+import threading
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from enum import Enum
 from logging import getLogger
-from typing import Dict, List, Optional, cast
+from typing import Dict, List, Optional, Tuple, cast
 
 from thonny import get_workbench
 
 logger = getLogger(__name__)
 
+MAX_CACHED_ANALYSIS_RESULTS = 50
+
 
 class ProgramAnalyzerResponseItemType(Enum):
     ERROR = "error"
@@ -46,6 +53,18 @@ class ProgramAnalyzer(ABC):
         Called in UI thread. Analyzer must be ready for next analysis before returning.
         """
 
+    def get_config_key(self, main_file: str) -> Optional[str]:
+        """
+        Called in UI thread. Results of analyses with same config key and same file contents
+        can be reused. None means the results must not be reused.
+        """
+        return None
+
+    def close(self) -> None:
+        """
+        Called in UI thread when Thonny is closing.
+        """
+
 
 class SubprocessProgramAnalyzer(ProgramAnalyzer, ABC):
     def __init__(self):
@@ -58,12 +77,17 @@ class SubprocessProgramAnalyzer(ProgramAnalyzer, ABC):
         results = []
 
         self.start_subprocess(main_file)
-        for line in self._proc.stdout:
+        proc = self._proc
+        for line in proc.stdout:
             item = self.parse_output_line(line)
             if item is not None:
                 results.append(item)
 
-        err = cast(str, self._proc.stderr.read().strip())
+        err = cast(str, proc.stderr.read().strip())
+        if self._proc is not proc:
+            # cancelled
+            return
+
         if err:
             results.append(
                 ProgramAnalyzerResponseItem(
@@ -83,6 +107,9 @@ class SubprocessProgramAnalyzer(ProgramAnalyzer, ABC):
     def get_results(self) -> Optional[List[ProgramAnalyzerResponseItem]]:
         return self._results
 
+    def get_config_key(self, main_file: str) -> Optional[str]:
+        return shlex.join(self.get_command_line(main_file)) + repr(sorted(self.get_env().items()))
+
     @abstractmethod
     def parse_output_line(self, line: str) -> Optional[ProgramAnalyzerResponseItem]: ...
 
@@ -113,3 +140,150 @@ class SubprocessProgramAnalyzer(ProgramAnalyzer, ABC):
 
     def get_env(self) -> Dict[str, str]:
         return {}
+
+
+class ProgramAnalysisRunner:
+    """
+    Runs enabled analyzers in parallel (each analyzer in its own worker thread) and
+    remembers their results for the contents of the analyzed files.
+    """
+
+    def __init__(self, max_cached_results: int = MAX_CACHED_ANALYSIS_RESULTS):
+        self._max_cached_results = max_cached_results
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._cache: "OrderedDict[Tuple[str, str, str], List[ProgramAnalyzerResponseItem]]" = (
+            OrderedDict()
+        )
+        self._results: Dict[str, Optional[List[ProgramAnalyzerResponseItem]]] = {}
+        self._running: Dict[str, ProgramAnalyzer] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def start_analysis(self, main_file: str) -> None:
+        """Called in UI thread"""
+        self.cancel()
+        generation = self._generation
+        files_key = get_program_files_fingerprint(main_file)
+
+        for name, analyzer in get_workbench().program_analyzers.items():
+            if not get_workbench().get_option(f"analysis.{name}.enabled"):
+                continue
+
+            try:
+                config_key = analyzer.get_config_key(main_file)
+            except Exception:
+                logger.exception("Could not get config key for %s", name)
+                config_key = None
+            key = None if config_key is None else (name, config_key, files_key)
+            with self._lock:
+                cached_results = self._cache.get(key)
+                if cached_results is not None:
+                    self._cache.move_to_end(key)
+                self._results[name] = cached_results
+
+            if cached_results is not None:
+                logger.info("Reusing %s results for %r", name, main_file)
+                get_workbench().queue_event(
+                    "ProgramAnalysisCompleted",
+                    event=dict(analyzer_class=type(analyzer).__name__, from_cache=True),
+                )
+            else:
+                if name not in self._executors:
+                    self._executors[name] = ThreadPoolExecutor(
+                        max_workers=1, thread_name_prefix="ProgramAnalyzer-" + name
+                    )
+                self._executors[name].submit(
+                    self._analyze, name, analyzer, main_file, key, generation
+                )
+
+    def get_results(self, name: str) -> Optional[List[ProgramAnalyzerResponseItem]]:
+        """Called in UI thread"""
+        with self._lock:
+            results = self._results.get(name)
+
+        if results is None and name in get_workbench().program_analyzers:
+            return get_workbench().program_analyzers[name].get_results()
+
+        return results
+
+    def cancel(self) -> None:
+        """Called in UI thread"""
+        with self._lock:
+            self._generation += 1
+            running = list(self._running.values())
+
+        for analyzer in running:
+            analyzer.cancel()
+
+    def close(self) -> None:
+        """Called in UI thread"""
+        self.cancel()
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors.clear()
+
+        for analyzer in get_workbench().program_analyzers.values():
+            try:
+                analyzer.close()
+            except Exception:
+                logger.exception("Could not close %r", analyzer)
+
+    def _analyze(
+        self,
+        name: str,
+        analyzer: ProgramAnalyzer,
+        main_file: str,
+        key: Optional[Tuple[str, str, str]],
+        generation: int,
+    ) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._running[name] = analyzer
+
+        try:
+            analyzer.analyze(main_file)
+            results = analyzer.get_results()
+            # files may have been changed during analysis
+            files_key = get_program_files_fingerprint(main_file)
+        except Exception:
+            logger.exception("Error when running %s", name)
+            return
+        finally:
+            with self._lock:
+                self._running.pop(name, None)
+
+        with self._lock:
+            if results is None:
+                return
+
+            if key is not None and key[2] == files_key:
+                self._cache[key] = results
+                self._cache.move_to_end(key)
+                while len(self._cache) > self._max_cached_results:
+                    self._cache.popitem(last=False)
+
+            if generation == self._generation:
+                self._results[name] = results
+
+
+def get_program_files_fingerprint(main_file: str) -> str:
+    """Hashes the contents of the main file and the user modules it imports"""
+    from thonny.assistance import _get_imported_user_files
+
+    digest = hashlib.sha256()
+    try:
+        imported_files = _get_imported_user_files(main_file)
+    except Exception:
+        logger.exception("Could not find imported files of %r", main_file)
+        imported_files = []
+
+    for path in [main_file] + sorted(imported_files):
+        digest.update(os.path.normcase(os.path.abspath(path)).encode("utf-8") + b"\0")
+        try:
+            with open(path, "rb") as fp:
+                digest.update(hashlib.sha256(fp.read()).digest())
+        except OSError:
+            digest.update(b"missing")
+
+    return digest.hexdigest()
@@ -39,8 +39,12 @@ from thonny import (
     report_time,
 )
 from thonny.common import (
+    BINARY_MESSAGE_FORMAT,
+    BINARY_MESSAGE_MARKER,
     INTERNAL_ERROR_STATUS_CODE,
+    MESSAGE_FORMAT_ENV_VAR,
     PROCESS_ACK,
+    TEXT_MESSAGE_FORMAT,
     BackendEvent,
     CommandToBackend,
     DebuggerCommand,
@@ -54,6 +58,7 @@ from thonny.common import (
     ToplevelCommand,
     ToplevelResponse,
     UserError,
+    VariablesDeltaDecoder,
     is_same_path,
     parse_message,
     path_startswith,
@@ -100,11 +105,27 @@ OSC_TERMINATOR = re.compile(r"\a|\x1B\\")
 TERMINATION_TIMEOUT = 2
 TERMINATION_POLL_INTERVAL = 0.02
 
+# How long to wait after starting a backend process before starting a spare one (ms)
+SPARE_BACKEND_DELAY = 1000
+
+# How long the GUI thread may spend on processing backend messages before it lets Tk
+# update the screen and handle user events
+MESSAGE_BATCH_TIME_BUDGET = 0.03
+# Polling interval when reader threads can wake up the GUI thread (only catches the cases
+# not announced by a wakeup, eg. process termination without EOF)
+MESSAGE_FALLBACK_POLL_INTERVAL = 250
+# Polling interval when wakeups are not supported (Windows)
+MESSAGE_POLL_INTERVAL = 20
+# Reader threads block when GUI thread lags this many messages behind
+MESSAGE_QUEUE_MAX_SIZE = 100
+
 # other components may turn it on in order to avoid grouping output lines into one event
 io_animation_required = False
 
 _console_allocated = False
 
+_spare_backend_process: Optional["SpareBackendProcess"] = None
+
 BASE_MODULES = [
     "_abc",
     "_codecs",
@@ -145,12 +166,19 @@ class Runner:
         get_workbench().set_default("run.allow_running_unnamed_programs", True)
         get_workbench().set_default("run.auto_cd", True)
         get_workbench().set_default("run.warn_module_shadowing", True)
+        # Format of the messages sent by the backend. The frontend always understands both and
+        # starts sending binary commands only after it has seen a binary message from the backend.
+        get_workbench().set_default("run.message_format", BINARY_MESSAGE_FORMAT)
+        # Keep an initialized backend process ready for next Run or Stop/Restart
+        get_workbench().set_default("run.prewarm_backend", True)
 
         self._init_commands()
         self._state = "starting"
         self._proxy: Optional[BackendProxy] = None
         self._publishing_events = False
         self._polling_after_id = None
+        self._message_wakeup: Optional[MessageWakeup] = None
+        self._pulling_messages = False
         self._postponed_commands = []  # type: List[CommandToBackend]
         self._thread_commands = queue.Queue()
         self._thread_command_results = {}
@@ -159,6 +187,7 @@ class Runner:
 
     def start(self) -> None:
         global _console_allocated
+        self._message_wakeup = MessageWakeup(get_workbench(), self._on_message_wakeup)
         try:
             self._check_alloc_console()
             _console_allocated = True
@@ -314,6 +343,9 @@ class Runner:
         # Attach extra info
         if "debug" in cmd.name.lower():
             cmd["breakpoints"] = get_current_breakpoints()
+            cmd["history_memory_limit"] = get_workbench().get_option(
+                "debugger.history_memory_limit", 256
+            )
 
         if "id" not in cmd:
             cmd["id"] = generate_command_id()
@@ -377,6 +409,8 @@ class Runner:
         proxy_at_start = self._proxy
 
         self._thread_commands.put(cmd)
+        # the commands are sent by the message pump
+        self.wake_up_message_pump()
 
         while time.time() - start_time < timeout:
             if self._proxy is not proxy_at_start:
@@ -698,39 +732,68 @@ class Runner:
         proxy = self.get_backend_proxy()
         return proxy and proxy.is_connected()
 
+    def wake_up_message_pump(self) -> None:
+        """Can be called from any thread after putting a message into proxy's queue"""
+        if self._message_wakeup is not None:
+            self._message_wakeup.notify()
+
+    def _on_message_wakeup(self) -> None:
+        if self._pulling_messages or self._proxy is None:
+            # the ongoing batch or the one scheduled after it will see the new messages
+            return
+
+        self._poll_backend_messages()
+
+    def _schedule_message_polling(self, delay: Optional[int]) -> None:
+        if self._polling_after_id is not None:
+            get_workbench().after_cancel(self._polling_after_id)
+
+        if delay is None:
+            self._polling_after_id = get_workbench().after_idle(self._poll_backend_messages)
+        else:
+            self._polling_after_id = get_workbench().after(delay, self._poll_backend_messages)
+
     def _poll_backend_messages(self) -> None:
-        """I chose polling instead of event_generate in listener thread,
+        """Called when a reader thread has signalled new messages and, as a fallback, periodically.
+
+        Reader threads don't call event_generate themselves,
         because event_generate across threads is not reliable
         http://www.thecodingforums.com/threads/more-on-tk-event_generate-and-threads.359615/
         """
-        self._polling_after_id = None
-        if self._pull_backend_messages() is False:
+        if self._polling_after_id is not None:
+            get_workbench().after_cancel(self._polling_after_id)
+            self._polling_after_id = None
+
+        if self._pull_backend_messages() is False or self._proxy is None:
             return
 
         if self._proxy.has_next_message():
             # Some events didn't fit into this batch. Start the next batch as soon as possible
-            self._polling_after_id = get_workbench().after_idle(self._poll_backend_messages)
+            self._schedule_message_polling(None)
+        elif self._message_wakeup is not None and self._message_wakeup.is_supported():
+            self._schedule_message_polling(MESSAGE_FALLBACK_POLL_INTERVAL)
         else:
-            # take it easy
-            self._polling_after_id = get_workbench().after(
-                20, lambda: get_workbench().after_idle(self._poll_backend_messages)
-            )
+            self._schedule_message_polling(MESSAGE_POLL_INTERVAL)
 
     def _pull_backend_messages(self):
-        # Don't process too many messages in single batch, allow screen updates
+        self._pulling_messages = True
+        try:
+            return self._pull_backend_messages_within_budget()
+        finally:
+            self._pulling_messages = False
+
+    def _pull_backend_messages_within_budget(self):
+        # Don't spend too much time in single batch, allow screen updates
         # and user actions between batches.
         # Mostly relevant when backend prints a lot quickly.
         # TODO: Should I leave new messages (caused by processing this batch) for next batch?
-        msg_count = 0
-        max_msg_count = 10
-        while self._proxy is not None and msg_count < max_msg_count:
+        deadline = time.perf_counter() + MESSAGE_BATCH_TIME_BUDGET
+        while self._proxy is not None and time.perf_counter() < deadline:
             try:
                 msg = self._proxy.fetch_next_message()
                 if not msg:
                     break
                 logger.debug("RUNNER GOT: %s in state: %s", msg.event_type, self.get_state())
-
-                msg_count += 1
             except BackendTerminatedError as exc:
                 logger.info("Backend terminated with code: %r", exc.returncode)
                 self._handle_backend_termination(exc.returncode)
@@ -822,6 +885,10 @@ class Runner:
         self._proxy = None
         logger.info("Starting backend %r", backend_class)
         self._proxy = backend_class(clean)
+        if not (
+            isinstance(self._proxy, SubprocessProxy) and self._proxy.can_use_spare_process()
+        ):
+            discard_spare_backend_process()
 
         if not first:
             get_shell().restart(automatic=automatic, was_running=was_running)
@@ -829,7 +896,7 @@ class Runner:
 
         get_workbench().event_generate("BackendRestart", full=True)
 
-        get_workbench().after_idle(self._poll_backend_messages)
+        self._schedule_message_polling(None)
 
     def destroy_backend(self, for_restart: bool = False) -> None:
         logger.info("Destroying backend")
@@ -844,6 +911,9 @@ class Runner:
             self._proxy = None
             get_workbench().event_generate("BackendTerminated")
 
+    def discard_spare_backend(self) -> None:
+        discard_spare_backend_process()
+
     def get_backend_proxy(self) -> "BackendProxy":
         return self._proxy
 
@@ -933,6 +1003,201 @@ class Runner:
             return self._proxy.is_connected()
 
 
+class SpareBackendProcess:
+    """
+    Backend process started in advance, so that it has completed its initialization
+    by the time a proxy needs a new process with the same launch arguments.
+    Its first messages wait in the pipe until the proxy starts reading them.
+    """
+
+    def __init__(self, cmd_line: List[str], popen_kwargs: Dict[str, Any], conditions: Any = None):
+        self._cmd_line = cmd_line
+        self._popen_kwargs = popen_kwargs
+        self._conditions = conditions
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._proc: Optional[subprocess.Popen] = None
+        self._stdout_line: Optional[str] = None
+        self._discarded = False
+        Thread(target=self._start, daemon=True).start()
+
+    def _start(self) -> None:
+        try:
+            proc = subprocess.Popen(self._cmd_line, **self._popen_kwargs)
+            # read success acknowledgement
+            stdout_line = proc.stdout.readline().strip("\r\n")
+        except Exception:
+            logger.exception("Could not start spare backend process")
+            self._ready.set()
+            return
+
+        with self._lock:
+            discarded = self._discarded
+            if not discarded:
+                self._proc = proc
+                self._stdout_line = stdout_line
+
+        self._ready.set()
+        if discarded:
+            self._kill(proc)
+
+    def matches(
+        self, cmd_line: List[str], popen_kwargs: Dict[str, Any], conditions: Any = None
+    ) -> bool:
+        return (
+            cmd_line == self._cmd_line
+            and popen_kwargs == self._popen_kwargs
+            and conditions == self._conditions
+        )
+
+    def take(self) -> Optional[Tuple[subprocess.Popen, str]]:
+        """Returns the process and its acknowledgement line or None if it is not usable"""
+        # a process which is still starting up is closer to the prompt than a new one
+        self._ready.wait()
+        with self._lock:
+            proc, self._proc = self._proc, None
+
+        if proc is None:
+            return None
+
+        if proc.poll() is not None or self._stdout_line != PROCESS_ACK:
+            logger.warning("Spare backend process is not usable (got %r)", self._stdout_line)
+            self._kill(proc)
+            return None
+
+        return proc, self._stdout_line
+
+    def discard(self) -> None:
+        with self._lock:
+            self._discarded = True
+            proc, self._proc = self._proc, None
+
+        if proc is not None:
+            self._kill(proc)
+
+    def _kill(self, proc: subprocess.Popen) -> None:
+        # the process hasn't run any user code, so there is nothing to clean up
+        proc.kill()
+        proc.wait()
+        for stream in [proc.stdin, proc.stdout, proc.stderr]:
+            stream.close()
+
+
+def discard_spare_backend_process() -> None:
+    global _spare_backend_process
+    if _spare_backend_process is not None:
+        _spare_backend_process.discard()
+        _spare_backend_process = None
+
+
+class MessageWakeup:
+    """Lets reader threads wake up the GUI thread when new backend messages are available.
+
+    Writing a byte into a pipe, which is registered as Tk file handler, makes Tk call the
+    callback in the GUI thread. Tk doesn't support file handlers on Windows, so there
+    the Runner needs to keep polling.
+    """
+
+    def __init__(self, tk_root: tk.Misc, callback: Callable[[], None]):
+        self._callback = callback
+        self._pending = False
+        self._read_fd = None
+        self._write_fd = None
+
+        if running_on_windows():
+            return
+
+        try:
+            read_fd, write_fd = os.pipe()
+            os.set_blocking(read_fd, False)
+            os.set_blocking(write_fd, False)
+            tk_root.tk.createfilehandler(read_fd, tk.READABLE, self._on_readable)
+        except (AttributeError, OSError, tk.TclError):
+            logger.warning("Could not set up message wakeup, will poll instead", exc_info=True)
+            return
+
+        self._read_fd = read_fd
+        self._write_fd = write_fd
+
+    def is_supported(self) -> bool:
+        return self._write_fd is not None
+
+    def notify(self) -> None:
+        # One pending byte is enough. Flag gets reset before the callback drains the queue,
+        # so a message put after that will cause a new wakeup.
+        if self._write_fd is None or self._pending:
+            return
+
+        self._pending = True
+        try:
+            os.write(self._write_fd, b"\0")
+        except BlockingIOError:
+            pass  # pipe is full of wakeups already
+
+    def _on_readable(self, fd, mask) -> None:
+        try:
+            os.read(fd, 4096)
+        except BlockingIOError:
+            pass
+        self._pending = False
+        self._callback()
+
+
+class BackendMessageQueue:
+    """Bounded queue between reader threads and the GUI thread.
+
+    Producers block when the queue is full, which also stops them from reading the backend's
+    output and thus slows down the backend instead of the GUI.
+    """
+
+    def __init__(self, max_size: int, on_put: Callable[[], None]):
+        self._items: collections.deque = collections.deque()
+        self._max_size = max_size
+        self._on_put = on_put
+        self._not_full = threading.Condition()
+        self._closed = False
+
+    def put(self, msg: MessageFromBackend) -> None:
+        with self._not_full:
+            while len(self._items) >= self._max_size and not self._closed:
+                self._not_full.wait()
+
+            if self._closed:
+                return
+
+            self._items.append(msg)
+
+        self._on_put()
+
+    def put_back(self, msg: MessageFromBackend) -> None:
+        """Meant for the consumer, which has taken more than it needed"""
+        with self._not_full:
+            self._items.appendleft(msg)
+
+    def get_nowait(self) -> Optional[MessageFromBackend]:
+        with self._not_full:
+            if not self._items:
+                return None
+            msg = self._items.popleft()
+            self._not_full.notify()
+            return msg
+
+    def close(self) -> None:
+        """Releases blocked producers and makes further puts no-ops"""
+        with self._not_full:
+            self._closed = True
+            self._not_full.notify_all()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def _wake_up_message_pump() -> None:
+    runner = get_runner()
+    if runner is not None:
+        runner.wake_up_message_pump()
+
+
 class BackendProxy(ABC):
     """Communicates with backend process.
 
@@ -1195,7 +1460,10 @@ class SubprocessProxy(BackendProxy, ABC):
         self._reported_executable = None
         self._gui_update_loop_id = None
         self._in_venv = None
+        self._command_message_format = TEXT_MESSAGE_FORMAT
         self._cwd = self._get_initial_cwd()  # pylint: disable=assignment-from-none
+        self._launch_time = None
+        self._spare_preparation_id = None
         self._start_background_process(clean=clean)
         self._have_check_remembered_current_configuration = False
 
@@ -1258,6 +1526,7 @@ class SubprocessProxy(BackendProxy, ABC):
 
         env["THONNY_LANGUAGE"] = get_workbench().get_option("general.language")
         env["THONNY_VERSION"] = get_version()
+        env[MESSAGE_FORMAT_ENV_VAR] = get_workbench().get_option("run.message_format")
 
         if thonny.in_debug_mode():
             env["THONNY_DEBUG"] = "1"
@@ -1276,14 +1545,58 @@ class SubprocessProxy(BackendProxy, ABC):
         ]
 
     def _start_background_process(self, clean=None, extra_args=[]):
-        # deque, because in one occasion I need to put messages back
         logger.info("Starting background process, clean: %r, extra_args: %r", clean, extra_args)
-        self._response_queue = collections.deque()
+        if self._response_queue is not None:
+            self._response_queue.close()
+        self._response_queue = BackendMessageQueue(MESSAGE_QUEUE_MAX_SIZE, _wake_up_message_pump)
+        # new process needs to prove again that it understands binary messages
+        self._command_message_format = TEXT_MESSAGE_FORMAT
 
         exe_validation_error = self.get_mgmt_executable_validation_error()
         if exe_validation_error:
             raise RuntimeError(exe_validation_error)
 
+        self._launch_time = time.perf_counter()
+        cmd_line, popen_kwargs = self._get_launch_spec(extra_args)
+        logger.info("Starting the backend: %s %s", cmd_line, get_workbench().get_local_cwd())
+
+        spare_process = self._take_spare_process(cmd_line, popen_kwargs)
+        if spare_process is not None:
+            logger.info("Using spare backend process")
+            self._proc, stdout_line = spare_process
+        else:
+            self._proc = subprocess.Popen(cmd_line, **popen_kwargs)
+
+            # read success acknowledgement
+            stdout_line = self._proc.stdout.readline().strip("\r\n")
+
+        # only attempt initial input if process started nicely,
+        # otherwise can't read the error from stderr
+        if stdout_line == PROCESS_ACK:
+            # setup asynchronous output listeners
+            Thread(target=self._listen_stdout, args=(self._proc.stdout,), daemon=True).start()
+            Thread(target=self._listen_stderr, args=(self._proc.stderr,), daemon=True).start()
+
+            self._send_initial_input()
+
+            if self.can_use_spare_process():
+                self._spare_preparation_id = get_workbench().after(
+                    SPARE_BACKEND_DELAY, lambda: self._prepare_spare_process(extra_args)
+                )
+        else:
+
+            return_code = self._proc.poll()
+            if return_code is not None:
+                err = self._proc.stderr.read()
+                if err:
+                    get_shell().print_error(err)
+
+            raise RuntimeError(
+                f"Could not start back-end process, got {stdout_line!r} instead of {PROCESS_ACK!r}"
+            )
+
+    def _get_launch_spec(self, extra_args: List[str]) -> Tuple[List[str], Dict[str, Any]]:
+        """Returns the command line and keyword arguments for subprocess.Popen"""
         cmd_line = (
             [self._mgmt_executable]
             + self.get_mgmt_executable_special_switches()
@@ -1299,10 +1612,7 @@ class SubprocessProxy(BackendProxy, ABC):
         if running_on_windows():
             creationflags = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
 
-        logger.info("Starting the backend: %s %s", cmd_line, get_workbench().get_local_cwd())
-
-        self._proc = subprocess.Popen(
-            cmd_line,
+        return cmd_line, dict(
             executable=cmd_line[0],
             bufsize=0,
             stdin=subprocess.PIPE,
@@ -1315,28 +1625,50 @@ class SubprocessProxy(BackendProxy, ABC):
             encoding="utf-8",
         )
 
-        # read success acknowledgement
-        stdout_line = self._proc.stdout.readline().strip("\r\n")
+    def can_use_spare_process(self) -> bool:
+        """Says whether the next backend process may be started in advance.
+        Requires that a fresh process only depends on its launch arguments
+        and doesn't do anything visible before receiving the first command."""
+        return False
 
-        # only attempt initial input if process started nicely,
-        # otherwise can't read the error from stderr
-        if stdout_line == PROCESS_ACK:
-            # setup asynchronous output listeners
-            Thread(target=self._listen_stdout, args=(self._proc.stdout,), daemon=True).start()
-            Thread(target=self._listen_stderr, args=(self._proc.stderr,), daemon=True).start()
+    def get_spare_process_conditions(self) -> Any:
+        """State of the environment (besides launch arguments) which a spare process
+        must have been started in, in order to be usable"""
+        return None
 
-            self._send_initial_input()
-        else:
+    def _take_spare_process(
+        self, cmd_line: List[str], popen_kwargs: Dict[str, Any]
+    ) -> Optional[Tuple[subprocess.Popen, str]]:
+        global _spare_backend_process
+        spare = _spare_backend_process
+        if spare is None:
+            return None
 
-            return_code = self._proc.poll()
-            if return_code is not None:
-                err = self._proc.stderr.read()
-                if err:
-                    get_shell().print_error(err)
+        _spare_backend_process = None
+        if not self.can_use_spare_process() or not spare.matches(
+            cmd_line, popen_kwargs, self.get_spare_process_conditions()
+        ):
+            logger.info("Discarding spare backend process with different configuration")
+            spare.discard()
+            return None
 
-            raise RuntimeError(
-                f"Could not start back-end process, got {stdout_line!r} instead of {PROCESS_ACK!r}"
-            )
+        return spare.take()
+
+    def _prepare_spare_process(self, extra_args: List[str]) -> None:
+        global _spare_backend_process
+        self._spare_preparation_id = None
+        if not self.can_use_spare_process() or not self.process_is_alive():
+            return
+
+        cmd_line, popen_kwargs = self._get_launch_spec(extra_args)
+        conditions = self.get_spare_process_conditions()
+        if _spare_backend_process is not None:
+            if _spare_backend_process.matches(cmd_line, popen_kwargs, conditions):
+                return
+            _spare_backend_process.discard()
+
+        logger.info("Starting spare backend process")
+        _spare_backend_process = SpareBackendProcess(cmd_line, popen_kwargs, conditions)
 
     def get_mgmt_executable_validation_error(self) -> Optional[str]:
         if not os.path.isfile(self._mgmt_executable):
@@ -1377,7 +1709,9 @@ class SubprocessProxy(BackendProxy, ABC):
             return
 
         try:
-            self._proc.stdin.write(serialize_message(msg) + "\n")
+            self._proc.stdin.write(
+                serialize_message(msg, message_format=self._command_message_format) + "\n"
+            )
             self._proc.stdin.flush()
         except BrokenPipeError:
             import traceback
@@ -1411,6 +1745,10 @@ class SubprocessProxy(BackendProxy, ABC):
         self._close_backend()
 
     def _close_backend(self):
+        if self._spare_preparation_id is not None:
+            get_workbench().after_cancel(self._spare_preparation_id)
+            self._spare_preparation_id = None
+
         if self._proc is not None and self._proc.poll() is None:
             logger.info("Trying to terminate backend process")
             self._proc.terminate()
@@ -1427,6 +1765,8 @@ class SubprocessProxy(BackendProxy, ABC):
                 self._proc.kill()
 
         self._proc = None
+        if self._response_queue is not None:
+            self._response_queue.close()
         self._response_queue = None
 
     def _listen_stdout(self, stdout):
@@ -1434,9 +1774,22 @@ class SubprocessProxy(BackendProxy, ABC):
 
         # allow self._response_queue to be replaced while processing
         message_queue = self._response_queue
+        # the state of the delta encoding belongs to this backend process
+        variables_decoder = VariablesDeltaDecoder()
+        launch_time = self._launch_time
 
         def publish_as_msg(data):
+            nonlocal launch_time
             msg = parse_message(data)
+            variables_decoder.decode_message(msg)
+            if launch_time is not None and isinstance(msg, ToplevelResponse):
+                logger.info(
+                    "Backend reached the prompt in %.3f s", time.perf_counter() - launch_time
+                )
+                launch_time = None
+            if data.startswith(BINARY_MESSAGE_MARKER):
+                # the backend has proven that it understands binary messages
+                self._command_message_format = BINARY_MESSAGE_FORMAT
             if "cwd" in msg:
                 self.cwd = msg["cwd"]
 
@@ -1445,13 +1798,8 @@ class SubprocessProxy(BackendProxy, ABC):
                 # (Yes, wrongly interleaved stdout and stderr are also ugly, but misplaced prompt is more)
                 sleep(0.01)
 
-            message_queue.append(msg)
-
-            if len(message_queue) > 10:
-                # Probably backend runs an infinite/long print loop.
-                # Throttle message throughput in order to keep GUI thread responsive.
-                while len(message_queue) > 0:
-                    sleep(0.005)
+            # Blocks when GUI thread lags behind
+            message_queue.put(msg)
 
         while True:
             try:
@@ -1464,6 +1812,8 @@ class SubprocessProxy(BackendProxy, ABC):
             # debug("... read some stdout data", repr(data))
             if data == "":
                 logger.info("Reader got EOF")
+                # let the GUI thread notice the termination
+                _wake_up_message_pump()
                 break
             else:
                 try:
@@ -1477,7 +1827,7 @@ class SubprocessProxy(BackendProxy, ABC):
                     parts = data.rsplit(common.MESSAGE_MARKER, maxsplit=1)
 
                     # print first part as it is
-                    message_queue.append(
+                    message_queue.put(
                         BackendEvent("ProgramOutput", data=parts[0], stream_name="stdout")
                     )
 
@@ -1487,22 +1837,21 @@ class SubprocessProxy(BackendProxy, ABC):
                             publish_as_msg(second_part)
                         except Exception:
                             # just print ...
-                            message_queue.append(
+                            message_queue.put(
                                 BackendEvent(
                                     "ProgramOutput", data=second_part, stream_name="stdout"
                                 )
                             )
 
     def _listen_stderr(self, stderr):
+        message_queue = self._response_queue
         while True:
             data = read_one_incoming_message_str(stderr.readline)
             if data == "":
                 logger.info("Reached end of STDERR")
                 break
             else:
-                self._response_queue.append(
-                    BackendEvent("ProgramOutput", stream_name="stderr", data=data)
-                )
+                message_queue.put(BackendEvent("ProgramOutput", stream_name="stderr", data=data))
                 logger.error("STDERR: %r", data)
 
     def _store_state_info(self, msg):
@@ -1632,7 +1981,7 @@ class SubprocessProxy(BackendProxy, ABC):
             else:
                 return None
 
-        msg = self._response_queue.popleft()
+        msg = self._response_queue.get_nowait()
         if isinstance(msg, ToplevelResponse):
             self._store_state_info(msg)
             if not self._have_check_remembered_current_configuration:
@@ -1655,7 +2004,7 @@ class SubprocessProxy(BackendProxy, ABC):
                     else:
                         return msg
                 else:
-                    next_msg = self._response_queue.popleft()
+                    next_msg = self._response_queue.get_nowait()
                     if (
                         next_msg.event_type == "ProgramOutput"
                         and next_msg["stream_name"] == msg["stream_name"]
@@ -1668,7 +2017,7 @@ class SubprocessProxy(BackendProxy, ABC):
                         msg["data"] += next_msg["data"]
                     else:
                         # not to be sent in the same block, put it back
-                        self._response_queue.appendleft(next_msg)
+                        self._response_queue.put_back(next_msg)
                         return msg
 
         else:
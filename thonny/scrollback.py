@@ -0,0 +1,125 @@
+"""
+Disk-backed storage for the shell lines which don't fit into the Text widget.
+
+Every line is stored as one record in an append-only temporary file. A record consists
+of the JSON-encoded tag ranges and embedded objects of the line, a NUL and the UTF-8 text
+of the line (without the line break and the embedded objects). The file is read through
+mmap and the records are located via an in-memory offset index, which works as a stack:
+lines get pushed when the shell discards old content and popped when the user scrolls
+back up. Records are never modified, but the space of popped records gets reused by later
+pushes.
+"""
+
+import json
+import mmap
+import tempfile
+from array import array
+from logging import getLogger
+from typing import List, Optional, Tuple
+
+logger = getLogger(__name__)
+
+# (start column, end column, tag names)
+TagRange = Tuple[int, int, Tuple[str, ...]]
+# (column, kind, content), eg. (3, "squeezed", "<long text>") or (0, "image", "<base64 data>")
+EmbeddedObject = Tuple[int, str, str]
+ScrollbackLine = Tuple[str, List[TagRange], List[EmbeddedObject]]
+
+_SEPARATOR = b"\0"
+
+
+class ScrollbackStore:
+    def __init__(self, directory: Optional[str] = None):
+        self._fp = tempfile.TemporaryFile(
+            mode="w+b", prefix="thonny-scrollback-", dir=directory, buffering=0
+        )
+        self._file_size = 0
+        # start offsets of the records, plus the end offset of the last record
+        self._offsets = array("Q", [0])
+        self._mmap: Optional[mmap.mmap] = None
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def push_lines(self, lines: List[ScrollbackLine]) -> None:
+        if not lines:
+            return
+
+        self._fp.seek(self._file_size)
+        chunks = []
+        offset = self._file_size
+        del self._offsets[-1]
+        for text, tag_ranges, embedded_objects in lines:
+            record = (
+                json.dumps([tag_ranges, embedded_objects], separators=(",", ":")).encode("utf-8")
+                + _SEPARATOR
+                + text.encode("utf-8", errors="surrogatepass")
+            )
+            chunks.append(record)
+            self._offsets.append(offset)
+            offset += len(record)
+
+        self._offsets.append(offset)
+        self._fp.write(b"".join(chunks))
+        self._file_size = offset
+
+    def pop_lines(self, count: int) -> List[ScrollbackLine]:
+        """Removes and returns up to `count` most recent lines (in their original order)"""
+        count = min(count, len(self))
+        if count == 0:
+            return []
+
+        first = len(self) - count
+        result = [self._read_line(i) for i in range(first, len(self))]
+        del self._offsets[first + 1 :]
+        # next push overwrites the popped records
+        self._file_size = self._offsets[-1]
+        return result
+
+    def find_last(self, needle: str, case_sensitive: bool = True) -> Optional[int]:
+        """Returns the number of the last line containing `needle`"""
+        if not case_sensitive:
+            needle = needle.casefold()
+
+        for i in range(len(self) - 1, -1, -1):
+            text = self._read_text(i)
+            if not case_sensitive:
+                text = text.casefold()
+            if needle in text:
+                return i
+
+        return None
+
+    def clear(self) -> None:
+        del self._offsets[1:]
+        self._offsets[0] = 0
+        self._file_size = 0
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._fp.close()
+
+    def _get_record(self, i: int) -> bytes:
+        start = self._offsets[i]
+        end = self._offsets[i + 1]
+        if self._mmap is None or len(self._mmap) < end:
+            # the file has grown since the last mapping
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap[start:end]
+
+    def _read_line(self, i: int) -> ScrollbackLine:
+        meta_part, text_part = self._get_record(i).split(_SEPARATOR, maxsplit=1)
+        tag_ranges, embedded_objects = json.loads(meta_part)
+        return (
+            text_part.decode("utf-8", errors="surrogatepass"),
+            [(start, end, tuple(tags)) for start, end, tags in tag_ranges],
+            [(col, kind, content) for col, kind, content in embedded_objects],
+        )
+
+    def _read_text(self, i: int) -> str:
+        record = self._get_record(i)
+        return record[record.index(_SEPARATOR) + 1 :].decode("utf-8", errors="surrogatepass")
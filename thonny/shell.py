@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import collections
 import os.path
 import pathlib
 import re
@@ -32,21 +33,20 @@ from thonny.common import (
     ToplevelResponse,
 )
 from thonny.custom_notebook import CustomNotebook
+from thonny.document_mirror import DocumentMirror, tk_counts_utf16_code_units, utf16_len
 from thonny.languages import tr
 from thonny.lsp_proxy import LanguageServerProxy
 from thonny.lsp_types import (
     DidChangeTextDocumentParams,
     DidCloseTextDocumentParams,
     DidOpenTextDocumentParams,
-    Position,
-    Range,
-    RangedTextDocumentContentChangeEvent,
     TextDocumentIdentifier,
     TextDocumentItem,
     VersionedTextDocumentIdentifier,
 )
 from thonny.misc_utils import construct_cmd_line, parse_cmd_line
 from thonny.running import EDITOR_CONTENT_TOKEN
+from thonny.scrollback import ScrollbackLine, ScrollbackStore
 from thonny.tktextext import TextFrame, TweakableText, index2line
 from thonny.ui_utils import (
     CommonDialog,
@@ -87,6 +87,12 @@ SIMPLE_URL_SPLIT_REGEX = re.compile(
 )
 
 INT_REGEX = re.compile(r"\d+")
+
+SCROLLBACK_PAGE_LINES = 100
+# Rewindable IO history is dropped in pieces of this fraction of shell.max_rewindable_io_chars
+IO_REWIND_SEGMENTS = 8
+# tags which are not worth keeping in scrollback
+_TRANSIENT_TAGS = {"sel", "found", "current_found"}
 ANSI_COLOR_NAMES = {
     "0": "black",
     "1": "red",
@@ -139,6 +145,10 @@ class ShellView(tk.PanedWindow):
         get_workbench().set_default("shell.auto_inspect_values", True)
         get_workbench().set_default("shell.clear_for_new_process", True)
         get_workbench().set_default("shell.io_tab_width", 8)
+        # How many characters of IO the debugger can step back over
+        get_workbench().set_default("shell.max_rewindable_io_chars", 1_000_000)
+        # Whether lines discarded because of max_lines are kept in a file and can be scrolled back to
+        get_workbench().set_default("shell.scrollback_to_disk", False)
 
         self.text = ShellText(
             main_frame,
@@ -299,6 +309,8 @@ class ShellView(tk.PanedWindow):
     def set_scrollbar(self, *args):
         self.vert_scrollbar.set(*args)
         self.update_plotter()
+        if float(args[0]) == 0.0:
+            self.text.schedule_loading_scrollback()
 
     def text_deleted(self, event):
         if event.text_widget == self.text:
@@ -379,13 +391,26 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
         self._last_ls_cwd: str = get_workbench().get_local_cwd()
         self._last_ls_uri: Optional[lsp_types.URI] = None
         self._last_ls_version: Optional[int] = None
+        # the content known to the language server
+        self._ls_document: Optional[DocumentMirror] = None
         self._context_lines_for_language_server: List[str] = []
         self._session_num_executed_lines_sent_to_ls: int = 0
 
         # logs of IO events for current toplevel block
         # (enables undoing and redoing the events)
-        self._applied_io_events = []
-        self._queued_io_events = []
+        self._applied_io_events = collections.deque()
+        self._queued_io_events = collections.deque()
+        # number of IO characters applied in current toplevel block
+        self._applied_io_char_count = 0
+        # Rewinding goes back to the oldest checkpoint (at "io_rewind_start") and replays
+        # applied events from there. Later checkpoints divide the events into segments, which
+        # get dropped one by one when the events exceed shell.max_rewindable_io_chars.
+        self._io_rewind_base_char_count = 0
+        self._io_rewind_base_state = None
+        # (mark name, char count, rendering state, number of events in the preceding segment)
+        self._io_rewind_checkpoints = collections.deque()
+        self._io_events_after_last_checkpoint = 0
+        self._io_checkpoint_counter = 0
         self._images = set()
 
         self._ansi_foreground = None
@@ -398,6 +423,9 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
         self._ansi_strikethrough = False
         self._io_cursor_offset = 0
         self._squeeze_buttons = set()
+        # lines discarded from the top of the widget (when shell.scrollback_to_disk is on)
+        self._scrollback: Optional[ScrollbackStore] = None
+        self._scrollback_loading_scheduled = False
 
         self.update_tty_mode()
 
@@ -460,6 +488,9 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
         self.mark_set("command_io_start", "1.0")
         self.mark_gravity("command_io_start", "left")
 
+        self.mark_set("io_rewind_start", "1.0")
+        self.mark_gravity("io_rewind_start", "left")
+
         self.active_extra_tags = []
 
         self.update_tab_stops()
@@ -503,7 +534,7 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
         self._ensure_visible()
         self._append_to_io_queue(msg.data, msg.stream_name)
 
-        if not self._applied_io_events:
+        if self._applied_io_char_count == 0:
             # this is first line of io, add padding below command line
             self.tag_add("before_io", "output_insert -1 line linestart")
 
@@ -569,31 +600,137 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
                     if block:
                         self._queued_io_events.append((block, stream_name))
 
+    def _reset_io_log(self):
+        self._applied_io_events.clear()
+        self._queued_io_events.clear()
+        self._applied_io_char_count = 0
+        # the debugger may ask for stepping back to any point since program start
+        self._set_io_rewind_checkpoint()
+
+    def _set_io_rewind_checkpoint(self):
+        """Forgets applied events. Rewinding can't go further back than current state."""
+        self._applied_io_events.clear()
+        self._forget_later_io_rewind_checkpoints()
+        self._io_rewind_base_char_count = self._applied_io_char_count
+        self._io_rewind_base_state = self._get_io_rendering_state()
+        self.mark_set("io_rewind_start", "output_insert")
+
+    def _forget_later_io_rewind_checkpoints(self):
+        for mark_name, *_ in self._io_rewind_checkpoints:
+            self.mark_unset(mark_name)
+        self._io_rewind_checkpoints.clear()
+        self._io_events_after_last_checkpoint = 0
+
+    def _record_applied_io_event(self, data, stream_name):
+        self._applied_io_char_count += len(data)
+        self._applied_io_events.append((data, stream_name))
+        self._io_events_after_last_checkpoint += 1
+
+        max_chars = get_workbench().get_option("shell.max_rewindable_io_chars")
+        if self._io_rewind_checkpoints:
+            last_checkpoint_char_count = self._io_rewind_checkpoints[-1][1]
+        else:
+            last_checkpoint_char_count = self._io_rewind_base_char_count
+        if self._applied_io_char_count - last_checkpoint_char_count >= max(
+            max_chars // IO_REWIND_SEGMENTS, 1
+        ):
+            self._add_io_rewind_checkpoint()
+
+        # Keep memory bounded. Stepping back will restore the output of the oldest
+        # remaining checkpoint instead of an earlier one.
+        while (
+            self._applied_io_char_count - self._io_rewind_base_char_count > max_chars
+            and self._io_rewind_checkpoints
+        ):
+            self._drop_oldest_io_segment()
+
+    def _add_io_rewind_checkpoint(self):
+        self._io_checkpoint_counter += 1
+        mark_name = "io_rewind_checkpoint_%d" % self._io_checkpoint_counter
+        self.mark_set(mark_name, "output_insert")
+        self.mark_gravity(mark_name, "left")
+        self._io_rewind_checkpoints.append(
+            (
+                mark_name,
+                self._applied_io_char_count,
+                self._get_io_rendering_state(),
+                self._io_events_after_last_checkpoint,
+            )
+        )
+        self._io_events_after_last_checkpoint = 0
+
+    def _drop_oldest_io_segment(self):
+        mark_name, char_count, state, event_count = self._io_rewind_checkpoints.popleft()
+        for _ in range(event_count):
+            self._applied_io_events.popleft()
+        self._io_rewind_base_char_count = char_count
+        self._io_rewind_base_state = state
+        self.mark_set("io_rewind_start", mark_name)
+        self.mark_unset(mark_name)
+
+    def _get_io_rendering_state(self):
+        return (
+            self._ansi_foreground,
+            self._ansi_background,
+            self._ansi_inverse,
+            self._ansi_intensity,
+            self._ansi_italic,
+            self._ansi_underline,
+            self._ansi_conceal,
+            self._ansi_strikethrough,
+            self._io_cursor_offset,
+            self.active_extra_tags.copy(),
+        )
+
+    def _set_io_rendering_state(self, state):
+        (
+            self._ansi_foreground,
+            self._ansi_background,
+            self._ansi_inverse,
+            self._ansi_intensity,
+            self._ansi_italic,
+            self._ansi_underline,
+            self._ansi_conceal,
+            self._ansi_strikethrough,
+            self._io_cursor_offset,
+            active_extra_tags,
+        ) = state
+        self.active_extra_tags = active_extra_tags.copy()
+
     def _update_visible_io(self, target_num_visible_chars):
         was_scrolled_to_end = self.is_scrolled_to_end()
-        current_num_visible_chars = sum(map(lambda x: len(x[0]), self._applied_io_events))
+        current_num_visible_chars = self._applied_io_char_count
 
         if (
             target_num_visible_chars is not None
             and target_num_visible_chars < current_num_visible_chars
         ):
+            # Events before last checkpoint are not available anymore
+            target_num_visible_chars = max(
+                target_num_visible_chars, self._io_rewind_base_char_count
+            )
+
             # hard to undo complex renderings (squeezed texts and ANSI codes)
-            # easier to clean everything and start again
-            self._queued_io_events = self._applied_io_events + self._queued_io_events
-            self._applied_io_events = []
-            self.direct_delete("command_io_start", "output_end")
-            current_num_visible_chars = 0
-            self._reset_ansi_attributes()
+            # easier to clean everything since last checkpoint and start again
+            self._queued_io_events.extendleft(reversed(self._applied_io_events))
+            self._applied_io_events.clear()
+            # replaying creates the checkpoints again
+            self._forget_later_io_rewind_checkpoints()
+            self.direct_delete("io_rewind_start", "output_end")
+            self._applied_io_char_count = current_num_visible_chars = (
+                self._io_rewind_base_char_count
+            )
+            self._set_io_rendering_state(self._io_rewind_base_state)
 
         while self._queued_io_events and current_num_visible_chars != target_num_visible_chars:
-            data, stream_name = self._queued_io_events.pop(0)
+            data, stream_name = self._queued_io_events.popleft()
 
             if target_num_visible_chars is not None:
                 leftover_count = current_num_visible_chars + len(data) - target_num_visible_chars
 
                 if leftover_count > 0:
                     # add suffix to the queue
-                    self._queued_io_events.insert(0, (data[-leftover_count:], stream_name))
+                    self._queued_io_events.appendleft((data[-leftover_count:], stream_name))
                     data = data[:-leftover_count]
 
             self._apply_io_event(data, stream_name)
@@ -672,22 +809,7 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
                 and not (data.startswith(OBJECT_LINK_START))
             ):
                 self._io_cursor_offset = 0  # ignore the effect of preceding \r and \b
-                actual_text = data
-                button_text = actual_text[:70] + " …"
-                btn = tk.Label(
-                    self,
-                    text=button_text,
-                    # width=len(button_text),
-                    cursor="arrow",
-                    borderwidth=2,
-                    relief="raised",
-                    font="IOFont",
-                )
-                btn.bind("<1>", lambda e: self._show_squeezed_text(btn), True)
-                btn.contained_text = actual_text
-                btn.tags = tags
-                self._squeeze_buttons.add(btn)
-                create_tooltip(btn, "%d characters squeezed. " % len(data) + "Click for details.")
+                btn = self._create_squeeze_button(data, tags)
 
                 # TODO: refactor
                 # (currently copied from insert_text_directly)
@@ -735,7 +857,30 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
                 # if any data is still left, then this should be output normally
                 self._insert_text_directly(data, tuple(tags))
 
-        self._applied_io_events.append((original_data, stream_name))
+        self._record_applied_io_event(original_data, stream_name)
+
+    def _create_squeeze_button(self, text, tags) -> tk.Label:
+        button_text = text[:70] + " …"
+        btn = tk.Label(
+            self,
+            text=button_text,
+            # width=len(button_text),
+            cursor="arrow",
+            borderwidth=2,
+            relief="raised",
+            font="IOFont",
+        )
+        btn.bind("<1>", lambda e: self._show_squeezed_text(btn), True)
+        btn.contained_text = text
+        btn.tags = tags
+        self._squeeze_buttons.add(btn)
+        create_tooltip(btn, "%d characters squeezed. " % len(text) + "Click for details.")
+        return btn
+
+    def _create_image(self, data: str) -> tk.PhotoImage:
+        img = tk.PhotoImage(data=data)
+        self._images.add(img)  # to avoid it being gc-d
+        return img
 
     def _show_squeezed_text(self, button):
         dlg = SqueezedTextDialog(self, button)
@@ -990,6 +1135,8 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
             and not was_running
         ):
             self._clear_content("end")
+            if self._scrollback is not None:
+                self._scrollback.clear()
         else:
             if (
                 "restart_line" in self.tag_names("output_insert -2 chars")
@@ -1009,6 +1156,7 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
 
         self._last_ls_uri = None
         self._last_ls_version = None
+        self._ls_document = None
         self._context_lines_for_language_server = []
         self._session_num_executed_lines_sent_to_ls = 0
 
@@ -1031,7 +1179,7 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
             EnhancedTextWithLogging.intercept_insert(self, index, chars, tags)
 
             if not get_runner().is_waiting_toplevel_command():
-                if not self._applied_io_events:
+                if self._applied_io_char_count == 0:
                     # tag preceding command line differently
                     self.tag_add("before_io", "input_start -1 lines linestart")
 
@@ -1133,8 +1281,7 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
                         token = ";base64,"
                         data = part[part.index(token) + len(token) :]
                         try:
-                            img = tk.PhotoImage(data=data)
-                            self._images.add(img)  # to avoit it being gc-d"""
+                            img = self._create_image(data)
                             self.image_create("output_insert", image=img)
                             for tag in tags:
                                 self.tag_add(tag, "output_insert -1 chars")
@@ -1373,8 +1520,7 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
                 self.mark_set("command_io_start", "output_insert")
                 self.mark_gravity("command_io_start", "left")
                 # discard old io events
-                self._applied_io_events = []
-                self._queued_io_events = []
+                self._reset_io_log()
             except Exception:
                 get_workbench().report_exception()
                 self._insert_prompt()
@@ -1385,7 +1531,7 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
             assert get_runner().is_running()
             get_runner().send_program_input(text_to_be_submitted)
             get_workbench().event_generate("ShellInput", input_text=text_to_be_submitted)
-            self._applied_io_events.append((text_to_be_submitted, "stdin"))
+            self._record_applied_io_event(text_to_be_submitted, "stdin")
 
     def _arrow_up(self, event):
         if not get_runner().is_waiting_toplevel_command():
@@ -1475,6 +1621,8 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
     def _clear_shell(self):
         end_index = self.index("output_end")
         self._clear_content(end_index)
+        if self._scrollback is not None:
+            self._scrollback.clear()
 
     def _on_backend_terminated(self, event=None):
         logger.info("BaseShellText._on_backend_terminated")
@@ -1579,8 +1727,144 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
         if not next_prompt:
             pass  # TODO: disable stepping back
 
+        if get_workbench().get_option("shell.scrollback_to_disk"):
+            if self._scrollback is None:
+                self._scrollback = ScrollbackStore()
+            self._scrollback.push_lines(self._export_lines("1.0", proposed_cut))
+
         self._clear_content(proposed_cut)
 
+    def _export_lines(self, start, end) -> List[ScrollbackLine]:
+        """Returns text, tag ranges and embedded objects of the complete lines between given
+        indices. Columns are given in Tk units (which may be UTF-16 code units)"""
+        utf16_columns = tk_counts_utf16_code_units(self.tk)
+        result = []
+        line_parts = []
+        line_length = 0
+        embedded_objects = []
+        tag_starts = {}
+        ranges_by_span = {}
+
+        def close_tag(tag, end_col):
+            start_col = tag_starts.pop(tag)
+            if start_col < end_col:
+                ranges_by_span.setdefault((start_col, end_col), []).append(tag)
+
+        for key, value, index in self.dump(
+            start, end, text=True, tag=True, window=True, image=True
+        ):
+            if key == "tagon":
+                if value not in _TRANSIENT_TAGS:
+                    tag_starts[value] = line_length
+            elif key == "tagoff":
+                if value in tag_starts:
+                    close_tag(value, line_length)
+            elif key == "window":
+                # squeezed text button
+                contained_text = getattr(self.nametowidget(value), "contained_text", None)
+                if contained_text is not None:
+                    embedded_objects.append((line_length, "squeezed", contained_text))
+                    line_length += 1
+            elif key == "image":
+                data = str(self.tk.call(self.image_cget(index, "image"), "cget", "-data"))
+                if data:
+                    embedded_objects.append((line_length, "image", data))
+                    line_length += 1
+            elif key == "text":
+                for i, part in enumerate(value.split("\n")):
+                    if i > 0:
+                        # tags continuing on next line get split
+                        continuing_tags = list(tag_starts)
+                        for tag in continuing_tags:
+                            close_tag(tag, line_length)
+                        result.append(
+                            (
+                                "".join(line_parts),
+                                [(s, e, tuple(tags)) for (s, e), tags in ranges_by_span.items()],
+                                embedded_objects,
+                            )
+                        )
+                        line_parts = []
+                        line_length = 0
+                        embedded_objects = []
+                        ranges_by_span = {}
+                        tag_starts = {tag: 0 for tag in continuing_tags}
+
+                    line_parts.append(part)
+                    line_length += utf16_len(part) if utf16_columns else len(part)
+
+        return result
+
+    def schedule_loading_scrollback(self):
+        if self._scrollback and not self._scrollback_loading_scheduled:
+            self._scrollback_loading_scheduled = True
+            self.after_idle(self._load_scrollback_page)
+
+    def _load_scrollback_page(self):
+        self._scrollback_loading_scheduled = False
+        if self._scrollback and self.yview()[0] == 0.0:
+            self._load_scrollback_lines(SCROLLBACK_PAGE_LINES)
+
+    def _load_scrollback_lines(self, count):
+        lines = self._scrollback.pop_lines(count)
+        if not lines:
+            return
+
+        top_index = self.index("@0,0")
+        # Marks with left gravity would stay in front of the loaded lines. This concerns
+        # command_io_start and io_rewind_start, when the start of the command has been cut off.
+        marks_at_start = [
+            name
+            for name in self.mark_names()
+            if self.mark_gravity(name) == "left" and self.compare(name, "==", "1.0")
+        ]
+        self.direct_insert("1.0", "".join(text + "\n" for text, _, _ in lines))
+        for name in marks_at_start:
+            self.mark_set(name, f"{len(lines) + 1}.0")
+
+        # One Tcl call per tag
+        indices_by_tag = {}
+        for lineno, (_, tag_ranges, embedded_objects) in enumerate(lines, start=1):
+            for start_col, end_col, tags in tag_ranges:
+                for tag in tags:
+                    indices_by_tag.setdefault(tag, []).extend(
+                        [f"{lineno}.{start_col}", f"{lineno}.{end_col}"]
+                    )
+
+            # columns include the preceding objects, so these need to be inserted in order
+            for col, kind, content in embedded_objects:
+                index = f"{lineno}.{col}"
+                if kind == "squeezed":
+                    tags = {
+                        tag
+                        for start_col, end_col, range_tags in tag_ranges
+                        if start_col <= col < end_col
+                        for tag in range_tags
+                    }
+                    self.window_create(index, window=self._create_squeeze_button(content, tags))
+                elif kind == "image":
+                    self.image_create(index, image=self._create_image(content))
+
+        for tag, indices in indices_by_tag.items():
+            self.tag_add(tag, *indices)
+
+        # keep showing the same content
+        self.yview(f"{top_index} +{len(lines)} lines")
+
+    def load_scrollback_for_search(self, needle, case_sensitive):
+        """Brings back the lines starting from the latest one containing needle.
+
+        Returns whether anything was loaded."""
+        if not self._scrollback:
+            return False
+
+        line_num = self._scrollback.find_last(needle, case_sensitive)
+        if line_num is None:
+            return False
+
+        self._load_scrollback_lines(len(self._scrollback) - line_num)
+        return True
+
     def _clear_content(self, cut_idx):
         proposed_cut_float = float(self.index(cut_idx))
         for btn in list(self._squeeze_buttons):
@@ -1739,12 +2023,14 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
                 self._session_num_executed_lines_sent_to_ls = 0
 
             version = 1
+            text = "".join(self._context_lines_for_language_server)
+            self._ls_document = DocumentMirror(text)
             ls_proxy.notify_did_open_text_document(
                 DidOpenTextDocumentParams(
                     textDocument=TextDocumentItem(
                         version=version,
                         uri=ls_uri,
-                        text="".join(self._context_lines_for_language_server),
+                        text=text,
                         languageId="python",
                     )
                 )
@@ -1778,24 +2064,18 @@ class BaseShellText(EnhancedTextWithLogging, SyntaxText):
     def _replace_suffix_at_ls(
         self, ls_proxy: LanguageServerProxy, unchanged_line_count: int, suffix_text: str
     ) -> None:
+        assert self._ls_document is not None
+        change = self._ls_document.replace_lines_from(unchanged_line_count, suffix_text)
+        if change is None:
+            return
+
         version = self._last_ls_version + 1
         ls_proxy.notify_did_change_text_document(
             DidChangeTextDocumentParams(
                 textDocument=VersionedTextDocumentIdentifier(
                     version=version, uri=self.get_ls_uri()
                 ),
-                contentChanges=[
-                    RangedTextDocumentContentChangeEvent(
-                        range=Range(
-                            start=Position(line=unchanged_line_count, character=0),
-                            end=Position(
-                                line=unchanged_line_count + len(suffix_text.splitlines()),
-                                character=0,
-                            ),
-                        ),
-                        text=suffix_text,
-                    )
-                ],
+                contentChanges=[change],
             )
         )
         self._last_ls_version = version
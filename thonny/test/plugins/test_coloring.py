@@ -0,0 +1,31 @@
+from thonny.plugins.coloring import String3Lexer
+
+
+def _scan_lines(source):
+    lexer = String3Lexer()
+    state = None
+    result = []
+    for line in source.splitlines(keepends=True):
+        spans, state = lexer.scan_line(line, state)
+        result.append((spans, state))
+    return result
+
+
+def test_closed_and_open_strings_on_one_line():
+    assert _scan_lines('x = """a""" + f\'\'\'b\n') == [
+        ([(4, 11, True), (14, 20, False)], "'''"),
+    ]
+
+
+def test_string_spanning_lines():
+    source = 'x = """\nabc \\""" \' # \'\'\n"""  # """\n'
+    assert _scan_lines(source) == [
+        ([(4, 8, False)], '"""'),
+        ([(0, 16, False)], '"""'),
+        ([(0, 3, True)], None),
+    ]
+
+
+def test_delimiters_in_comments_are_ignored():
+    assert _scan_lines("# '''\nx = 1 # \"\"\"\n") == [([], None), ([], None)]
+    assert _scan_lines("%run '''x.py\nx = 1\n") == [([], None), ([], None)]
@@ -0,0 +1,13 @@
+from thonny.plugins.cpython_backend.cp_back import get_bounded_repr
+
+
+def test_bounded_repr_is_prefix_of_repr():
+    recursive = [1, {"a": (2,), "b": {3}}, frozenset(), set()]
+    recursive.append(recursive)
+    for value in [recursive, list(range(1000)), ((),), {1: [2, "x" * 50]}]:
+        for max_length in [0, 5, 20, 1000]:
+            rep = get_bounded_repr(value, max_length)
+            assert repr(value).startswith(rep)
+            assert len(rep) > max_length or rep == repr(value)
+
+    assert len(get_bounded_repr(list(range(10**6)), 100)) < 110
@@ -0,0 +1,71 @@
+import ast
+import os
+import time
+
+from thonny.common import TextRange
+from thonny.plugins.cpython_backend.cp_code_cache import (
+    InstrumentedCodeCache,
+    create_nodes,
+    export_node_records,
+)
+
+
+def test_node_records_keep_parents_and_focus():
+    root = ast.parse("x = y + 1")
+    statement = root.body[0]
+    binop = statement.value
+    binop.end_lineno, binop.end_col_offset = 1, 9
+    binop.tags = {"class=BinOp"}
+    binop.parent_node = statement
+    binop.parent_statement_focus = TextRange(1, 0, 1, 9)
+    statement.tags = {"class=Assign"}
+
+    nodes = create_nodes(export_node_records([binop]))
+    assert len(nodes) == 2
+    assert (nodes[0].lineno, nodes[0].col_offset, nodes[0].end_col_offset) == (1, 4, 9)
+    assert nodes[0].tags == {"class=BinOp"}
+    assert nodes[0].parent_node is nodes[1]
+    assert nodes[0].parent_statement_focus == TextRange(1, 0, 1, 9)
+    assert nodes[1].tags == {"class=Assign"}
+    assert not hasattr(nodes[1], "parent_node")
+    assert not hasattr(nodes[1], "parent_statement_focus")
+
+
+def test_entries_are_invalidated_by_changed_source(tmp_path):
+    cache = InstrumentedCodeCache(str(tmp_path))
+    source = b"print(42)\n"
+    filename = str(tmp_path / "prog.py")
+    code = compile(source, filename, "exec")
+    records = [(1, 0, 1, 9, {"class=Call"}, None, None)]
+
+    assert cache.load(source, filename, "exec") is None
+    cache.store(source, filename, "exec", code, records)
+    assert cache.load(source, filename, "exec") == (code, records)
+    assert cache.load(b"print(43)\n", filename, "exec") is None
+    assert cache.load(source, filename + "x", "exec") is None
+
+    # unreadable entries get removed
+    (entry_path,) = [entry.path for entry in os.scandir(tmp_path) if entry.is_file()]
+    with open(entry_path, "wb") as fp:
+        fp.write(b"garbage")
+    assert cache.load(source, filename, "exec") is None
+    assert not os.path.exists(entry_path)
+
+
+def test_least_recently_used_entries_get_pruned(tmp_path):
+    cache = InstrumentedCodeCache(str(tmp_path / "cache"), max_entries=2)
+    code = compile("pass", "<string>", "exec")
+    for name in ["a.py", "b.py"]:
+        cache.store("pass", name, "exec", code, [])
+
+    # don't rely on the resolution of file system timestamps
+    now = time.time()
+    for age, name in [(20, "a.py"), (10, "b.py")]:
+        entry_path = cache._get_entry_path(name, "exec")
+        os.utime(entry_path, (now - age, now - age))
+
+    cache.store("pass", "c.py", "exec", code, [])
+
+    assert len(os.listdir(tmp_path / "cache")) == 2
+    assert cache.load("pass", "a.py", "exec") is None
+    assert cache.load("pass", "c.py", "exec") is not None
@@ -0,0 +1,48 @@
+import gc
+
+from thonny.plugins.cpython_backend.cp_heap import HeapHandleTable
+
+
+class Thing:
+    pass
+
+
+def test_old_generations_are_referenced_weakly():
+    table = HeapHandleTable()
+    kept = Thing()
+    kept_key = table.add(kept)
+    dropped_key = table.add(Thing())
+    list_key = table.add([1, 2])
+    table.start_generation()
+
+    # shown in the views
+    assert dropped_key in table
+    assert table[list_key] == [1, 2]
+
+    table.start_generation()
+    gc.collect()
+    assert table[kept_key] is kept
+    assert dropped_key not in table
+    assert list_key not in table
+    assert table.get_stats()["weak"] == 1
+
+
+def test_reexported_and_pinned_values_stay():
+    table = HeapHandleTable(max_pinned_objects_per_kind=2)
+    values = [[i] for i in range(3)]
+    for value in values:
+        table.pin(value, "shell")
+    none_key = table.add(None)
+    table.start_generation()
+    table.add(None)
+    table.start_generation()
+
+    assert id(values[0]) not in table
+    assert table[id(values[2])] == [2]
+    assert table[none_key] is None
+    assert sorted(key for key, _ in table.items()) == sorted(
+        [none_key, id(values[1]), id(values[2])]
+    )
+
+    table.start_generation()
+    assert none_key not in table
@@ -0,0 +1,280 @@
+import os.path
+import subprocess
+import sys
+import textwrap
+import threading
+
+import pytest
+
+import thonny
+from thonny.common import (
+    DebuggerCommand,
+    InlineCommand,
+    ToplevelCommand,
+    VariablesDeltaDecoder,
+    parse_message,
+    read_one_incoming_message_str,
+    serialize_message,
+)
+from thonny.plugins.cpython_backend.cp_tracers import DEBUGGER_ENGINE_ENV_VAR
+
+LAUNCHER_PATH = os.path.join(
+    os.path.dirname(thonny.__file__), "plugins", "cpython_backend", "cp_launcher.py"
+)
+# seconds, a stuck backend gets killed, so that the test fails instead of hanging
+SESSION_TIMEOUT = 60
+
+
+class DebuggerSession:
+    """Runs a program under the debugger in a backend process"""
+
+    def __init__(self, tmp_path, source, env=None):
+        self.program_path = str(tmp_path / "prog.py")
+        with open(self.program_path, "w", encoding="utf-8") as fp:
+            fp.write(textwrap.dedent(source))
+
+        user_dir = tmp_path / "user_dir"
+        user_dir.mkdir(exist_ok=True)
+        self._proc = subprocess.Popen(
+            [sys.executable, LAUNCHER_PATH, str(tmp_path), "{}"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=dict(os.environ, THONNY_USER_DIR=str(user_dir), **(env or {})),
+        )
+        self._decoder = VariablesDeltaDecoder()
+        self._timer = threading.Timer(SESSION_TIMEOUT, self._proc.kill)
+        self._timer.start()
+        # process ack
+        self._proc.stdout.readline()
+
+    def start(self, command_name, breakpoints=None, **kw):
+        # without breakpoints the debugger stops at the first statement
+        self.breakpoints = {self.program_path: set(breakpoints)} if breakpoints else {}
+        self._send(
+            ToplevelCommand(
+                command_name, args=[self.program_path], breakpoints=self.breakpoints, **kw
+            )
+        )
+        return self.read_response()
+
+    def send_debugger_command(self, name, msg):
+        frame = msg.stack[-1]
+        self._send(
+            DebuggerCommand(
+                name,
+                frame_id=frame.id,
+                breakpoints=self.breakpoints,
+                state=frame.event,
+                focus=frame.focus,
+                exception=None,
+                allow_stepping_into_libraries=False,
+            )
+        )
+        return self.read_response()
+
+    def query(self, cmd):
+        self._send(cmd)
+        return self.read_response(cmd.name + "_response")
+
+    def read_response(self, *event_types):
+        event_types = event_types or ("DebuggerResponse", "ToplevelResponse")
+        while True:
+            data = read_one_incoming_message_str(self._proc.stdout.readline)
+            if data == "":
+                raise AssertionError("Backend exited: " + self._proc.stderr.read())
+            if not data.startswith("\x02"):
+                # program output
+                continue
+
+            msg = parse_message(data)
+            self._decoder.decode_message(msg)
+            if msg.event_type in event_types:
+                return msg
+
+    def close(self):
+        self._timer.cancel()
+        self._proc.kill()
+        self._proc.wait()
+        self._proc.stdout.close()
+        self._proc.stderr.close()
+        self._proc.stdin.close()
+
+    def _send(self, msg):
+        self._proc.stdin.write(serialize_message(msg) + "\n")
+        self._proc.stdin.flush()
+
+
+def test_shown_evaluations_stay_inspectable(tmp_path):
+    session = DebuggerSession(tmp_path, "x = [1, 2] + [3] + [4] + [5] + [6]\n")
+    try:
+        msg = session.start("Debug")
+        while True:
+            msg = session.send_debugger_command("step_into", msg)
+            value_infos = [v for _, v in msg.stack[-1].current_evaluations if v.repr == "[1, 2]"]
+            if value_infos:
+                break
+        value_info = value_infos[0]
+
+        # the value stays in the expression box while the rest gets evaluated
+        for _ in range(5):
+            msg = session.send_debugger_command("step_into", msg)
+            assert value_info in [v for _, v in msg.stack[-1].current_evaluations]
+
+        response = session.query(
+            InlineCommand("get_object_info", object_id=value_info.id, include_attributes=False)
+        )
+        assert "error" not in response["info"]
+        assert response["info"]["repr"] == "[1, 2]"
+    finally:
+        session.close()
+
+
+STEPPING_PROGRAM = """\
+def helper(a):
+    b = a + 1
+    return b * 2
+
+def main():
+    x = helper(1)
+    y = helper(x)
+    return x + y
+
+result = main()
+print(result)
+"""
+
+
+def _run_stepping_program(tmp_path, engine, breakpoints, commands):
+    session = DebuggerSession(tmp_path, STEPPING_PROGRAM, {DEBUGGER_ENGINE_ENV_VAR: engine})
+    try:
+        msg = session.start("FastDebug", breakpoints=breakpoints)
+        stops = [_describe_stop(msg)]
+        for command in commands:
+            msg = session.send_debugger_command(command, msg)
+            stops.append(_describe_stop(msg))
+        return stops
+    finally:
+        session.close()
+
+
+def _describe_stop(msg):
+    if msg.event_type == "ToplevelResponse":
+        return "end"
+    frame = msg.stack[-1]
+    return frame.code_name, frame.focus.lineno, frame.event
+
+
+requires_monitoring = pytest.mark.skipif(
+    sys.version_info < (3, 12), reason="sys.monitoring requires Python 3.12"
+)
+
+
+@requires_monitoring
+@pytest.mark.parametrize("engine", ["monitoring", "settrace"])
+def test_debugger_engines_stop_at_same_places(tmp_path, engine):
+    stops = _run_stepping_program(
+        tmp_path,
+        engine,
+        breakpoints=[6, 3],
+        commands=["resume", "step_over", "step_into", "step_over", "step_out", "resume"],
+    )
+    assert stops == [
+        ("main", 6, "line"),
+        ("helper", 3, "line"),
+        ("main", 7, "line"),
+        ("helper", 2, "line"),
+        ("helper", 3, "line"),
+        ("main", 8, "line"),
+        "end",
+    ]
+
+
+@requires_monitoring
+@pytest.mark.parametrize(
+    "engine, last_stop", [("monitoring", ("<module>", 11, "line")), ("settrace", "end")]
+)
+def test_stepping_out_of_function_with_untraced_caller(tmp_path, engine, last_stop):
+    # the settrace engine runs to the end when leaving a frame whose caller it hasn't traced,
+    # sys.monitoring stops in the caller
+    stops = _run_stepping_program(
+        tmp_path, engine, breakpoints=[6], commands=["step_over", "step_out"]
+    )
+    assert stops == [("main", 6, "line"), ("main", 7, "line"), last_stop]
+
+
+def test_bounded_history_keeps_stepping_back_within_available_states(tmp_path):
+    session = DebuggerSession(
+        tmp_path,
+        """\
+        total = 0
+        for i in range(1000):
+            total += i
+        print(total)
+        """,
+    )
+    try:
+        # room for a few loop iterations only
+        msg = session.start("Debug", history_memory_limit=0.005)
+        assert not msg.history_truncated
+
+        steps_back_available = []
+        for _ in range(300):
+            msg = session.send_debugger_command("step_into", msg)
+            steps_back_available.append(msg.steps_back_available)
+        assert msg.history_truncated
+        assert max(steps_back_available) < 50
+
+        while msg.steps_back_available:
+            prev_steps_back_available = msg.steps_back_available
+            msg = session.send_debugger_command("step_back", msg)
+            assert msg.event_type == "DebuggerResponse"
+            assert not msg.in_present
+            assert msg.steps_back_available < prev_steps_back_available
+
+        # the oldest kept state stays put
+        oldest_focus = msg.stack[-1].focus
+        msg = session.send_debugger_command("step_back", msg)
+        assert msg.event_type == "DebuggerResponse"
+        assert msg.steps_back_available == 0
+        assert msg.stack[-1].focus == oldest_focus
+
+        msg = session.send_debugger_command("step_into", msg)
+        assert msg.steps_back_available == 1
+        msg = session.send_debugger_command("resume", msg)
+        assert msg.event_type == "ToplevelResponse"
+    finally:
+        session.close()
+
+
+def test_stepping_back_to_oldest_state_not_seen_before(tmp_path):
+    session = DebuggerSession(
+        tmp_path,
+        """\
+        total = 0
+        for i in range(1000):
+            total += i
+        print(total)
+        """,
+    )
+    try:
+        msg = session.start("Debug", breakpoints=[4], history_memory_limit=0.005)
+        assert msg.stack[-1].focus.lineno == 4
+        assert msg.history_truncated
+        # the states of the beginning of the program have been discarded
+        assert msg.steps_back_available == 0
+
+        # the oldest remaining state gets shown although it wasn't reported before
+        for _ in range(2):
+            msg = session.send_debugger_command("step_back", msg)
+            assert msg.event_type == "DebuggerResponse"
+            assert msg.stack[-1].focus.lineno == 3
+            assert msg.steps_back_available == 0
+
+        msg = session.send_debugger_command("resume", msg)
+        assert msg.stack[-1].focus.lineno == 4
+        msg = session.send_debugger_command("resume", msg)
+        assert msg.event_type == "ToplevelResponse"
+    finally:
+        session.close()
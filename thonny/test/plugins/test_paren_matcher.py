@@ -0,0 +1,14 @@
+import parso
+
+from thonny.plugins.paren_matcher import ParenToken, find_paren_tokens
+
+
+def test_brackets_in_strings_and_comments_are_ignored():
+    module = parso.parse('x = f(a["(", 1]) # )\ny = {\n')
+    assert find_paren_tokens(module) == [
+        ParenToken("(", (1, 5), (1, 6)),
+        ParenToken("[", (1, 7), (1, 8)),
+        ParenToken("]", (1, 14), (1, 15)),
+        ParenToken(")", (1, 15), (1, 16)),
+        ParenToken("{", (2, 4), (2, 5)),
+    ]
@@ -0,0 +1,230 @@
+import os
+import time
+
+from thonny import base_file_browser
+from thonny.base_file_browser import (
+    MIN_CACHED_DIR_AGE,
+    RENDER_CHUNK_SIZE,
+    BaseFileBrowser,
+    BaseLocalFileBrowser,
+    DirListingCache,
+)
+
+TREE_COLUMNS = ["#0", "kind", "path", "name"]
+
+
+class FakeTree:
+    """Keeps the nodes the way ttk.Treeview does, without a display"""
+
+    def __init__(self):
+        self._nodes = {"": {"values": {}, "children": [], "text": "", "open": True}}
+        self._counter = 0
+
+    def insert(self, parent, index, tags=(), values=()):
+        self._counter += 1
+        node_id = "I%03d" % self._counter
+        self._nodes[node_id] = {
+            "values": dict(zip(TREE_COLUMNS, values)),
+            "children": [],
+            "text": "",
+            "open": False,
+            "parent": parent,
+        }
+        self._nodes[parent]["children"].append(node_id)
+        return node_id
+
+    def set(self, node_id, column, value=None):
+        if value is None:
+            return self._nodes[node_id]["values"].get(column, "")
+        self._nodes[node_id]["values"][column] = value
+
+    def item(self, node_id, option=None, **kw):
+        if option is not None:
+            return self._nodes[node_id][option]
+        self._nodes[node_id].update(kw)
+
+    def get_children(self, node_id):
+        return tuple(self._nodes[node_id]["children"])
+
+    def set_children(self, node_id, *children):
+        self._nodes[node_id]["children"] = list(children)
+
+    def delete(self, *node_ids):
+        for node_id in node_ids:
+            node = self._nodes.pop(node_id)
+            siblings = self._nodes[node["parent"]]["children"]
+            if node_id in siblings:
+                siblings.remove(node_id)
+
+    def exists(self, node_id):
+        return node_id in self._nodes
+
+
+class FakeFileBrowser(BaseFileBrowser):
+    def __init__(self):
+        # skip the widget part
+        self._cached_child_data = {}
+        self.path_to_highlight = None
+        self.order_by = "name"
+        self.reverse_order = False
+        self.filter = None
+        self._sorted_child_names = {}
+        self._rendered_child_counts = {}
+        self._more_node_ids = {}
+        self._rendered_node_data = {}
+        self.tree = FakeTree()
+        self.tree.set("", "path", "/data")
+
+    def get_dir_separator(self):
+        return "/"
+
+    def update_node_data(self, node_id, name, data):
+        self.tree.set(node_id, "name", name)
+        self.tree.set(node_id, "kind", "dir" if data["isdir"] else "file")
+
+
+def _create_file_browser(file_count):
+    browser = FakeFileBrowser()
+    browser._cached_child_data["/data"] = {
+        "f%04d.txt" % i: {"isdir": False, "size_bytes": i, "modified_epoch": i}
+        for i in range(file_count)
+    }
+    return browser
+
+
+def _get_rendered_names(browser):
+    return [browser.tree.set(node_id, "name") for node_id in browser.tree.get_children("")]
+
+
+def _set_old_mtime(path):
+    old_time = time.time() - MIN_CACHED_DIR_AGE - 10
+    os.utime(path, (old_time, old_time))
+
+
+def test_listing_is_cached_until_dir_changes(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    _set_old_mtime(tmp_path)
+
+    cache = DirListingCache()
+    listing = cache.get(str(tmp_path), False)
+    assert list(listing) == ["a.txt"]
+    assert cache.get(str(tmp_path), False) is listing
+    assert cache.get_changed_paths([str(tmp_path)]) == []
+
+    # recently modified directories are not cached
+    (tmp_path / "b.txt").write_text("b")
+    assert cache.get_changed_paths([str(tmp_path)]) == [str(tmp_path)]
+    assert sorted(cache.get(str(tmp_path), False)) == ["a.txt", "b.txt"]
+    assert cache.get_changed_paths([str(tmp_path)]) == [str(tmp_path)]
+
+    _set_old_mtime(tmp_path)
+    listing = cache.get(str(tmp_path), False)
+    assert cache.get(str(tmp_path), False) is listing
+    cache.invalidate([str(tmp_path)])
+    assert cache.get(str(tmp_path), False) is not listing
+
+
+class FakeLocalFileBrowser(BaseLocalFileBrowser):
+    def __init__(self):
+        # skip the widget part
+        self._cached_child_data = {}
+        self.refreshed_paths = []
+
+    def winfo_ismapped(self):
+        return True
+
+    def refresh_tree(self, paths_to_invalidate=None):
+        self.refreshed_paths.append(paths_to_invalidate)
+
+
+def test_files_overwritten_in_place_get_relisted(tmp_path, monkeypatch):
+    cache = DirListingCache()
+    monkeypatch.setattr(base_file_browser, "_local_dir_listing_cache", cache)
+    (tmp_path / "a.txt").write_text("a")
+    _set_old_mtime(tmp_path)
+    listing = cache.get(str(tmp_path), False)
+
+    # doesn't change the mtime of the directory
+    dir_stat = os.stat(tmp_path)
+    (tmp_path / "a.txt").write_text("abc")
+    os.utime(tmp_path, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+    assert cache.get(str(tmp_path), False) is listing
+
+    browser = FakeLocalFileBrowser()
+    browser._cached_child_data = {"": {}, str(tmp_path): listing, "gone": "missing"}
+    browser.on_toplevel_response()
+    assert browser.refreshed_paths == [[str(tmp_path)]]
+    assert cache.get(str(tmp_path), False)["a.txt"]["size_bytes"] == 3
+
+
+def test_large_directory_is_rendered_in_chunks():
+    file_count = RENDER_CHUNK_SIZE * 2 + 50
+    browser = _create_file_browser(file_count)
+
+    browser.render_children_from_cache("")
+    names = _get_rendered_names(browser)
+    assert len(names) == RENDER_CHUNK_SIZE + 1
+    assert names[0] == "f0000.txt"
+    more_id = browser._more_node_ids[""]
+    assert browser.tree.set(more_id, "kind") == "more"
+    assert "%d more items" % (file_count - RENDER_CHUNK_SIZE) in browser.tree.item(more_id, "text")
+
+    first_ids = browser.tree.get_children("")[:RENDER_CHUNK_SIZE]
+    browser.render_more_children("")
+    assert len(_get_rendered_names(browser)) == RENDER_CHUNK_SIZE * 2 + 1
+    # existing nodes are reused
+    assert browser.tree.get_children("")[:RENDER_CHUNK_SIZE] == first_ids
+    assert "50 more items" in browser.tree.item(more_id, "text")
+
+    browser.render_more_children("")
+    names = _get_rendered_names(browser)
+    assert len(names) == file_count
+    assert names[-1] == "f%04d.txt" % (file_count - 1)
+    assert "" not in browser._more_node_ids
+    assert not browser.tree.exists(more_id)
+
+
+def test_highlighted_item_gets_rendered():
+    browser = _create_file_browser(RENDER_CHUNK_SIZE * 3)
+    browser.path_to_highlight = "/data/f%04d.txt" % (RENDER_CHUNK_SIZE + 10)
+
+    browser.render_children_from_cache("")
+    names = _get_rendered_names(browser)
+    # rendering stops at the end of the chunk containing the highlighted item
+    assert len(names) == RENDER_CHUNK_SIZE * 2 + 1
+    assert "f%04d.txt" % (RENDER_CHUNK_SIZE + 10) in names
+
+    # the expanded count sticks after the highlight is done
+    browser.path_to_highlight = None
+    browser.render_children_from_cache("")
+    assert len(_get_rendered_names(browser)) == RENDER_CHUNK_SIZE * 2 + 1
+
+
+def test_sorted_child_names_are_remembered_until_something_changes():
+    browser = _create_file_browser(5)
+    children_data = browser._cached_child_data["/data"]
+    children_data["sub"] = {"isdir": True, "size_bytes": None, "modified_epoch": 100}
+
+    names = browser.get_sorted_child_names("/data", children_data)
+    assert names[0] == "sub"
+    assert browser.get_sorted_child_names("/data", children_data) is names
+
+    browser.reverse_order = True
+    names = browser.get_sorted_child_names("/data", children_data)
+    assert names[-1] == "sub"
+
+    browser.order_by = "modified"
+    browser.reverse_order = False
+    names = browser.get_sorted_child_names("/data", children_data)
+    assert names[:2] == ["sub", "f0004.txt"]
+
+    browser.filter = [".py"]
+    assert browser.get_sorted_child_names("/data", children_data) == ["sub"]
+
+    new_data = dict(children_data, **{"a.py": {"isdir": False, "modified_epoch": 0}})
+    assert browser.get_sorted_child_names("/data", new_data) == ["sub", "a.py"]
+
+    memo_names = browser.get_sorted_child_names("/data", new_data)
+    browser.invalidate_cache(["/data"])
+    assert "/data" not in browser._sorted_child_names
+    assert browser.get_sorted_child_names("/data", new_data) is not memo_names
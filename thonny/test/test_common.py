@@ -1,6 +1,28 @@
+import base64
+import marshal
 import os
+from collections import namedtuple
 
-from thonny.common import path_startswith
+import pytest
+
+from thonny.common import (
+    BINARY_MESSAGE_FORMAT,
+    BINARY_MESSAGE_MARKER,
+    TEXT_MESSAGE_FORMAT,
+    BackendEvent,
+    DistInfo,
+    FrameInfo,
+    InlineResponse,
+    TextRange,
+    ToplevelResponse,
+    ValueInfo,
+    VariablesDeltaDecoder,
+    VariablesDeltaEncoder,
+    parse_message,
+    path_startswith,
+    read_one_incoming_message_str,
+    serialize_message,
+)
 
 
 def test_path_startswith():
@@ -31,3 +53,77 @@ def test_path_startswith():
         assert path_startswith("c:\\foo\\bar.txt/kala\\pala", "C:\\")
 
         assert not path_startswith("C:\\kalapala\\pala", "C:\\kala")
+
+
+def test_message_formats_round_trip():
+    messages = [
+        BackendEvent("ProgramOutput", stream_name="stdout", data="ü\x02\n"),
+        InlineResponse("get_dirs_children_info", dists=[DistInfo("thonny", "5.0")]),
+        ToplevelResponse(
+            globals={"x": ValueInfo(1, "[1, 2]")},
+            stack=[FrameInfo(*range(16), current_evaluations=[(TextRange(1, 0, 1, 4), "'a'")])],
+            misc=(1, (2, 3), {4}, frozenset([5]), {(6, 7): None}, b"\x00", 1.5),
+        ),
+    ]
+
+    for message_format in [TEXT_MESSAGE_FORMAT, BINARY_MESSAGE_FORMAT]:
+        for msg in messages:
+            serialized = serialize_message(msg, max_line_length=16, message_format=message_format)
+            lines = iter(serialized.splitlines(keepends=True))
+            msg_str = read_one_incoming_message_str(lambda: next(lines, ""))
+            parsed = parse_message(msg_str)
+            assert type(parsed) is type(msg)
+            assert parsed.__dict__ == msg.__dict__
+            assert next(lines, "") == ""
+
+
+def test_binary_format_falls_back_to_text_for_unknown_values():
+    msg = ToplevelResponse(value=object())
+    assert serialize_message(msg, message_format=BINARY_MESSAGE_FORMAT) == serialize_message(msg)
+
+
+def test_binary_format_only_carries_registered_classes():
+    PluginInfo = namedtuple("PluginInfo", ["name"])
+
+    class PluginResponse(ToplevelResponse):
+        pass
+
+    for msg in [ToplevelResponse(info=PluginInfo("x")), PluginResponse(value=1)]:
+        assert serialize_message(msg, message_format=BINARY_MESSAGE_FORMAT) == serialize_message(
+            msg
+        )
+
+    # other names are not looked up from the module
+    payload = marshal.dumps((1, "serialize_message", {}))
+    forged = "%s1 %d %s" % (
+        BINARY_MESSAGE_MARKER,
+        len(payload),
+        base64.b64encode(payload).decode("ascii"),
+    )
+    with pytest.raises(ValueError):
+        parse_message(forged)
+
+
+def test_variables_deltas_restore_globals():
+    encoder = VariablesDeltaEncoder()
+    decoder = VariablesDeltaDecoder()
+    variables = {name: ValueInfo(i, repr(i)) for i, name in enumerate("abcdef")}
+    frame = FrameInfo(*range(16), current_evaluations=None)._replace(module_name="__main__")
+
+    for changes in [{}, {"a": ValueInfo(10, "10")}, {"b": None}, {}]:
+        variables = dict(variables)
+        for name, value_info in changes.items():
+            if value_info is None:
+                del variables[name]
+            else:
+                variables[name] = value_info
+
+        msg = ToplevelResponse(globals=variables, stack=[frame._replace(globals=variables)] * 2)
+        encoder.encode_message(msg)
+        delta = msg["globals"]
+        assert delta.complete or len(delta.changed) + len(delta.removed) == len(changes)
+        serialized = serialize_message(msg, message_format=BINARY_MESSAGE_FORMAT)
+        parsed = parse_message(serialized)
+        decoder.decode_message(parsed)
+        assert parsed["globals"] == variables
+        assert [frame.globals for frame in parsed["stack"]] == [variables] * 2
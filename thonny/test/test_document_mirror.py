@@ -0,0 +1,74 @@
+from thonny.document_mirror import DocumentMirror, append_change
+from thonny.lsp_types import Position, Range
+
+
+def _apply_change(text: str, change) -> str:
+    """Applies LSP change to text, interpreting positions as UTF-16 offsets"""
+
+    def to_offset(pos: Position) -> int:
+        lines = text.split("\n")
+        offset = sum(len(line) + 1 for line in lines[: pos.line])
+        line16 = lines[pos.line].encode("utf-16-le")
+        return offset + len(line16[: pos.character * 2].decode("utf-16-le"))
+
+    return text[: to_offset(change.range.start)] + change.text + text[to_offset(change.range.end) :]
+
+
+def test_insert_and_delete_with_utf16_columns():
+    doc = DocumentMirror("a😀b\nsecond", tk_columns_in_utf16=True)
+    server_text = doc.get_text()
+
+    # Tk 8.6 column 3 is after the emoji
+    change = doc.insert("1.3", "X\nY")
+    assert change.range.start == Position(line=0, character=3)
+    server_text = _apply_change(server_text, change)
+    assert server_text == doc.get_text() == "a😀X\nYb\nsecond"
+
+    change = doc.delete("1.1", "2.1")
+    assert change.range == Range(Position(0, 1), Position(1, 1))
+    server_text = _apply_change(server_text, change)
+    assert server_text == doc.get_text() == "ab\nsecond"
+
+    # Tk end index gets clamped to the end of document
+    change = doc.insert("3.0", "!")
+    assert _apply_change(server_text, change) == doc.get_text() == "ab\nsecond!"
+
+
+def test_code_point_columns():
+    doc = DocumentMirror("😀😀", tk_columns_in_utf16=False)
+    change = doc.insert("1.1", "x")
+    assert change.range.start == Position(line=0, character=2)
+    assert doc.get_text() == "😀x😀"
+
+
+def test_merging_changes():
+    doc = DocumentMirror("abc\n")
+    changes = []
+    append_change(changes, doc.insert("1.1", "x"))
+    append_change(changes, doc.insert("1.2", "y"))
+    append_change(changes, doc.insert("1.3", "\n"))
+    append_change(changes, doc.insert("2.0", "😀"))
+    assert len(changes) == 1
+    assert changes[0].text == "xy\n😀"
+    assert _apply_change("abc\n", changes[0]) == doc.get_text()
+
+    before = doc.get_text()
+    changes = []
+    append_change(changes, doc.delete("2.2", "2.3"))
+    append_change(changes, doc.delete("2.0", "2.2"))
+    append_change(changes, doc.delete("1.3", "2.0"))
+    assert len(changes) == 1
+    assert _apply_change(before, changes[0]) == doc.get_text() == "axyc\n"
+
+
+def test_replace_lines_from():
+    doc = DocumentMirror("x = 1\n")
+    assert doc.replace_lines_from(1, "") is None
+
+    change = doc.replace_lines_from(1, "print(x)")
+    assert change.range == Range(Position(1, 0), Position(1, 0))
+    change = doc.replace_lines_from(1, "print(x, y)")
+    assert change.range == Range(Position(1, 7), Position(1, 7))
+    assert change.text == ", y"
+    change = doc.replace_lines_from(1, "y = 2\n")
+    assert doc.get_text() == "x = 1\ny = 2\n"
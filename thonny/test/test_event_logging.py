@@ -0,0 +1,98 @@
+import os.path
+
+from thonny.plugins.event_logging import (
+    INDEX_BLOCK_SIZE,
+    EventLogWriter,
+    IndexedSessionEvents,
+    get_index_path,
+    iter_events_from_file,
+    load_session_index,
+    open_session_events,
+)
+
+
+def _create_events(count):
+    return [
+        {
+            "sequence": "TextInsert",
+            "time": "2024-01-01T10:%02d:%02d.5" % (i // 60 % 60, i % 60),
+            "text": str(i),
+        }
+        for i in range(count)
+    ]
+
+
+def test_indexed_session_log(tmp_path):
+    events = _create_events(INDEX_BLOCK_SIZE * 2 + 10)
+    events[5]["editor_id"] = 42
+
+    path = os.path.join(tmp_path, "session.jsonl.gz")
+    writer = EventLogWriter(path)
+    for event in events[:5]:
+        writer.write(event)
+    # flushing creates a short block
+    assert writer.flush(timeout=5)
+    for event in events[5:]:
+        writer.write(event)
+    writer.close()
+    writer.save_index(get_index_path(path))
+
+    assert list(iter_events_from_file(path)) == events
+
+    index = load_session_index(path)
+    assert index is not None
+    assert index["event_count"] == len(events)
+    assert index["block_start_indices"] == [0, 5, 5 + INDEX_BLOCK_SIZE, 5 + 2 * INDEX_BLOCK_SIZE]
+    assert index["editor_ids"] == [42]
+
+    lazy_events = open_session_events(path)
+    assert isinstance(lazy_events, IndexedSessionEvents)
+    assert len(lazy_events) == len(events)
+    assert lazy_events[-1] == events[-1]
+    assert lazy_events[INDEX_BLOCK_SIZE] == events[INDEX_BLOCK_SIZE]
+    assert list(lazy_events) == events
+
+    start, end = lazy_events.get_index_range_for_time(lazy_events.end_time)
+    assert start <= len(events) - 1 <= end
+
+    # outdated index is ignored, truncated file is read as far as possible
+    with open(path, "r+b") as fp:
+        fp.truncate(index["block_offsets"][-1] + 10)
+    assert load_session_index(path) is None
+    assert list(iter_events_from_file(path)) == events[: index["block_start_indices"][-1]]
+
+
+def test_reading_log_while_writing(tmp_path):
+    events = _create_events(10)
+    path = os.path.join(tmp_path, "session.jsonl.gz")
+    writer = EventLogWriter(path)
+    try:
+        for event in events:
+            writer.write(event)
+        assert writer.flush(timeout=5)
+
+        lazy_events = IndexedSessionEvents(path, writer.get_index())
+        writer.write(_create_events(1)[0])
+        assert list(lazy_events) == events
+    finally:
+        writer.close()
+
+
+def test_open_events_follow_renamed_log(tmp_path):
+    events = _create_events(INDEX_BLOCK_SIZE * 2 + 10)
+    writer = EventLogWriter(os.path.join(tmp_path, "current.jsonl.gz"))
+    for event in events:
+        writer.write(event)
+    assert writer.flush(timeout=5)
+
+    lazy_events = IndexedSessionEvents(writer.path, writer.get_index())
+    writer.add_view(lazy_events)
+    assert lazy_events[0] == events[0]
+
+    # session gets split
+    writer.close()
+    writer.move(os.path.join(tmp_path, "final.jsonl.gz"))
+
+    assert lazy_events.path == writer.path
+    assert lazy_events[-5] == events[-5]
+    assert list(lazy_events) == events
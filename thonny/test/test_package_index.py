@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from thonny import package_index
+from thonny.package_index import (
+    PackageSearchIndex,
+    PyPIMetadataClient,
+    compute_dist_name_similarity,
+    download_with_cache,
+)
+
+
+def test_search_finds_best_matches():
+    names = ["numpy", "requests", "requests-oauthlib", "micropython-foo", "flask", "django-rest"]
+    names += ["package-%d" % i for i in range(1000)]
+    index = PackageSearchIndex([{"name": name, "summary": None} for name in names])
+
+    for query, common_tokens in [
+        ("requests", []),
+        ("nmupy", []),
+        ("rest-django", []),
+        ("foo", ["micropython"]),
+    ]:
+        expected = max(
+            names,
+            key=lambda name: compute_dist_name_similarity(name, query.split("-"), common_tokens),
+        )
+        assert index.search(query, common_tokens)[0][1]["name"] == expected
+
+
+def test_cached_content_is_revalidated(tmp_path):
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+            else:
+                self.send_response(200)
+                self.send_header("ETag", '"v1"')
+                self.end_headers()
+                self.wfile.write(b"[]")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = "http://127.0.0.1:%d/summaries.json" % server.server_port
+        cache_path = str(tmp_path / "summaries.json")
+        assert download_with_cache(url, cache_path) == (b"[]", True)
+        assert download_with_cache(url, cache_path) == (b"[]", False)
+        assert requests == [None, '"v1"']
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # server is gone
+    assert download_with_cache(url, cache_path) == (b"[]", False)
+
+
+def test_metadata_client_reuses_connections_and_cached_data(tmp_path):
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            requests.append((self.path, self.client_address, self.headers.get("If-None-Match")))
+            if self.path == "/pypi/THONNY/json":
+                # like PyPI does for names differing from the display name
+                self.send_response(301)
+                self.send_header("Location", "/pypi/thonny/json")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif self.path != "/pypi/thonny/json":
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+            else:
+                # give other requests time to arrive
+                time.sleep(0.2)
+                body = json.dumps({"info": {"name": "thonny"}}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("ETag", '"v1"')
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = "http://127.0.0.1:%d" % server.server_port
+    try:
+        client = PyPIMetadataClient(base_url, cache_dir=str(tmp_path))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: client.get_project_data("thonny"), range(4)))
+        assert all(result == {"info": {"name": "thonny"}} for result in results)
+        assert len(requests) == 1
+
+        with pytest.raises(urllib.error.HTTPError) as exc_info:
+            client.get_project_data("missing")
+        assert exc_info.value.code == 404
+        assert requests[1][1] == requests[0][1]  # same connection
+        client.close()
+
+        # new session
+        client = PyPIMetadataClient(base_url, cache_dir=str(tmp_path))
+        assert client.get_project_data("thonny") == {"info": {"name": "thonny"}}
+        assert requests[-1] == ("/pypi/thonny/json", requests[-1][1], '"v1"')
+
+        # redirected requests are cached under the final path
+        assert client.get_project_data("THONNY") == {"info": {"name": "thonny"}}
+        assert [(request[0], request[2]) for request in requests[-2:]] == [
+            ("/pypi/THONNY/json", None),
+            ("/pypi/thonny/json", '"v1"'),
+        ]
+        request_count = len(requests)
+        assert client.get_project_data("THONNY") == {"info": {"name": "thonny"}}
+        assert len(requests) == request_count
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_metadata_client_keeps_bounded_caches(tmp_path, monkeypatch):
+    monkeypatch.setattr(package_index, "MAX_METADATA_IN_MEMORY", 2)
+    monkeypatch.setattr(package_index, "MAX_CACHED_RESPONSES", 3)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            body = json.dumps({"path": self.path}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = PyPIMetadataClient("http://127.0.0.1:%d" % server.server_port, str(tmp_path))
+        for i in range(5):
+            client.get_project_data("p%d" % i)
+            # don't rely on the resolution of file system timestamps
+            for j, entry in enumerate(sorted(tmp_path.iterdir(), key=lambda p: p.stat().st_mtime)):
+                os.utime(entry, (j, j))
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(client._fresh_data) == 2
+    assert len(list(tmp_path.iterdir())) == 3
@@ -0,0 +1,114 @@
+import sys
+import textwrap
+
+import thonny
+from thonny.plugin_manifest import PluginLoader, PluginStandIn
+
+LAZY_PLUGIN = """
+from thonny import get_workbench
+
+load_lazily = True
+loaded = False
+
+
+class HelloView:
+    def __init__(self, master):
+        self.master = master
+
+
+def load_plugin():
+    global loaded
+    loaded = True
+
+    def say_hello():
+        return "hello from " + get_workbench().get_option("greeting.name")
+
+    get_workbench().set_default("greeting.name", "lazy")
+    get_workbench().add_command("hello", "tools", "Say hello", say_hello, group=10)
+    if not get_workbench().in_simple_mode():
+        get_workbench().add_view(HelloView, "Hello", "s")
+"""
+
+NOT_RECORDABLE_PLUGIN = """
+from thonny import get_workbench
+
+load_lazily = True
+
+
+def load_plugin():
+    get_workbench().add_command("timer", "tools", "Timer", lambda: None)
+    get_workbench().after(100, lambda: None)
+"""
+
+
+class FakeWorkbench:
+    def __init__(self):
+        self.options = {"general.language": "en_US"}
+        self.commands = {}
+        self.views = {}
+
+    def get_option(self, name):
+        return self.options[name]
+
+    def set_default(self, name, value):
+        self.options.setdefault(name, value)
+
+    def get_ui_mode(self):
+        return "regular"
+
+    def in_simple_mode(self):
+        return False
+
+    def add_command(
+        self, command_id, menu_name, command_label, handler=None, tester=None, group=99
+    ):
+        self.commands[command_id] = handler
+
+    def add_view(self, cls, label, default_location, visible_by_default=False):
+        self.views[cls.__name__] = cls
+
+    def after(self, ms, func):
+        pass
+
+    def report_exception(self, title):
+        raise AssertionError(title)
+
+
+def _load(tmp_path, monkeypatch):
+    workbench = FakeWorkbench()
+    monkeypatch.setattr(thonny, "_workbench", workbench)
+    loader = PluginLoader(workbench, str(tmp_path / "manifest.txt"), [])
+    loader.load_plugins([([str(tmp_path / "fakeplugins")], "fakeplugins.")])
+    return workbench
+
+
+def test_lazy_plugin_gets_loaded_on_first_use(tmp_path, monkeypatch):
+    package_dir = tmp_path / "fakeplugins"
+    package_dir.mkdir()
+    (package_dir / "__init__.py").write_text("")
+    (package_dir / "hello.py").write_text(textwrap.dedent(LAZY_PLUGIN))
+    (package_dir / "timer.py").write_text(textwrap.dedent(NOT_RECORDABLE_PLUGIN))
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    # first startup loads everything and records the manifest
+    workbench = _load(tmp_path, monkeypatch)
+    assert sys.modules["fakeplugins.hello"].loaded
+    assert workbench.commands["hello"]() == "hello from lazy"
+    assert (tmp_path / "manifest.txt").exists()
+
+    for name in ["fakeplugins", "fakeplugins.hello", "fakeplugins.timer"]:
+        monkeypatch.delitem(sys.modules, name)
+
+    # next startup registers stand-ins instead of importing the lazy plug-in
+    workbench = _load(tmp_path, monkeypatch)
+    assert "fakeplugins.hello" not in sys.modules
+    assert "fakeplugins.timer" in sys.modules
+    assert not isinstance(workbench.commands["timer"], PluginStandIn)
+    assert workbench.options["greeting.name"] == "lazy"
+    assert isinstance(workbench.views["HelloView"], PluginStandIn)
+
+    workbench.options["greeting.name"] = "user"
+    assert workbench.commands["hello"]() == "hello from user"
+    view = workbench.views["HelloView"]("master")
+    assert type(view) is sys.modules["fakeplugins.hello"].HelloView
+    assert view.master == "master"
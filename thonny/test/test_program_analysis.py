@@ -0,0 +1,137 @@
+import threading
+
+import thonny
+from thonny.program_analysis import (
+    ProgramAnalysisRunner,
+    ProgramAnalyzer,
+    ProgramAnalyzerResponseItem,
+    ProgramAnalyzerResponseItemType,
+    get_program_files_fingerprint,
+)
+
+
+class FakeAnalyzer(ProgramAnalyzer):
+    def __init__(self, before_finishing=None):
+        self.analyzed_files = []
+        self.started = threading.Event()
+        self._before_finishing = before_finishing
+        self._cancelled = False
+        self._results = None
+
+    def analyze(self, main_file):
+        self._cancelled = False
+        self._results = None
+        self.analyzed_files.append(main_file)
+        self.started.set()
+        if self._before_finishing is not None:
+            self._before_finishing(main_file)
+        if not self._cancelled:
+            self._results = [
+                ProgramAnalyzerResponseItem(
+                    "checked", ProgramAnalyzerResponseItemType.WARNING, main_file, 1, 0
+                )
+            ]
+
+    def get_results(self):
+        return self._results
+
+    def cancel(self):
+        self._cancelled = True
+        self._results = None
+
+    def get_config_key(self, main_file):
+        return "fake"
+
+
+class FakeWorkbench:
+    def __init__(self, analyzer):
+        self.program_analyzers = {"fake": analyzer}
+        self.events = []
+
+    def get_option(self, name):
+        return name == "analysis.fake.enabled"
+
+    def queue_event(self, sequence, event=None):
+        self.events.append((sequence, event))
+
+
+def _run(runner, main_file):
+    runner.start_analysis(str(main_file))
+    # the executor has a single worker, so this waits for the submitted analysis
+    runner._executors["fake"].submit(lambda: None).result(timeout=10)
+
+
+def _make_runner(tmp_path, monkeypatch, analyzer):
+    monkeypatch.setattr(thonny, "_workbench", FakeWorkbench(analyzer))
+    main_file = tmp_path / "main.py"
+    main_file.write_text("x = 1\n")
+    return ProgramAnalysisRunner(), main_file
+
+
+def test_fingerprint_covers_imported_user_files(tmp_path):
+    main_file = tmp_path / "main.py"
+    main_file.write_text("import helper\n")
+    helper_file = tmp_path / "helper.py"
+    helper_file.write_text("x = 1\n")
+
+    fingerprint = get_program_files_fingerprint(str(main_file))
+    assert get_program_files_fingerprint(str(main_file)) == fingerprint
+
+    helper_file.write_text("x = 2\n")
+    assert get_program_files_fingerprint(str(main_file)) != fingerprint
+
+
+def test_runner_reuses_results_for_unchanged_files(tmp_path, monkeypatch):
+    analyzer = FakeAnalyzer()
+    runner, main_file = _make_runner(tmp_path, monkeypatch, analyzer)
+
+    _run(runner, main_file)
+    assert len(analyzer.analyzed_files) == 1
+    assert runner.get_results("fake")[0].message == "checked"
+
+    _run(runner, main_file)
+    assert len(analyzer.analyzed_files) == 1
+    assert runner.get_results("fake")[0].message == "checked"
+    assert thonny.get_workbench().events[-1] == (
+        "ProgramAnalysisCompleted",
+        dict(analyzer_class="FakeAnalyzer", from_cache=True),
+    )
+
+    main_file.write_text("x = 2\n")
+    _run(runner, main_file)
+    assert len(analyzer.analyzed_files) == 2
+
+
+def test_runner_doesnt_store_results_of_cancelled_run(tmp_path, monkeypatch):
+    proceed = threading.Event()
+    analyzer = FakeAnalyzer(lambda main_file: proceed.wait(10))
+    runner, main_file = _make_runner(tmp_path, monkeypatch, analyzer)
+
+    runner.start_analysis(str(main_file))
+    assert analyzer.started.wait(10)
+    runner.cancel()
+    proceed.set()
+    runner._executors["fake"].submit(lambda: None).result(timeout=10)
+    assert runner.get_results("fake") is None
+    assert not runner._cache
+
+    _run(runner, main_file)
+    assert len(analyzer.analyzed_files) == 2
+    assert runner.get_results("fake")[0].message == "checked"
+
+
+def test_runner_doesnt_cache_results_when_files_change_during_run(tmp_path, monkeypatch):
+    def modify_file(main_file):
+        with open(main_file, "a") as fp:
+            fp.write("y = 2\n")
+
+    analyzer = FakeAnalyzer(modify_file)
+    runner, main_file = _make_runner(tmp_path, monkeypatch, analyzer)
+
+    _run(runner, main_file)
+    # results are shown, but not reused for the new contents
+    assert runner.get_results("fake")[0].message == "checked"
+    assert not runner._cache
+
+    _run(runner, main_file)
+    assert len(analyzer.analyzed_files) == 2
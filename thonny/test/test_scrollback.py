@@ -0,0 +1,42 @@
+from thonny.scrollback import ScrollbackStore
+
+
+def test_push_and_pop_lines():
+    store = ScrollbackStore()
+    try:
+        store.push_lines([("first", [(0, 5, ("io", "stdout"))], []), ("zero\0byte", [], [])])
+        store.push_lines([("ümlaut 😀", [(0, 6, ("fore_red",))], [(2, "squeezed", "x" * 100)])])
+        assert len(store) == 3
+
+        assert store.pop_lines(2) == [
+            ("zero\0byte", [], []),
+            ("ümlaut 😀", [(0, 6, ("fore_red",))], [(2, "squeezed", "x" * 100)]),
+        ]
+        assert len(store) == 1
+
+        # popped space gets reused
+        store.push_lines([("second", [], [])])
+        assert store.pop_lines(10) == [
+            ("first", [(0, 5, ("io", "stdout"))], []),
+            ("second", [], []),
+        ]
+        assert len(store) == 0
+        assert store.pop_lines(1) == []
+    finally:
+        store.close()
+
+
+def test_find_last():
+    store = ScrollbackStore()
+    try:
+        store.push_lines([("Hello", [], []), ("world", [], []), ("hello again", [], [])])
+        assert store.find_last("hello") == 2
+        assert store.find_last("Hello") == 0
+        assert store.find_last("WORLD", case_sensitive=False) == 1
+        assert store.find_last("missing") is None
+
+        store.clear()
+        assert len(store) == 0
+        assert store.find_last("hello") is None
+    finally:
+        store.close()
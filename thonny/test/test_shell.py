@@ -0,0 +1,71 @@
+import collections
+
+import thonny
+from thonny.shell import IO_REWIND_SEGMENTS, BaseShellText
+
+
+class FakeWorkbench:
+    def __init__(self, max_rewindable_io_chars):
+        self.options = {"shell.max_rewindable_io_chars": max_rewindable_io_chars}
+
+    def get_option(self, name):
+        return self.options[name]
+
+
+class FakeShellText(BaseShellText):
+    def __init__(self):
+        # skip the widget part, marks are tracked by the positions of the output
+        self.marks = {"output_insert": 0}
+        self._applied_io_events = collections.deque()
+        self._applied_io_char_count = 0
+        self._io_rewind_checkpoints = collections.deque()
+        self._io_events_after_last_checkpoint = 0
+        self._io_checkpoint_counter = 0
+        self._reset_ansi_attributes()
+        self._io_cursor_offset = 0
+        self.active_extra_tags = []
+
+    def mark_set(self, name, index):
+        self.marks[name] = self.marks.get(index, index)
+
+    def mark_unset(self, name):
+        del self.marks[name]
+
+    def mark_gravity(self, name, direction=None):
+        pass
+
+    def apply_output(self, data):
+        self.marks["output_insert"] += len(data)
+        self._record_applied_io_event(data, "stdout")
+
+
+def test_oldest_io_segments_get_dropped_one_by_one(monkeypatch):
+    max_chars = 80
+    monkeypatch.setattr(thonny, "_workbench", FakeWorkbench(max_chars))
+    text = FakeShellText()
+    # command started
+    text._set_io_rewind_checkpoint()
+    assert text.marks["io_rewind_start"] == 0
+
+    segment_size = max_chars // IO_REWIND_SEGMENTS
+    for _ in range(IO_REWIND_SEGMENTS):
+        text.apply_output("x" * segment_size)
+
+    # everything since program start can be rewound
+    assert text.marks["io_rewind_start"] == 0
+    assert len(text._applied_io_events) == IO_REWIND_SEGMENTS
+
+    text.apply_output("y" * segment_size)
+    # only the oldest segment is dropped
+    assert text.marks["io_rewind_start"] == segment_size
+    assert text._io_rewind_base_char_count == segment_size
+    assert len(text._applied_io_events) == IO_REWIND_SEGMENTS
+    assert text._applied_io_events[-1] == ("y" * segment_size, "stdout")
+    assert (
+        sum(len(data) for data, _ in text._applied_io_events)
+        == text._applied_io_char_count - text._io_rewind_base_char_count
+    )
+
+    # marks of dropped checkpoints get removed
+    checkpoint_marks = [name for name in text.marks if name.startswith("io_rewind_checkpoint")]
+    assert len(checkpoint_marks) == len(text._io_rewind_checkpoints)
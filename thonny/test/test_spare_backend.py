@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+from thonny.running import SpareBackendProcess
+
+POPEN_KWARGS = dict(
+    stdin=subprocess.PIPE,
+    stdout=subprocess.PIPE,
+    stderr=subprocess.PIPE,
+    universal_newlines=True,
+    encoding="utf-8",
+)
+
+
+def test_spare_process_keeps_its_output_for_the_taker():
+    cmd_line = [sys.executable, "-c", "import sys; print('OK'); print('ready'); sys.stdin.read()"]
+    spare = SpareBackendProcess(cmd_line, POPEN_KWARGS, conditions=False)
+    assert spare.matches(list(cmd_line), dict(POPEN_KWARGS), False)
+    assert not spare.matches(cmd_line + ["-u"], POPEN_KWARGS, False)
+    # eg. user site-packages has been created meanwhile
+    assert not spare.matches(cmd_line, POPEN_KWARGS, True)
+
+    proc, ack = spare.take()
+    try:
+        assert ack == "OK"
+        assert proc.stdout.readline() == "ready\n"
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def test_failed_or_discarded_spare_process_is_not_used():
+    spare = SpareBackendProcess([sys.executable, "-c", "print('Error')"], POPEN_KWARGS)
+    assert spare.take() is None
+
+    spare = SpareBackendProcess([sys.executable, "-c", "print('OK'); input()"], POPEN_KWARGS)
+    spare.discard()
+    assert spare.take() is None
@@ -45,8 +45,12 @@ SQSTRING_CLOSED = STRINGPREFIX + r"'[^'\\\n]*(\\.[^'\\\n]*)*'"
 DQSTRING_OPEN = STRINGPREFIX + r'"[^"\\\n]*(\\.[^"\\\n]*)*\n?'
 DQSTRING_CLOSED = STRINGPREFIX + r'"[^"\\\n]*(\\.[^"\\\n]*)*"'
 
-SQ3STRING = STRINGPREFIX + r"'''[^'\\]*((\\.|'(?!''))[^'\\]*)*(''')?"
-DQ3STRING = STRINGPREFIX + r'"""[^"\\]*((\\.|"(?!""))[^"\\]*)*(""")?'
+# the rest of a triple-quoted string after the opening delimiter
+SQ3STRING_BODY = r"[^'\\]*((\\.|'(?!''))[^'\\]*)*(''')?"
+DQ3STRING_BODY = r'[^"\\]*((\\.|"(?!""))[^"\\]*)*(""")?'
+
+SQ3STRING = STRINGPREFIX + r"'''" + SQ3STRING_BODY
+DQ3STRING = STRINGPREFIX + r'"""' + DQ3STRING_BODY
 
 SQ3DELIMITER = STRINGPREFIX + "'''"
 DQ3DELIMITER = STRINGPREFIX + '"""'
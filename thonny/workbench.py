@@ -1,11 +1,9 @@
 # -*- coding: utf-8 -*-
 import ast
 import collections
-import importlib
 import json
 import os.path
 import pathlib
-import pkgutil
 import platform
 import queue
 import re
@@ -31,6 +29,7 @@ from thonny import (
     get_thonny_user_dir,
     is_portable,
     languages,
+    report_time,
     ui_utils,
 )
 from thonny.common import Record, UserError, normpath_with_actual_case
@@ -79,7 +78,8 @@ from thonny.misc_utils import (
     running_on_windows,
     uri_to_legacy_filename,
 )
-from thonny.program_analysis import ProgramAnalyzer
+from thonny.plugin_manifest import PluginLoader
+from thonny.program_analysis import ProgramAnalysisRunner, ProgramAnalyzer
 from thonny.running import BackendProxy, Runner
 from thonny.shell import ShellView
 from thonny.ui_utils import (
@@ -202,6 +202,7 @@ class Workbench(tk.Tk):
         self._view_records = {}  # type: Dict[str, Dict[str, Any]]
         self.content_inspector_classes = []  # type: List[Type]
         self.program_analyzers: Dict[str, ProgramAnalyzer] = {}
+        self.program_analysis_runner = ProgramAnalysisRunner()
         self._latin_shortcuts = {}  # type: Dict[Tuple[int,int], List[Tuple[Callable, Callable]]]
         self._os_dark_mode = os_is_in_dark_mode()
         self._init_language()
@@ -225,7 +226,9 @@ class Workbench(tk.Tk):
         self._runner = Runner()
         self._init_hooks()  # Plugins may register hooks, so initialized them before to load plugins.
         logger.info("Start loading plugins")
+        report_time("Before loading plugins")
         self._load_plugins()
+        report_time("After loading plugins")
         logger.info("Done loading plugins")
 
         self._editor_notebook = None  # type: Optional[EditorNotebook]
@@ -296,6 +299,7 @@ class Workbench(tk.Tk):
 
     def finalize_startup(self):
         logger.info("Finalizing startup")
+        report_time("Finalizing startup")
         try:
             self.ready = True
             self._editor_notebook.update_appearance()
@@ -622,7 +626,7 @@ class Workbench(tk.Tk):
         # built-in plugins
         import thonny.plugins  # pylint: disable=redefined-outer-name
 
-        self._load_plugins_from_path(thonny.plugins.__path__, "thonny.plugins.")  # type: ignore
+        sources = [(thonny.plugins.__path__, "thonny.plugins.")]  # type: ignore
 
         # 3rd party plugins from namespace package
         # Now it's time to add plugins dir to sys path
@@ -633,34 +637,14 @@ class Workbench(tk.Tk):
             # No 3rd party plugins installed
             pass
         else:
-            self._load_plugins_from_path(thonnycontrib.__path__, "thonnycontrib.")
+            sources.append((thonnycontrib.__path__, "thonnycontrib."))
 
-    def _load_plugins_from_path(self, path: List[str], prefix: str) -> None:
-        load_function_name = "load_plugin"
-
-        modules = []
-        for _, module_name, _ in sorted(pkgutil.iter_modules(path, prefix), key=lambda x: x[2]):
-            if module_name in OBSOLETE_PLUGINS:
-                logger.debug("Skipping plug-in %s", module_name)
-            else:
-                try:
-                    logger.debug("Importing %r", module_name)
-                    m = importlib.import_module(module_name)
-                    if hasattr(m, load_function_name):
-                        modules.append(m)
-                except Exception:
-                    logger.exception("Failed loading plugin '" + module_name + "'")
-
-        def module_sort_key(m):
-            return getattr(m, "load_order_key", m.__name__)
-
-        for m in sorted(modules, key=module_sort_key):
-            logger.debug("Loading plugin %r from file %r", m.__name__, m.__file__)
-            try:
-                getattr(m, load_function_name)()
-            except Exception:
-                logger.exception("Could not load plugin")
-                self.report_exception("Coult not load plugin " + m.__name__)
+        self._plugin_loader = PluginLoader(
+            self,
+            os.path.join(thonny.get_thonny_user_dir(), "plugin_manifest.txt"),
+            OBSOLETE_PLUGINS,
+        )
+        self._plugin_loader.load_plugins(sources)
 
     def _init_fonts(self) -> None:
         # set up editor and shell fonts
@@ -2798,6 +2782,7 @@ class Workbench(tk.Tk):
 
         self._closing = True
         self.shut_down_language_servers()
+        self.program_analysis_runner.close()
         try:
             from thonny.plugins import replayer
 